@@ -1,3 +1,15 @@
-from .server import find_documents, enhance_question, intent_classification, get_prompt
+"""
+Tool server (FastMCP). Các tool được import lazy để `import MCP.http_transport`
+(hoặc client chỉ gọi tool qua HTTP) không kéo theo MongoClient và model của MCP.server.
+"""
+import importlib
 
-__all__ = ["find_documents", "enhance_question", "intent_classification", "server", "get_prompt"]
\ No newline at end of file
+__all__ = ["find_documents", "enhance_question", "intent_classification", "route_query", "classify_slot",
+           "search_job_hybrid", "server", "get_prompt"]
+
+
+def __getattr__(name):
+    if name in ("find_documents", "enhance_question", "intent_classification", "route_query", "classify_slot",
+                "search_job_hybrid", "get_prompt"):
+        return getattr(importlib.import_module(".server", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
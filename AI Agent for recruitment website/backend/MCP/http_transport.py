@@ -0,0 +1,68 @@
+"""
+Chạy FastMCP server qua streamable HTTP để nhiều web worker/agent dùng chung
+một tool server đã warm-up (client: llms/mcp_client.py).
+
+Tool sync của FastMCP chạy thẳng trên event loop, nên một tool chậm (LLM, embedding)
+sẽ chặn mọi request khác. offload_sync_tools() chuyển chúng sang thread pool
+(giới hạn bởi CapacityLimiter) để các tool call được xử lý song song.
+"""
+import functools
+from typing import Optional
+
+import anyio
+from loguru import logger
+from mcp.server.fastmcp import FastMCP
+from mcp.server.transport_security import TransportSecuritySettings
+
+from setting import Settings
+
+
+def offload_sync_tools(server: FastMCP, max_threads: int = 16) -> int:
+    """
+    Bọc các tool sync đã đăng ký thành async (chạy bằng anyio.to_thread).
+    Hàm Python gốc không bị thay đổi nên vẫn gọi trực tiếp trong process được.
+    Trả về số tool đã bọc.
+    """
+    limiter: Optional[anyio.CapacityLimiter] = None
+    wrapped = 0
+
+    for tool in server._tool_manager.list_tools():
+        if tool.is_async:
+            continue
+
+        def make_async(fn):
+            async def run_in_thread(**kwargs):
+                nonlocal limiter
+                if limiter is None:
+                    # CapacityLimiter phải được tạo trong event loop
+                    limiter = anyio.CapacityLimiter(max_threads)
+                return await anyio.to_thread.run_sync(functools.partial(fn, **kwargs), limiter=limiter)
+            return run_in_thread
+
+        tool.fn = make_async(tool.fn)
+        tool.is_async = True
+        wrapped += 1
+    return wrapped
+
+
+def transport_security(settings: Settings) -> TransportSecuritySettings:
+    """Chống DNS rebinding: chỉ nhận Host (và Origin tương ứng) trong Settings.MCP_ALLOWED_HOSTS"""
+    return TransportSecuritySettings(
+        enable_dns_rebinding_protection=True,
+        allowed_hosts=list(settings.MCP_ALLOWED_HOSTS),
+        allowed_origins=[f"http://{host}" for host in settings.MCP_ALLOWED_HOSTS],
+    )
+
+
+def run_http(server: FastMCP, settings: Optional[Settings] = None):
+    """Chạy server ở chế độ streamable HTTP theo Settings.MCP_HOST/MCP_PORT/MCP_PATH"""
+    settings = settings or Settings.load_settings()
+    server.settings.host = settings.MCP_HOST
+    server.settings.port = settings.MCP_PORT
+    server.settings.streamable_http_path = settings.MCP_PATH
+    # Mặc định FastMCP chỉ cho phép Host localhost: web worker gọi qua tên service (mcp-server:8000) sẽ bị chặn
+    server.settings.transport_security = transport_security(settings)
+    wrapped = offload_sync_tools(server, settings.MCP_TOOL_THREADS)
+    logger.info(f"🌐 MCP server listening on http://{settings.MCP_HOST}:{settings.MCP_PORT}{settings.MCP_PATH} "
+                f"({wrapped} sync tools offloaded to threads)")
+    server.run(transport="streamable-http")
@@ -6,26 +6,75 @@ from pathlib import Path
 backend_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(backend_dir))
 
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from mcp.server.fastmcp import FastMCP
 from pymongo import MongoClient
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from loguru import logger
 from setting import Settings
+from log_config import setup_logging
+from tool.tracing import SPAN_KIND_CLIENT, trace_span, traced
+
+try:
+    from pymongo import AsyncMongoClient
+except ImportError:  # pymongo < 4.9: find_documents async chạy bản sync trên executor
+    AsyncMongoClient = None
 
 # 1️⃣ Tạo server
 server = FastMCP("demo-mcp")
 
 # Load settings
 settings = Settings.load_settings()
+setup_logging(settings)
 
 # connect to MongoDB (example, adjust as needed)
 mongo_client = MongoClient(settings.DATABASE_HOST)
 db = mongo_client[settings.DATABASE_NAME]
 
-# 🚀 Preload models để tăng tốc độ response
-print("🚀 Initializing models...")
+
+# Async driver cho tool async, tạo khi cần trong event loop của server
+_async_mongo = None  # (event loop, AsyncMongoClient)
+
+# Executor cho phần CPU-bound (encode embedding) của tool async
+_cpu_executor = None
+_cpu_executor_lock = threading.Lock()
+
+
+def reset_mongo_client():
+    """Tạo MongoClient mới (MongoClient không fork-safe: gọi trong worker sau khi fork)"""
+    global mongo_client, db, _async_mongo
+    mongo_client = MongoClient(settings.DATABASE_HOST)
+    db = mongo_client[settings.DATABASE_NAME]
+    _async_mongo = None
+
+
+def get_async_db():
+    """Database của AsyncMongoClient gắn với event loop hiện tại"""
+    global _async_mongo
+    loop = asyncio.get_running_loop()
+    if _async_mongo is None or _async_mongo[0] is not loop:
+        _async_mongo = (loop, AsyncMongoClient(settings.DATABASE_HOST))
+    return _async_mongo[1][settings.DATABASE_NAME]
+
+
+async def run_cpu_bound(fn, *args, **kwargs):
+    """Chạy hàm CPU-bound (torch encode nhả GIL) trên executor riêng, không chặn event loop"""
+    global _cpu_executor
+    if _cpu_executor is None:
+        with _cpu_executor_lock:
+            if _cpu_executor is None:
+                _cpu_executor = ThreadPoolExecutor(max_workers=settings.MAX_WORKERS, thread_name_prefix="mcp-encode")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_cpu_executor, functools.partial(fn, *args, **kwargs))
+
 from tool.model_manager import model_manager
-model_manager.preload_models()
-print("✅ Models preloaded successfully!")
+from tool.query_routing import classify_query, classify_slot, route_query
+
+# Chỉ một request bootstrap hybrid index, các request khác chờ rồi dùng index đã dựng
+_hybrid_bootstrap_lock = threading.Lock()
 
 # 2️⃣ Định nghĩa tool
 @server.tool()
@@ -34,7 +83,6 @@ def hello(name: str) -> str:
     return f"Hello, {name}!"
 
 #MongoDB
-@server.tool()
 def find_documents(collection: str, query: Dict[str, Any] = {}) -> List[Dict[str, Any]]:
     """
     find documents in mongoDB
@@ -42,15 +90,29 @@ def find_documents(collection: str, query: Dict[str, Any] = {}) -> List[Dict[str
         collection: name of the collection on mongoDB
         query: fillter query (vd: {"name": "Alice"})
     """
-    col = db[collection]
-    docs = list(col.find(query))
+    with trace_span("mongo.find", kind=SPAN_KIND_CLIENT, collection=collection) as span:
+        col = db[collection]
+        docs = list(col.find(query))
+        span.set_attribute("db.documents", len(docs))
     
     for d in docs:
         d["_id"] = str(d["_id"])
     return docs
 
+
+@server.tool(name="find_documents", description=find_documents.__doc__)
+async def find_documents_async(collection: str, query: Dict[str, Any] = {}) -> List[Dict[str, Any]]:
+    if AsyncMongoClient is None:
+        return await run_cpu_bound(find_documents, collection, query)
+    with trace_span("mongo.find", kind=SPAN_KIND_CLIENT, collection=collection) as span:
+        docs = await get_async_db()[collection].find(query).to_list(None)
+        span.set_attribute("db.documents", len(docs))
+    for d in docs:
+        d["_id"] = str(d["_id"])
+    return docs
+
 # Tool trích xuất đặc trưng từ câu hỏi về JD
-@server.tool()
+@traced("tool.extract_features_from_question")
 def extract_features_from_question(query: str, prompt_type: str) -> Dict[str, Any]:
     """
     Trích xuất các đặc trưng từ câu hỏi về JD
@@ -62,14 +124,25 @@ def extract_features_from_question(query: str, prompt_type: str) -> Dict[str, An
     """
     from tool.extract_feature_question_about_jd import ExtractFeatureQuestion
     extractor = ExtractFeatureQuestion(
-        model_name=os.getenv("OLLAMA_MODEL", "hf.co/Cactus-Compute/Qwen3-1.7B-Instruct-GGUF:Q4_K_M"),
         validate_response=["title", "skills", "company", "location", "experience"]
     )
     features = extractor.extract(query, prompt_type)
     return features
 
 
-@server.tool()
+@server.tool(name="extract_features_from_question", description=extract_features_from_question.__doc__)
+@traced("tool.extract_features_from_question")
+async def extract_features_from_question_async(query: str, prompt_type: str) -> Dict[str, Any]:
+    from tool.extract_feature_question_about_jd import ExtractFeatureQuestion
+    # Chọn model (/api/tags) và tạo client (warm-up) là blocking I/O: chạy trên executor
+    extractor = await run_cpu_bound(
+        ExtractFeatureQuestion,
+        validate_response=["title", "skills", "company", "location", "experience"]
+    )
+    return await extractor.aextract(query, prompt_type)
+
+
+@traced("tool.intent_classification")
 def intent_classification(query: str) -> str:
     """
     Phân loại intent của câu hỏi (sử dụng cached models)
@@ -78,24 +151,32 @@ def intent_classification(query: str) -> str:
     Returns:
         str: intent đã phân loại (vd: "recruitment", "salary", "company_info", ...)
     """
-    from tool.model_manager import model_manager
-    
-    try:
-        # Lấy semantic router từ cache
-        semantic_router = model_manager.get_semantic_router()
-        
-        # Phân loại intent
-        print(f"\n🔍 Classifying query: {query}")
-        score, route_name = semantic_router.guide(query)
-        print(f"✅ Classification result: {route_name} (score: {score:.4f})")
-        
-        return route_name
-        
-    except Exception as e:
-        print(f"❌ Error in intent classification: {str(e)}")
-        return "unknown"
+    route_name, _ = classify_query(query)
+    return route_name
+
+
+@server.tool(name="intent_classification", description=intent_classification.__doc__)
+@traced("tool.intent_classification")
+async def intent_classification_async(query: str) -> str:
+    # Encode câu hỏi (torch) trên executor, event loop vẫn phục vụ tool call khác
+    route_name, _ = await run_cpu_bound(classify_query, query)
+    return route_name
+
+
+@server.tool(name="route_query", description=route_query.__doc__)
+@traced("tool.route_query")
+async def route_query_async(query: str) -> Dict[str, Any]:
+    return await run_cpu_bound(route_query, query)
+
+
+@server.tool(name="classify_slot", description=classify_slot.__doc__)
+@traced("tool.classify_slot")
+async def classify_slot_async(message: str, expected_slot: Optional[str] = None) -> Dict[str, Any]:
+    return await run_cpu_bound(classify_slot, message, expected_slot=expected_slot)
+
 
 @server.tool()
+@traced("tool.enhance_question")
 def enhance_question(query: str) -> str:
     """
     Nâng cấp câu hỏi từ incomplete -> complete
@@ -106,28 +187,76 @@ def enhance_question(query: str) -> str:
     """
     from tool.question_enhancer import QuestionEnhancer
     enhancer = QuestionEnhancer()
-    print(f"\nCâu hỏi: '{query}'")
     info_status = enhancer.analyze_incomplete_question(query)
     missing_info = enhancer.get_priority_missing_info(info_status)
     follow_up = enhancer.generate_follow_up_question(missing_info)
         
-    print(f"Thông tin thiếu: {[info.value for info in missing_info]}")
-    print(f"Câu hỏi follow-up: {follow_up}")
+    logger.debug("Câu hỏi: {!r} | Thông tin thiếu: {} | Câu hỏi follow-up: {}",
+                 query, [info.value for info in missing_info], follow_up)
     return follow_up
 
 
+@server.tool()
+def suggest_jobs_for_cv(cv_features: Dict[str, Any], top_k: int = 5) -> List[Dict[str, Any]]:
+    """
+    Gợi ý job phù hợp với CV (intent_suggest_job)
+    Args:
+        cv_features: đặc trưng CV (skills, experience_years, location, ...) theo prompt extract_features_cv
+        top_k: số job trả về
+    Returns:
+        list: các job phù hợp nhất kèm score
+    """
+    matcher = model_manager.get_job_matcher()
+    if not len(matcher.jobs):
+        collection = db[settings.COLLECTION_JOB or "jobs"]
+        matcher.index_jobs(list(collection.find(
+            {}, {"_id": 0, "content_hash": 0, "extra": 0, "created_at": 0, "updated_at": 0}
+        )))
+    return matcher.suggest_jobs(cv_features, top_k=top_k or settings.MATCH_TOP_K)
+
+
+@traced("tool.search_job_hybrid")
+def search_job_hybrid(query: str, top_k: int = 5, location: str = "") -> Dict[str, Any]:
+    """
+    Tìm kiếm công việc bằng hybrid retrieval (BM25 bỏ dấu + embedding, gộp bằng RRF)
+    Args:
+        query: câu hỏi hoặc từ khóa tìm kiếm (vd: "python hà nội")
+        top_k: số kết quả trả về
+        location: chỉ lấy job ở địa điểm này (để trống nếu không lọc)
+    Returns:
+        dict: kết quả tìm kiếm
+    """
+    index = model_manager.get_hybrid_index()
+    if not len(index):
+        with _hybrid_bootstrap_lock:
+            index = model_manager.get_hybrid_index()
+            if not len(index):
+                # Lần đầu: index toàn bộ job catalog từ MongoDB rồi lưu xuống disk
+                # (job ingestion cập nhật index đã lưu, các process khác load lại)
+                index.add(find_documents(settings.COLLECTION_JOB or "jobs", {}))
+                index.save(settings.HYBRID_INDEX_PATH)
+
+    results = index.search(query, top_k=top_k, location=location or None)
+    if not results:
+        return {"message": "No jobs found matching the query."}
+    return {"query": query, "total_found": len(results), "jobs": results}
+
+
+@server.tool(name="search_job_hybrid", description=search_job_hybrid.__doc__)
+async def search_job_hybrid_async(query: str, top_k: int = 5, location: str = "") -> Dict[str, Any]:
+    # BM25 + encode câu hỏi (và bootstrap index lần đầu) trên executor
+    return await run_cpu_bound(search_job_hybrid, query, top_k=top_k, location=location)
+
+
 @server.tool()
 def get_prompt(prompt_name: str, **kwargs) -> str:
     """
     Lấy prompt text. Nếu có kwargs thì format các placeholder.
     Ví dụ: get_prompt("extract_features_question_aboout_job", user_input="Tìm việc ở Hà Nội")
     """
-    from prompt.promt_config import PromptConfig
-    prompt_config = PromptConfig()
-    prompt_text = prompt_config.get_prompt(prompt_name, **kwargs)
-    return prompt_text
+    from prompt.promt_config import get_prompt as render_prompt
+    return render_prompt(prompt_name, **kwargs)
 
-@server.tool()
 def get_reflection(history: List[Dict[str, str]]) -> str:
     """
     Sử dụng Reflection để tự đánh giá và cải thiện câu trả lời
@@ -139,24 +268,48 @@ def get_reflection(history: List[Dict[str, str]]) -> str:
         str: câu trả lời đã được cải thiện
     """
     from tool.reflection import Reflection
-    from llms.ollama_llms import OllamaLLMs
     
-    # Create LLM instance for reflection
-    default_url = "http://host.docker.internal:11434" if os.getenv("DOCKER_ENV") == "true" else "http://localhost:11434"
-    ollama_url = os.getenv("OLLAMA_URL", default_url)
-    ollama_model = os.getenv("OLLAMA_MODEL", "hf.co/Cactus-Compute/Qwen3-1.7B-Instruct-GGUF:Q4_K_M")
-    
-    llm = OllamaLLMs(base_url=ollama_url, model_name=ollama_model)
+    # LLM cho reflection theo model tier của task "reflect" (cached)
+    llm = model_manager.get_llm_model(task="reflect")
     reflection = Reflection(llm=llm)
     
     try:
         improved_answer = reflection.__call__(history)
-        print("Reflection completed.", {"improved_answer": improved_answer})
+        logger.debug("Reflection completed: {}", improved_answer)
+        return improved_answer
+    except Exception as e:
+        logger.error("❌ Error in reflection process: {}", e)
+        return "Error in reflection process."
+
+
+@server.tool(name="get_reflection", description=get_reflection.__doc__)
+async def get_reflection_async(history: List[Dict[str, str]]) -> str:
+    from tool.reflection import Reflection
+
+    llm = await run_cpu_bound(model_manager.get_llm_model, task="reflect")
+    reflection = Reflection(llm=llm)
+
+    try:
+        improved_answer = await reflection.acall(history)
+        logger.debug("Reflection completed: {}", improved_answer)
         return improved_answer
     except Exception as e:
-        print(f"❌ Error in reflection process: {str(e)}")
+        logger.error("❌ Error in reflection process: {}", e)
         return "Error in reflection process."
 
-# 3️⃣ Chạy server qua STDIO
+def run_server(transport: str = None):
+    """Chạy server qua STDIO hoặc streamable HTTP (Settings.MCP_TRANSPORT)"""
+    transport = transport or settings.MCP_TRANSPORT
+    # 🚀 Preload models (song song, nền) để tăng tốc độ response
+    from tool.startup_orchestrator import start_warmup
+    # Tool server tự load model, kể cả khi .env dùng chung có MCP_SERVER_URL (của web worker)
+    start_warmup(settings.model_copy(update={"MCP_SERVER_URL": ""}))
+    if transport == "streamable-http":
+        from MCP.http_transport import run_http
+        run_http(server, settings)
+    else:
+        server.run(transport=transport)
+
+# 3️⃣ Chạy server (STDIO mặc định, streamable HTTP khi MCP_TRANSPORT="streamable-http")
 if __name__ == "__main__":
-    server.run()
+    run_server(sys.argv[1] if len(sys.argv) > 1 else None)
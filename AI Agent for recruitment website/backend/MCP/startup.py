@@ -3,56 +3,47 @@ Script khởi động tối ưu cho ứng dụng với preloading models
 """
 import sys
 import os
-import time
 from pathlib import Path
 
 # Add backend to path
 backend_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(backend_dir))
 
+from loguru import logger
+
+from log_config import setup_logging
 from setting import Settings
 from tool.model_manager import model_manager
-from llms.ollama_llms import OllamaLLMs
+from tool.startup_orchestrator import start_warmup
 
 def startup_optimization():
     """
-    Thực hiện tối ưu hóa khi khởi động ứng dụng
+    Thực hiện tối ưu hóa khi khởi động ứng dụng: các bước warm-up độc lập
+    (embedding model, route index, Ollama, MongoDB) chạy song song
     """
-    print("🚀 Starting AI Agent Recruitment System...")
-    
     # Load settings
     settings = Settings.load_settings()
-    print("✅ Settings loaded")
+    setup_logging(settings)
+    logger.info("🚀 Starting AI Agent Recruitment System...")
     
-    if settings.ENABLE_MODEL_PRELOAD:
-        print("🔥 Preloading models...")
-        start_time = time.time()
-        
-        # Preload embedding model và semantic router
-        model_manager.preload_models()
-        
-        # Preload và warm-up Ollama model
-        try:
-            ollama_model = OllamaLLMs(
-                base_url=settings.OLLAMA_BASE_URL,
-                model_name=settings.RAG_MODEL_ID.split("/")[-1].split(":")[0]  # Extract model name
-            )
-            # Set keep-alive để model không bị unload
-            ollama_model.keep_alive(settings.MODEL_KEEP_ALIVE)
-            print(f"✅ Ollama model warmed up: {settings.RAG_MODEL_ID}")
-        except Exception as e:
-            print(f"⚠️ Ollama warm-up failed: {e}")
-        
-        elapsed_time = time.time() - start_time
-        print(f"✅ All models preloaded in {elapsed_time:.2f} seconds")
+    logger.info("🔥 Warming up...")
+    orchestrator = start_warmup(settings)
+    ready = orchestrator.wait(settings.STARTUP_TIMEOUT, critical_only=False)
+    
+    for name, task in orchestrator.get_status()["tasks"].items():
+        duration = f"{task['duration']:.2f}s" if task["duration"] is not None else "-"
+        logger.info("   {:<16} {:<9} {}{}", name, task["status"], duration, f"  ({task['error']})" if task["error"] else "")
     
-    print("🎯 System ready for optimal performance!")
+    if ready:
+        logger.info("🎯 System ready for optimal performance!")
+    else:
+        logger.warning("⚠️ Critical warm-up tasks not finished, continuing in background")
     
     # In thông tin cache
     cache_info = model_manager.get_cache_info()
-    print(f"📦 Cached models: {cache_info['cached_models']}")
+    logger.info("📦 Cached models: {}", cache_info["cached_models"])
     
-    return True
+    return ready
 
 def health_check():
     """
@@ -63,28 +54,27 @@ def health_check():
         
         # Test intent classification
         test_result = intent_classification("Tôi muốn tìm việc")
-        print(f"🔍 Health check passed - Intent: {test_result}")
+        logger.info("🔍 Health check passed - Intent: {}", test_result)
         return True
     except Exception as e:
-        print(f"❌ Health check failed: {e}")
+        logger.error("❌ Health check failed: {}", e)
         return False
 
 if __name__ == "__main__":
-    print("=" * 50)
-    print("🤖 AI Agent Recruitment System")
-    print("=" * 50)
+    setup_logging()
+    logger.info("🤖 AI Agent Recruitment System")
     
     # Startup optimization
     startup_optimization()
     
     # Health check
     if health_check():
-        print("✅ System is healthy and ready!")
+        logger.info("✅ System is healthy and ready!")
     else:
-        print("❌ System health check failed!")
+        logger.error("❌ System health check failed!")
         sys.exit(1)
     
     # Start main server
-    print("🌟 Starting main server...")
-    from server import server
-    server.run()
+    logger.info("🌟 Starting main server...")
+    from server import run_server
+    run_server(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -1,13 +1,40 @@
 
 import os
 import logging
+import numpy as np
 from typing import List, Dict, Union, Callable, Any, Optional
 from .base import BaseChatbot
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
-from llms.ollama_llms import OllamaLLMs
 from llms.tools import list_available_tools
-from MCP.server import server, intent_classification, enhance_question, get_prompt, get_reflection
+from llms.admission import AdmissionRejected, Priority, request_priority
+from llms.thinking import strip_think
+from llms.usage import TokenBudgetExceeded, current_usage_scope, get_usage_metrics
+from llms.context_cache import get_context_store
+from llms.mcp_client import get_tool
+from prompt.promt_config import get_prompt
+from tool.model_manager import model_manager
+from tool.question_enhancer import QuestionEnhancer, InfoType
+from tool.stage_scheduler import stage_scheduler
+from tool.tracing import current_span, traced
+from setting import Settings
+
+# Tool gọi LLM: qua MCP tool server dùng chung nếu có Settings.MCP_SERVER_URL, ngược lại gọi trong process
+intent_classification = get_tool("intent_classification")
+enhance_question = get_tool("enhance_question")
+extract_features_from_question = get_tool("extract_features_from_question")
+get_reflection = get_tool("get_reflection")
+# Routing và slot classifier (embedding) cũng qua tool server: web worker không cần load model embedding
+route_query = get_tool("route_query")
+classify_slot = get_tool("classify_slot")
+
+
+def classify_query(message: str):
+    """(intent, embedding của câu hỏi) từ route_query, embedding là None nếu routing lỗi"""
+    result = route_query(message)
+    embedding = result.get("embedding")
+    return result["route"], np.asarray(embedding, dtype=np.float32) if embedding is not None else None
+
 
 class ChatbotOllama(BaseChatbot):
     def __init__(self, model_name: str = "hf.co/unsloth/Qwen3-1.7B-GGUF:IQ4_XS", **kwargs):
@@ -19,11 +46,16 @@ class ChatbotOllama(BaseChatbot):
         
         logging.info(f"Initializing Ollama client with URL: {ollama_url}, Model: {ollama_model}")
         
-        self.client = OllamaLLMs(
-            base_url=ollama_url,
-            model_name=ollama_model
-        )
+        # Model tier "answer" (mặc định là OLLAMA_MODEL), dùng chung giữa các session
+        self.client = model_manager.get_llm_model(task="answer")
+        self.settings = Settings.load_settings()
+        self.question_enhancer = QuestionEnhancer()
     
+    def clear_history(self):
+        # Bỏ context đã evaluate của lịch sử cũ trên mọi model
+        get_context_store().invalidate(self.context_key)
+        super().clear_history()
+
     def _set_conversation_state_from_question(self, enhanced_question: str, original_message: str):
         """Set conversation state based on the enhanced question"""
         enhanced_lower = enhanced_question.lower()
@@ -39,27 +71,39 @@ class ChatbotOllama(BaseChatbot):
         else:
             self.conversation_state = "waiting_for_info"
     
-    def _handle_ongoing_conversation(self, message: str, messages: List[Dict]) -> str:
-        """Handle conversation when we're waiting for specific information"""
-        print("Handling ongoing conversation...")
-        
+    def _classify_slot_with_llm(self, message: str) -> str:
+        """Fallback: dùng LLM để phân loại slot khi slot classifier không đủ tin cậy"""
         # Create proper message format for generate_content
         classification_prompt = get_prompt("classification_recruitment_intent", user_input=message)
         classification_messages = [{"role": "user", "content": classification_prompt}]
         
-        intent = self.client.generate_content(classification_messages)
-        intent = intent.strip().lower()  # Clean up the response
-        
+        classifier_llm = model_manager.get_llm_model(task="classify")
+        intent = classifier_llm.generate_content(classification_messages, think=False)
         # Extract only the final answer, ignore <think> sections
-        if "</think>" in intent:
-            intent = intent.split("</think>")[-1].strip()
+        intent = strip_think(intent).lower()
         
         # Extract the final word/classification
         intent_words = intent.split()
         if intent_words:
             intent = intent_words[-1]  # Get the last word as the classification
+        return intent
+
+    def _handle_ongoing_conversation(self, message: str, messages: List[Dict]) -> str:
+        """Handle conversation when we're waiting for specific information"""
+        logging.debug("Handling ongoing conversation (state: %s)", self.conversation_state)
         
-        print(f"Extracted intent: {intent}")
+        # Slot classifier (keyword + embedding) trả lời trong vài ms; chỉ gọi LLM khi không chắc chắn
+        expected_slot = self.conversation_state.replace("waiting_for_", "")
+        try:
+            result = classify_slot(message=message, expected_slot=expected_slot)
+            intent, confidence = result["slot"], result["confidence"]
+            logging.debug("Slot classifier: %s (confidence: %.4f)", intent, confidence)
+        except Exception as e:
+            logging.error(f"Slot classifier error: {str(e)}")
+            intent = None
+        
+        if intent is None:
+            intent = self._classify_slot_with_llm(message)
         
         if intent == "location" or "địa điểm" in intent:
             self.recruitment_context["location"] = message
@@ -70,18 +114,16 @@ class ChatbotOllama(BaseChatbot):
         elif intent == "position" or "vị trí" in intent:
             self.recruitment_context["position"] = message
             
-        print(f"Extracted intent: {intent}")
+        logging.debug("Extracted intent: %s", intent)
         
         # Check if we have enough information
         if self._is_recruitment_complete():
             self.conversation_state = "idle"
             # Use reflection to generate comprehensive response
-            print(f"Current state: {self.conversation_state}")
-            print(f"Current context: {self.recruitment_context}")
+            logging.debug("Current state: %s, context: %s", self.conversation_state, self.recruitment_context)
             return self._generate_recruitment_response_with_reflection(messages)
         else:
-            print(f"Current state: {self.conversation_state}")
-            print(f"Current context: {self.recruitment_context}")
+            logging.debug("Current state: %s, context: %s", self.conversation_state, self.recruitment_context)
             # Continue asking for more information
             return self._ask_for_next_missing_info()
     
@@ -138,43 +180,113 @@ class ChatbotOllama(BaseChatbot):
             self.add_assistant_message(fallback_response)
             return fallback_response
 
+    def _is_likely_recruitment_complete(self, info_status: Dict[InfoType, bool]) -> bool:
+        """Keyword analysis cho thấy câu hỏi có thể đủ thông tin để trích xuất đặc trưng"""
+        return info_status.get(InfoType.JOB_POSITION, False) and info_status.get(InfoType.LOCATION, False)
+
+    def _trim_history(self, keep_messages: int):
+        """Giữ system message và keep_messages message gần nhất"""
+        system = [m for m in self.conversation_history if m["role"] == "system"]
+        others = [m for m in self.conversation_history if m["role"] != "system"]
+        if len(others) > keep_messages:
+            self.conversation_history = system + others[-keep_messages:]
+
+    @traced("chatbot.chat")
     def chat(self, message: str, include_history: bool = True) -> str:
+        # Intent của lượt trước không được báo lại (và lưu vào state) nếu lượt này lỗi trước khi routing
+        self.last_intent = None
         # Add user message to history first
         self.add_user_message(message)
         
+        # Session đã dùng nhiều token (soft budget): cắt bớt lịch sử gửi cho model
+        if include_history and get_usage_metrics().over_soft_budget():
+            self._trim_history(self.settings.SESSION_BUDGET_KEEP_MESSAGES)
+            current_span().set_attribute("chat.history_trimmed", True)
+        
         # Prepare messages for Ollama API
         if include_history:
             messages = self.conversation_history.copy()
         else:
             messages = [{"role": "user", "content": message}]
+        # Chỉ lịch sử đầy đủ mới dùng lại được context của lượt trước
+        context_key = self.context_key if include_history else None
         
         try:
             # print("history = ", self.conversation_history)
-            print(f"Current state: {self.conversation_state}")
-            print(f"Current context: {self.recruitment_context}")
+            logging.debug("Current state: %s, context: %s", self.conversation_state, self.recruitment_context)
+            current_span().set_attribute("chat.state", self.conversation_state)
             
             # Check conversation state first - if we're waiting for info, handle it
             if self.conversation_state != "idle":
-                return self._handle_ongoing_conversation(message, messages)
+                self.last_intent = "recruitment_incomplete"
+                current_usage_scope().route = self.last_intent
+                # Follow-up khi đang hỏi thêm thông tin được ưu tiên trước chitchat
+                with request_priority(Priority.SLOT_FILLING):
+                    return self._handle_ongoing_conversation(message, messages)
             
-            # Only classify intent when in idle state
-            intent = intent_classification(message)
-            print(f"Intent classified as: {intent}")
+            # Only classify intent when in idle state.
+            # Routing (embedding) và keyword analysis độc lập nên chạy song song;
+            # trích xuất đặc trưng chạy speculative và bị hủy nếu intent không cần.
+            with stage_scheduler.run_pass() as stages:
+                stages.submit("route", classify_query, message)
+                stages.submit("keywords", self.question_enhancer.analyze_incomplete_question, message)
+
+                info_status = stages.result("keywords")
+                if self.settings.ENABLE_SPECULATIVE_EXTRACTION and self._is_likely_recruitment_complete(info_status):
+                    stages.submit(
+                        "features",
+                        extract_features_from_question,
+                        message,
+                        "extract_features_question_about_job",
+                        speculative=True
+                    )
+
+                intent, query_embedding = stages.result("route")
+                self.last_intent = intent
+                current_usage_scope().route = intent
+                logging.debug("Intent classified as: %s", intent)
+                current_span().set_attribute("chat.intent", intent)
+
+                if intent == "recruitment_complete" and stages.has("features"):
+                    features = stages.result("features")
+                    self.recruitment_context.update(features or {})
             
             if intent == "chitchat":
-                messages.append({"role": "user", "content": get_prompt("chitchat")}) 
-                assistant_response = self.client.generate_content(messages)
+                # Semantic cache: trả lời ngay nếu đã có câu hỏi gần giống
+                cache = model_manager.get_semantic_cache(intent)
+                if cache is not None and query_embedding is not None:
+                    cached_response = cache.lookup(query_embedding)
+                    if cached_response is not None:
+                        current_span().set_attribute("semantic_cache.hit", True)
+                        self.add_assistant_message(cached_response)
+                        return cached_response
+
+                # Cache dùng chung mọi session: chỉ lưu câu trả lời sinh ra không kèm lịch sử hội thoại
+                # (system prompt + câu hỏi), tránh lộ nội dung của session này sang session khác
+                cacheable = all(m["role"] == "system" for m in messages[:-1])
+
+                # Chỉ dẫn chitchat là prefix cố định (system message đầu prompt) thay vì nối vào cuối mỗi lượt:
+                # lượt chitchat sau chỉ gửi message mới kèm context của lượt này
+                messages.insert(0, {"role": "system", "content": get_prompt("chitchat")})
+                with request_priority(Priority.CHITCHAT):
+                    chitchat_llm = model_manager.get_llm_model(task="chitchat")
+                    assistant_response = chitchat_llm.generate_content(messages, context_key=context_key)
                 self.add_assistant_message(assistant_response)
+
+                if cacheable and cache is not None and query_embedding is not None:
+                    cache.add(query_embedding, message, assistant_response)
                 return assistant_response
                 
             elif intent == "recruitment_incomplete":
-                enhanced_question = enhance_question(message)
+                # Tái sử dụng kết quả keyword analysis thay vì gọi lại enhance_question
+                missing_info = self.question_enhancer.get_priority_missing_info(info_status)
+                enhanced_question = self.question_enhancer.generate_follow_up_question(missing_info)
                 self.add_assistant_message(enhanced_question)
                 
                 # Store the original query and set conversation state
                 self.recruitment_context["initial_query"] = message
                 self._set_conversation_state_from_question(enhanced_question, message)
-                print(f"State set to: {self.conversation_state}")
+                logging.debug("State set to: %s", self.conversation_state)
                 return enhanced_question
                 
             elif intent == "recruitment_complete":
@@ -198,10 +310,15 @@ class ChatbotOllama(BaseChatbot):
                     return assistant_response
             
             # Default fallback
-            assistant_response = self.client.generate_content(messages)
+            assistant_response = self.client.generate_content(messages, context_key=context_key)
             self.add_assistant_message(assistant_response)
             return assistant_response
             
+        except (AdmissionRejected, TokenBudgetExceeded):
+            # Bỏ tin nhắn vừa thêm để client retry (Retry-After) không bị lặp lịch sử
+            if self.conversation_history and self.conversation_history[-1] == {"role": "user", "content": message}:
+                self.conversation_history.pop()
+            raise
         except Exception as e:
             error_msg = f"Error communicating with Ollama: {str(e)}"
             self.add_assistant_message(error_msg)
@@ -1,6 +1,10 @@
 
+import uuid
 from abc import ABC, abstractmethod
-from typing import Dict, List
+from typing import Any, Dict, List
+
+# Tăng khi đổi format của to_state() (state cũ khác version sẽ bị bỏ qua)
+STATE_VERSION = 1
 
 
 class BaseChatbot(ABC):
@@ -9,6 +13,11 @@ class BaseChatbot(ABC):
         self.conversation_history = []
         self.conversation_state = "idle"  # idle, waiting_for_location, waiting_for_skills, etc.
         self.recruitment_context = {}  # Store recruitment-related information
+        self.last_intent = None  # Intent từ lượt chat gần nhất (routing result)
+        self.state_revision = 0  # Tăng mỗi lần state được lưu vào session store
+        self.context_key = uuid.uuid4().hex  # Khóa context của LLM (incremental generation), đổi khi clear_history
+        self.used_tokens = 0  # Token LLM session đã dùng trên mọi worker (budget), không reset khi clear_history
+        self.saved_tokens = 0  # used_tokens của revision đã load/lưu gần nhất (gộp state song song)
     
     def add_system_message(self, message: str):
         self.conversation_history.append({"role": "system", "content": message})
@@ -25,8 +34,10 @@ class BaseChatbot(ABC):
     
     def clear_history(self):
         self.conversation_history = []
+        self.context_key = uuid.uuid4().hex
         self.conversation_state = "idle"
         self.recruitment_context = {}
+        self.last_intent = None
     
     def clear_conversation_state(self):
         """Clear conversation state while keeping history"""
@@ -35,6 +46,68 @@ class BaseChatbot(ABC):
 
     def get_history(self) -> List[Dict[str, str]]:
         return self.conversation_history
+
+    def to_state(self) -> Dict[str, Any]:
+        """
+        State gọn của chatbot để lưu ngoài process (session store).
+        Message chỉ có role + content được lưu dạng [role, content] thay vì dict.
+        """
+        history = [
+            [m["role"], m["content"]] if m.keys() == {"role", "content"} else m
+            for m in self.conversation_history
+        ]
+        return {
+            "v": STATE_VERSION,
+            "rev": self.state_revision,
+            "model": self.model_name,
+            "history": history,
+            "state": self.conversation_state,
+            "context": self.recruitment_context,
+            "intent": self.last_intent,
+            "tokens": self.used_tokens,
+            "tokens_base": self.saved_tokens,
+        }
+
+    def apply_state(self, state: Dict[str, Any]) -> bool:
+        """Khôi phục từ to_state(), trả về False nếu state khác version"""
+        if not state or state.get("v") != STATE_VERSION:
+            return False
+        self.conversation_history = [
+            {"role": m[0], "content": m[1]} if isinstance(m, list) else dict(m)
+            for m in state.get("history", [])
+        ]
+        self.conversation_state = state.get("state", "idle")
+        self.recruitment_context = dict(state.get("context") or {})
+        self.last_intent = state.get("intent")
+        self.used_tokens = self.saved_tokens = state.get("tokens", 0)
+        self.state_revision = state.get("rev", 0)
+        return True
+
+    @staticmethod
+    def merge_states(stored: Dict[str, Any], local: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Gộp state khi hai worker lưu cùng một revision (request song song của cùng session):
+        giữ lịch sử trong store, nối thêm các message local chưa có; slot state lấy theo local.
+        Token: bản trong store cộng phần local dùng thêm từ revision nó đã load (tokens_base).
+        Revision của kết quả lớn hơn bản trong store.
+        """
+        rev = max(stored.get("rev", 0), local.get("rev", 0)) + 1
+        if stored.get("v") != STATE_VERSION or local.get("v") != STATE_VERSION:
+            return {**local, "rev": rev}
+        stored_history = stored.get("history", [])
+        local_history = local.get("history", [])
+        common = 0
+        for stored_message, local_message in zip(stored_history, local_history):
+            if stored_message != local_message:
+                break
+            common += 1
+        return {
+            **local,
+            "rev": rev,
+            "history": stored_history + local_history[common:],
+            "context": {**(stored.get("context") or {}), **(local.get("context") or {})},
+            "tokens": stored.get("tokens", 0) + local.get("tokens", 0) - local.get("tokens_base", 0),
+        }
     
     @abstractmethod
     def chat(self, message: str, include_history: bool = True) -> str:
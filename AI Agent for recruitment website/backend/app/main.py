@@ -1,7 +1,7 @@
 """
 Simple Flask app for AI Recruitment System
 """
-from flask import Flask, jsonify, request, render_template, send_from_directory, session
+from flask import Flask, g, jsonify, request, render_template, send_from_directory, session
 import os
 import sys
 import time
@@ -13,7 +13,21 @@ backend_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, backend_path)
 
 from llms.ollama_llms import OllamaLLMs
+from llms.transport import CircuitOpenError
+from llms.backend_pool import NoHealthyBackendError
+from llms.admission import AdmissionRejected, get_admission_controller
+from llms.thinking import get_thinking_metrics, strip_think
+from llms.residency import get_residency_manager
+from llms.usage import TokenBudgetExceeded, get_usage_metrics, usage_scope
+from llms.context_cache import get_context_store
 from chatbot.ChatbotOllama import ChatbotOllama
+from tool.model_manager import model_manager
+from tool.session_store import create_session_store
+from tool.single_flight import get_single_flight_stats
+from tool.startup_orchestrator import start_warmup, startup_orchestrator
+from tool.tracing import SPAN_KIND_SERVER, current_span, get_tracer
+from log_config import setup_logging
+from loguru import logger as log
 import logging
 
 # Determine template folder path based on environment
@@ -27,8 +41,8 @@ else:
 app = Flask(__name__, template_folder=template_folder)
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (loguru; stdlib logging được chuyển sang loguru)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize LLM client and chatbot with error handling
@@ -51,8 +65,7 @@ def initialize_llm_client():
         )
         
         # Simple connection test without generating content
-        import requests
-        response = requests.get(f"{ollama_url}/api/version", timeout=5)
+        response = client.pool.get("/api/version", timeout=5)
         if response.status_code == 200:
             logger.info("Ollama server is accessible")
             return client
@@ -71,9 +84,59 @@ def initialize_llm_client():
 
 llm_client = initialize_llm_client()
 
-# Dictionary to store chatbot instances for each user session
+# Warm-up in the background (embedding model, route index, Ollama, MongoDB); /ready reports progress
+start_warmup()
+
+# Dictionary to store chatbot instances for each user session (local cache of the session store)
 user_chatbots = {}
 
+# Chat state shared across workers; writes are batched in the background (write-behind).
+# Writes are conditional on the revision: two workers saving the same revision get merged
+session_store = create_session_store(merge=ChatbotOllama.merge_states)
+
+SYSTEM_PROMPT = (
+    "Bạn là một trợ lý thân thiện trong lĩnh vực tuyển dụng. "
+    "Hãy giúp đỡ ứng viên về việc làm, phỏng vấn và tư vấn nghề nghiệp. "
+    "Trả lời ngắn gọn và hữu ích."
+)
+
+@app.before_request
+def start_request_span():
+    """Root span of the request (continues the caller's trace when a traceparent header is sent)"""
+    g.trace_span = get_tracer().start_span(
+        f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+        kind=SPAN_KIND_SERVER,
+        attributes={"http.method": request.method, "http.target": request.path},
+        traceparent=request.headers.get("traceparent")
+    )
+    # Gắn session id vào mọi dòng log của request
+    g.log_context = log.contextualize(session=session.get("session_id", "-"))
+    g.log_context.__enter__()
+
+
+@app.after_request
+def add_trace_headers(response):
+    """Return the trace id so slow turns can be looked up in the trace store"""
+    span = g.get("trace_span")
+    if span is not None and span.trace_id:
+        span.set_attribute("http.status_code", response.status_code)
+        if response.status_code >= 500:
+            span.status = "error"
+        response.headers["X-Trace-Id"] = span.trace_id
+        response.headers["traceparent"] = span.traceparent
+    return response
+
+
+@app.teardown_request
+def end_request_span(error=None):
+    span = g.pop("trace_span", None)
+    if span is not None:
+        get_tracer().end_span(span, error)
+    log_context = g.pop("log_context", None)
+    if log_context is not None:
+        log_context.__exit__(None, None, None)
+
+
 def get_session_id():
     """Get or create session ID for current user"""
     if 'session_id' not in session:
@@ -82,29 +145,47 @@ def get_session_id():
     return session['session_id']
 
 def get_user_chatbot(session_id):
-    """Get or create chatbot instance for specific user session"""
+    """Get or create chatbot instance for specific user session (load from session store on miss)"""
     if session_id not in user_chatbots:
         try:
             chatbot = ChatbotOllama()
-            chatbot.add_system_message(
-                "Bạn là một trợ lý thân thiện trong lĩnh vực tuyển dụng. "
-                "Hãy giúp đỡ ứng viên về việc làm, phỏng vấn và tư vấn nghề nghiệp. "
-                "Trả lời ngắn gọn và hữu ích."
-            )
+            state = session_store.load(session_id)
+            if state and chatbot.apply_state(state):
+                logger.info(f"Restored chatbot for session {session_id} from session store")
+            else:
+                chatbot.add_system_message(SYSTEM_PROMPT)
+                logger.info(f"Created new chatbot for session: {session_id}")
             user_chatbots[session_id] = {
                 'chatbot': chatbot,
                 'created_at': datetime.now(),
                 'last_activity': datetime.now()
             }
-            logger.info(f"Created new chatbot for session: {session_id}")
         except Exception as e:
             logger.error(f"Failed to create chatbot for session {session_id}: {e}")
             return None
-    
+    else:
+        # Another worker may have handled a newer turn of this session
+        chatbot = user_chatbots[session_id]['chatbot']
+        try:
+            state = session_store.load(session_id, newer_than=chatbot.state_revision)
+            if state:
+                chatbot.apply_state(state)
+        except Exception as e:
+            logger.warning(f"Session store revalidation failed for {session_id}: {e}")
+
     # Update last activity
     user_chatbots[session_id]['last_activity'] = datetime.now()
     return user_chatbots[session_id]['chatbot']
 
+def save_user_chatbot(session_id, chatbot):
+    """Persist chatbot state (queued by the write-behind store, does not block the request)"""
+    try:
+        chatbot.state_revision += 1
+        session_store.save(session_id, chatbot.to_state())
+        chatbot.saved_tokens = chatbot.used_tokens
+    except Exception as e:
+        logger.warning(f"Failed to persist session {session_id}: {e}")
+
 def cleanup_inactive_sessions():
     """Remove inactive user sessions (older than 1 hour)"""
     current_time = datetime.now()
@@ -138,6 +219,13 @@ def health_check():
     })
 
 
+@app.route('/ready')
+def readiness_check():
+    """Readiness endpoint: 503 until the critical warm-up tasks have finished"""
+    status = startup_orchestrator.get_status()
+    return jsonify(status), (200 if status["ready"] else 503)
+
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Chat endpoint for recruitment conversations using ChatbotOllama"""
@@ -159,16 +247,25 @@ def chat():
                 "status": "service_unavailable"
             }), 503
         
+        current_span().set_attribute("session.id", session_id)
+
         try:
             # Generate response using chatbot
-            response = bot.chat(user_message)
+            # Token của mọi LLM call trong lượt chat được tính vào session; budget được kiểm tra
+            # theo số token lưu trong state của session (dùng chung giữa các worker)
+            with usage_scope(session=session_id, session_tokens=bot.used_tokens) as scope:
+                try:
+                    response = bot.chat(user_message)
+                finally:
+                    bot.used_tokens += scope.tokens
+            save_user_chatbot(session_id, bot)
             
             # Clean response (remove thinking tags if present)
-            if "<think>" in response:
-                response = response.split("</think>")[-1].strip()
+            response = strip_think(response)
             
-            # Get intent classification
-            intent = bot.classify_intent(user_message)
+            # Reuse the routing result from the chat pass instead of classifying again
+            intent = bot.last_intent or bot.classify_intent(user_message)
+            current_span().set_attribute("chat.intent", intent)
             
             # Cleanup inactive sessions periodically
             if len(user_chatbots) > 10:  # Only cleanup when we have many sessions
@@ -181,11 +278,30 @@ def chat():
                 "status": "success"
             })
             
+        except AdmissionRejected as rejected:
+            logger.warning(f"LLM admission rejected: {rejected}")
+            response = jsonify({
+                "error": "Server is busy. Please retry shortly.",
+                "status": "overloaded",
+                "retry_after": rejected.retry_after
+            })
+            response.headers["Retry-After"] = str(rejected.retry_after)
+            return response, 429
+
+        except TokenBudgetExceeded as exceeded:
+            logger.warning(f"Token budget exceeded: {exceeded}")
+            return jsonify({
+                "error": "Token budget for this session is exhausted.",
+                "status": "token_budget_exceeded",
+                "used_tokens": exceeded.used,
+                "budget": exceeded.budget
+            }), 429
+
         except Exception as llm_error:
             logger.error(f"Chatbot error: {llm_error}")
             
             # Check if it's a connection error
-            if "Connection refused" in str(llm_error) or "Max retries exceeded" in str(llm_error):
+            if isinstance(llm_error, (CircuitOpenError, NoHealthyBackendError)) or "Connection refused" in str(llm_error) or "Max retries exceeded" in str(llm_error):
                 return jsonify({
                     "error": "Ollama service is not available. Please ensure Ollama is running.",
                     "status": "service_unavailable",
@@ -250,11 +366,8 @@ def clear_chat_history():
         
         bot.clear_history()
         # Re-add system message
-        bot.add_system_message(
-            "Bạn là một trợ lý thân thiện trong lĩnh vực tuyển dụng. "
-            "Hãy giúp đỡ ứng viên về việc làm, phỏng vấn và tư vấn nghề nghiệp. "
-            "Trả lời ngắn gọn và hữu ích."
-        )
+        bot.add_system_message(SYSTEM_PROMPT)
+        save_user_chatbot(session_id, bot)
         
         return jsonify({
             "message": "Conversation history cleared",
@@ -334,15 +447,134 @@ def get_current_session_info():
         }), 500
 
 
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Get semantic cache hit-rate metrics (admin endpoint)"""
+    try:
+        return jsonify({
+            "caches": model_manager.get_semantic_cache_stats(),
+            "status": "success"
+        })
+
+    except Exception as e:
+        logger.error(f"Cache stats endpoint error: {e}")
+        return jsonify({
+            "error": str(e),
+            "status": "error"
+        }), 500
+
+
+@app.route('/api/metrics/admission', methods=['GET'])
+def get_admission_stats():
+    """Get LLM admission queue depth and wait time metrics (admin endpoint)"""
+    try:
+        return jsonify({
+            "admission": get_admission_controller().get_stats(),
+            "status": "success"
+        })
+
+    except Exception as e:
+        logger.error(f"Admission stats endpoint error: {e}")
+        return jsonify({
+            "error": str(e),
+            "status": "error"
+        }), 500
+
+
+@app.route('/api/metrics/thinking', methods=['GET'])
+def get_thinking_stats():
+    """Get reasoning (<think>) token usage per task/model (admin endpoint)"""
+    try:
+        return jsonify({
+            "thinking": get_thinking_metrics().get_stats(),
+            "status": "success"
+        })
+
+    except Exception as e:
+        logger.error(f"Thinking stats endpoint error: {e}")
+        return jsonify({
+            "error": str(e),
+            "status": "error"
+        }), 500
+
+
+@app.route('/api/metrics/usage', methods=['GET'])
+def get_usage_stats():
+    """Get LLM token usage per task/route/session, tokens/sec, prompt share and reused generation context (admin endpoint)"""
+    try:
+        return jsonify({
+            "usage": get_usage_metrics().get_stats(),
+            "context": get_context_store().get_stats(),
+            "status": "success"
+        })
+
+    except Exception as e:
+        logger.error(f"Usage stats endpoint error: {e}")
+        return jsonify({
+            "error": str(e),
+            "status": "error"
+        }), 500
+
+
+@app.route('/api/metrics/residency', methods=['GET'])
+def get_residency_stats():
+    """Get Ollama model residency (keep-alive refreshes, evictions, cold load durations) (admin endpoint)"""
+    try:
+        return jsonify({
+            "residency": get_residency_manager().get_stats(),
+            "status": "success"
+        })
+
+    except Exception as e:
+        logger.error(f"Residency stats endpoint error: {e}")
+        return jsonify({
+            "error": str(e),
+            "status": "error"
+        }), 500
+
+
+@app.route('/api/metrics/tracing', methods=['GET'])
+def get_tracing_stats():
+    """Get tracing sample/export counters (admin endpoint)"""
+    try:
+        return jsonify({
+            "tracing": get_tracer().get_stats(),
+            "status": "success"
+        })
+
+    except Exception as e:
+        logger.error(f"Tracing stats endpoint error: {e}")
+        return jsonify({
+            "error": str(e),
+            "status": "error"
+        }), 500
+
+
+@app.route('/api/metrics/single_flight', methods=['GET'])
+def get_single_flight_metrics():
+    """Get coalesced (deduplicated) LLM and embedding call counters (admin endpoint)"""
+    try:
+        return jsonify({
+            "single_flight": get_single_flight_stats(),
+            "status": "success"
+        })
+
+    except Exception as e:
+        logger.error(f"Single-flight stats endpoint error: {e}")
+        return jsonify({
+            "error": str(e),
+            "status": "error"
+        }), 500
+
+
 @app.route('/api/models', methods=['GET'])
 def list_models():
     """List available models"""
     try:
-        import requests
         ollama_url = llm_client.base_url
         
         # Check if Ollama is accessible
-        response = requests.get(f"{ollama_url}/api/version", timeout=5)
+        response = llm_client.pool.get("/api/version", timeout=5)
         if response.status_code != 200:
             return jsonify({
                 "error": "Ollama service is not accessible",
@@ -351,7 +583,7 @@ def list_models():
             }), 503
         
         # Try to get list of models
-        models_response = requests.get(f"{ollama_url}/api/tags", timeout=10)
+        models_response = llm_client.pool.get("/api/tags", timeout=10)
         if models_response.status_code == 200:
             models_data = models_response.json()
             available_models = [model["name"] for model in models_data.get("models", [])]
@@ -379,12 +611,11 @@ def list_models():
 def ollama_health():
     """Check Ollama service health"""
     try:
-        import requests
         ollama_url = llm_client.base_url
         
         # Test basic connectivity
         start_time = time.time()
-        response = requests.get(f"{ollama_url}/api/version", timeout=10)
+        response = llm_client.pool.get("/api/version", timeout=10)
         response_time = time.time() - start_time
         
         if response.status_code != 200:
@@ -413,6 +644,7 @@ def ollama_health():
             "response_time_seconds": response_time,
             "model_test_success": model_test_success,
             "model_error": model_error,
+            "backends": llm_client.pool.get_stats(),
             "timestamp": time.time()
         })
         
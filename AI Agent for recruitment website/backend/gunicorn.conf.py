@@ -0,0 +1,94 @@
+"""
+Gunicorn config cho production (thay Flask dev server):
+
+    gunicorn -c backend/gunicorn.conf.py
+
+- Số worker/thread/timeout đọc từ Settings (MAX_WORKERS, SERVER_*)
+- preload_app: master import app (embedding model, semantic router, route embeddings)
+  một lần, worker fork ra dùng chung bộ nhớ đó theo copy-on-write
+- gc.freeze() trước khi fork để GC của worker không ghi vào (và copy) các page của master
+- Master chờ warm-up (tool/startup_orchestrator.py) xong rồi mới fork worker
+- Tài nguyên không fork-safe (MongoClient, HTTP pool tới Ollama, thread pool) được tạo lại trong worker
+"""
+import gc
+import os
+import sys
+
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+app_dir = os.path.join(backend_dir, "app")
+for path in (app_dir, backend_dir):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from log_config import setup_logging
+from setting import Settings
+
+settings = Settings.load_settings()
+setup_logging(settings)
+
+wsgi_app = "app.main:app"
+pythonpath = f"{backend_dir},{app_dir}"
+bind = os.getenv("BIND", settings.SERVER_BIND)
+workers = settings.MAX_WORKERS
+worker_class = "gthread"
+threads = settings.SERVER_THREADS
+timeout = settings.SERVER_TIMEOUT
+graceful_timeout = settings.SERVER_GRACEFUL_TIMEOUT
+keepalive = settings.SERVER_KEEPALIVE
+max_requests = settings.SERVER_MAX_REQUESTS
+max_requests_jitter = settings.SERVER_MAX_REQUESTS // 10
+preload_app = settings.SERVER_PRELOAD_APP
+accesslog = "-"
+
+if preload_app:
+    # Tắt GC trong lúc load để object của master không bị phân mảnh giữa các generation
+    gc.disable()
+
+
+def reset_after_fork():
+    """Tạo lại tài nguyên không fork-safe của các module đã được import trong master"""
+    if "llms.transport" in sys.modules:
+        sys.modules["llms.transport"].reset_transports()
+    if "llms.backend_pool" in sys.modules:
+        sys.modules["llms.backend_pool"].reset_backend_pools()
+    if "llms.residency" in sys.modules:
+        sys.modules["llms.residency"].reset_residency_manager()
+    if "tool.tracing.tracer" in sys.modules:
+        sys.modules["tool.tracing.tracer"].reset_tracer_after_fork()
+    if "tool.model_manager" in sys.modules:
+        sys.modules["tool.model_manager"].model_manager.reset_after_fork()
+    if "tool.stage_scheduler" in sys.modules:
+        sys.modules["tool.stage_scheduler"].stage_scheduler.reset_after_fork()
+    if "tool.startup_orchestrator" in sys.modules:
+        sys.modules["tool.startup_orchestrator"].startup_orchestrator.reset_after_fork()
+    if "MCP.server" in sys.modules:
+        sys.modules["MCP.server"].reset_mongo_client()
+    for name in ("app.main", "main"):
+        module = sys.modules.get(name)
+        if module is not None and hasattr(module, "llm_client"):
+            module.llm_client.reset_connections()
+
+
+def when_ready(server):
+    # Chờ warm-up của master xong để model được load trước khi fork (worker dùng chung),
+    # task chưa xong sẽ được chạy lại trong từng worker
+    if "tool.startup_orchestrator" in sys.modules:
+        orchestrator = sys.modules["tool.startup_orchestrator"].startup_orchestrator
+        ready = orchestrator.wait(settings.STARTUP_TIMEOUT, critical_only=False)
+        server.log.info(f"Warm-up {'finished' if ready else 'incomplete'}: {orchestrator.get_status()['tasks']}")
+
+    # App đã được preload: chuyển toàn bộ object hiện có sang permanent generation
+    gc.freeze()
+    gc.enable()
+    server.log.info(f"Frozen {gc.get_freeze_count()} objects before forking {workers} workers")
+
+
+def pre_fork(server, worker):
+    # Object tạo thêm trong master (vd: khi respawn worker) cũng được freeze
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+    reset_after_fork()
+    server.log.info(f"Worker {worker.pid} ready (fork-unsafe resources re-initialized)")
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Admission control trước khi gọi LLM: giới hạn số call đồng thời,
+hàng đợi có giới hạn theo độ ưu tiên và từ chối sớm (429) khi chờ quá deadline.
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Dict, Any, Optional
+
+from setting import Settings
+
+
+class Priority(IntEnum):
+    """Độ ưu tiên của LLM call (số nhỏ hơn được phục vụ trước)"""
+    SLOT_FILLING = 0  # Câu trả lời follow-up khi đang hỏi thêm thông tin
+    INTERACTIVE = 1   # Request tương tác thông thường
+    CHITCHAT = 2      # Nói chuyện phiếm
+    BATCH = 3         # Pipeline xử lý hàng loạt
+
+
+_current_priority: ContextVar[Priority] = ContextVar("llm_priority", default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority: Priority):
+    """Đặt độ ưu tiên cho mọi LLM call trong context hiện tại"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> Priority:
+    return _current_priority.get()
+
+
+class AdmissionRejected(Exception):
+    """LLM call bị từ chối vì hàng đợi đầy hoặc thời gian chờ vượt deadline"""
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = max(1, int(round(retry_after)))
+        super().__init__(f"LLM admission rejected ({reason}), retry after {self.retry_after}s")
+
+
+class _Waiter:
+    """Waiter trong hàng đợi: chờ bằng threading.Event (sync) hoặc asyncio.Future trên event loop (async)"""
+    __slots__ = ("priority", "event", "loop", "future", "granted", "cancelled")
+
+    def __init__(self, priority: Priority, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.priority = priority
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+        self.granted = False
+        self.cancelled = False
+
+    def notify(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdmissionController:
+    """
+    Semaphore có hàng đợi ưu tiên.
+    Thời gian chờ được ước lượng bằng EWMA thời gian xử lý của các call trước;
+    nếu ước lượng vượt deadline thì từ chối ngay thay vì xếp hàng vô ích.
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_queue: int = 64, default_deadline: float = 30.0, ewma_alpha: float = 0.2):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.default_deadline = default_deadline
+        self.ewma_alpha = ewma_alpha
+
+        self._lock = threading.Lock()
+        self._queue = []  # heap (priority, seq, waiter)
+        self._sequence = itertools.count()
+        self._active = 0
+        self._queued = 0
+        self._service_time: Optional[float] = None
+
+        # Metrics
+        self._admitted = 0
+        self._rejected: Dict[str, int] = {"queue_full": 0, "deadline": 0, "timeout": 0}
+        self._wait_times = deque(maxlen=1000)
+
+    def _estimate_wait(self, priority: Priority) -> float:
+        if self._service_time is None:
+            return 0.0
+        ahead = sum(1 for _, _, waiter in self._queue if not waiter.cancelled and waiter.priority <= priority)
+        return self._service_time * (ahead + 1) / self.max_concurrent
+
+    def _reject(self, reason: str, retry_after: float):
+        self._rejected[reason] += 1
+        raise AdmissionRejected(reason, retry_after)
+
+    def _admit_or_queue(self, priority: Priority, deadline: float,
+                        loop: Optional[asyncio.AbstractEventLoop] = None) -> Optional[_Waiter]:
+        """Nhận ngay (trả về None) hoặc xếp hàng (trả về waiter); raise AdmissionRejected nếu từ chối"""
+        with self._lock:
+            if self._active < self.max_concurrent and self._queued == 0:
+                self._active += 1
+                self._admitted += 1
+                self._wait_times.append(0.0)
+                return None
+
+            if self._queued >= self.max_queue:
+                self._reject("queue_full", self._estimate_wait(priority) or deadline)
+
+            estimated_wait = self._estimate_wait(priority)
+            if estimated_wait > deadline:
+                self._reject("deadline", estimated_wait)
+
+            waiter = _Waiter(priority, loop)
+            heapq.heappush(self._queue, (int(priority), next(self._sequence), waiter))
+            self._queued += 1
+            return waiter
+
+    def _finish_wait(self, waiter: _Waiter, priority: Priority, deadline: float, start_time: float) -> float:
+        """Sau khi chờ: raise nếu chưa tới lượt (hết deadline), ngược lại trả về thời gian đã chờ"""
+        with self._lock:
+            if not waiter.granted:
+                waiter.cancelled = True
+                self._queued -= 1
+                self._reject("timeout", self._estimate_wait(priority) or deadline)
+
+        waited = time.monotonic() - start_time
+        self._wait_times.append(waited)
+        return waited
+
+    def _abandon(self, waiter: _Waiter):
+        """Waiter bị hủy (task async bị cancel): bỏ khỏi hàng đợi, hoặc trả lại slot nếu vừa được cấp"""
+        with self._lock:
+            if waiter.granted:
+                self._release_slot()
+            else:
+                waiter.cancelled = True
+                self._queued -= 1
+
+    def _enter(self, priority: Priority, deadline: float) -> float:
+        """Chờ tới lượt; trả về thời gian đã chờ"""
+        start_time = time.monotonic()
+        waiter = self._admit_or_queue(priority, deadline)
+        if waiter is None:
+            return 0.0
+        waiter.event.wait(deadline)
+        return self._finish_wait(waiter, priority, deadline, start_time)
+
+    def _release_slot(self):
+        """Chuyển slot cho waiter ưu tiên cao nhất (bỏ qua waiter đã hết hạn); gọi khi đang giữ _lock"""
+        while self._queue:
+            _, _, waiter = heapq.heappop(self._queue)
+            if waiter.cancelled:
+                continue
+            waiter.granted = True
+            self._queued -= 1
+            self._admitted += 1
+            waiter.notify()
+            return
+        self._active -= 1
+
+    def _exit(self, service_time: float):
+        with self._lock:
+            if self._service_time is None:
+                self._service_time = service_time
+            else:
+                self._service_time = self.ewma_alpha * service_time + (1 - self.ewma_alpha) * self._service_time
+            self._release_slot()
+
+    @contextmanager
+    def acquire(self, priority: Optional[Priority] = None, deadline: Optional[float] = None):
+        """
+        Giữ một slot LLM trong suốt call
+        Args:
+            priority: mặc định lấy từ request_priority() của context hiện tại
+            deadline: thời gian chờ tối đa (giây)
+        Raises:
+            AdmissionRejected: khi hàng đợi đầy hoặc không kịp deadline
+        """
+        priority = current_priority() if priority is None else priority
+        deadline = self.default_deadline if deadline is None else deadline
+        self._enter(priority, deadline)
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self._exit(time.monotonic() - start_time)
+
+    @asynccontextmanager
+    async def acquire_async(self, priority: Optional[Priority] = None, deadline: Optional[float] = None):
+        """
+        acquire() cho code async: khi phải xếp hàng thì chờ trên asyncio.Future của event loop
+        (không chiếm thread), cùng hàng đợi/giới hạn với các call sync.
+        Task bị cancel khi đang chờ thì rời hàng đợi (hoặc trả lại slot vừa được cấp).
+        """
+        priority = current_priority() if priority is None else priority
+        deadline = self.default_deadline if deadline is None else deadline
+        wait_start = time.monotonic()
+        waiter = self._admit_or_queue(priority, deadline, loop=asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), deadline)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                self._abandon(waiter)
+                raise
+            self._finish_wait(waiter, priority, deadline, wait_start)
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self._exit(time.monotonic() - start_time)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            depth_by_priority = {priority.name.lower(): 0 for priority in Priority}
+            for _, _, waiter in self._queue:
+                if not waiter.cancelled:
+                    depth_by_priority[waiter.priority.name.lower()] += 1
+            wait_times = sorted(self._wait_times)
+
+        def percentile(p: float) -> float:
+            if not wait_times:
+                return 0.0
+            return wait_times[min(len(wait_times) - 1, int(p * len(wait_times)))]
+
+        return {
+            "active": self._active,
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": self._queued,
+            "queue_depth_by_priority": depth_by_priority,
+            "max_queue": self.max_queue,
+            "admitted": self._admitted,
+            "rejected": dict(self._rejected),
+            "wait_seconds_p50": percentile(0.5),
+            "wait_seconds_p99": percentile(0.99),
+            "service_time_ewma_seconds": self._service_time
+        }
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """Admission controller dùng chung cho mọi LLM call trong process"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                settings = Settings.load_settings()
+                _controller = AdmissionController(
+                    max_concurrent=settings.LLM_MAX_CONCURRENT,
+                    max_queue=settings.LLM_MAX_QUEUE,
+                    default_deadline=settings.LLM_QUEUE_DEADLINE
+                )
+    return _controller
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+Pool nhiều Ollama server với load balancing least-outstanding-requests,
+latency EWMA, health check (passive + active) và tự động eject / re-admit node lỗi.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Any, Tuple
+
+import requests
+
+from .transport import (
+    OllamaTransport, CircuitOpenError, CONNECTION_ERRORS, IDEMPOTENT_METHODS, get_transport, request_not_sent
+)
+from setting import Settings
+
+
+class NoHealthyBackendError(ConnectionError):
+    """Không còn Ollama backend nào để gửi request"""
+
+
+class OllamaBackend:
+    """Trạng thái của một Ollama server trong pool"""
+
+    def __init__(self, url: str, transport: OllamaTransport):
+        self.url = url.rstrip("/")
+        self.transport = transport
+        self.in_flight = 0
+        self.ewma_latency: Optional[float] = None
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.total_requests = 0
+        self.total_failures = 0
+        self._client = None
+        self._async_client = None  # (event loop, ollama.AsyncClient)
+
+    @property
+    def client(self):
+        """ollama.Client cho function calling (khởi tạo khi cần)"""
+        if self._client is None:
+            import ollama
+            self._client = ollama.Client(host=self.url, timeout=self.transport.read_timeout)
+        return self._client
+
+    @property
+    def async_client(self):
+        """
+        ollama.AsyncClient cho event loop hiện tại
+        (connection pool của httpx.AsyncClient gắn với loop nên tạo lại khi loop đổi)
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client[0] is not loop:
+            import ollama
+            self._async_client = (loop, ollama.AsyncClient(host=self.url, timeout=self.transport.read_timeout))
+        return self._async_client[1]
+
+    def is_ejected(self, now: float) -> bool:
+        return self.ejected_until > now
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "in_flight": self.in_flight,
+            "ewma_latency_seconds": self.ewma_latency,
+            "ejected": self.is_ejected(time.monotonic()),
+            "consecutive_failures": self.consecutive_failures,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+            "circuit_state": self.transport.breaker.state
+        }
+
+
+class OllamaBackendPool:
+    """
+    Chọn backend có ít request đang xử lý nhất (hòa thì chọn latency EWMA thấp hơn).
+    Backend lỗi liên tiếp bị eject trong eject_duration giây, sau đó được thử lại;
+    health check định kỳ (GET /api/version) re-admit sớm khi node sống lại.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        ewma_alpha: float = 0.3,
+        failure_threshold: int = 3,
+        eject_duration: float = 30.0,
+        health_check_interval: float = 10.0,
+        transports: Optional[Dict[str, OllamaTransport]] = None
+    ):
+        if not urls:
+            raise ValueError("OllamaBackendPool requires at least one backend URL")
+
+        transports = transports or {}
+        self.backends = [
+            OllamaBackend(url, transports.get(url) or get_transport(url)) for url in urls
+        ]
+        self.ewma_alpha = ewma_alpha
+        self.failure_threshold = failure_threshold
+        self.eject_duration = eject_duration
+        self.health_check_interval = health_check_interval
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+
+    @property
+    def primary(self) -> OllamaBackend:
+        return self.backends[0]
+
+    def select(self, exclude: Tuple[str, ...] = ()) -> OllamaBackend:
+        """
+        Chọn backend theo least-outstanding-requests (đã tăng in_flight của backend được chọn)
+        """
+        with self._lock:
+            now = time.monotonic()
+            candidates = [backend for backend in self.backends if backend.url not in exclude]
+            if not candidates:
+                raise NoHealthyBackendError("No Ollama backend left to try")
+
+            available = [backend for backend in candidates if not backend.is_ejected(now)]
+            if not available:
+                # Panic mode: mọi node đều bị eject, thử node sắp hết thời gian eject nhất
+                available = [min(candidates, key=lambda backend: backend.ejected_until)]
+
+            backend = min(
+                available,
+                key=lambda backend: (backend.in_flight, backend.ewma_latency or 0.0)
+            )
+            backend.in_flight += 1
+            backend.total_requests += 1
+            return backend
+
+    def _release(self, backend: OllamaBackend, latency: Optional[float], failed: bool):
+        with self._lock:
+            backend.in_flight -= 1
+            if failed:
+                backend.total_failures += 1
+                backend.consecutive_failures += 1
+                if backend.consecutive_failures >= self.failure_threshold:
+                    self._eject(backend)
+                return
+
+            backend.consecutive_failures = 0
+            backend.ejected_until = 0.0
+            if latency is not None:
+                if backend.ewma_latency is None:
+                    backend.ewma_latency = latency
+                else:
+                    backend.ewma_latency = self.ewma_alpha * latency + (1 - self.ewma_alpha) * backend.ewma_latency
+
+    def _eject(self, backend: OllamaBackend):
+        if not backend.is_ejected(time.monotonic()):
+            self.logger.warning(f"⚠️ Ejecting Ollama backend {backend.url} for {self.eject_duration}s")
+        backend.ejected_until = time.monotonic() + self.eject_duration
+
+    @contextmanager
+    def acquire(self, exclude: Tuple[str, ...] = ()):
+        """
+        Giữ một backend trong suốt một call (dùng cho ollama.Client / streaming)
+        """
+        backend = self.select(exclude)
+        start_time = time.perf_counter()
+        try:
+            yield backend
+        except CONNECTION_ERRORS:
+            self._release(backend, None, failed=True)
+            raise
+        except Exception:
+            self._release(backend, time.perf_counter() - start_time, failed=False)
+            raise
+        else:
+            self._release(backend, time.perf_counter() - start_time, failed=False)
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """
+        Gửi request tới backend tốt nhất; nếu không kết nối được thì failover sang backend khác
+        """
+        idempotent = kwargs.get("idempotent")
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        tried: Tuple[str, ...] = ()
+        while True:
+            backend = self.select(tried)
+            start_time = time.perf_counter()
+            try:
+                response = backend.transport.request(method, path, **kwargs)
+            except (CircuitOpenError, requests.ConnectionError) as e:
+                # Request không idempotent chỉ failover khi chưa tới được server; kết nối bị ngắt
+                # giữa chừng (hay ReadTimeout) thì request có thể đã được xử lý
+                self._release(backend, None, failed=True)
+                tried += (backend.url,)
+                if len(tried) >= len(self.backends) or not (idempotent or request_not_sent(e)):
+                    raise
+                self.logger.warning(f"Ollama backend {backend.url} unavailable, failing over: {e}")
+                continue
+            except Exception:
+                self._release(backend, None, failed=True)
+                raise
+
+            self._release(backend, time.perf_counter() - start_time, failed=response.status_code >= 500)
+            return response
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def check_health(self, timeout: float = 2.0):
+        """Active health check: ping từng backend, eject node lỗi và re-admit node đã sống lại"""
+        for backend in self.backends:
+            try:
+                response = backend.transport.session.get(
+                    f"{backend.url}/api/version",
+                    timeout=(timeout, timeout)
+                )
+                healthy = response.status_code == 200
+            except requests.RequestException:
+                healthy = False
+
+            with self._lock:
+                if healthy:
+                    if backend.is_ejected(time.monotonic()):
+                        self.logger.info(f"✅ Re-admitting Ollama backend {backend.url}")
+                    backend.consecutive_failures = 0
+                    backend.ejected_until = 0.0
+                    backend.transport.breaker.record_success()
+                else:
+                    backend.consecutive_failures += 1
+                    self._eject(backend)
+
+    def _health_loop(self):
+        while not self._stop_event.wait(self.health_check_interval):
+            try:
+                self.check_health()
+            except Exception as e:
+                self.logger.warning(f"⚠️ Ollama health check failed: {e}")
+
+    def start_health_checks(self):
+        if self.health_check_interval <= 0 or self._health_thread is not None:
+            return
+        self._stop_event.clear()
+        self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def stop_health_checks(self):
+        self._stop_event.set()
+        self._health_thread = None
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [backend.get_stats() for backend in self.backends]
+
+
+_pools: Dict[Tuple[str, ...], OllamaBackendPool] = {}
+_pools_lock = threading.Lock()
+
+
+def resolve_backend_urls(base_url: str, settings: Optional[Settings] = None) -> List[str]:
+    """
+    Danh sách backend: Settings.OLLAMA_BASE_URLS (phân cách bởi dấu phẩy) nếu có, ngược lại base_url
+    """
+    settings = settings or Settings.load_settings()
+    urls = [url.strip().rstrip("/") for url in settings.OLLAMA_BASE_URLS.split(",") if url.strip()]
+    return urls or [base_url.rstrip("/")]
+
+
+def get_backend_pool(base_url: str) -> OllamaBackendPool:
+    """
+    Lấy pool dùng chung cho các OllamaLLMs (cùng danh sách backend thì cùng pool)
+    """
+    settings = Settings.load_settings()
+    urls = tuple(resolve_backend_urls(base_url, settings))
+    pool = _pools.get(urls)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(urls)
+            if pool is None:
+                pool = OllamaBackendPool(
+                    list(urls),
+                    failure_threshold=settings.OLLAMA_EJECT_FAILURE_THRESHOLD,
+                    eject_duration=settings.OLLAMA_EJECT_DURATION,
+                    health_check_interval=settings.OLLAMA_HEALTH_CHECK_INTERVAL
+                )
+                if len(urls) > 1:
+                    pool.start_health_checks()
+                _pools[urls] = pool
+    return pool
+
+
+def reset_backend_pools():
+    """Dừng health check và xóa các pool (vd: sau khi fork process)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.stop_health_checks()
+        _pools.clear()
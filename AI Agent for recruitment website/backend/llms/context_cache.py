@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Tái sử dụng `context` của /api/generate giữa các lượt chat của một session:
+lượt sau chỉ gửi các message mới kèm context (token đã evaluate của lượt trước)
+thay vì gửi lại toàn bộ lịch sử đã nối thành một prompt.
+
+Context chỉ được dùng khi prompt mới bắt đầu đúng bằng các message lượt trước đã gửi,
+tiếp theo là câu trả lời của model. Lịch sử bị sửa/cắt bớt, clear_history hoặc context
+quá lớn thì gửi lại toàn bộ prompt (và lưu context mới).
+
+Context chứa mọi token đã evaluate, kể cả message chỉ dẫn được thêm vào cuối prompt mỗi
+lượt mà không lưu trong lịch sử: lượt trước có message như vậy thì không dùng lại context
+(nếu không mỗi lượt sẽ tích thêm một bản chỉ dẫn trong context của model).
+"""
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from setting import Settings
+
+Messages = List[Dict[str, str]]
+
+
+def _message_key(message: Dict[str, Any]) -> Tuple[str, str]:
+    return message.get("role", ""), message.get("content") or ""
+
+
+class _ContextEntry:
+    __slots__ = ("sent", "response", "context")
+
+    def __init__(self, sent: List[Tuple[str, str]], response: str, context: array):
+        self.sent = sent          # Các message đã gửi ở lượt trước
+        self.response = response  # Câu trả lời (đã bỏ <think>) được thêm vào lịch sử
+        self.context = context    # Token context Ollama trả về (array("i") để tiết kiệm memory)
+
+
+class GenerationContextStore:
+    """Context của /api/generate theo (context_key, model), LRU giới hạn số entry"""
+
+    def __init__(self, enabled: bool = True, max_tokens: int = 3072, max_entries: int = 1000):
+        self.enabled = enabled
+        self.max_tokens = max_tokens
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], _ContextEntry]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "mismatches": 0, "too_large": 0, "reused_tokens": 0}
+
+    def lookup(self, context_key: str, model: str, prompt: Messages,
+               max_tokens: Optional[int] = None) -> Tuple[Optional[Messages], Optional[List[int]]]:
+        """
+        Trả về (message mới cần gửi, context) nếu dùng lại được context của lượt trước,
+        ngược lại (None, None) và prompt phải được gửi đầy đủ.
+
+        Toàn bộ message lượt trước phải nằm trong prompt mới (theo sau là câu trả lời của model);
+        message chỉ có ở cuối prompt lượt trước (chỉ dẫn theo lượt) thì gửi lại prompt đầy đủ.
+        """
+        if not self.enabled or not context_key:
+            return None, None
+        with self._lock:
+            entry = self._entries.get((context_key, model))
+            if entry is None:
+                self._stats["misses"] += 1
+                return None, None
+            self._entries.move_to_end((context_key, model))
+
+        keys = [_message_key(m) for m in prompt]
+        shared = 0
+        while shared < min(len(entry.sent), len(keys)) and entry.sent[shared] == keys[shared]:
+            shared += 1
+        reusable = (
+            shared == len(entry.sent)
+            and shared < len(keys)
+            and keys[shared] == ("assistant", entry.response)
+        )
+        limit = max_tokens or self.max_tokens
+        with self._lock:
+            if not reusable:
+                self._stats["mismatches"] += 1
+                self._entries.pop((context_key, model), None)
+                return None, None
+            if limit and len(entry.context) >= limit:
+                self._stats["too_large"] += 1
+                self._entries.pop((context_key, model), None)
+                return None, None
+            self._stats["hits"] += 1
+            self._stats["reused_tokens"] += len(entry.context)
+        return prompt[shared + 1:], entry.context.tolist()
+
+    def save(self, context_key: str, model: str, prompt: Messages, response: str, context: Optional[List[int]]):
+        """Lưu context sau một lượt /api/generate (prompt là danh sách message đầy đủ của lượt đó)"""
+        if not self.enabled or not context_key:
+            return
+        if not context or (self.max_tokens and len(context) >= self.max_tokens):
+            self.invalidate(context_key, model)
+            return
+        entry = _ContextEntry([_message_key(m) for m in prompt], str(response or ""), array("i", context))
+        with self._lock:
+            self._entries[(context_key, model)] = entry
+            self._entries.move_to_end((context_key, model))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, context_key: str, model: Optional[str] = None):
+        """Bỏ context của một session (mọi model nếu model=None)"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == context_key and (model is None or key[1] == model)]:
+                del self._entries[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["context_tokens"] = sum(len(entry.context) for entry in self._entries.values())
+        lookups = stats["hits"] + stats["misses"] + stats["mismatches"] + stats["too_large"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["enabled"] = self.enabled
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_context_store: Optional[GenerationContextStore] = None
+_context_store_lock = threading.Lock()
+
+
+def get_context_store() -> GenerationContextStore:
+    """Context store dùng chung cho mọi OllamaLLMs trong process"""
+    global _context_store
+    if _context_store is None:
+        with _context_store_lock:
+            if _context_store is None:
+                settings = Settings.load_settings()
+                _context_store = GenerationContextStore(
+                    enabled=settings.LLM_INCREMENTAL_CONTEXT,
+                    max_tokens=settings.LLM_CONTEXT_MAX_TOKENS,
+                    max_entries=settings.LLM_CONTEXT_MAX_SESSIONS
+                )
+    return _context_store
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Client pool cho MCP tool server chạy ở chế độ streamable HTTP (MCP/http_transport.py):
+- giữ `size` MCP session lâu dài, mỗi session multiplex nhiều tool call đồng thời
+- chọn session đang ít call nhất
+- lỗi kết nối: đóng session, kết nối lại và retry (full jitter backoff)
+
+Code đồng bộ (Flask, stage scheduler) gọi qua một event loop chạy trên thread nền.
+"""
+import asyncio
+import importlib
+import json
+import os
+import random
+import threading
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from setting import Settings
+from tool.tracing import SPAN_KIND_CLIENT, trace_span
+
+try:
+    from mcp import ClientSession
+    from mcp.client.streamable_http import streamablehttp_client
+    from mcp.shared.exceptions import McpError
+    from mcp.types import CONNECTION_CLOSED
+except ImportError:  # mcp chưa cài: chỉ dùng được tool trong process
+    ClientSession = None
+    McpError = None
+    CONNECTION_CLOSED = -32000
+
+# Server không còn session (vd: server restart, trả 404): client mcp báo lỗi với code này
+SESSION_TERMINATED = 32600
+
+
+class MCPToolError(RuntimeError):
+    """Tool chạy trên server bị lỗi (không retry)"""
+
+    def __init__(self, tool_name: str, message: str):
+        self.tool_name = tool_name
+        super().__init__(f"MCP tool {tool_name} failed: {message}")
+
+
+def _is_retryable(error: BaseException) -> bool:
+    """Lỗi kết nối/session đóng thì retry; lỗi JSON-RPC khác (sai tham số, tool không tồn tại) thì không"""
+    if isinstance(error, MCPToolError):
+        return False
+    if McpError is not None and isinstance(error, McpError):
+        return error.error.code in (CONNECTION_CLOSED, SESSION_TERMINATED)
+    return True
+
+
+def _unwrap_result(result, output_schema: Optional[Dict[str, Any]]) -> Any:
+    """CallToolResult -> giá trị Python giống như khi gọi hàm tool trong process"""
+    if result.structuredContent is not None:
+        properties = (output_schema or {}).get("properties") or {}
+        # FastMCP bọc kiểu không phải object (str, list, ...) trong {"result": ...}
+        if set(properties) == {"result"} and set(result.structuredContent) == {"result"}:
+            return result.structuredContent["result"]
+        return result.structuredContent
+
+    texts = [block.text for block in result.content if getattr(block, "type", None) == "text"]
+    if len(texts) == 1:
+        try:
+            return json.loads(texts[0])
+        except ValueError:
+            return texts[0]
+    return texts
+
+
+class _PooledSession:
+    """Một MCP session lâu dài; context manager của transport được giữ mở trong task riêng"""
+
+    def __init__(self, pool: "MCPClientPool", index: int):
+        self.pool = pool
+        self.index = index
+        self.session: Optional[ClientSession] = None
+        self.in_flight = 0
+        self._connect_lock = asyncio.Lock()
+        self._closing: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _hold(self, ready: asyncio.Future):
+        try:
+            async with streamablehttp_client(
+                self.pool.url, timeout=self.pool.connect_timeout, sse_read_timeout=self.pool.timeout
+            ) as (read_stream, write_stream, _):
+                async with ClientSession(read_stream, write_stream) as session:
+                    await session.initialize()
+                    if not self.pool.tool_schemas:
+                        tools = await session.list_tools()
+                        self.pool._register_tools(tools.tools)
+                    self.session = session
+                    ready.set_result(session)
+                    await self._closing.wait()
+        except BaseException as e:
+            if not ready.done():
+                ready.set_exception(e)
+            elif not isinstance(e, asyncio.CancelledError):
+                logger.warning(f"⚠️ MCP session {self.index} closed: {e}")
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            self.session = None
+
+    async def get(self) -> "ClientSession":
+        if self.session is not None:
+            return self.session
+        async with self._connect_lock:
+            if self.session is None:
+                ready = asyncio.get_running_loop().create_future()
+                self._closing = asyncio.Event()
+                self._task = asyncio.create_task(self._hold(ready))
+                await asyncio.wait_for(ready, self.pool.connect_timeout)
+                self.pool.stats["connects"] += 1
+        return self.session
+
+    async def reset(self):
+        """Đóng session hiện tại (lần get() sau sẽ kết nối lại)"""
+        self.session = None
+        if self._closing is not None:
+            self._closing.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), 5)
+            except BaseException:
+                self._task.cancel()
+            self._task = None
+
+
+class MCPClientPool:
+    """Pool các MCP session tới một tool server streamable HTTP"""
+
+    def __init__(
+        self,
+        url: str,
+        size: int = 4,
+        timeout: float = 60.0,
+        connect_timeout: float = 10.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 4.0
+    ):
+        if ClientSession is None:
+            raise ImportError("MCPClientPool cần package mcp>=1.8 (streamable HTTP client)")
+        self.url = url
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.tool_schemas: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"calls": 0, "retries": 0, "connects": 0, "errors": 0}
+
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._sessions: List[_PooledSession] = []
+
+    @classmethod
+    def from_settings(cls, url: str, settings: Optional[Settings] = None) -> "MCPClientPool":
+        settings = settings or Settings.load_settings()
+        return cls(
+            url,
+            size=settings.MCP_POOL_SIZE,
+            timeout=settings.MCP_CALL_TIMEOUT,
+            connect_timeout=settings.MCP_CONNECT_TIMEOUT,
+            max_retries=settings.MCP_MAX_RETRIES,
+            backoff_base=settings.MCP_RETRY_BACKOFF,
+            backoff_max=settings.OLLAMA_RETRY_BACKOFF_MAX
+        )
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        # Event loop và session không dùng lại được sau fork: tạo lại khi pid đổi
+        # (proxy từ tool() giữ tham chiếu tới pool nên pool tự reset thay vì bị thay thế)
+        if self._loop is None or self._pid != os.getpid():
+            with self._lock:
+                if self._loop is None or self._pid != os.getpid():
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name="mcp-client", daemon=True)
+                    thread.start()
+                    self._sessions = [_PooledSession(self, i) for i in range(self.size)]
+                    self._loop, self._thread, self._pid = loop, thread, os.getpid()
+        return self._loop
+
+    def _register_tools(self, tools):
+        self.tool_schemas = {
+            tool.name: {"input": tool.inputSchema or {}, "output": tool.outputSchema}
+            for tool in tools
+        }
+
+    def _pick(self) -> _PooledSession:
+        """Session ít call đang chạy nhất (ưu tiên session đã kết nối)"""
+        return min(self._sessions, key=lambda s: (s.in_flight, s.session is None, s.index))
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _call(self, name: str, arguments: Dict[str, Any], timeout: float) -> Any:
+        attempt = 0
+        while True:
+            pooled = self._pick()
+            pooled.in_flight += 1
+            try:
+                session = await pooled.get()
+                result = await session.call_tool(name, arguments, read_timeout_seconds=timedelta(seconds=timeout))
+                if result.isError:
+                    message = " ".join(getattr(block, "text", "") for block in result.content)
+                    raise MCPToolError(name, message)
+                return _unwrap_result(result, (self.tool_schemas.get(name) or {}).get("output"))
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    self.stats["errors"] += 1
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                logger.warning(f"⚠️ MCP call {name} failed ({type(e).__name__}: {e}), reconnecting (retry {attempt}/{self.max_retries})")
+                await pooled.reset()
+                await asyncio.sleep(self._backoff(attempt))
+            finally:
+                pooled.in_flight -= 1
+
+    def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Any:
+        """Gọi tool (đồng bộ), trả về kết quả đã unwrap"""
+        timeout = timeout or self.timeout
+        self.stats["calls"] += 1
+        with trace_span(f"mcp.call {name}", kind=SPAN_KIND_CLIENT, server=self.url):
+            future = asyncio.run_coroutine_threadsafe(self._call(name, arguments or {}, timeout), self._ensure_loop())
+            # Chừa thời gian cho các lần retry + kết nối lại
+            return future.result(timeout=(timeout + self.connect_timeout) * (self.max_retries + 1) + self.backoff_max * self.max_retries)
+
+    def list_tools(self) -> List[str]:
+        if not self.tool_schemas:
+            # Tạo loop (và session) trước khi chọn session
+            loop = self._ensure_loop()
+            future = asyncio.run_coroutine_threadsafe(self._pick().get(), loop)
+            future.result(timeout=self.connect_timeout * 2)
+        return list(self.tool_schemas)
+
+    def tool(self, name: str) -> Callable[..., Any]:
+        """Hàm proxy cho một tool: nhận tham số theo vị trí (theo thứ tự trong input schema) hoặc theo tên"""
+        def call_remote(*args, **kwargs):
+            if args:
+                if not self.tool_schemas:
+                    self.list_tools()
+                params = list((self.tool_schemas.get(name) or {}).get("input", {}).get("properties", {}))
+                if len(args) > len(params):
+                    raise TypeError(f"{name}() takes {len(params)} positional arguments but {len(args)} were given")
+                kwargs = {**dict(zip(params, args)), **kwargs}
+            return self.call_tool(name, kwargs)
+
+        call_remote.__name__ = name
+        return call_remote
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "url": self.url,
+            "sessions": [
+                {"connected": s.session is not None, "in_flight": s.in_flight} for s in self._sessions
+            ],
+        }
+
+    def close(self):
+        loop = self._loop
+        if loop is None:
+            return
+        if self._pid == os.getpid() and loop.is_running():
+            async def close_all():
+                await asyncio.gather(*(s.reset() for s in self._sessions), return_exceptions=True)
+            try:
+                asyncio.run_coroutine_threadsafe(close_all(), loop).result(timeout=10)
+            except Exception:
+                pass
+            loop.call_soon_threadsafe(loop.stop)
+        self._loop = None
+        self._sessions = []
+
+
+# Pool dùng chung theo URL (giống llms/backend_pool.py)
+_pools: Dict[str, MCPClientPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_mcp_client_pool(url: str) -> MCPClientPool:
+    pool = _pools.get(url)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(url)
+            if pool is None:
+                pool = MCPClientPool.from_settings(url)
+                _pools[url] = pool
+    return pool
+
+
+def get_tool(name: str) -> Callable[..., Any]:
+    """
+    Tool theo tên: gọi qua MCP tool server nếu có Settings.MCP_SERVER_URL,
+    ngược lại dùng hàm trong process (import MCP.server, load model vào process này)
+    """
+    settings = Settings.load_settings()
+    if settings.MCP_SERVER_URL:
+        return get_mcp_client_pool(settings.MCP_SERVER_URL).tool(name)
+    mcp_server = importlib.import_module("MCP.server")
+    return getattr(mcp_server, name)
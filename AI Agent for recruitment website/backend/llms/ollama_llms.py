@@ -1,35 +1,72 @@
 # -*- coding: utf-8 -*-
 import ollama
-import requests
 import json
 import logging
 from typing import List, Dict, Optional, Callable, Any, Union
 from .base import BaseLLM
 from .tools import AVAILABLE_TOOLS, get_tool_by_name
+from .backend_pool import get_backend_pool
+from .admission import get_admission_controller, AdmissionRejected
+from .residency import get_residency_manager
+from .transport import CircuitOpenError
+from .thinking import NO_THINK_DIRECTIVE, ThinkTagFilter, get_thinking_metrics, split_think, strip_think
+from .usage import LLMResponse, TokenBudgetExceeded, Usage, get_usage_metrics
+from .context_cache import get_context_store
+from tool.single_flight import get_single_flight, llm_call_key
+from tool.tracing import SPAN_KIND_CLIENT, trace_span
+
+
+def _usage_attributes(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Số token và thời gian (ms) trong response của Ollama, dùng làm attribute của span"""
+    return {
+        "llm.prompt_tokens": data.get("prompt_eval_count"),
+        "llm.completion_tokens": data.get("eval_count"),
+        "llm.load_ms": round(data["load_duration"] / 1e6, 1) if data.get("load_duration") else None,
+        "llm.total_ms": round(data["total_duration"] / 1e6, 1) if data.get("total_duration") else None,
+    }
 
 
 class OllamaLLMs(BaseLLM):
-    def __init__(self, base_url: str = "http://localhost:11434", model_name: str = "llama2", **kwargs):
+    def __init__(self, base_url: str = "http://localhost:11434", model_name: str = "llama2", default_options: Optional[Dict[str, Any]] = None,
+                 think: Optional[bool] = None, think_mode: str = "option", **kwargs):
         """
         Ollama client với function calling support và connection optimization.
         base_url: URL Ollama server (mặc định: http://localhost:11434)
         model_name: tên model đã pull về trong Ollama
+        default_options: Ollama "options" mặc định (temperature, num_predict, ...) cho mọi call
+        think: bật/tắt reasoning mặc định cho mọi call (None = để model tự quyết định)
+        think_mode: cách tắt reasoning - "option" (field `think` của Ollama),
+                    "directive" (thêm /no_think vào prompt) hoặc "both"
         """
         super().__init__(model_name=model_name, **kwargs)
         self.base_url = base_url.rstrip("/")
+        self.default_options = dict(default_options or {})
+        self.default_think = think
+        self.think_mode = think_mode
+        self.task: Optional[str] = None
+        self._think_option_supported = True
+        self.thinking_metrics = get_thinking_metrics()
         
-        # Initialize Ollama client with connection pooling
-        self.client = ollama.Client(
-            host=base_url,
-            timeout=120  # Tăng timeout cho models lớn
-        )
+        # Pool các Ollama backend (Settings.OLLAMA_BASE_URLS hoặc chỉ base_url),
+        # mỗi backend có transport riêng (pooled keep-alive, timeout, retry, circuit breaker)
+        self.pool = get_backend_pool(self.base_url)
+        self.transport = self.pool.primary.transport
+        self.session = self.transport.session
+        
+        # Giới hạn số LLM call đồng thời + hàng đợi ưu tiên (dùng chung trong process)
+        self.admission = get_admission_controller()
+        
+        # Ghi nhận load_duration (cold load) của model, dùng chung trong process
+        self.residency = get_residency_manager(self.base_url)
+        
+        # Thống kê token theo session/task/route + budget token của session
+        self.usage_metrics = get_usage_metrics()
         
-        # Tạo session với connection pooling cho HTTP requests
-        self.session = requests.Session()
-        self.session.headers.update({
-            'Content-Type': 'application/json',
-            'Connection': 'keep-alive'
-        })
+        # Context của /api/generate theo session (incremental generation)
+        self.context_store = get_context_store()
+        
+        # Gộp các LLM call deterministic giống hệt nhau đang chạy (double-click, retry của frontend, ...)
+        self.single_flight = get_single_flight("llm")
         
         # Setup logging
         self.logger = logging.getLogger(__name__)
@@ -37,82 +74,354 @@ class OllamaLLMs(BaseLLM):
         # Keep model warm (load vào memory nếu chưa load)
         self._ensure_model_loaded()
     
+    def reset_connections(self):
+        """Lấy lại backend pool/transport (sau reset_backend_pools, vd: trong worker sau khi fork)"""
+        self.pool = get_backend_pool(self.base_url)
+        self.transport = self.pool.primary.transport
+        self.session = self.transport.session
+
+    @property
+    def client(self) -> ollama.Client:
+        """ollama.Client của backend chính (function calling đi qua self.pool.acquire())"""
+        return self.pool.primary.client
+    
     def _ensure_model_loaded(self):
         """
-        Đảm bảo model đã được load vào memory (warm-up)
+        Đảm bảo model đã được load vào memory (warm-up) trên mọi backend
         """
-        try:
-            # Gửi một request nhỏ để warm-up model
-            warmup_response = self.client.chat(
-                model=self.model_name,
-                messages=[{"role": "user", "content": "Hi"}],
-                options={"num_predict": 1}  # Chỉ generate 1 token
-            )
-            self.logger.info(f"🔥 Model {self.model_name} warmed up successfully")
-        except Exception as e:
-            self.logger.warning(f"⚠️ Model warm-up failed: {e}")
+        for backend in self.pool.backends:
+            try:
+                # Gửi một request nhỏ để warm-up model
+                backend.transport.post("/api/chat", json={
+                    "model": self.model_name,
+                    "messages": [{"role": "user", "content": "Hi"}],
+                    "stream": False,
+                    "options": {"num_predict": 1}  # Chỉ generate 1 token
+                })
+                self.logger.info(f"🔥 Model {self.model_name} warmed up successfully on {backend.url}")
+            except Exception as e:
+                self.logger.warning(f"⚠️ Model warm-up failed on {backend.url}: {e}")
+    
+    def _post_json(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        POST tới Ollama qua backend pool (least-outstanding-requests)
+        """
+        self.usage_metrics.check_budget()
+        with trace_span(f"ollama {path}", kind=SPAN_KIND_CLIENT, model=self.model_name, task=self.task) as span:
+            def send():
+                with self.admission.acquire():
+                    resp = self.pool.post(path, json=payload)
+
+                if resp.status_code != 200:
+                    raise ValueError(f"Ollama request failed: {resp.status_code}, {resp.text}")
+                return resp.json()
+
+            data, shared = self.single_flight.do(llm_call_key(path, payload), send)
+            span.set_attributes(_usage_attributes(data))
+        return self._after_response(data, shared, span)
+
+    def _after_response(self, data: Dict[str, Any], shared: bool, span) -> Dict[str, Any]:
+        """Response dùng chung với call khác (single-flight) được đánh dấu để không tính token hai lần"""
+        if shared:
+            span.set_attribute("llm.coalesced", True)
+            return {**data, "coalesced": True}
+        self.residency.record_load(self.model_name, data)
+        return data
     
     def keep_alive(self, duration: int = 300):
         """
         Giữ model trong memory trong khoảng thời gian nhất định
         Args:
             duration: Thời gian giữ model (giây), -1 = vĩnh viễn
+        Returns:
+            True nếu model đã được load trên ít nhất một backend
         """
+        payload = {
+            "model": self.model_name,
+            "keep_alive": duration if duration > 0 else -1
+        }
+        loaded = False
+        for backend in self.pool.backends:
+            try:
+                response = backend.transport.post("/api/generate", json=payload)
+                if response.status_code != 200:
+                    self.logger.warning(f"⚠️ Keep-alive failed on {backend.url}: HTTP {response.status_code} {response.text[:200]}")
+                    continue
+                loaded = True
+                self.logger.info(f"🔄 Model {self.model_name} keep-alive set to {duration}s on {backend.url}")
+            except Exception as e:
+                self.logger.warning(f"⚠️ Keep-alive failed on {backend.url}: {e}")
+        return loaded
+
+    def _merge_options(self, options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Ghép default_options của instance với options của từng call (call được ưu tiên)"""
+        return {**self.default_options, **(options or {})}
+
+    def _apply_think(self, payload: Dict[str, Any], think: Optional[bool]) -> Optional[bool]:
+        """
+        Gắn chế độ reasoning vào payload (/api/chat hoặc /api/generate).
+        Trả về giá trị think thực sự được áp dụng.
+        """
+        if think is None:
+            think = self.default_think
+        if think is None:
+            return None
+
+        use_option = self.think_mode in ("option", "both") and self._think_option_supported
+        if use_option:
+            payload["think"] = think
+
+        # Ollama cũ không có field `think`: dùng directive /no_think của Qwen3
+        if think is False and (not use_option or self.think_mode == "both"):
+            if "messages" in payload:
+                messages = [dict(m) for m in payload["messages"]]
+                for message in reversed(messages):
+                    if message.get("role") == "user":
+                        if NO_THINK_DIRECTIVE not in message.get("content", ""):
+                            message["content"] = f"{message.get('content', '')} {NO_THINK_DIRECTIVE}"
+                        break
+                payload["messages"] = messages
+            elif NO_THINK_DIRECTIVE not in payload.get("prompt", ""):
+                payload["prompt"] = f"{payload.get('prompt', '')} {NO_THINK_DIRECTIVE}"
+        return think
+
+    def _post_with_think(self, path: str, payload: Dict[str, Any], think: Optional[bool]):
+        """
+        POST kèm chế độ reasoning, tự chuyển sang directive nếu server không hỗ trợ field `think`.
+        Trả về (response data, think đã áp dụng)
+        """
+        base_payload = dict(payload)
+        think = self._apply_think(payload, think)
         try:
-            payload = {
-                "model": self.model_name,
-                "keep_alive": duration if duration > 0 else -1
-            }
-            self.session.post(f"{self.base_url}/api/generate", json=payload)
-            self.logger.info(f"🔄 Model {self.model_name} keep-alive set to {duration}s")
-        except Exception as e:
-            self.logger.warning(f"⚠️ Keep-alive failed: {e}")
+            return self._post_json(path, payload), think
+        except ValueError as e:
+            if "think" not in payload or "think" not in str(e).lower():
+                raise
+            self.logger.warning(f"⚠️ {self.model_name} không hỗ trợ field `think`, chuyển sang {NO_THINK_DIRECTIVE}: {e}")
+            self._think_option_supported = False
+            self._apply_think(base_payload, think)
+            return self._post_json(path, base_payload), think
 
-    def generate_content(self, prompt: List[Dict[str, str]]) -> str:
+    def _generate_payload(self, prompt: List[Dict[str, str]], options: Optional[Dict[str, Any]],
+                          context_key: Optional[str] = None) -> Dict[str, Any]:
         """
-        Generate content using the legacy API (backward compatibility)
+        context_key: khóa của session; nếu context lượt trước còn dùng được thì prompt
+        chỉ gồm các message mới và payload mang `context` của lượt trước
         """
-        messages = "\n".join([f"{p['role']}: {p['content']}" for p in prompt])
+        merged_options = self._merge_options(options)
+        num_ctx = merged_options.get("num_ctx")
+        new_messages, context = self.context_store.lookup(
+            context_key, self.model_name, prompt,
+            max_tokens=num_ctx - (merged_options.get("num_predict") or 0) if num_ctx else None
+        )
+        payload = {
+            "model": self.model_name,
+            "prompt": "\n".join([f"{p['role']}: {p['content']}" for p in (prompt if context is None else new_messages)]),
+            "stream": False,
+        }
+        if context is not None:
+            payload["context"] = context
+        if merged_options:
+            payload["options"] = merged_options
+        return payload
 
+    def _chat_payload(self, messages: List[Dict[str, str]], options: Dict[str, Any]) -> Dict[str, Any]:
         payload = {
             "model": self.model_name,
-            "prompt": messages,
+            "messages": messages,
             "stream": False,
+            **options
         }
+        merged_options = self._merge_options(options.get("options"))
+        if merged_options:
+            payload["options"] = merged_options
+        return payload
+
+    async def _apost_json(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        _post_json() bản async qua ollama.AsyncClient (không chặn event loop của MCP server)
+        """
+        self.usage_metrics.check_budget()
+        with trace_span(f"ollama {path}", kind=SPAN_KIND_CLIENT, model=self.model_name, task=self.task) as span:
+            async def send():
+                async with self.admission.acquire_async():
+                    with self.pool.acquire() as backend, backend.transport.guarded():
+                        client = backend.async_client
+                        try:
+                            if path == "/api/chat":
+                                response = await client.chat(**payload)
+                            else:
+                                response = await client.generate(**payload)
+                        except ollama.ResponseError as e:
+                            raise ValueError(f"Ollama request failed: {e.status_code}, {e.error}")
+                return response.model_dump() if hasattr(response, "model_dump") else dict(response)
+
+            # Khóa riêng cho bản async (response của ollama.AsyncClient khác định dạng JSON thô)
+            key = llm_call_key(path, payload)
+            data, shared = await self.single_flight.ado(f"async:{key}" if key else None, send)
+            span.set_attributes(_usage_attributes(data))
+        return self._after_response(data, shared, span)
 
-        resp = requests.post(
-            f"{self.base_url}/api/generate",
-            json=payload,
+    async def _apost_with_think(self, path: str, payload: Dict[str, Any], think: Optional[bool]):
+        """_post_with_think() bản async"""
+        base_payload = dict(payload)
+        think = self._apply_think(payload, think)
+        try:
+            return await self._apost_json(path, payload), think
+        except ValueError as e:
+            if "think" not in payload or "think" not in str(e).lower():
+                raise
+            self.logger.warning(f"⚠️ {self.model_name} không hỗ trợ field `think`, chuyển sang {NO_THINK_DIRECTIVE}: {e}")
+            self._think_option_supported = False
+            self._apply_think(base_payload, think)
+            return await self._apost_json(path, base_payload), think
+
+    def _record_thinking(self, data: Dict[str, Any], content: str, thinking: str, think: Optional[bool]):
+        """Ghi nhận số token dùng cho reasoning (field `thinking` riêng hoặc <think> trong content)"""
+        inline_thinking, answer = split_think(content)
+        self.thinking_metrics.record(
+            model=self.model_name,
+            task=self.task,
+            think=think,
+            eval_count=data.get("eval_count", 0) or 0,
+            thinking_chars=len(thinking or "") + len(inline_thinking),
+            answer_chars=len(answer or "")
         )
 
-        if resp.status_code != 200:
-            raise ValueError(f"Ollama request failed: {resp.status_code}, {resp.text}")
+    def _record_usage(self, data: Any) -> Usage:
+        """Usage của một response, được cộng vào thống kê theo session/task/route"""
+        return self.usage_metrics.record(Usage.from_response(data, model=self.model_name, task=self.task))
+
+    def _response(self, data: Dict[str, Any], content: str) -> LLMResponse:
+        return LLMResponse(strip_think(content), self._record_usage(data))
 
-        data = resp.json()
-        return data.get("response", "")
+    def generate_content(self, prompt: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None,
+                         think: Optional[bool] = None, context_key: Optional[str] = None) -> LLMResponse:
+        """
+        Generate content using the legacy API (backward compatibility)
+        think: bật/tắt reasoning cho call này (None = mặc định của instance)
+        context_key: khóa của session để lượt sau chỉ gửi message mới (xem llms/context_cache.py)
+        Returns: text (đã bỏ <think> block), số token/thời gian ở .usage
+        """
+        payload = self._generate_payload(prompt, options, context_key)
+        data, think = self._post_with_think("/api/generate", payload, think)
+        content = data.get("response", "")
+        self._record_thinking(data, content, data.get("thinking", ""), think)
+        response = self._response(data, content)
+        self.context_store.save(context_key, self.model_name, prompt, response, data.get("context"))
+        return response
 
-    def chat(self, messages: List[Dict[str, str]], **options) -> str:
+    def chat(self, messages: List[Dict[str, str]], think: Optional[bool] = None, **options) -> LLMResponse:
         """
-        Chat using Ollama 0.4 API without tools
+        Chat using Ollama /api/chat without tools
         
         Args:
             messages: List of message dicts with 'role' and 'content'
-            **options: Additional options (temperature, etc.)
+            think: bật/tắt reasoning cho call này (None = mặc định của instance)
+            **options: Additional request fields (options, format, keep_alive, ...)
         
         Returns:
-            str: Generated response
+            LLMResponse: Generated response (đã bỏ <think> block), số token/thời gian ở .usage
         """
         try:
-            response = self.client.chat(
-                model=self.model_name,
-                messages=messages,
-                **options
-            )
-            return response['message']['content']
+            payload = self._chat_payload(messages, options)
+            data, think = self._post_with_think("/api/chat", payload, think)
+            message = data['message']
+            self._record_thinking(data, message['content'], message.get('thinking', ''), think)
+            return self._response(data, message['content'])
+        except (AdmissionRejected, TokenBudgetExceeded, CircuitOpenError):
+            raise
+        except Exception as e:
+            self.logger.error(f"Chat error: {e}")
+            raise ValueError(f"Chat request failed: {str(e)}")
+
+    async def agenerate_content(self, prompt: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None,
+                                think: Optional[bool] = None, context_key: Optional[str] = None) -> LLMResponse:
+        """generate_content() bản async"""
+        payload = self._generate_payload(prompt, options, context_key)
+        data, think = await self._apost_with_think("/api/generate", payload, think)
+        content = data.get("response") or ""
+        self._record_thinking(data, content, data.get("thinking") or "", think)
+        response = self._response(data, content)
+        self.context_store.save(context_key, self.model_name, prompt, response, data.get("context"))
+        return response
+
+    async def achat(self, messages: List[Dict[str, str]], think: Optional[bool] = None, **options) -> LLMResponse:
+        """chat() bản async (ollama.AsyncClient), dùng cho tool async của MCP server"""
+        try:
+            payload = self._chat_payload(messages, options)
+            data, think = await self._apost_with_think("/api/chat", payload, think)
+            message = data['message']
+            self._record_thinking(data, message['content'] or "", message.get('thinking') or "", think)
+            return self._response(data, message['content'] or "")
+        except (AdmissionRejected, TokenBudgetExceeded, CircuitOpenError):
+            raise
         except Exception as e:
             self.logger.error(f"Chat error: {e}")
             raise ValueError(f"Chat request failed: {str(e)}")
 
+    def stream_chat(self, messages: List[Dict[str, str]], think: Optional[bool] = None, **options):
+        """
+        Stream câu trả lời từ /api/chat, lọc <think> block ngay trong lúc stream
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            think: bật/tắt reasoning cho call này (None = mặc định của instance)
+            **options: Additional request fields (options, format, keep_alive, ...)
+        
+        Yields:
+            str: các đoạn text hiển thị được cho user
+        """
+        payload = {
+            "model": self.model_name,
+            "messages": messages,
+            "stream": True,
+            **options
+        }
+        merged_options = self._merge_options(options.get("options"))
+        if merged_options:
+            payload["options"] = merged_options
+        think = self._apply_think(payload, think)
+
+        self.usage_metrics.check_budget()
+        think_filter = ThinkTagFilter()
+        eval_count = 0
+        with self.admission.acquire():
+            resp = self.pool.post("/api/chat", json=payload, stream=True)
+            try:
+                if resp.status_code != 200:
+                    raise ValueError(f"Ollama request failed: {resp.status_code}, {resp.text}")
+
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    message = chunk.get("message", {})
+                    # Ollama tách reasoning sang field `thinking` khi dùng option `think`
+                    think_filter.thinking_chars += len(message.get("thinking", "") or "")
+                    visible = think_filter.feed(message.get("content", ""))
+                    if visible:
+                        yield visible
+                    if chunk.get("done"):
+                        eval_count = chunk.get("eval_count", 0) or 0
+                        self.residency.record_load(self.model_name, chunk)
+                        self._record_usage(chunk)
+
+                tail = think_filter.flush()
+                if tail:
+                    yield tail
+            finally:
+                resp.close()
+
+        self.thinking_metrics.record(
+            model=self.model_name,
+            task=self.task,
+            think=think,
+            eval_count=eval_count,
+            thinking_chars=think_filter.thinking_chars,
+            answer_chars=think_filter.visible_chars
+        )
+
     def chat_with_tools(
         self, 
         messages: List[Dict[str, str]], 
@@ -130,7 +439,7 @@ class OllamaLLMs(BaseLLM):
             **options: Additional options (temperature, etc.)
         
         Returns:
-            dict: Response with final answer and tool call history
+            dict: Response with final answer, tool call history and token usage (tổng các bước)
         """
         if not tools:
             # No tools provided, use regular chat
@@ -138,7 +447,8 @@ class OllamaLLMs(BaseLLM):
             return {
                 "final_answer": response,
                 "tool_calls": [],
-                "steps": 1
+                "steps": 1,
+                "usage": response.usage.to_dict()
             }
         
         # Convert tools to proper format
@@ -146,18 +456,22 @@ class OllamaLLMs(BaseLLM):
         
         current_messages = messages.copy()
         tool_call_history = []
+        usages = []
         
         for step in range(max_steps):
             try:
+                self.usage_metrics.check_budget()
                 # Call Ollama with tools
-                response = self.client.chat(
-                    model=self.model_name,
-                    messages=current_messages,
-                    tools=tool_functions,
-                    **options
-                )
+                with self.admission.acquire(), self.pool.acquire() as backend, backend.transport.guarded():
+                    response = backend.client.chat(
+                        model=self.model_name,
+                        messages=current_messages,
+                        tools=tool_functions,
+                        **options
+                    )
                 
                 message = response['message']
+                usages.append(self._record_usage(response))
                 
                 # Check if model wants to use tools
                 if not hasattr(message, 'tool_calls') or not message.tool_calls:
@@ -165,7 +479,8 @@ class OllamaLLMs(BaseLLM):
                     return {
                         "final_answer": message['content'],
                         "tool_calls": tool_call_history,
-                        "steps": step + 1
+                        "steps": step + 1,
+                        "usage": Usage.total(usages).to_dict()
                     }
                 
                 # Process tool calls
@@ -188,12 +503,15 @@ class OllamaLLMs(BaseLLM):
                         "content": str(tool_result)
                     })
                 
+            except (AdmissionRejected, TokenBudgetExceeded):
+                raise
             except Exception as e:
                 self.logger.error(f"Tool calling error at step {step}: {e}")
                 return {
                     "final_answer": f"Error during tool execution: {str(e)}",
                     "tool_calls": tool_call_history,
                     "steps": step + 1,
+                    "usage": Usage.total(usages).to_dict(),
                     "error": str(e)
                 }
         
@@ -204,18 +522,24 @@ class OllamaLLMs(BaseLLM):
                 "content": "Please provide a final answer based on the information above."
             })
             
-            final_response = self.client.chat(
-                model=self.model_name,
-                messages=current_messages,
-                **options
-            )
+            self.usage_metrics.check_budget()
+            with self.admission.acquire(), self.pool.acquire() as backend, backend.transport.guarded():
+                final_response = backend.client.chat(
+                    model=self.model_name,
+                    messages=current_messages,
+                    **options
+                )
+            usages.append(self._record_usage(final_response))
             
             return {
                 "final_answer": final_response['message']['content'],
                 "tool_calls": tool_call_history,
                 "steps": max_steps,
-                "max_steps_reached": True
+                "max_steps_reached": True,
+                "usage": Usage.total(usages).to_dict()
             }
+        except (AdmissionRejected, TokenBudgetExceeded):
+            raise
         except Exception as e:
             return {
                 "final_answer": "Max steps reached and couldn't generate final answer",
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Giữ các model tier luôn nằm trong memory của Ollama:
+- định kỳ đọc /api/ps của từng backend, gia hạn keep-alive cho model sắp hết hạn
+- model bị Ollama evict (hết keep-alive, thiếu VRAM, restart) thì load lại ngay,
+  không để user kế tiếp chịu cold load
+- ghi nhận load_duration trong response của các LLM call để thấy cold load trong metrics
+"""
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Set
+
+from .backend_pool import get_backend_pool
+from setting import Settings
+
+# Go trả về thời gian dạng RFC3339Nano (tới 9 chữ số lẻ), datetime chỉ nhận tối đa 6
+_FRACTION_RE = re.compile(r"(\.\d{6})\d+")
+
+
+def parse_expires_at(value: Optional[str]) -> Optional[float]:
+    """expires_at của /api/ps -> unix timestamp (None nếu không đọc được)"""
+    if not value:
+        return None
+    try:
+        value = _FRACTION_RE.sub(r"\1", value.replace("Z", "+00:00"))
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    except ValueError:
+        return None
+
+
+def _model_names(name: str) -> Set[str]:
+    """Tên model kèm/không kèm tag :latest (Ollama luôn trả về tên có tag)"""
+    names = {name}
+    if name.endswith(":latest"):
+        names.add(name[:-len(":latest")])
+    elif ":" not in name.rsplit("/", 1)[-1]:
+        names.add(f"{name}:latest")
+    return names
+
+
+class ModelResidencyManager:
+    """Heartbeat keep-alive + phát hiện eviction cho các model được track"""
+
+    def __init__(self, base_url: str, keep_alive: int = 600, interval: float = 30.0,
+                 cold_load_threshold: float = 1.0):
+        self.base_url = base_url.rstrip("/")
+        self.keep_alive = keep_alive
+        self.interval = interval
+        self.cold_load_threshold = cold_load_threshold
+        self.models: Set[str] = set()
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._resident: Dict[str, Set[str]] = {}  # backend url -> model đang nằm trong memory (lần poll trước)
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _model_stats(self, model: str) -> Dict[str, Any]:
+        return self._stats.setdefault(model, {
+            "calls": 0,
+            "cold_loads": 0,
+            "load_seconds_total": 0.0,
+            "max_load_seconds": 0.0,
+            "last_cold_load_at": None,
+            "refreshes": 0,
+            "evictions": 0,
+            "rewarms": 0,
+            "rewarm_failures": 0,
+        })
+
+    def track(self, models: Iterable[str]):
+        """Thêm model cần giữ trong memory"""
+        with self._lock:
+            self.models.update(model for model in models if model)
+
+    def record_load(self, model: str, data: Dict[str, Any]):
+        """Ghi nhận load_duration (ns) trong response /api/chat hoặc /api/generate"""
+        load_seconds = (data.get("load_duration") or 0) / 1e9
+        with self._lock:
+            stats = self._model_stats(model)
+            stats["calls"] += 1
+            stats["load_seconds_total"] += load_seconds
+            stats["max_load_seconds"] = max(stats["max_load_seconds"], load_seconds)
+            if load_seconds >= self.cold_load_threshold:
+                stats["cold_loads"] += 1
+                stats["last_cold_load_at"] = time.time()
+        if load_seconds >= self.cold_load_threshold:
+            self.logger.warning(f"🧊 Cold load of {model}: {load_seconds:.2f}s")
+
+    def _refresh_window(self) -> float:
+        """Gia hạn khi thời gian còn lại ít hơn ngưỡng này (giây)"""
+        return max(self.interval * 2, self.keep_alive / 2)
+
+    def _load(self, backend, model: str) -> bool:
+        """Load model (hoặc gia hạn nếu đã load) bằng /api/generate không có prompt"""
+        response = backend.transport.post(
+            "/api/generate",
+            json={"model": model, "keep_alive": self.keep_alive if self.keep_alive > 0 else -1}
+        )
+        if response.status_code != 200:
+            self.logger.warning(f"⚠️ Keep-alive {model} failed on {backend.url}: HTTP {response.status_code}")
+            return False
+        return True
+
+    def poll(self):
+        """Một vòng heartbeat trên mọi backend"""
+        with self._lock:
+            models = set(self.models)
+        if not models:
+            return
+
+        now = time.time()
+        for backend in get_backend_pool(self.base_url).backends:
+            try:
+                response = backend.transport.get("/api/ps", timeout=5)
+                if response.status_code != 200:
+                    continue
+                running = {}
+                for entry in response.json().get("models", []):
+                    expires_at = parse_expires_at(entry.get("expires_at"))
+                    for name in _model_names(entry.get("name") or entry.get("model") or ""):
+                        running[name] = expires_at
+            except Exception as e:
+                self.logger.warning(f"⚠️ Residency poll failed on {backend.url}: {e}")
+                continue
+
+            previously_resident = self._resident.get(backend.url, set())
+            resident = set()
+            for model in sorted(models):
+                if model in running:
+                    expires_at = running[model]
+                    if expires_at is None or expires_at - now < self._refresh_window():
+                        try:
+                            if self._load(backend, model):
+                                with self._lock:
+                                    self._model_stats(model)["refreshes"] += 1
+                        except Exception as e:
+                            self.logger.warning(f"⚠️ Keep-alive {model} failed on {backend.url}: {e}")
+                    resident.add(model)
+                    continue
+
+                evicted = model in previously_resident
+                start_time = time.perf_counter()
+                try:
+                    loaded = self._load(backend, model)
+                except Exception as e:
+                    self.logger.warning(f"⚠️ Re-warm {model} failed on {backend.url}: {e}")
+                    loaded = False
+                with self._lock:
+                    stats = self._model_stats(model)
+                    if evicted:
+                        stats["evictions"] += 1
+                    if loaded:
+                        stats["rewarms"] += 1
+                    else:
+                        stats["rewarm_failures"] += 1
+                if loaded:
+                    resident.add(model)
+                    self.logger.info(
+                        f"🔥 {'Evicted model' if evicted else 'Model'} {model} re-warmed on {backend.url} "
+                        f"in {time.perf_counter() - start_time:.2f}s"
+                    )
+            self._resident[backend.url] = resident
+
+    def _loop(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                self.logger.warning(f"⚠️ Model residency check failed: {e}")
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="ollama-residency", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread = None
+
+    def reset_after_fork(self):
+        """
+        Worker không chạy heartbeat riêng: thread của master (preload_app) vẫn tiếp tục
+        gia hạn keep-alive cho cả host. Metrics của worker bắt đầu lại từ đầu.
+        """
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stats = {}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {model: dict(value) for model, value in self._stats.items()}
+            tracked = sorted(self.models)
+        for value in stats.values():
+            value["avg_load_seconds"] = (
+                round(value["load_seconds_total"] / value["calls"], 4) if value["calls"] else 0.0
+            )
+        return {
+            "tracked_models": tracked,
+            "keep_alive": self.keep_alive,
+            "interval": self.interval,
+            "running": self._thread is not None,
+            "resident": {url: sorted(models) for url, models in self._resident.items()},
+            "models": stats,
+        }
+
+
+_manager: Optional[ModelResidencyManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_residency_manager(base_url: Optional[str] = None) -> ModelResidencyManager:
+    """Residency manager dùng chung trong process"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                settings = Settings.load_settings()
+                _manager = ModelResidencyManager(
+                    base_url or settings.OLLAMA_BASE_URL,
+                    keep_alive=settings.MODEL_KEEP_ALIVE,
+                    interval=settings.MODEL_RESIDENCY_INTERVAL,
+                    cold_load_threshold=settings.MODEL_COLD_LOAD_THRESHOLD
+                )
+    return _manager
+
+
+def reset_residency_manager():
+    """Gọi trong worker sau khi fork (xem ModelResidencyManager.reset_after_fork)"""
+    if _manager is not None:
+        _manager.reset_after_fork()
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Điều khiển reasoning (<think>...</think>) của các model kiểu Qwen3:
+- strip_think: bỏ think block khỏi một response hoàn chỉnh
+- ThinkTagFilter: lọc think block theo từng chunk khi streaming
+- ThinkingMetrics: thống kê số token model dùng để "suy nghĩ"
+"""
+import re
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+NO_THINK_DIRECTIVE = "/no_think"
+
+THINK_BLOCK_PATTERN = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+
+def strip_think(text: str) -> str:
+    """
+    Bỏ các think block, kể cả block chưa đóng (output bị cắt bởi num_predict)
+    hoặc chỉ còn thẻ đóng (server đã tách phần mở đầu)
+    """
+    if not text:
+        return text
+    text = THINK_BLOCK_PATTERN.sub("", text)
+    if THINK_CLOSE in text:
+        text = text.split(THINK_CLOSE)[-1]
+    if THINK_OPEN in text:
+        text = text.split(THINK_OPEN)[0]
+    return text.strip()
+
+
+def split_think(text: str) -> Tuple[str, str]:
+    """Tách response thành (thinking, answer)"""
+    if not text:
+        return "", text or ""
+    thinking = "".join(block[len(THINK_OPEN):-len(THINK_CLOSE)] for block in THINK_BLOCK_PATTERN.findall(text))
+    return thinking.strip(), strip_think(text)
+
+
+class ThinkTagFilter:
+    """
+    Lọc think block khỏi stream token: feed() trả về phần text được phép hiển thị.
+    Thẻ có thể bị cắt giữa hai chunk ("<thi" + "nk>") nên phần đuôi có thể là
+    tiền tố của thẻ sẽ được giữ lại cho tới chunk tiếp theo.
+    """
+
+    def __init__(self):
+        self.in_think = False
+        self.thinking_chars = 0
+        self.visible_chars = 0
+        self._buffer = ""
+        self._leading = True  # Bỏ khoảng trắng ngay sau think block ở đầu câu trả lời
+
+    @staticmethod
+    def _partial_tag_length(text: str, tag: str) -> int:
+        """Độ dài phần đuôi của text trùng với tiền tố của tag"""
+        for length in range(min(len(tag) - 1, len(text)), 0, -1):
+            if text.endswith(tag[:length]):
+                return length
+        return 0
+
+    def feed(self, chunk: str) -> str:
+        text = self._buffer + (chunk or "")
+        self._buffer = ""
+        output = []
+
+        while text:
+            tag = THINK_CLOSE if self.in_think else THINK_OPEN
+            index = text.find(tag)
+            if index == -1:
+                keep = self._partial_tag_length(text, tag)
+                emit, self._buffer = text[:len(text) - keep], text[len(text) - keep:]
+                self._consume(emit, output)
+                break
+
+            self._consume(text[:index], output)
+            self.in_think = not self.in_think
+            text = text[index + len(tag):]
+
+        return "".join(output)
+
+    def _consume(self, text: str, output: list):
+        if not text:
+            return
+        if self.in_think:
+            self.thinking_chars += len(text)
+            return
+        if self._leading:
+            text = text.lstrip()
+            if not text:
+                return
+            self._leading = False
+        self.visible_chars += len(text)
+        output.append(text)
+
+    def flush(self) -> str:
+        """Kết thúc stream: trả về phần buffer còn lại (nếu không nằm trong think block)"""
+        text, self._buffer = self._buffer, ""
+        output = []
+        self._consume(text, output)
+        return "".join(output)
+
+
+class ThinkingMetrics:
+    """Thống kê token dùng cho reasoning theo model/task"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, model: str, task: Optional[str], think: Optional[bool], eval_count: int,
+               thinking_chars: int, answer_chars: int):
+        """
+        Ollama chỉ trả về eval_count (tổng token sinh ra), nên số token suy nghĩ
+        được ước lượng theo tỉ lệ ký tự thinking / tổng ký tự
+        """
+        total_chars = thinking_chars + answer_chars
+        thinking_tokens = round(eval_count * thinking_chars / total_chars) if total_chars else 0
+
+        key = f"{task or 'default'}:{model}"
+        with self._lock:
+            stats = self._stats.setdefault(key, {
+                "model": model,
+                "task": task,
+                "calls": 0,
+                "think_disabled_calls": 0,
+                "calls_with_thinking": 0,
+                "eval_tokens": 0,
+                "thinking_tokens": 0,
+            })
+            stats["calls"] += 1
+            if think is False:
+                stats["think_disabled_calls"] += 1
+            if thinking_chars:
+                stats["calls_with_thinking"] += 1
+            stats["eval_tokens"] += eval_count
+            stats["thinking_tokens"] += thinking_tokens
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {key: dict(value) for key, value in self._stats.items()}
+        for value in stats.values():
+            value["thinking_ratio"] = (
+                round(value["thinking_tokens"] / value["eval_tokens"], 4) if value["eval_tokens"] else 0.0
+            )
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+thinking_metrics = ThinkingMetrics()
+
+
+def get_thinking_metrics() -> ThinkingMetrics:
+    return thinking_metrics
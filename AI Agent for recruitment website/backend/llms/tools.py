@@ -9,7 +9,13 @@ from typing import Dict, List, Optional, Union
 from datetime import datetime
 
 
-from MCP.server import find_documents, enhance_question, intent_classification
+from .mcp_client import get_tool
+
+# Qua MCP tool server nếu có Settings.MCP_SERVER_URL, ngược lại gọi trong process
+find_documents = get_tool("find_documents")
+enhance_question = get_tool("enhance_question")
+intent_classification = get_tool("intent_classification")
+_search_job_hybrid = get_tool("search_job_hybrid")
 
 
 # tool for mongoDB
@@ -31,6 +37,21 @@ def search_job_info_from_mongo(collection: str, query: str) -> Dict:
         return {"message": "No jobs found matching the query."}
     return results
 
+def search_job_hybrid(query: str, top_k: int = 5, location: str = "") -> Dict:
+    """
+    Tìm kiếm công việc bằng hybrid retrieval (BM25 bỏ dấu + embedding, gộp bằng RRF)
+
+    Args:
+        query: Câu hỏi hoặc từ khóa tìm kiếm (vd: "python hà nội")
+        top_k: Số kết quả trả về
+        location: Chỉ lấy job ở địa điểm này (để trống nếu không lọc)
+
+    Returns:
+        dict: Kết quả tìm kiếm
+    """
+    # Index (và model embedding) nằm ở tool server, không load trong web worker
+    return _search_job_hybrid(query=query, top_k=top_k, location=location)
+
 def tool_self_query() -> str:
     """
     Tool này trả về tên và chức năng của chính nó
@@ -222,6 +243,7 @@ AVAILABLE_TOOLS = {
     # "format_json_response": format_json_response,
     # "make_safe_http_request": make_safe_http_request,
     "search_job_info_from_mongo": search_job_info_from_mongo,
+    "search_job_hybrid": search_job_hybrid,
     
 }
 
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP transport dùng chung cho mọi request tới Ollama:
+connection pooling (keep-alive), timeout, retry có jitter và circuit breaker.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Any
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from setting import Settings
+
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Lỗi kết nối từ requests và từ ollama.Client (httpx)
+CONNECTION_ERRORS = (ConnectionError, TimeoutError, requests.ConnectionError, requests.Timeout)
+try:
+    import httpx
+    CONNECTION_ERRORS += (httpx.TransportError,)
+except ImportError:
+    pass
+
+
+class CircuitOpenError(ConnectionError):
+    """Circuit breaker đang mở: Ollama được coi là down, request bị từ chối ngay"""
+
+    def __init__(self, base_url: str, retry_after: float):
+        self.base_url = base_url
+        self.retry_after = retry_after
+        super().__init__(f"Ollama circuit breaker is open for {base_url}, retry after {retry_after:.1f}s")
+
+
+def request_not_sent(error: BaseException) -> bool:
+    """
+    Lỗi xảy ra trước khi request tới được Ollama (circuit mở, connect timeout, không mở được
+    kết nối): failover sang backend khác an toàn kể cả với POST. Kết nối bị ngắt giữa chừng
+    thì không, vì server có thể đã xử lý request.
+    """
+    if isinstance(error, (CircuitOpenError, requests.ConnectTimeout)):
+        return True
+    if isinstance(error, requests.ConnectionError) and error.args:
+        # requests bọc MaxRetryError của urllib3, lỗi gốc nằm ở .reason
+        reason = getattr(error.args[0], "reason", error.args[0])
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker 3 trạng thái:
+    - closed: request đi bình thường, đếm lỗi liên tiếp
+    - open: fail fast cho tới khi hết reset_timeout
+    - half_open: cho 1 request thử, thành công thì đóng lại, lỗi thì mở lại
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class OllamaTransport:
+    """Pooled keep-alive session tới một Ollama server"""
+
+    def __init__(
+        self,
+        base_url: str,
+        pool_size: int = 20,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 120.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 4.0,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.logger = logging.getLogger(__name__)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'Connection': 'keep-alive'
+        })
+
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+    @classmethod
+    def from_settings(cls, base_url: str, settings: Optional[Settings] = None) -> "OllamaTransport":
+        settings = settings or Settings.load_settings()
+        return cls(
+            base_url=base_url,
+            pool_size=settings.OLLAMA_POOL_SIZE,
+            connect_timeout=settings.OLLAMA_CONNECT_TIMEOUT,
+            read_timeout=settings.OLLAMA_TIMEOUT,
+            max_retries=settings.OLLAMA_MAX_RETRIES,
+            backoff_base=settings.OLLAMA_RETRY_BACKOFF,
+            backoff_max=settings.OLLAMA_RETRY_BACKOFF_MAX,
+            breaker=CircuitBreaker(
+                failure_threshold=settings.OLLAMA_CIRCUIT_FAILURE_THRESHOLD,
+                reset_timeout=settings.OLLAMA_CIRCUIT_RESET_TIMEOUT
+            )
+        )
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _check_breaker(self):
+        if not self.breaker.allow_request():
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(self.base_url, self.breaker.retry_after())
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        idempotent: Optional[bool] = None,
+        timeout: Optional[float] = None,
+        **kwargs
+    ) -> requests.Response:
+        """
+        Gửi request tới Ollama
+        Args:
+            method: HTTP method
+            path: đường dẫn API (vd: "/api/generate")
+            idempotent: cho phép retry; mặc định True với GET/HEAD/OPTIONS
+            timeout: read timeout (giây), mặc định Settings.OLLAMA_TIMEOUT
+        Returns:
+            requests.Response (lỗi 4xx/5xx không raise, caller tự kiểm tra status_code)
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        url = f"{self.base_url}{path}"
+        timeouts = (self.connect_timeout, timeout if timeout is not None else self.read_timeout)
+
+        attempt = 0
+        while True:
+            self._check_breaker()
+            self.stats["requests"] += 1
+            try:
+                response = self.session.request(method, url, timeout=timeouts, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.breaker.record_failure()
+                self.stats["failures"] += 1
+                # Request chưa tới server (connect timeout) thì retry được cả với POST
+                retryable = idempotent or isinstance(e, requests.ConnectTimeout)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+            except Exception:
+                # Lỗi khác (ChunkedEncodingError, InvalidURL, ...): không retry, nhưng vẫn phải kết thúc
+                # request thử của HALF_OPEN, nếu không circuit kẹt ở trạng thái chờ trial mãi mãi
+                self.breaker.record_failure()
+                self.stats["failures"] += 1
+                raise
+            else:
+                if response.status_code < 500:
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                self.stats["failures"] += 1
+                if not idempotent or attempt >= self.max_retries:
+                    return response
+
+            delay = self._backoff(attempt)
+            attempt += 1
+            self.stats["retries"] += 1
+            self.logger.warning(f"Retrying {method} {path} in {delay:.2f}s (attempt {attempt}/{self.max_retries})")
+            time.sleep(delay)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    @contextmanager
+    def guarded(self):
+        """
+        Áp dụng circuit breaker cho các call không đi qua session (vd: ollama.Client)
+        """
+        self._check_breaker()
+        try:
+            yield
+        except CONNECTION_ERRORS:
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            # Lỗi từ phía model/request không có nghĩa là server down
+            self.breaker.record_success()
+            raise
+        else:
+            self.breaker.record_success()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "circuit_state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            **self.stats
+        }
+
+    def close(self):
+        self.session.close()
+
+
+_transports: Dict[str, OllamaTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(base_url: str) -> OllamaTransport:
+    """
+    Lấy transport dùng chung cho một Ollama server (mọi OllamaLLMs cùng URL dùng chung pool)
+    """
+    key = base_url.rstrip("/")
+    transport = _transports.get(key)
+    if transport is None:
+        with _transports_lock:
+            transport = _transports.get(key)
+            if transport is None:
+                transport = OllamaTransport.from_settings(key)
+                _transports[key] = transport
+    return transport
+
+
+def reset_transports():
+    """Đóng và xóa tất cả transport (vd: sau khi fork process)"""
+    with _transports_lock:
+        for transport in _transports.values():
+            transport.close()
+        _transports.clear()
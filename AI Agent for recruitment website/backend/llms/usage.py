@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+Thống kê token từ response của Ollama (prompt_eval_count, eval_count, *_duration):
+- Usage: token + thời gian của một LLM call
+- LLMResponse: str kèm .usage (code cũ vẫn dùng như str)
+- UsageMetrics: gộp theo session / task / route, tokens/sec, tỉ lệ token prompt
+- Budget token theo session: vượt soft budget thì cắt bớt lịch sử, vượt budget thì từ chối
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, Optional
+
+from setting import Settings
+
+
+@dataclass
+class Usage:
+    """Token và thời gian (ms) của một LLM call"""
+    model: str = ""
+    task: Optional[str] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    prompt_eval_ms: float = 0.0
+    eval_ms: float = 0.0
+    load_ms: float = 0.0
+    total_ms: float = 0.0
+    coalesced: bool = False  # Kết quả dùng chung với call khác (single-flight), không tốn thêm token
+
+    @classmethod
+    def from_response(cls, data: Any, model: str = "", task: Optional[str] = None) -> "Usage":
+        """data: dict của /api/chat, /api/generate hoặc response của ollama.Client"""
+        if not isinstance(data, dict):
+            data = data.model_dump() if hasattr(data, "model_dump") else dict(data)
+
+        def ms(field: str) -> float:
+            return round((data.get(field) or 0) / 1e6, 3)
+
+        return cls(
+            model=data.get("model") or model,
+            task=task,
+            prompt_tokens=data.get("prompt_eval_count") or 0,
+            completion_tokens=data.get("eval_count") or 0,
+            prompt_eval_ms=ms("prompt_eval_duration"),
+            eval_ms=ms("eval_duration"),
+            load_ms=ms("load_duration"),
+            total_ms=ms("total_duration"),
+            coalesced=bool(data.get("coalesced")),
+        )
+
+    @classmethod
+    def total(cls, usages: Iterable["Usage"]) -> "Usage":
+        """Cộng dồn nhiều call (vd: các bước của chat_with_tools)"""
+        result = cls()
+        for usage in usages:
+            result.model = result.model or usage.model
+            result.task = result.task or usage.task
+            result.prompt_tokens += usage.prompt_tokens
+            result.completion_tokens += usage.completion_tokens
+            result.prompt_eval_ms += usage.prompt_eval_ms
+            result.eval_ms += usage.eval_ms
+            result.load_ms += usage.load_ms
+            result.total_ms += usage.total_ms
+        return result
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def tokens_per_second(self) -> float:
+        return round(self.completion_tokens / (self.eval_ms / 1000), 2) if self.eval_ms else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["total_tokens"] = self.total_tokens
+        data["tokens_per_second"] = self.tokens_per_second
+        return data
+
+
+class LLMResponse(str):
+    """Text trả về của LLM, kèm .usage của call đã sinh ra nó"""
+
+    def __new__(cls, text: str, usage: Optional[Usage] = None):
+        response = super().__new__(cls, text or "")
+        response.usage = usage or Usage()
+        return response
+
+
+class TokenBudgetExceeded(Exception):
+    """Session đã dùng hết budget token (SESSION_TOKEN_BUDGET)"""
+
+    def __init__(self, session: str, used: int, budget: int):
+        super().__init__(f"Session {session} used {used} tokens (budget {budget})")
+        self.session = session
+        self.used = used
+        self.budget = budget
+
+
+class UsageScope:
+    """Session và route mà các LLM call trong context hiện tại được tính vào"""
+    __slots__ = ("session", "route", "base_tokens", "tokens")
+
+    def __init__(self, session: Optional[str] = None, route: Optional[str] = None, base_tokens: Optional[int] = None):
+        self.session = session
+        self.route = route
+        self.base_tokens = base_tokens  # Token session đã dùng trước scope này (state của session, mọi worker)
+        self.tokens = 0  # Token của các LLM call trong scope này
+
+
+_current_scope: ContextVar[Optional[UsageScope]] = ContextVar("llm_usage_scope", default=None)
+
+
+@contextmanager
+def usage_scope(session: Optional[str] = None, route: Optional[str] = None, session_tokens: Optional[int] = None):
+    """
+    Gắn session/route cho mọi LLM call trong context (kể cả stage chạy trên thread khác,
+    vì stage scheduler copy context). Route thường chỉ biết sau khi routing:
+    current_usage_scope().route = intent
+    session_tokens: token session đã dùng (lưu trong session store); budget được kiểm tra theo
+    session_tokens + scope.tokens thay vì chỉ số token process này đã thấy
+    """
+    outer = _current_scope.get()
+    scope = UsageScope(
+        session=session or (outer.session if outer else None),
+        route=route or (outer.route if outer else None),
+        base_tokens=session_tokens
+    )
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+
+
+def current_usage_scope() -> UsageScope:
+    """Scope hiện tại (ngoài usage_scope() trả về scope tạm, gán vào không có tác dụng)"""
+    return _current_scope.get() or UsageScope()
+
+
+def _new_bucket() -> Dict[str, Any]:
+    return {
+        "calls": 0,
+        "coalesced_calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "prompt_eval_ms": 0.0,
+        "eval_ms": 0.0,
+        "load_ms": 0.0,
+    }
+
+
+def _bucket_stats(bucket: Dict[str, Any]) -> Dict[str, Any]:
+    stats = dict(bucket)
+    total = bucket["prompt_tokens"] + bucket["completion_tokens"]
+    stats["total_tokens"] = total
+    stats["prompt_share"] = round(bucket["prompt_tokens"] / total, 4) if total else 0.0
+    stats["tokens_per_second"] = (
+        round(bucket["completion_tokens"] / (bucket["eval_ms"] / 1000), 2) if bucket["eval_ms"] else 0.0
+    )
+    stats["prompt_tokens_per_second"] = (
+        round(bucket["prompt_tokens"] / (bucket["prompt_eval_ms"] / 1000), 2) if bucket["prompt_eval_ms"] else 0.0
+    )
+    for field in ("prompt_eval_ms", "eval_ms", "load_ms"):
+        stats[field] = round(stats[field], 1)
+    return stats
+
+
+class UsageMetrics:
+    """Gộp Usage theo session, task và route; kiểm tra budget token của session"""
+
+    def __init__(self, session_budget: int = 0, session_soft_budget: int = 0, max_sessions: int = 10000):
+        self.session_budget = session_budget
+        self.session_soft_budget = session_soft_budget
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._total = _new_bucket()
+        self._by_task: Dict[str, Dict[str, Any]] = {}
+        self._by_route: Dict[str, Dict[str, Any]] = {}
+        self._by_session: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.refused = 0
+
+    @staticmethod
+    def _add(bucket: Dict[str, Any], usage: Usage):
+        bucket["calls"] += 1
+        if usage.coalesced:
+            # Token đã được tính cho call thực sự gửi tới Ollama
+            bucket["coalesced_calls"] += 1
+            return
+        bucket["prompt_tokens"] += usage.prompt_tokens
+        bucket["completion_tokens"] += usage.completion_tokens
+        bucket["prompt_eval_ms"] += usage.prompt_eval_ms
+        bucket["eval_ms"] += usage.eval_ms
+        bucket["load_ms"] += usage.load_ms
+
+    def record(self, usage: Usage, scope: Optional[UsageScope] = None) -> Usage:
+        scope = scope or current_usage_scope()
+        with self._lock:
+            self._add(self._total, usage)
+            self._add(self._by_task.setdefault(usage.task or "default", _new_bucket()), usage)
+            self._add(self._by_route.setdefault(scope.route or "none", _new_bucket()), usage)
+            if scope.session:
+                bucket = self._by_session.get(scope.session)
+                if bucket is None:
+                    bucket = self._by_session[scope.session] = _new_bucket()
+                    # Giới hạn số session giữ trong memory (bỏ session ít dùng gần đây nhất)
+                    while len(self._by_session) > self.max_sessions:
+                        self._by_session.popitem(last=False)
+                else:
+                    self._by_session.move_to_end(scope.session)
+                self._add(bucket, usage)
+                if not usage.coalesced:
+                    scope.tokens += usage.total_tokens
+        return usage
+
+    def session_tokens(self, session: Optional[str] = None) -> int:
+        """
+        Token session đã dùng. Trong usage_scope(session_tokens=...) là số token đã lưu
+        cộng token của scope (các worker khác cũng được tính), ngoài ra chỉ tính process này
+        """
+        scope = current_usage_scope()
+        session = session or scope.session
+        with self._lock:
+            bucket = self._by_session.get(session) if session else None
+            local = bucket["prompt_tokens"] + bucket["completion_tokens"] if bucket else 0
+        if session and session == scope.session and scope.base_tokens is not None:
+            return max(local, scope.base_tokens + scope.tokens)
+        return local
+
+    def over_soft_budget(self, session: Optional[str] = None) -> bool:
+        """Session đã vượt soft budget: nên gửi ít lịch sử hơn"""
+        return bool(self.session_soft_budget) and self.session_tokens(session) >= self.session_soft_budget
+
+    def check_budget(self, session: Optional[str] = None):
+        """Gọi trước mỗi LLM call, raise TokenBudgetExceeded nếu session đã hết budget"""
+        if not self.session_budget:
+            return
+        session = session or current_usage_scope().session
+        if not session:
+            return
+        used = self.session_tokens(session)
+        if used >= self.session_budget:
+            with self._lock:
+                self.refused += 1
+            raise TokenBudgetExceeded(session, used, self.session_budget)
+
+    def reset_session(self, session: str):
+        with self._lock:
+            self._by_session.pop(session, None)
+
+    def get_stats(self, top_sessions: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            total = _bucket_stats(self._total)
+            by_task = {key: _bucket_stats(value) for key, value in self._by_task.items()}
+            by_route = {key: _bucket_stats(value) for key, value in self._by_route.items()}
+            sessions = sorted(
+                self._by_session.items(),
+                key=lambda item: item[1]["prompt_tokens"] + item[1]["completion_tokens"],
+                reverse=True
+            )[:top_sessions]
+            top = {key: _bucket_stats(value) for key, value in sessions}
+            tracked_sessions = len(self._by_session)
+            refused = self.refused
+        return {
+            "total": total,
+            "by_task": by_task,
+            "by_route": by_route,
+            "top_sessions": top,
+            "tracked_sessions": tracked_sessions,
+            "budget": {
+                "session_budget": self.session_budget,
+                "session_soft_budget": self.session_soft_budget,
+                "refused_calls": refused,
+            },
+        }
+
+    def reset(self):
+        with self._lock:
+            self._total = _new_bucket()
+            self._by_task.clear()
+            self._by_route.clear()
+            self._by_session.clear()
+            self.refused = 0
+
+
+_usage_metrics: Optional[UsageMetrics] = None
+_usage_metrics_lock = threading.Lock()
+
+
+def get_usage_metrics() -> UsageMetrics:
+    """UsageMetrics dùng chung cho mọi LLM call trong process"""
+    global _usage_metrics
+    if _usage_metrics is None:
+        with _usage_metrics_lock:
+            if _usage_metrics is None:
+                settings = Settings.load_settings()
+                _usage_metrics = UsageMetrics(
+                    session_budget=settings.SESSION_TOKEN_BUDGET,
+                    session_soft_budget=settings.SESSION_TOKEN_SOFT_BUDGET,
+                    max_sessions=settings.USAGE_MAX_SESSIONS
+                )
+    return _usage_metrics
@@ -0,0 +1,153 @@
+"""
+Cấu hình logging (loguru) dùng chung cho app, MCP server và các script:
+
+    from loguru import logger
+    logger.debug("Intent: {}", intent)                         # DEBUG bị sample theo LOG_DEBUG_SAMPLE_RATE
+    logger.bind(stage="route").info("...")                     # field có cấu trúc: session, stage, trace_id
+    logger.bind(throttle=30).warning("Keep-alive failed ...")  # tối đa một dòng / 30 giây cho call site này
+    logger.bind(sample=1.0).debug("...")                       # luôn ghi (bỏ qua sampling)
+
+- enqueue=True: ghi log trên thread nền, request không chờ I/O của stdout/stderr
+- level theo module (LOG_LEVELS, so khớp theo prefix tên module)
+- stdlib logging (Flask, werkzeug, llms.*) được chuyển sang loguru
+"""
+import inspect
+import logging
+import random
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+from loguru import logger
+
+from setting import Settings
+
+TEXT_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "<cyan>{name}</cyan>:<cyan>{line}</cyan> | "
+    "session={extra[session]} stage={extra[stage]} trace={extra[trace_id]} - <level>{message}</level>"
+)
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+class LogFilter:
+    """
+    Filter của một sink: level theo module, sampling cho DEBUG và throttle theo call site.
+    Chạy ở thread gọi log (trước khi vào queue) nên bản ghi bị bỏ không tốn chi phí ghi.
+    """
+
+    def __init__(self, levels: Dict[str, str], debug_sample_rate: float = 1.0):
+        # Prefix dài nhất khớp trước
+        self.levels = sorted(
+            ((prefix, logger.level(level.upper()).no) for prefix, level in levels.items()),
+            key=lambda item: len(item[0]),
+            reverse=True
+        )
+        self.debug_sample_rate = debug_sample_rate
+        self.debug_level = logger.level("DEBUG").no
+        self._module_levels: Dict[str, int] = {}
+        self._last_emitted: Dict[object, float] = {}
+        self.suppressed = 0
+
+    def min_level(self, name: str) -> int:
+        level = self._module_levels.get(name)
+        if level is None:
+            level = 0
+            for prefix, prefix_level in self.levels:
+                if not prefix or name == prefix or name.startswith(prefix + "."):
+                    level = prefix_level
+                    break
+            self._module_levels[name] = level
+        return level
+
+    def __call__(self, record) -> bool:
+        level = record["level"].no
+        if level < self.min_level(record["name"] or ""):
+            return False
+
+        extra = record["extra"]
+        sample = extra.get("sample")
+        if sample is None and level <= self.debug_level:
+            sample = self.debug_sample_rate
+        if sample is not None and sample < 1.0 and random.random() >= sample:
+            self.suppressed += 1
+            return False
+
+        throttle = extra.get("throttle")
+        if throttle:
+            key = extra.get("throttle_key") or (record["name"], record["line"])
+            now = time.monotonic()
+            last = self._last_emitted.get(key)
+            if last is not None and now - last < throttle:
+                self.suppressed += 1
+                return False
+            self._last_emitted[key] = now
+        return True
+
+
+class InterceptHandler(logging.Handler):
+    """Chuyển bản ghi của stdlib logging sang loguru (giữ đúng module/dòng gọi log)"""
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            level = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+
+        frame, depth = inspect.currentframe(), 0
+        while frame is not None and (depth == 0 or frame.f_code.co_filename == logging.__file__):
+            frame = frame.f_back
+            depth += 1
+        logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
+
+
+def _add_trace_id(record):
+    extra = record["extra"]
+    if "trace_id" not in extra:
+        tracing = sys.modules.get("tool.tracing.tracer")
+        extra["trace_id"] = (tracing.current_trace_id() if tracing is not None else None) or "-"
+
+
+def setup_logging(settings: Optional[Settings] = None, force: bool = False):
+    """Cấu hình sink của loguru (gọi một lần ở entry point: app, MCP server, script)"""
+    global _configured
+    with _configure_lock:
+        if _configured and not force:
+            return
+        settings = settings or Settings.load_settings()
+        levels = {"": settings.LOG_LEVEL, **settings.LOG_LEVELS}
+        min_level = min(logger.level(level.upper()).no for level in levels.values())
+
+        logger.remove()
+        logger.configure(extra={"session": "-", "stage": "-"}, patcher=_add_trace_id)
+        sink_options = {
+            "level": min_level,
+            "enqueue": settings.LOG_ENQUEUE,
+            "serialize": settings.LOG_JSON,
+            "backtrace": False,
+            "diagnose": False,
+        }
+        logger.add(
+            sys.stderr,
+            format=TEXT_FORMAT,
+            filter=LogFilter(levels, settings.LOG_DEBUG_SAMPLE_RATE),
+            colorize=None if not settings.LOG_JSON else False,
+            **sink_options
+        )
+        if settings.LOG_FILE:
+            logger.add(
+                settings.LOG_FILE,
+                format=TEXT_FORMAT,
+                filter=LogFilter(levels, settings.LOG_DEBUG_SAMPLE_RATE),
+                rotation=settings.LOG_FILE_ROTATION,
+                retention=settings.LOG_FILE_RETENTION,
+                colorize=False,
+                **sink_options
+            )
+
+        # Level của stdlib cũng đặt theo min_level để debug log của thư viện (urllib3, httpx) không bị tạo ra
+        logging.basicConfig(handlers=[InterceptHandler()], level=min_level, force=True)
+        _configured = True
@@ -1,3 +1,3 @@
-from .promt_config import PromptConfig
+from .promt_config import PromptConfig, get_prompt
 
-__all__ = ["PromptConfig"]
\ No newline at end of file
+__all__ = ["PromptConfig", "get_prompt"]
\ No newline at end of file
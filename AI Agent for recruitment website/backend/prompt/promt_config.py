@@ -95,6 +95,12 @@ OUTPUT:
 """
             ),
             
+          "chitchat": (
+                "Khi người dùng nói chuyện phiếm, hãy trả lời một cách thân thiện và tự nhiên, "
+                "sau đó khéo léo chuyển hướng cuộc trò chuyện về chủ đề tuyển dụng và tìm việc làm. "
+                "Hãy trả lời ngắn gọn."
+            ),
+
           "chitchat_to_recruitment": (
                 """
             Người dùng đang nói chuyện phiếm về: "{user_input}"
@@ -229,3 +235,14 @@ Trả lời:
         """
         template = self.prompts.get(prompt_name, "Prompt not found.")
         return template.format(**kwargs)  # <-- inject user_input etc.
+
+
+_prompt_config = None
+
+
+def get_prompt(prompt_name: str, **kwargs) -> str:
+    """PromptConfig.get_prompt() trên instance dùng chung của module"""
+    global _prompt_config
+    if _prompt_config is None:
+        _prompt_config = PromptConfig()
+    return _prompt_config.get_prompt(prompt_name, **kwargs)
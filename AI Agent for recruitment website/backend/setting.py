@@ -1,4 +1,5 @@
 from loguru import logger
+from typing import Any, Dict, List
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -25,12 +26,171 @@ class Settings(BaseSettings):
     
     # Performance optimization settings
     OLLAMA_BASE_URL: str = "http://localhost:11434"
-    OLLAMA_TIMEOUT: int = 120
+    OLLAMA_TIMEOUT: int = 120  # Read timeout (giây)
+    OLLAMA_CONNECT_TIMEOUT: float = 5.0  # Connect timeout (giây)
+    OLLAMA_POOL_SIZE: int = 20  # Số keep-alive connections tối đa tới mỗi Ollama server
+    OLLAMA_MAX_RETRIES: int = 2  # Số lần retry tối đa cho request idempotent
+    OLLAMA_RETRY_BACKOFF: float = 0.5  # Backoff cơ sở (giây), có jitter
+    OLLAMA_RETRY_BACKOFF_MAX: float = 4.0
+    OLLAMA_CIRCUIT_FAILURE_THRESHOLD: int = 5  # Số lỗi liên tiếp trước khi mở circuit breaker
+    OLLAMA_CIRCUIT_RESET_TIMEOUT: float = 30.0  # Thời gian fail fast trước khi thử lại (giây)
+    OLLAMA_BASE_URLS: str = ""  # Nhiều Ollama server, phân cách bởi dấu phẩy (rỗng = chỉ dùng một URL)
+    OLLAMA_EJECT_FAILURE_THRESHOLD: int = 3  # Số lỗi liên tiếp trước khi eject một backend
+    OLLAMA_EJECT_DURATION: float = 30.0  # Thời gian eject trước khi thử lại backend (giây)
+    OLLAMA_HEALTH_CHECK_INTERVAL: float = 10.0  # Chu kỳ active health check (giây), 0 = tắt
+
+    # Admission control settings
+    LLM_MAX_CONCURRENT: int = 4  # Số LLM call đồng thời tối đa trong một process
+    LLM_MAX_QUEUE: int = 64  # Số LLM call tối đa được xếp hàng chờ
+    LLM_QUEUE_DEADLINE: float = 30.0  # Thời gian chờ tối đa trong hàng đợi (giây) trước khi trả 429
+
+    # Token usage settings (llms/usage.py)
+    SESSION_TOKEN_BUDGET: int = 0  # Tổng token (prompt + completion) tối đa của một session, 0 = không giới hạn
+    SESSION_TOKEN_SOFT_BUDGET: int = 0  # Vượt ngưỡng này thì chỉ gửi SESSION_BUDGET_KEEP_MESSAGES message gần nhất, 0 = tắt
+    SESSION_BUDGET_KEEP_MESSAGES: int = 6
+    USAGE_MAX_SESSIONS: int = 10000  # Số session được giữ thống kê token trong memory
+
+    # Incremental generation settings (llms/context_cache.py)
+    LLM_INCREMENTAL_CONTEXT: bool = True  # Lượt chat sau chỉ gửi message mới kèm `context` của /api/generate
+    LLM_CONTEXT_MAX_TOKENS: int = 3072  # Context dài hơn (hoặc options.num_ctx của call) thì gửi lại toàn bộ prompt
+    LLM_CONTEXT_MAX_SESSIONS: int = 1000  # Số session giữ context trong memory (LRU)
+
+    # Single-flight settings (tool/single_flight.py)
+    SINGLE_FLIGHT_ENABLED: bool = True  # Gộp LLM call deterministic / embedding giống hệt nhau đang chạy đồng thời
+
+    # Model tiering settings: task -> model ("" = model mặc định OLLAMA_MODEL / RAG_MODEL_ID)
+    LLM_TASK_MODELS: Dict[str, str] = {
+        "classify": "qwen3:0.6b",
+        "extract": "qwen3:0.6b",
+        "chitchat": "qwen3:0.6b",
+        "reflect": "",
+        "answer": "",
+    }
+    # Generation defaults (Ollama "options") cho từng task
+    LLM_TASK_OPTIONS: Dict[str, Dict[str, Any]] = {
+        "classify": {"temperature": 0, "num_predict": 16},
+        "extract": {"temperature": 0, "num_predict": 256},
+        "chitchat": {"temperature": 0.7, "num_predict": 256},
+        "reflect": {"temperature": 0.2, "num_predict": 256},
+        "answer": {"temperature": 0.5},
+    }
+    # Fallback chain khi model của một task không có trên Ollama
+    LLM_TASK_FALLBACKS: Dict[str, List[str]] = {
+        "classify": ["extract", "answer"],
+        "extract": ["answer"],
+        "chitchat": ["answer"],
+        "reflect": ["answer"],
+        "answer": [],
+    }
+    # Reasoning (<think>) mặc định cho từng task: False = tắt, True = bật
+    LLM_TASK_THINK: Dict[str, bool] = {
+        "classify": False,
+        "extract": False,
+        "chitchat": False,
+        "reflect": False,
+        "answer": True,
+    }
+    LLM_THINK_MODE: str = "option"  # "option" (field think của Ollama), "directive" (/no_think) hoặc "both"
+    # Structured extraction settings (ExtractFeatureQuestion)
+    EXTRACT_NUM_PREDICT: int = 128  # Số token tối đa cho JSON trích xuất
+    EXTRACT_STOP: List[str] = ["\n\n\n", "```"]
+    # Bulk CV extraction settings (tool/cv_extraction)
+    CV_EXTRACTION_WORKERS: int = 4  # Số CV xử lý song song
+    CV_EXTRACTION_MAX_RETRIES: int = 2  # Số lần retry cho mỗi CV
+    CV_EXTRACTION_NUM_PREDICT: int = 512  # Số token tối đa cho JSON đặc trưng CV
+    # Job ingestion settings (tool/job_ingestion)
+    JOB_INGEST_CHUNK_SIZE: int = 2000  # Số dòng đọc mỗi chunk
+    JOB_INGEST_WRITE_BATCH: int = 500  # Số UpdateOne mỗi lần bulk_write
+    # Google Sheet reader settings (tool/retrieve_data_from_google_sheet)
+    SHEET_CACHE_DIR: str = ".cache/sheets"  # Cache dạng cột (.npy, memory-mapped) của sheet đã đọc
+    SHEET_CACHE_TTL: int = 300  # Thời gian dùng cache (giây) khi URL không có ETag/Last-Modified
+    # Job matching settings (tool/job_matching)
+    MATCH_EXPERIENCE_TOLERANCE: float = 1.0  # Job được yêu cầu nhiều hơn số năm của CV tối đa chừng này năm
+    MATCH_TOP_K: int = 5
+    # Hybrid retrieval settings (tool/hybrid_search)
+    HYBRID_INDEX_PATH: str = ".cache/hybrid_index"  # Thư mục lưu index BM25 + vector
+    HYBRID_RRF_K: int = 60  # Hằng số k của reciprocal rank fusion
+    HYBRID_CANDIDATES: int = 100  # Số ứng viên lấy từ mỗi nhánh (BM25, vector) trước khi gộp
+    # Session persistence settings (tool/session_store)
+    SESSION_STORE_BACKEND: str = "sqlite"  # "sqlite", "file", "redis" hoặc "memory" (chỉ trong process)
+    SESSION_STORE_PATH: str = ".cache/sessions.db"  # File SQLite hoặc thư mục (backend "file")
+    SESSION_REDIS_URL: str = "redis://localhost:6379/0"
+    SESSION_TTL: int = 86400  # Session không hoạt động quá thời gian này (giây) bị bỏ qua
+    SESSION_WRITE_BEHIND_INTERVAL: float = 0.05  # Chu kỳ flush write-behind (giây), 0 = ghi đồng bộ
+    SESSION_WRITE_BEHIND_MAX_BATCH: int = 256  # Flush sớm khi số session chờ ghi đạt ngưỡng
+    SESSION_COMPRESS_MIN_BYTES: int = 1024  # Nén zlib state lớn hơn ngưỡng này
+    # MCP tool server settings (MCP/http_transport.py, llms/mcp_client.py)
+    MCP_TRANSPORT: str = "stdio"  # "stdio" hoặc "streamable-http"
+    MCP_HOST: str = "127.0.0.1"
+    MCP_PORT: int = 8000
+    MCP_PATH: str = "/mcp"
+    # Host header được chấp nhận (chống DNS rebinding), thêm tên service khi MCP_HOST=0.0.0.0
+    MCP_ALLOWED_HOSTS: List[str] = ["127.0.0.1:*", "localhost:*", "[::1]:*", "mcp-server:*"]
+    MCP_TOOL_THREADS: int = 16  # Số tool sync chạy đồng thời trên server HTTP
+    MCP_SERVER_URL: str = ""  # vd: http://localhost:8000/mcp; rỗng = gọi tool trong process
+    MCP_POOL_SIZE: int = 4  # Số MCP session giữ sẵn tới tool server
+    MCP_CALL_TIMEOUT: float = 60.0  # Timeout của một tool call (giây)
+    MCP_CONNECT_TIMEOUT: float = 10.0
+    MCP_MAX_RETRIES: int = 2  # Số lần kết nối lại + retry khi lỗi kết nối
+    MCP_RETRY_BACKOFF: float = 0.5
+
+    # Logging settings (log_config.py)
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: Dict[str, str] = {"urllib3": "WARNING", "httpx": "WARNING", "httpcore": "WARNING"}  # Level theo module (prefix)
+    LOG_DEBUG_SAMPLE_RATE: float = 0.1  # Tỉ lệ log DEBUG được ghi (log theo từng request)
+    LOG_ENQUEUE: bool = True  # Ghi log trên thread nền
+    LOG_JSON: bool = False
+    LOG_FILE: str = ""
+    LOG_FILE_ROTATION: str = "100 MB"
+    LOG_FILE_RETENTION: str = "7 days"
+
+    # Tracing settings (tool/tracing)
+    TRACING_ENABLED: bool = True
+    TRACING_SAMPLE_RATE: float = 0.1  # Tỉ lệ trace được ghi lại (trace có traceparent sampled từ upstream luôn được ghi)
+    TRACING_EXPORTER: str = "none"  # "jsonl", "otlp" hoặc "none"
+    TRACING_JSONL_PATH: str = ".cache/traces.jsonl"
+    TRACING_JSONL_MAX_BYTES: int = 50 * 1024 * 1024  # File JSONL vượt quá thì đổi tên thành <path>.1 (0 = không rotate)
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318"  # OTLP/HTTP collector
+    TRACING_SERVICE_NAME: str = "ai-recruitment-agent"
+    TRACING_EXPORT_INTERVAL: float = 2.0
+    TRACING_MAX_QUEUE: int = 2048  # Span chờ export tối đa, vượt quá thì bỏ
+
+    # Startup settings (tool/startup_orchestrator.py)
+    STARTUP_CRITICAL_TASKS: List[str] = ["embedding_model", "route_index", "ollama_warmup", "mcp_pool"]  # /ready trả 503 tới khi các task này xong
+    STARTUP_TIMEOUT: float = 300.0  # Gunicorn master chờ warm-up tối đa bao lâu trước khi fork worker
+    STARTUP_RETRY_INTERVAL: float = 10.0  # Task critical bị lỗi được thử lại sau bao nhiêu giây (0 = không thử lại)
+    STARTUP_MONGO_TIMEOUT: float = 5.0
+
+    # Model preload and batching settings
     MODEL_KEEP_ALIVE: int = 600  # Giữ model trong 10 phút
+    MODEL_RESIDENCY_INTERVAL: float = 30.0  # Chu kỳ kiểm tra /api/ps và gia hạn keep-alive (giây), 0 = tắt
+    MODEL_COLD_LOAD_THRESHOLD: float = 1.0  # load_duration (giây) từ mức này được tính là cold load
     ENABLE_MODEL_PRELOAD: bool = True
     BATCH_SIZE: int = 32  # Batch size cho embedding
-    MAX_WORKERS: int = 4  # Số threads cho parallel processing
-    
+    MAX_WORKERS: int = 4  # Số threads cho parallel processing (và số gunicorn worker)
+
+    # Production server settings (gunicorn.conf.py)
+    SERVER_BIND: str = "0.0.0.0:5000"
+    SERVER_THREADS: int = 4  # Số thread mỗi worker (gthread)
+    SERVER_TIMEOUT: int = 180  # Worker im lặng quá thời gian này (giây) bị restart, > OLLAMA_TIMEOUT
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    SERVER_KEEPALIVE: int = 5
+    SERVER_PRELOAD_APP: bool = True  # Load app + models trong master, worker dùng chung copy-on-write
+    SERVER_MAX_REQUESTS: int = 0  # Restart worker sau số request này (0 = không restart)
+
+    # Semantic cache settings
+    SEMANTIC_CACHE_ROUTES: str = "chitchat"  # Các route bật cache, phân cách bởi dấu phẩy
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # Cosine similarity tối thiểu để trả về câu trả lời đã cache
+    SEMANTIC_CACHE_TTL: int = 3600  # Thời gian sống của một entry (giây)
+    SEMANTIC_CACHE_MAX_SIZE: int = 512  # Số entry tối đa cho mỗi route
+
+    # Stage scheduler settings
+    STAGE_SCHEDULER_WORKERS: int = 16  # Số threads chạy các stage song song trong một lượt chat
+    ENABLE_SPECULATIVE_EXTRACTION: bool = True  # Trích xuất đặc trưng trước khi biết intent
+
+    # Slot classifier settings
+    SLOT_CLASSIFIER_THRESHOLD: float = 0.6  # Dưới ngưỡng này mới gọi LLM để phân loại slot
+
     
     @classmethod
     def load_settings(cls) -> "Settings":
@@ -39,7 +199,7 @@ class Settings(BaseSettings):
         """
         try:
             settings = cls()
-            logger.info("Settings loaded successfully")
+            logger.debug("Settings loaded successfully")
             return settings
         except Exception as e:
             logger.error(f"Failed to load settings: {e}")
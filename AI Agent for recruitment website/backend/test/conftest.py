@@ -0,0 +1,4 @@
+import os
+
+# Test không ghi span ra file trong source tree (.cache/traces.jsonl); env var ưu tiên hơn .env
+os.environ["TRACING_EXPORTER"] = "none"
@@ -8,6 +8,7 @@ backend_dir = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(backend_dir))
 
 from llms.ollama_llms import OllamaLLMs
+from llms.thinking import strip_think
 from MCP.server import get_prompt
 
 
@@ -42,8 +43,7 @@ def extract_cv_features(cv_text: str) -> dict:
         # Extract JSON from response (ignore <think> sections)
         try:
             # Remove <think> sections if present
-            if "<think>" in response:
-                response = response.split("</think>")[-1].strip()
+            response = strip_think(response)
             
             # Find JSON part (between { and })
             start_idx = response.find('{')
@@ -0,0 +1,18 @@
+"""
+WSGI app giả lập app thật khi chạy với preload_app: "model" lớn được load lúc import
+(trong master), worker chỉ đọc. Dùng bởi test_gunicorn_memory.py.
+"""
+import json
+
+import numpy as np
+
+# ~160MB vector embedding và ~300k object Python (giống vocab/route embeddings)
+MODEL = np.random.default_rng(0).random((20_000, 1_000))
+VOCAB = {f"token-{i}": (i, str(i)) for i in range(300_000)}
+
+
+def app(environ, start_response):
+    row = int(environ.get("QUERY_STRING") or 0) % MODEL.shape[0]
+    body = json.dumps({"score": float(MODEL[row] @ MODEL[0]), "vocab": len(VOCAB)}).encode()
+    start_response("200 OK", [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+    return [body]
@@ -0,0 +1,43 @@
+"""
+App thật (app.main) với embedding model giả: SentenceTransformer được thay bằng model
+~160MB load trong master (warm-up task embedding_model), route index và slot classifier
+được dựng trên đó như bình thường. Dùng bởi test_gunicorn_memory.py.
+"""
+import sys
+import types
+import zlib
+
+import numpy as np
+
+
+from tool.semantic_router.sample import Sample
+
+DIM = 384
+# Câu mẫu của mỗi route nằm trên một trục riêng: gửi đúng câu mẫu thì được route vào route đó
+ROUTE_AXES = {}
+for axis, samples in enumerate([Sample.recruitment_incomplete, Sample.recruitment_complete, Sample.chitchatSample]):
+    for text in samples:
+        ROUTE_AXES.setdefault(text, axis)
+
+
+class FakeSentenceTransformer:
+    """Model giả: giữ ~160MB "weights", vector là one-hot theo ROUTE_AXES hoặc crc32 của text"""
+
+    def __init__(self, name, **kwargs):
+        self.weights = np.random.default_rng(0).random((20_000, 1_000), dtype=np.float64)
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else texts
+        vectors = np.zeros((len(texts), DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            axis = ROUTE_AXES.get(text)
+            vectors[row, axis if axis is not None else 3 + zlib.crc32(text.encode("utf-8")) % (DIM - 3)] = 1.0
+        return vectors[0] if single else vectors
+
+
+sentence_transformers = types.ModuleType("sentence_transformers")
+sentence_transformers.SentenceTransformer = FakeSentenceTransformer
+sys.modules["sentence_transformers"] = sentence_transformers
+
+from app.main import app  # noqa: E402
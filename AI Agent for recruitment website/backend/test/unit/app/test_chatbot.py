@@ -0,0 +1,116 @@
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+
+@pytest.fixture
+def chatbot_module(monkeypatch):
+    # Tool là proxy MCP (chỉ kết nối khi được gọi): không import MCP.server / MongoDB trong test
+    monkeypatch.setenv("MCP_SERVER_URL", "http://127.0.0.1:9/mcp")
+    from app.chatbot import ChatbotOllama as module
+    return module
+
+
+def _route_to(monkeypatch, module, route):
+    monkeypatch.setattr(module, "route_query", lambda message: {"route": route, "embedding": None})
+
+
+def test_failed_turn_does_not_report_previous_intent(chatbot_module, monkeypatch):
+    monkeypatch.setattr(chatbot_module.model_manager, "get_llm_model", lambda **kwargs: MagicMock())
+    bot = chatbot_module.ChatbotOllama()
+    bot.last_intent = "chitchat"
+
+    def routing_down(message):
+        raise ConnectionError("tool server down")
+
+    monkeypatch.setattr(chatbot_module, "route_query", routing_down)
+    response = bot.chat("Xin chào")
+
+    assert response.startswith("Error communicating with Ollama")
+    assert bot.last_intent is None
+    assert bot.to_state()["intent"] is None
+
+
+@pytest.fixture
+def remote_calls(monkeypatch):
+    """Ghi lại tool call gửi tới MCP tool server; model embedding trong process không được load"""
+    from llms.mcp_client import MCPClientPool
+    from tool.model_manager import model_manager
+
+    def loaded_in_worker(*args, **kwargs):
+        raise AssertionError("embedding model loaded in the web worker")
+
+    monkeypatch.setattr(model_manager, "get_embedding_model", loaded_in_worker)
+    monkeypatch.setattr(model_manager, "get_slot_classifier", loaded_in_worker)
+    monkeypatch.setattr(model_manager, "get_hybrid_index", loaded_in_worker)
+    calls = []
+    responses = {}
+
+    def call_tool(self, name, arguments=None, timeout=None):
+        calls.append((name, arguments))
+        return responses[name]
+
+    monkeypatch.setattr(MCPClientPool, "call_tool", call_tool)
+    return calls, responses
+
+
+def test_slot_filling_uses_tool_server(chatbot_module, remote_calls, monkeypatch):
+    calls, responses = remote_calls
+    responses["classify_slot"] = {"slot": "location", "confidence": 1.0}
+    monkeypatch.setattr(chatbot_module.model_manager, "get_llm_model", lambda **kwargs: MagicMock())
+    bot = chatbot_module.ChatbotOllama()
+    bot.conversation_state = "waiting_for_location"
+    monkeypatch.setattr(bot, "_ask_for_next_missing_info", lambda: "Bạn có kỹ năng gì?")
+
+    bot._handle_ongoing_conversation("Ở Hà Nội", [])
+
+    assert calls == [("classify_slot", {"message": "Ở Hà Nội", "expected_slot": "location"})]
+    assert bot.recruitment_context["location"] == "Ở Hà Nội"
+
+
+def test_hybrid_search_uses_tool_server(chatbot_module, remote_calls):
+    from llms.tools import search_job_hybrid
+
+    calls, responses = remote_calls
+    responses["search_job_hybrid"] = {"query": "python", "total_found": 0, "jobs": []}
+
+    assert search_job_hybrid("python", location="Hà Nội") == responses["search_job_hybrid"]
+    assert calls == [("search_job_hybrid", {"query": "python", "top_k": 5, "location": "Hà Nội"})]
+
+
+def test_chitchat_turns_reuse_generation_context(chatbot_module, monkeypatch):
+    """Lượt chitchat thứ hai chỉ gửi message mới kèm context của lượt đầu"""
+    from llms.ollama_llms import OllamaLLMs
+
+    chitchat_llm = OllamaLLMs(model_name="qwen3:0.6b", base_url="http://mockserver:11434")
+    monkeypatch.setattr(chatbot_module.model_manager, "get_llm_model", lambda **kwargs: chitchat_llm)
+    monkeypatch.setattr(chatbot_module.model_manager, "get_semantic_cache", lambda intent: None)
+    _route_to(monkeypatch, chatbot_module, "chitchat")
+    payloads = []
+
+    def generate(method, url, json=None, **kwargs):
+        payloads.append(json)
+        response = MagicMock()
+        response.status_code = 200
+        response.json.return_value = {
+            "response": f"Trả lời {len(payloads)}", "context": list(range(10 * len(payloads))), "done": True
+        }
+        return response
+
+    bot = chatbot_module.ChatbotOllama()
+    bot.add_system_message("Bạn là trợ lý tuyển dụng")
+    with patch.object(requests.Session, "request", side_effect=generate):
+        assert bot.chat("Xin chào") == "Trả lời 1"
+        assert bot.chat("Hôm nay trời đẹp nhỉ") == "Trả lời 2"
+
+    first, second = payloads
+    assert "context" not in first
+    assert first["prompt"].startswith("system: " + chatbot_module.get_prompt("chitchat"))
+    assert second["context"] == list(range(10))
+    assert second["prompt"] == "user: Hôm nay trời đẹp nhỉ"
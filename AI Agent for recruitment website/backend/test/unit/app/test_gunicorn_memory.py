@@ -0,0 +1,149 @@
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+import requests
+
+BACKEND_DIR = Path(__file__).parents[3]
+sys.path.append(str(BACKEND_DIR))
+
+from tool.semantic_router.sample import Sample
+CONFIG_PATH = BACKEND_DIR / "gunicorn.conf.py"
+
+WORKERS = 2
+# Bộ nhớ riêng (không chia sẻ với master) tối đa của mỗi worker; "model" preload khoảng 180MB
+WORKER_PRIVATE_BUDGET_MB = 80
+
+pytestmark = [
+    pytest.mark.slow,
+    pytest.mark.skipif(shutil.which("gunicorn") is None, reason="gunicorn is not installed"),
+    pytest.mark.skipif(not Path("/proc/self/smaps_rollup").exists(), reason="needs Linux /proc"),
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _memory_mb(pid: int) -> dict:
+    """Rss và bộ nhớ riêng (Private_Clean + Private_Dirty) của một process, đơn vị MB"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1]) / 1024
+    return {"rss": values["Rss"], "private": values["Private_Clean"] + values["Private_Dirty"]}
+
+
+def _children(pid: int) -> list:
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def _start_gunicorn(tmp_path, app_spec: str, ready_path: str = "/", env=None, timeout: float = 60):
+    """gunicorn với gunicorn.conf.py thật (preload, gc.freeze, post_fork), chờ tới khi đủ worker"""
+    port = _free_port()
+    log_path = tmp_path / "gunicorn.log"
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn", "-c", str(CONFIG_PATH),
+            "--workers", str(WORKERS), "--bind", f"127.0.0.1:{port}",
+            "--pythonpath", str(Path(__file__).parent), app_spec,
+        ],
+        cwd=tmp_path,
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=open(log_path, "wb"),
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url + ready_path, timeout=1).status_code == 200 and len(_children(process.pid)) == WORKERS:
+                return process, url
+        except requests.RequestException:
+            if process.poll() is not None:
+                pytest.fail(f"gunicorn exited: {log_path.read_text(errors='replace')[-2000:]}")
+        time.sleep(0.2)
+    process.kill()
+    pytest.fail(f"gunicorn did not start in time: {log_path.read_text(errors='replace')[-2000:]}")
+
+
+def _stop_gunicorn(process):
+    process.send_signal(signal.SIGTERM)
+    process.wait(timeout=30)
+
+
+def _assert_workers_share_master_memory(process):
+    master = _memory_mb(process.pid)
+    assert master["rss"] > 150, "preloaded model should live in the master"
+
+    for pid in _children(process.pid):
+        memory = _memory_mb(pid)
+        # Rss vẫn tính các page dùng chung, nên worker "thấy" model nhưng không copy nó
+        assert memory["rss"] > 150
+        assert memory["private"] < WORKER_PRIVATE_BUDGET_MB, f"worker {pid} copied {memory['private']:.0f}MB"
+
+
+@pytest.fixture
+def gunicorn_server(tmp_path):
+    process, url = _start_gunicorn(tmp_path, "preloaded_app:app")
+    yield process, url
+    _stop_gunicorn(process)
+
+
+@pytest.fixture
+def app_server(tmp_path):
+    """app.main thật, model giả (preloaded_main.py); Ollama/MongoDB trỏ tới port không có server"""
+    dead_url = f"http://127.0.0.1:{_free_port()}"
+    process, url = _start_gunicorn(tmp_path, "preloaded_main:app", ready_path="/ready", timeout=120, env={
+        "MCP_SERVER_URL": "",
+        "OLLAMA_URL": dead_url,
+        "OLLAMA_BASE_URL": dead_url,
+        "DATABASE_HOST": f"mongodb://127.0.0.1:{_free_port()}/?serverSelectionTimeoutMS=500",
+        "STARTUP_CRITICAL_TASKS": '["embedding_model", "route_index"]',
+        "STARTUP_MONGO_TIMEOUT": "0.5",
+        "SESSION_STORE_BACKEND": "memory",
+    })
+    yield process, url
+    _stop_gunicorn(process)
+
+
+def test_workers_share_preloaded_model(gunicorn_server):
+    """Worker dùng chung model đã preload trong master (copy-on-write), bộ nhớ riêng nằm trong budget"""
+    process, url = gunicorn_server
+    for i in range(200):
+        assert requests.get(f"{url}/?{i}", timeout=5).status_code == 200
+
+    _assert_workers_share_master_memory(process)
+
+
+def test_app_workers_do_not_reload_models(app_server):
+    """
+    App thật qua các hook của gunicorn.conf.py (post_fork -> reset_after_fork): worker dùng
+    embedding model, route index và slot classifier của master thay vì load lại
+    """
+    process, url = app_server
+    # Embedding giả khớp chính xác câu mẫu: lượt đầu vào route recruitment_incomplete,
+    # các lượt sau đi qua slot classifier
+    turns = [Sample.recruitment_incomplete[0], "Ở Hà Nội", "Python", "Xin chào"]
+    intents = set()
+    for _ in range(20):
+        with requests.Session() as client:
+            for message in turns:
+                response = client.post(f"{url}/api/chat", json={"message": message}, timeout=30)
+                assert response.status_code == 200
+                intents.add(response.json()["intent"])
+
+    assert "recruitment_incomplete" in intents
+
+    _assert_workers_share_master_memory(process)
@@ -0,0 +1,68 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class FakeOllamaServer:
+    """
+    Fake Ollama server chạy local trên port ngẫu nhiên.
+    get(server) / post(server, body) trả về body JSON của response (mặc định: /api/version, {"done": true})
+    """
+
+    def __init__(self, get=None, post=None):
+        self.get = get or (lambda server: {"version": "0.0.0-fake"})
+        self.post = post or (lambda server, body: {"done": True})
+        self.delay_event = None  # POST chờ event này rồi mới trả lời
+        self.drop_post = False  # Đọc request rồi đóng kết nối, không trả lời
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, body):
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._send(server.get(server))
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server.requests += 1
+                if server.drop_post:
+                    self.close_connection = True
+                    return
+                if server.delay_event is not None:
+                    server.delay_event.wait(5)
+                self._send(server.post(server, json.loads(raw) if raw else {}))
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def ollama_server():
+    """Factory khởi động FakeOllamaServer(get=..., post=...), tự dừng khi test kết thúc"""
+    started = []
+
+    def start(**handlers):
+        server = FakeOllamaServer(**handlers)
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.stop()
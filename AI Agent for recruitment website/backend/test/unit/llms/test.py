@@ -15,14 +15,15 @@ def test_generate_content_success(ollama_client):
     mock_response.status_code = 200
     mock_response.json.return_value = {"response": "Hello from Ollama"}
 
-    with patch.object(requests, "post", return_value=mock_response) as mock_post:
+    with patch.object(requests.Session, "request", return_value=mock_response) as mock_post:
         prompt = [{"role": "user", "content": "Say hello"}]
         output = ollama_client.generate_content(prompt)
 
         assert output == "Hello from Ollama"
         mock_post.assert_called_once()
-        # Check URL đúng endpoint
-        assert "/api/generate" in mock_post.call_args[0][0]
+        # Check URL đúng endpoint (qua session dùng chung, có timeout)
+        assert "/api/generate" in mock_post.call_args[0][1]
+        assert mock_post.call_args.kwargs["timeout"] is not None
 
 
 def test_generate_content_failure(ollama_client):
@@ -32,7 +33,7 @@ def test_generate_content_failure(ollama_client):
     mock_response.status_code = 500
     mock_response.text = "Internal Server Error"
 
-    with patch.object(requests, "post", return_value=mock_response):
+    with patch.object(requests.Session, "request", return_value=mock_response):
         prompt = [{"role": "user", "content": "Say hello"}]
 
         with pytest.raises(ValueError) as excinfo:
@@ -48,9 +49,85 @@ def test_generate_content_empty_response(ollama_client):
     mock_response.status_code = 200
     mock_response.json.return_value = {}
 
-    with patch.object(requests, "post", return_value=mock_response):
+    with patch.object(requests.Session, "request", return_value=mock_response):
         prompt = [{"role": "user", "content": "Say hello"}]
         output = ollama_client.generate_content(prompt)
 
         # Vì không có 'response', sẽ trả về chuỗi rỗng
         assert output == ""
+
+
+def test_chat_think_switch_and_strip(ollama_client):
+    """think=False gửi field `think` cho Ollama và câu trả lời không còn <think> block"""
+
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {"message": {"content": "<think>\n\n</think>\n\nlocation"}, "eval_count": 5}
+
+    with patch.object(requests.Session, "request", return_value=mock_response) as mock_post:
+        output = ollama_client.chat([{"role": "user", "content": "Hà Nội"}], think=False)
+
+        assert output == "location"
+        assert mock_post.call_args.kwargs["json"]["think"] is False
+
+
+def test_chat_falls_back_to_no_think_directive(ollama_client):
+    """Server không hỗ trợ field `think` thì dùng directive /no_think"""
+
+    unsupported = MagicMock()
+    unsupported.status_code = 400
+    unsupported.text = '{"error": "llama2 does not support thinking"}'
+    ok = MagicMock()
+    ok.status_code = 200
+    ok.json.return_value = {"message": {"content": "Xin chào"}}
+
+    with patch.object(requests.Session, "request", side_effect=[unsupported, ok]) as mock_post:
+        output = ollama_client.chat([{"role": "user", "content": "Hi"}], think=False)
+
+        assert output == "Xin chào"
+        retry_payload = mock_post.call_args.kwargs["json"]
+        assert "think" not in retry_payload
+        assert retry_payload["messages"][-1]["content"].endswith("/no_think")
+
+
+def test_achat_uses_async_client(ollama_client):
+    """achat() gọi ollama.AsyncClient, xử lý kết quả giống chat()"""
+    import asyncio
+    from unittest.mock import AsyncMock
+
+    async_client = MagicMock()
+    async_client.chat = AsyncMock(return_value={
+        "message": {"content": "<think>\n\n</think>\n\nrecruitment", "thinking": None},
+        "eval_count": 3
+    })
+
+    with patch("llms.backend_pool.OllamaBackend.async_client", new=async_client):
+        output = asyncio.run(ollama_client.achat([{"role": "user", "content": "Tìm việc"}], think=False, format="json"))
+
+    assert output == "recruitment"
+    kwargs = async_client.chat.call_args.kwargs
+    assert kwargs["think"] is False
+    assert kwargs["format"] == "json"
+    assert kwargs["stream"] is False
+
+
+def test_achat_fails_fast_when_circuit_is_open():
+    """achat() đi qua circuit breaker của backend như chat(): circuit mở thì không gọi AsyncClient"""
+    import asyncio
+    from unittest.mock import AsyncMock
+    from llms.transport import CircuitOpenError
+
+    # URL riêng: transport (và breaker) được dùng chung theo base_url
+    client = OllamaLLMs(model_name="llama2", base_url="http://circuit-open:11434")
+    with client.pool.acquire() as backend:
+        breaker = backend.transport.breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    async_client = MagicMock()
+    async_client.chat = AsyncMock(return_value={"message": {"content": "ok"}})
+    with patch("llms.backend_pool.OllamaBackend.async_client", new=async_client):
+        with pytest.raises(CircuitOpenError):
+            asyncio.run(client.achat([{"role": "user", "content": "Tìm việc"}], think=False))
+
+    async_client.chat.assert_not_called()
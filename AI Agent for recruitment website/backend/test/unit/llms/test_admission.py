@@ -0,0 +1,157 @@
+import threading
+import time
+
+import pytest
+from llms.admission import AdmissionController, AdmissionRejected, Priority, request_priority
+
+
+def _hold_slot(controller, release, started):
+    with controller.acquire(priority=Priority.INTERACTIVE):
+        started.set()
+        release.wait(5)
+
+
+def test_queue_serves_higher_priority_first():
+    """Slot-filling được phục vụ trước chitchat dù tới sau"""
+    controller = AdmissionController(max_concurrent=1, max_queue=10, default_deadline=5)
+    release, started = threading.Event(), threading.Event()
+    holder = threading.Thread(target=_hold_slot, args=(controller, release, started))
+    holder.start()
+    started.wait(5)
+
+    order = []
+
+    def call(priority):
+        with request_priority(priority):
+            with controller.acquire():
+                order.append(priority)
+
+    waiters = [threading.Thread(target=call, args=(Priority.CHITCHAT,))]
+    waiters[0].start()
+    while controller.get_stats()["queue_depth"] < 1:
+        time.sleep(0.001)
+    waiters.append(threading.Thread(target=call, args=(Priority.SLOT_FILLING,)))
+    waiters[1].start()
+    while controller.get_stats()["queue_depth"] < 2:
+        time.sleep(0.001)
+
+    release.set()
+    for thread in [holder] + waiters:
+        thread.join(5)
+
+    assert order == [Priority.SLOT_FILLING, Priority.CHITCHAT]
+    assert controller.get_stats()["admitted"] == 3
+
+
+def test_rejects_when_queue_is_full():
+    """Hàng đợi đầy thì từ chối ngay với retry_after"""
+    controller = AdmissionController(max_concurrent=1, max_queue=0, default_deadline=5)
+    release, started = threading.Event(), threading.Event()
+    holder = threading.Thread(target=_hold_slot, args=(controller, release, started))
+    holder.start()
+    started.wait(5)
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        with controller.acquire():
+            pass
+
+    release.set()
+    holder.join(5)
+    assert excinfo.value.retry_after >= 1
+    assert controller.get_stats()["rejected"]["queue_full"] == 1
+
+
+def test_rejects_early_when_estimated_wait_exceeds_deadline():
+    """Ước lượng thời gian chờ vượt deadline thì không xếp hàng"""
+    controller = AdmissionController(max_concurrent=1, max_queue=10, default_deadline=1)
+    controller._service_time = 10.0  # Mỗi call trung bình mất 10s
+    release, started = threading.Event(), threading.Event()
+    holder = threading.Thread(target=_hold_slot, args=(controller, release, started))
+    holder.start()
+    started.wait(5)
+
+    start_time = time.monotonic()
+    with pytest.raises(AdmissionRejected) as excinfo:
+        with controller.acquire():
+            pass
+
+    release.set()
+    holder.join(5)
+    assert time.monotonic() - start_time < 0.5
+    assert excinfo.value.reason == "deadline"
+    assert excinfo.value.retry_after == 10
+
+
+def test_acquire_async_waits_without_blocking_event_loop():
+    """Call async dùng chung giới hạn với call sync; khi phải chờ, event loop vẫn chạy được việc khác"""
+    import asyncio
+
+    controller = AdmissionController(max_concurrent=1, max_queue=10, default_deadline=5)
+    release, started = threading.Event(), threading.Event()
+    holder = threading.Thread(target=_hold_slot, args=(controller, release, started))
+    holder.start()
+    started.wait(5)
+
+    async def main():
+        ticks = 0
+
+        async def waiter():
+            async with controller.acquire_async():
+                return controller.get_stats()["active"]
+
+        task = asyncio.create_task(waiter())
+        while controller.get_stats()["queue_depth"] < 1:
+            ticks += 1
+            await asyncio.sleep(0.001)
+        threading.Timer(0.05, release.set).start()
+        active = await task
+        return ticks, active
+
+    ticks, active = asyncio.run(main())
+    holder.join(5)
+
+    assert ticks >= 1
+    assert active == 1
+    assert controller.get_stats()["active"] == 0
+    assert controller.get_stats()["admitted"] == 2
+
+
+def test_cancelled_async_waiter_releases_its_place():
+    """Task async bị cancel khi đang chờ thì rời hàng đợi, slot không bị giữ mãi"""
+    import asyncio
+
+    controller = AdmissionController(max_concurrent=1, max_queue=10, default_deadline=5)
+
+    async def main():
+        async with controller.acquire_async():
+            cancelled = asyncio.create_task(_enter_async(controller))
+            follower = asyncio.create_task(_enter_async(controller))
+            while controller.get_stats()["queue_depth"] < 2:
+                await asyncio.sleep(0.001)
+            cancelled.cancel()
+            await asyncio.sleep(0)
+        assert await follower == 1
+
+        # Bị cancel ngay sau khi được cấp slot (trước khi task chạy tiếp): slot chuyển cho waiter sau
+        async with controller.acquire_async():
+            granted_then_cancelled = asyncio.create_task(_enter_async(controller))
+            follower = asyncio.create_task(_enter_async(controller))
+            while controller.get_stats()["queue_depth"] < 2:
+                await asyncio.sleep(0.001)
+        granted_then_cancelled.cancel()
+        assert await follower == 1
+        assert granted_then_cancelled.cancelled()
+        assert cancelled.cancelled()
+
+    asyncio.run(main())
+
+    stats = controller.get_stats()
+    assert (stats["active"], stats["queue_depth"]) == (0, 0)
+    # Slot vẫn dùng được cho call sync
+    with controller.acquire(deadline=0.5):
+        pass
+
+
+async def _enter_async(controller):
+    async with controller.acquire_async():
+        return controller.get_stats()["active"]
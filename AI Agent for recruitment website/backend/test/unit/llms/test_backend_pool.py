@@ -0,0 +1,89 @@
+import socket
+import threading
+
+import pytest
+import requests
+from llms.backend_pool import OllamaBackendPool
+from llms.transport import OllamaTransport, CircuitBreaker
+
+
+def _dead_url():
+    """URL của một port không có server nào lắng nghe"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}"
+
+
+def _pool(urls, **kwargs):
+    transports = {
+        url: OllamaTransport(url, max_retries=0, breaker=CircuitBreaker(failure_threshold=100))
+        for url in urls
+    }
+    return OllamaBackendPool(urls, transports=transports, health_check_interval=0, **kwargs)
+
+
+@pytest.fixture
+def servers(ollama_server):
+    """Hai backend, /api/generate trả về tên backend đã xử lý request"""
+    return [ollama_server(post=lambda server, body, name=name: {"response": f"from-{name}"}) for name in "ab"]
+
+
+def test_least_outstanding_requests_routing(servers):
+    """Request mới đi tới backend đang rảnh khi backend kia còn request chưa xong"""
+    slow = threading.Event()
+    servers[0].delay_event = slow
+    pool = _pool([servers[0].url, servers[1].url])
+
+    first = threading.Thread(target=pool.post, args=("/api/generate",), kwargs={"json": {}})
+    first.start()
+    while pool.backends[0].in_flight == 0:
+        pass
+
+    response = pool.post("/api/generate", json={})
+    slow.set()
+    first.join()
+
+    assert response.json()["response"] == "from-b"
+    assert pool.backends[0].in_flight == 0
+    assert pool.backends[1].ewma_latency is not None
+
+
+def test_failover_and_ejection_of_dead_backend(servers):
+    """Backend chết bị failover và eject sau failure_threshold lỗi"""
+    dead_url = _dead_url()
+    pool = _pool([dead_url, servers[0].url], failure_threshold=1, eject_duration=60)
+
+    response = pool.post("/api/generate", json={})
+    assert response.json()["response"] == "from-a"
+
+    stats = {backend["url"]: backend for backend in pool.get_stats()}
+    assert stats[dead_url]["ejected"] is True
+
+    # Backend đã bị eject không còn nhận request
+    pool.post("/api/generate", json={})
+    assert stats[dead_url]["total_requests"] == pool.get_stats()[0]["total_requests"]
+
+
+def test_active_health_check_readmits_backend(servers):
+    """Health check re-admit backend đã bị eject khi nó trả lời lại"""
+    pool = _pool([servers[0].url, servers[1].url], eject_duration=60)
+    pool._eject(pool.backends[0])
+    assert pool.get_stats()[0]["ejected"] is True
+
+    pool.check_health()
+
+    assert pool.get_stats()[0]["ejected"] is False
+
+
+def test_post_dropped_after_sending_is_not_failed_over(servers):
+    """Kết nối bị ngắt sau khi POST đã gửi: không gửi lại sang backend khác (có thể đã xử lý)"""
+    servers[0].drop_post = True
+    pool = _pool([servers[0].url, servers[1].url])
+
+    with pytest.raises(requests.ConnectionError):
+        pool.post("/api/generate", json={})
+
+    assert servers[0].requests == 1
+    assert servers[1].requests == 0
@@ -0,0 +1,79 @@
+import requests
+from unittest.mock import patch, MagicMock
+from llms.context_cache import GenerationContextStore
+from llms.ollama_llms import OllamaLLMs
+
+SYSTEM = {"role": "system", "content": "Bạn là trợ lý tuyển dụng"}
+INSTRUCTION = {"role": "user", "content": "Trả lời ngắn gọn, thân thiện"}
+
+
+def test_reuses_context_of_previous_turn():
+    store = GenerationContextStore(max_tokens=100)
+    first = [SYSTEM, {"role": "user", "content": "Xin chào"}]
+    store.save("s1", "qwen3", first, "Chào bạn!", [1, 2, 3])
+
+    second = first + [{"role": "assistant", "content": "Chào bạn!"},
+                      {"role": "user", "content": "Có việc Python ở Hà Nội không?"}]
+    new_messages, context = store.lookup("s1", "qwen3", second)
+
+    assert context == [1, 2, 3]
+    assert new_messages == second[3:]
+    assert store.lookup("s1", "other-model", second) == (None, None)
+
+
+def test_trailing_instruction_is_not_carried_in_context():
+    """Chỉ dẫn thêm vào cuối mỗi lượt (không lưu trong lịch sử) không được tích lũy trong context"""
+    store = GenerationContextStore(max_tokens=100)
+    first = [SYSTEM, {"role": "user", "content": "Xin chào"}, INSTRUCTION]
+    store.save("s1", "qwen3", first, "Chào bạn!", [1, 2, 3])
+
+    second = [SYSTEM, {"role": "user", "content": "Xin chào"}, {"role": "assistant", "content": "Chào bạn!"},
+              {"role": "user", "content": "Có việc Python ở Hà Nội không?"}, INSTRUCTION]
+    assert store.lookup("s1", "qwen3", second) == (None, None)
+    assert store.get_stats()["mismatches"] == 1
+
+
+def test_edited_history_or_large_context_falls_back():
+    store = GenerationContextStore(max_tokens=100)
+    first = [SYSTEM, {"role": "user", "content": "Xin chào"}]
+    store.save("s1", "qwen3", first, "Chào bạn!", [1, 2, 3])
+
+    edited = [SYSTEM, {"role": "user", "content": "Hello"}, {"role": "assistant", "content": "Chào bạn!"}]
+    assert store.lookup("s1", "qwen3", edited) == (None, None)
+    assert store.get_stats()["entries"] == 0  # Context không khớp bị bỏ
+
+    store.save("s1", "qwen3", first, "Chào bạn!", list(range(50)))
+    follow_up = first + [{"role": "assistant", "content": "Chào bạn!"}, {"role": "user", "content": "?"}]
+    assert store.lookup("s1", "qwen3", follow_up, max_tokens=40) == (None, None)
+
+    store.save("s1", "qwen3", first, "Chào bạn!", list(range(200)))
+    assert store.get_stats()["entries"] == 0  # Lớn hơn max_tokens thì không lưu
+
+    store.save("s1", "qwen3", first, "Chào bạn!", [1])
+    store.invalidate("s1")
+    assert store.lookup("s1", "qwen3", follow_up) == (None, None)
+
+
+def test_generate_content_sends_only_new_messages():
+    client = OllamaLLMs(model_name="qwen3:0.6b", base_url="http://mockserver:11434")
+    client.context_store = GenerationContextStore()
+
+    responses = [
+        {"response": "Chào bạn!", "context": [11, 12, 13]},
+        {"response": "Có, bạn muốn mức lương bao nhiêu?", "context": [11, 12, 13, 14, 15]},
+    ]
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.side_effect = responses
+
+    history = [SYSTEM, {"role": "user", "content": "Xin chào"}]
+    with patch.object(requests.Session, "request", return_value=mock_response) as mock_post:
+        answer = client.generate_content(history, context_key="s1")
+        history += [{"role": "assistant", "content": answer}, {"role": "user", "content": "Có việc Python không?"}]
+        client.generate_content(history, context_key="s1")
+
+    first_payload = mock_post.call_args_list[-2].kwargs["json"]
+    second_payload = mock_post.call_args_list[-1].kwargs["json"]
+    assert "context" not in first_payload
+    assert second_payload["context"] == [11, 12, 13]
+    assert second_payload["prompt"] == "user: Có việc Python không?"
@@ -0,0 +1,73 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from llms.residency import ModelResidencyManager, parse_expires_at
+
+
+def _expires_in(seconds):
+    # Định dạng giống Ollama (RFC3339 với 9 chữ số lẻ)
+    expires_at = datetime.now(timezone(timedelta(hours=7))) + timedelta(seconds=seconds)
+    return expires_at.strftime("%Y-%m-%dT%H:%M:%S.%f") + "123+07:00"
+
+
+def _running_models(server):
+    """/api/ps: các model đang load"""
+    return {"models": [
+        {"name": name, "model": name, "expires_at": expires_at}
+        for name, expires_at in server.running.items()
+    ]}
+
+
+def _load_model(server, body):
+    """/api/generate không prompt: load model"""
+    server.loads.append(body["model"])
+    server.running[body["model"]] = _expires_in(body["keep_alive"])
+    return {"model": body["model"], "done": True, "done_reason": "load"}
+
+
+@pytest.fixture
+def ollama(ollama_server):
+    server = ollama_server(get=_running_models, post=_load_model)
+    server.running = {}  # model -> expires_at (ISO)
+    server.loads = []
+    return server
+
+
+def test_parse_expires_at_handles_nanoseconds():
+    expected = time.time() + 300
+    assert parse_expires_at(_expires_in(300)) == pytest.approx(expected, abs=2)
+    assert parse_expires_at("not a date") is None
+
+
+def test_poll_refreshes_expiring_models_and_rewarms_evicted(ollama):
+    manager = ModelResidencyManager(ollama.url, keep_alive=600, interval=30)
+    manager.track(["qwen3:0.6b", "qwen3:1.7b"])
+    ollama.running = {"qwen3:0.6b": _expires_in(500), "qwen3:1.7b": _expires_in(20)}
+
+    manager.poll()
+    # Model còn nhiều thời gian thì không gửi gì, model sắp hết hạn thì gia hạn
+    assert ollama.loads == ["qwen3:1.7b"]
+    stats = manager.get_stats()["models"]
+    assert stats["qwen3:1.7b"]["refreshes"] == 1
+    assert "qwen3:0.6b" not in stats
+
+    # Ollama evict model: lần poll sau phát hiện và load lại ngay
+    del ollama.running["qwen3:0.6b"]
+    manager.poll()
+    assert ollama.loads == ["qwen3:1.7b", "qwen3:0.6b"]
+    stats = manager.get_stats()["models"]["qwen3:0.6b"]
+    assert stats["evictions"] == 1
+    assert stats["rewarms"] == 1
+
+
+def test_record_load_counts_cold_loads():
+    manager = ModelResidencyManager("http://localhost:11434", cold_load_threshold=1.0)
+    manager.record_load("qwen3:1.7b", {"load_duration": 20_000_000})
+    manager.record_load("qwen3:1.7b", {"load_duration": 4_500_000_000})
+
+    stats = manager.get_stats()["models"]["qwen3:1.7b"]
+    assert stats["calls"] == 2
+    assert stats["cold_loads"] == 1
+    assert stats["max_load_seconds"] == pytest.approx(4.5)
+    assert stats["avg_load_seconds"] == pytest.approx(2.26)
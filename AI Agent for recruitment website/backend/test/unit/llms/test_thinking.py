@@ -0,0 +1,39 @@
+import pytest
+from llms.thinking import ThinkTagFilter, ThinkingMetrics, strip_think
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("<think>\nngười dùng hỏi về lương\n</think>\n\nchitchat", "chitchat"),
+    ("<think>\n\n</think>\n\n{\"title\": \"Dev\"}", "{\"title\": \"Dev\"}"),
+    ("phần suy nghĩ bị tách</think> location", "location"),
+    ("skills <think>bị cắt bởi num_predict", "skills"),
+    ("không có think", "không có think"),
+])
+def test_strip_think(text, expected):
+    """Bỏ think block hoàn chỉnh, bị cắt hoặc chỉ còn thẻ đóng"""
+    assert strip_think(text) == expected
+
+
+def test_filter_handles_tags_split_across_chunks():
+    """Thẻ <think> bị cắt giữa các chunk vẫn được lọc đúng"""
+    chunks = ["<thi", "nk>đang suy ", "nghĩ</th", "ink>\n\nXin ", "chào <", "b>bạn</b>"]
+    think_filter = ThinkTagFilter()
+
+    visible = "".join(think_filter.feed(chunk) for chunk in chunks) + think_filter.flush()
+
+    assert visible == "Xin chào <b>bạn</b>"
+    assert think_filter.thinking_chars == len("đang suy nghĩ")
+    assert think_filter.visible_chars == len(visible)
+
+
+def test_metrics_estimate_thinking_tokens():
+    """Số token suy nghĩ ước lượng theo tỉ lệ ký tự"""
+    metrics = ThinkingMetrics()
+    metrics.record("qwen3", "classify", think=False, eval_count=10, thinking_chars=0, answer_chars=8)
+    metrics.record("qwen3", "answer", think=True, eval_count=100, thinking_chars=300, answer_chars=100)
+
+    stats = metrics.get_stats()
+    assert stats["classify:qwen3"]["thinking_tokens"] == 0
+    assert stats["classify:qwen3"]["think_disabled_calls"] == 1
+    assert stats["answer:qwen3"]["thinking_tokens"] == 75
+    assert stats["answer:qwen3"]["thinking_ratio"] == 0.75
@@ -0,0 +1,88 @@
+import pytest
+import requests
+from unittest.mock import patch, MagicMock
+from llms.transport import OllamaTransport, CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def transport():
+    return OllamaTransport(
+        base_url="http://mockserver:11434",
+        max_retries=2,
+        backoff_base=0,
+        breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    )
+
+
+def _response(status_code):
+    response = MagicMock()
+    response.status_code = status_code
+    return response
+
+
+def test_get_retries_on_server_error(transport):
+    """GET là idempotent nên được retry khi server trả 5xx"""
+    responses = [_response(503), _response(200)]
+
+    with patch.object(requests.Session, "request", side_effect=responses) as mock_request:
+        response = transport.get("/api/version")
+
+    assert response.status_code == 200
+    assert mock_request.call_count == 2
+    assert transport.stats["retries"] == 1
+
+
+def test_post_is_not_retried_after_read_timeout(transport):
+    """POST /api/generate không được retry khi request đã tới server"""
+    with patch.object(requests.Session, "request", side_effect=requests.ReadTimeout()) as mock_request:
+        with pytest.raises(requests.ReadTimeout):
+            transport.post("/api/generate", json={})
+
+    assert mock_request.call_count == 1
+
+
+def test_timeouts_are_always_set(transport):
+    """Mọi request đều có (connect, read) timeout"""
+    with patch.object(requests.Session, "request", return_value=_response(200)) as mock_request:
+        transport.post("/api/generate", json={}, timeout=10)
+
+    assert mock_request.call_args.kwargs["timeout"] == (transport.connect_timeout, 10)
+
+
+def test_circuit_opens_and_fails_fast(transport):
+    """Sau nhiều lỗi liên tiếp, request bị từ chối ngay không chạm tới server"""
+    with patch.object(requests.Session, "request", side_effect=requests.ConnectionError("Connection refused")) as mock_request:
+        with pytest.raises(requests.ConnectionError):
+            transport.get("/api/version")
+        assert mock_request.call_count == 3
+
+        with pytest.raises(CircuitOpenError):
+            transport.get("/api/version")
+        assert mock_request.call_count == 3
+
+
+def test_half_open_trial_closes_circuit():
+    """Hết reset_timeout thì cho một request thử, thành công thì đóng circuit"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.allow_request() is True
+    assert breaker.allow_request() is False  # Chỉ một request thử
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_other_request_errors_end_half_open_trial():
+    """Lỗi ngoài ConnectionError/Timeout trong request thử không làm circuit kẹt ở HALF_OPEN"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    transport = OllamaTransport(base_url="http://mockserver:11434", max_retries=0, breaker=breaker)
+    breaker.record_failure()
+
+    with patch.object(requests.Session, "request", side_effect=requests.exceptions.ChunkedEncodingError("broken")):
+        with pytest.raises(requests.exceptions.ChunkedEncodingError):
+            transport.post("/api/generate", json={})
+
+    with patch.object(requests.Session, "request", return_value=_response(200)):
+        assert transport.get("/api/version").status_code == 200
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,111 @@
+import pytest
+import requests
+from unittest.mock import patch, MagicMock
+from llms.ollama_llms import OllamaLLMs
+from llms.usage import LLMResponse, TokenBudgetExceeded, Usage, UsageMetrics, current_usage_scope, usage_scope
+
+OLLAMA_RESPONSE = {
+    "model": "qwen3:0.6b",
+    "response": "<think>ok</think>Xin chào!",
+    "prompt_eval_count": 120,
+    "eval_count": 30,
+    "prompt_eval_duration": 60_000_000,
+    "eval_duration": 600_000_000,
+    "load_duration": 5_000_000,
+    "total_duration": 700_000_000,
+}
+
+
+def test_usage_from_response():
+    usage = Usage.from_response(OLLAMA_RESPONSE, task="chitchat")
+
+    assert usage.model == "qwen3:0.6b"
+    assert (usage.prompt_tokens, usage.completion_tokens, usage.total_tokens) == (120, 30, 150)
+    assert usage.eval_ms == 600.0
+    assert usage.tokens_per_second == 50.0
+
+    response = LLMResponse("Xin chào!", usage)
+    assert response == "Xin chào!" and isinstance(response, str)
+    assert response.usage is usage
+
+
+def test_metrics_aggregate_per_session_task_and_route():
+    metrics = UsageMetrics()
+    with usage_scope(session="s1"):
+        metrics.record(Usage.from_response(OLLAMA_RESPONSE, task="extract"))
+        current_usage_scope().route = "chitchat"
+        metrics.record(Usage.from_response(OLLAMA_RESPONSE, task="chitchat"))
+    metrics.record(Usage.from_response(OLLAMA_RESPONSE, task="chitchat"))
+
+    stats = metrics.get_stats()
+    assert stats["total"]["calls"] == 3
+    assert stats["total"]["prompt_share"] == 0.8
+    assert stats["total"]["tokens_per_second"] == 50.0
+    assert stats["by_task"]["chitchat"]["calls"] == 2
+    assert set(stats["by_route"]) == {"none", "chitchat"}
+    assert stats["by_route"]["chitchat"]["calls"] == 1
+    assert stats["top_sessions"]["s1"]["total_tokens"] == 300
+    assert metrics.session_tokens("s1") == 300
+
+
+def test_session_budget_soft_and_hard_limits():
+    metrics = UsageMetrics(session_budget=300, session_soft_budget=150)
+    with usage_scope(session="s1"):
+        metrics.check_budget()
+        metrics.record(Usage.from_response(OLLAMA_RESPONSE))
+        assert metrics.over_soft_budget()
+        metrics.check_budget()
+        metrics.record(Usage.from_response(OLLAMA_RESPONSE))
+        with pytest.raises(TokenBudgetExceeded) as exc_info:
+            metrics.check_budget()
+
+    assert exc_info.value.used == 300
+    assert not metrics.over_soft_budget("s2")
+    metrics.check_budget("s2")
+    assert metrics.get_stats()["budget"]["refused_calls"] == 1
+
+
+def test_budget_counts_tokens_persisted_by_other_workers():
+    """Mỗi worker có UsageMetrics riêng: budget tính theo token đã lưu trong state của session"""
+    worker_a, worker_b = UsageMetrics(session_budget=300), UsageMetrics(session_budget=300)
+    with usage_scope(session="s1", session_tokens=0) as scope:
+        worker_a.record(Usage.from_response(OLLAMA_RESPONSE))
+        worker_a.record(Usage.from_response({**OLLAMA_RESPONSE, "coalesced": True}))
+    persisted = scope.tokens
+    assert persisted == 150
+
+    with usage_scope(session="s1", session_tokens=persisted):
+        worker_b.check_budget()
+        worker_b.record(Usage.from_response(OLLAMA_RESPONSE))
+        assert worker_b.session_tokens() == 300
+        with pytest.raises(TokenBudgetExceeded):
+            worker_b.check_budget()
+
+    # Ngoài scope chỉ còn số token worker này thấy
+    assert worker_b.session_tokens("s1") == 150
+
+
+def test_generate_content_returns_usage():
+    client = OllamaLLMs(model_name="qwen3:0.6b", base_url="http://mockserver:11434")
+    client.usage_metrics = UsageMetrics()
+
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = OLLAMA_RESPONSE
+
+    with patch.object(requests.Session, "request", return_value=mock_response):
+        with usage_scope(session="s1", route="chitchat"):
+            output = client.generate_content([{"role": "user", "content": "Xin chào"}])
+
+    assert output == "Xin chào!"
+    assert output.usage.completion_tokens == 30
+    assert client.usage_metrics.get_stats()["by_route"]["chitchat"]["prompt_tokens"] == 120
+
+
+def test_coalesced_call_is_not_counted_twice():
+    metrics = UsageMetrics()
+    metrics.record(Usage.from_response(OLLAMA_RESPONSE, task="classify"))
+    metrics.record(Usage.from_response({**OLLAMA_RESPONSE, "coalesced": True}, task="classify"))
+
+    stats = metrics.get_stats()["by_task"]["classify"]
+    assert (stats["calls"], stats["coalesced_calls"], stats["total_tokens"]) == (2, 1, 150)
@@ -0,0 +1,161 @@
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+uvicorn = pytest.importorskip("uvicorn")
+from mcp.server.fastmcp import FastMCP
+
+from MCP.http_transport import offload_sync_tools
+from llms.mcp_client import MCPClientPool, MCPToolError
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _build_server(port: int) -> FastMCP:
+    server = FastMCP("test-mcp", port=port)
+
+    @server.tool()
+    def slow_echo(text: str, delay: float = 0.3) -> str:
+        """Tool sync chậm (giống tool gọi LLM)"""
+        time.sleep(delay)
+        return text
+
+    @server.tool()
+    def job_info(title: str, skills: List[str]) -> Dict[str, Any]:
+        return {"title": title, "skills": skills}
+
+    @server.tool()
+    def broken(query: str) -> str:
+        raise ValueError("boom")
+
+    offload_sync_tools(server, max_threads=8)
+    return server
+
+
+class _ServerThread:
+    def __init__(self, port: int):
+        self.port = port
+        self.uvicorn = None
+        self.thread = None
+
+    def start(self):
+        app = _build_server(self.port).streamable_http_app()
+        self.uvicorn = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=self.port, log_level="error", timeout_graceful_shutdown=1
+        ))
+        self.thread = threading.Thread(target=self.uvicorn.run, daemon=True)
+        self.thread.start()
+        deadline = time.time() + 10
+        while not self.uvicorn.started and time.time() < deadline:
+            time.sleep(0.05)
+        assert self.uvicorn.started
+
+    def stop(self):
+        self.uvicorn.should_exit = True
+        self.thread.join(timeout=10)
+
+
+@pytest.fixture
+def mcp_server():
+    server = _ServerThread(_free_port())
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def pool(mcp_server):
+    pool = MCPClientPool(f"http://127.0.0.1:{mcp_server.port}/mcp", size=2, timeout=10,
+                         connect_timeout=5, max_retries=3, backoff_base=0.05)
+    yield pool
+    pool.close()
+
+
+def test_call_tool_returns_python_values(pool):
+    """Kết quả được unwrap giống như gọi hàm trong process"""
+    assert pool.call_tool("slow_echo", {"text": "xin chào", "delay": 0}) == "xin chào"
+    assert pool.call_tool("job_info", {"title": "Python Dev", "skills": ["python"]}) == {
+        "title": "Python Dev", "skills": ["python"]
+    }
+    # Proxy nhận tham số theo vị trí theo thứ tự trong input schema
+    assert pool.tool("slow_echo")("hi", 0) == "hi"
+
+
+def test_list_tools_connects_fresh_pool(pool):
+    # Warm-up (task mcp_pool) gọi list_tools() trước mọi tool call
+    assert {"slow_echo", "job_info", "broken"} <= set(pool.list_tools())
+    assert pool.get_stats()["connects"] == 1
+
+
+def test_concurrent_calls_run_in_parallel(pool):
+    """Tool sync chạy trên thread pool của server, các call được multiplex qua các session"""
+    results = []
+    threads = [
+        threading.Thread(target=lambda i=i: results.append(pool.call_tool("slow_echo", {"text": str(i)})))
+        for i in range(8)
+    ]
+    pool.call_tool("slow_echo", {"text": "warm", "delay": 0})
+
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+
+    assert sorted(results) == [str(i) for i in range(8)]
+    assert elapsed < 8 * 0.3 / 2
+    assert pool.get_stats()["connects"] <= 2
+
+
+def test_tool_error_is_not_retried(pool):
+    with pytest.raises(MCPToolError):
+        pool.call_tool("broken", {"query": "x"})
+    assert pool.get_stats()["retries"] == 0
+
+
+def test_reconnects_after_server_restart(pool, mcp_server):
+    """Server restart: session cũ chết, pool kết nối lại và retry"""
+    assert pool.call_tool("slow_echo", {"text": "before", "delay": 0}) == "before"
+
+    mcp_server.stop()
+    mcp_server.start()
+
+    assert pool.call_tool("slow_echo", {"text": "after", "delay": 0}) == "after"
+    stats = pool.get_stats()
+    assert stats["retries"] >= 1
+    assert stats["connects"] >= 2
+
+
+def test_transport_security_allows_configured_hosts_only():
+    from starlette.testclient import TestClient
+    from MCP.http_transport import transport_security
+    from setting import Settings
+
+    server = FastMCP("test-mcp")
+    server.settings.transport_security = transport_security(
+        Settings(MCP_HOST="0.0.0.0", MCP_ALLOWED_HOSTS=["mcp-server:*"])
+    )
+    body = {"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {
+        "protocolVersion": "2025-03-26", "capabilities": {}, "clientInfo": {"name": "test", "version": "0"}
+    }}
+    headers = {"Accept": "application/json, text/event-stream", "Content-Type": "application/json"}
+
+    with TestClient(server.streamable_http_app()) as client:
+        allowed = client.post("/mcp", json=body, headers={**headers, "Host": "mcp-server:8000"})
+        rebound = client.post("/mcp", json=body, headers={**headers, "Host": "attacker.example:8000"})
+
+    assert allowed.status_code == 200
+    assert rebound.status_code == 421
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+
+class FakeEmbedding:
+    """
+    Embedding giả kiểu bag-of-words: mỗi từ khóa là một trục, giá trị là số lần xuất hiện trong text.
+    vocab: list từ khóa hoặc dict từ khóa -> trục (nhiều từ chung một trục)
+    bias: thêm một trục hằng để vector không bằng 0
+    """
+
+    def __init__(self, vocab=(), bias=0.0, preprocess=str.lower):
+        self.axes = vocab if isinstance(vocab, dict) else {word: axis for axis, word in enumerate(vocab)}
+        self.dim = max(self.axes.values(), default=-1) + 1
+        self.bias = bias
+        self.preprocess = preprocess
+        self.batches = []  # Số text của từng batch đã encode
+
+    def encode_batch(self, texts, batch_size=32):
+        self.batches.append(len(texts))
+        vectors = np.zeros((len(texts), self.dim + (1 if self.bias else 0)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            text = self.preprocess(text)
+            for word, axis in self.axes.items():
+                vectors[row, axis] += text.count(word)
+        if self.bias:
+            vectors[:, self.dim] = self.bias
+        return vectors
+
+    def encode(self, texts):
+        return self.encode_batch(texts)
+
+
+@pytest.fixture
+def fake_embedding():
+    """Factory tạo FakeEmbedding: fake_embedding(vocab, bias=..., preprocess=...)"""
+    return FakeEmbedding
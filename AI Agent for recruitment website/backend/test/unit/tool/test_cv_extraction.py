@@ -0,0 +1,81 @@
+import json
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+from tool.cv_extraction import CVExtractionPipeline, iter_cv_records, load_checkpoint
+
+
+class FakeLLM:
+    """LLM giả: CV chứa "FAIL" luôn lỗi, các CV khác trả về JSON kèm <think>"""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def chat(self, messages, **kwargs):
+        content = messages[0]["content"]
+        with self.lock:
+            self.calls.append(kwargs)
+        if "FAIL" in content:
+            raise ValueError("Chat request failed: boom")
+        return '<think></think>{"skills": ["Python"], "experience_years": 2, "location": "Hà Nội",}'
+
+
+@pytest.fixture
+def cv_jsonl(tmp_path):
+    path = tmp_path / "cvs.jsonl"
+    lines = [json.dumps({"id": f"cv{i}", "text": f"CV số {i}"}) for i in range(6)]
+    lines.append(json.dumps({"cv_id": "bad", "content": "FAIL"}))
+    lines.append("not json")
+    path.write_text("\n".join(lines), encoding="utf-8")
+    return path
+
+
+def test_iter_cv_records_from_directory(tmp_path):
+    """Mỗi file .txt/.md là một CV, id là đường dẫn tương đối"""
+    (tmp_path / "a.txt").write_text("CV A", encoding="utf-8")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "b.md").write_text("CV B", encoding="utf-8")
+    (tmp_path / "ignore.pdf").write_text("x", encoding="utf-8")
+
+    records = list(iter_cv_records(str(tmp_path)))
+    assert [(r.id, r.text) for r in records] == [("a.txt", "CV A"), ("sub/b.md", "CV B")]
+
+
+def test_pipeline_writes_results_and_stats(cv_jsonl, tmp_path):
+    """Ghi JSONL cho từng CV, lỗi được retry rồi thống kê theo loại"""
+    output = tmp_path / "out.jsonl"
+    llm = FakeLLM()
+    pipeline = CVExtractionPipeline(llm=llm, max_workers=3, max_retries=0)
+
+    summary = pipeline.run(iter_cv_records(str(cv_jsonl)), str(output))
+
+    results = {item["id"]: item for item in map(json.loads, output.read_text(encoding="utf-8").splitlines())}
+    assert summary["succeeded"] == 6 and summary["failed"] == 1
+    assert summary["errors"] == {"ValueError": 1}
+    assert results["cv0"]["features"] == {"skills": ["Python"], "experience_years": 2, "location": "Hà Nội"}
+    assert results["bad"]["status"] == "error"
+    assert llm.calls[0]["think"] is False and "format" in llm.calls[0]
+
+
+def test_pipeline_resumes_from_checkpoint(cv_jsonl, tmp_path):
+    """Chạy lại sau crash chỉ xử lý CV chưa thành công"""
+    output = tmp_path / "out.jsonl"
+    pipeline = CVExtractionPipeline(llm=FakeLLM(), max_workers=2, max_retries=0)
+    pipeline.run(iter_cv_records(str(cv_jsonl)), str(output), limit=3)
+    # Giả lập crash khi đang ghi dòng cuối
+    with open(output, "a", encoding="utf-8") as f:
+        f.write('{"id": "cv5", "stat')
+
+    llm = FakeLLM()
+    summary = CVExtractionPipeline(llm=llm, max_workers=2, max_retries=0).run(iter_cv_records(str(cv_jsonl)), str(output))
+
+    assert summary["skipped"] == 3
+    assert len(llm.calls) == 4
+    assert load_checkpoint(str(output)) == {f"cv{i}" for i in range(6)}
@@ -0,0 +1,64 @@
+import json
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+from tool.extract_feature_question_about_jd import ExtractFeatureQuestion
+
+
+@pytest.fixture
+def extractor():
+    with patch("tool.extract_feature_question_about_jd.model_manager") as manager:
+        manager.get_llm_model.return_value = MagicMock()
+        yield ExtractFeatureQuestion(validate_response=["title", "location"])
+
+
+def test_schema_built_from_valid_fields(extractor):
+    """Schema chỉ cho phép các field hợp lệ"""
+    assert set(extractor.schema["properties"]) == {"title", "location"}
+    assert extractor.schema["additionalProperties"] is False
+
+
+def test_call_llm_passes_schema_and_limits(extractor):
+    """Gọi LLM với structured format và giới hạn num_predict/stop"""
+    extractor.llm.chat.return_value = '{"title": "Java Developer"}'
+    result = extractor.extract("Tìm việc Java Developer", "extract_features_question_aboout_job")
+
+    assert result == {"title": "Java Developer"}
+    kwargs = extractor.llm.chat.call_args.kwargs
+    assert kwargs["format"] == extractor.schema
+    assert kwargs["options"]["num_predict"] == extractor.settings.EXTRACT_NUM_PREDICT
+    assert kwargs["options"]["stop"] == extractor.settings.EXTRACT_STOP
+
+
+@pytest.mark.parametrize("response, expected", [
+    ('<think>\nuser wants {jobs}\n</think>\n```json\n{"title": "Tester"}\n```', {"title": "Tester"}),
+    ('Kết quả: {"title": "Dev", "location": "Hà Nội",}', {"title": "Dev", "location": "Hà Nội"}),
+    ('{"title": "Data {Analyst}"} thêm giải thích', {"title": "Data {Analyst}"}),
+    ('{"title": "Dev", "location": "Hà', {"title": "Dev", "location": "Hà"}),
+    ('{"title": "Dev", "loca', {"title": "Dev"}),
+    ('{"title": ', {}),
+    ('Không có thông tin', {}),
+])
+def test_repair_parser(extractor, response, expected):
+    """Repair parser xử lý think block, code fence, dấu phẩy thừa và output bị cắt"""
+    assert json.loads(extractor._clear_llm_response(response)) == expected
+
+
+def test_aextract_uses_async_llm_call(extractor):
+    """aextract() gửi cùng request với extract() qua llm.achat"""
+    import asyncio
+    from unittest.mock import AsyncMock
+
+    extractor.llm.achat = AsyncMock(return_value='{"title": "Java Developer", "location": "Hà Nội"}')
+    result = asyncio.run(extractor.aextract("Tìm việc Java ở Hà Nội", "extract_features_question_aboout_job"))
+
+    assert result == {"title": "Java Developer", "location": "Hà Nội"}
+    kwargs = extractor.llm.achat.call_args.kwargs
+    assert kwargs["format"] == extractor.schema
+    assert kwargs["options"]["num_predict"] == extractor.settings.EXTRACT_NUM_PREDICT
@@ -0,0 +1,78 @@
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+from tool.retrieve_data_from_google_sheet import fetch_google_sheet
+
+
+@pytest.fixture
+def sheet(tmp_path):
+    path = tmp_path / "jobs.tsv"
+    rows = ["Bảng tuyển dụng", "title\tsalary\tlocation"]
+    rows += [f"Dev {i}\t{1000 + i}\t{'Hà Nội' if i % 2 else ''}" for i in range(7)]
+    path.write_text("\n".join(rows), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "cache")
+
+
+def test_legacy_single_column_call(sheet, cache_dir):
+    """Cách gọi cũ fetch_google_sheet(url, column) vẫn trả về một cột"""
+    df = fetch_google_sheet(str(sheet), 0, cache_dir=cache_dir)
+    assert list(df.columns) == ["title"]
+    assert df["title"].tolist() == [f"Dev {i}" for i in range(7)]
+
+
+def test_chunked_reads_hit_cache(sheet, cache_dir):
+    """Lần đọc thứ hai lấy từ cache (không parse lại), giữ dtype và giá trị null"""
+    options = {"usecols": ["title", "salary", "location"], "dtype": {"salary": "int64"}, "cache_dir": cache_dir}
+    first = list(fetch_google_sheet(str(sheet), chunksize=3, **options))
+    with patch("pandas.read_csv", side_effect=AssertionError("should not parse")):
+        second = list(fetch_google_sheet(str(sheet), chunksize=4, **options))
+
+    assert [len(chunk) for chunk in first] == [3, 3, 1]
+    assert [len(chunk) for chunk in second] == [4, 3]
+    merged = pd.concat(second, ignore_index=True)
+    assert merged["salary"].dtype == "int64"
+    assert merged["location"].isna().tolist() == [i % 2 == 0 for i in range(7)]
+    pd.testing.assert_frame_equal(merged, pd.concat(first, ignore_index=True), check_dtype=False)
+
+
+def test_cache_invalidated_when_file_changes(sheet, cache_dir):
+    """Sửa file (mtime/size đổi) thì đọc lại từ nguồn"""
+    fetch_google_sheet(str(sheet), cache_dir=cache_dir)
+    with open(sheet, "a", encoding="utf-8") as f:
+        f.write("\nTester\t900\tĐà Nẵng")
+    stat = os.stat(sheet)
+    os.utime(sheet, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    df = fetch_google_sheet(str(sheet), cache_dir=cache_dir)
+
+    assert df["title"].tolist()[-1] == "Tester"
+    assert len([name for name in os.listdir(cache_dir) if ".tmp-" in name]) == 0
+
+
+def test_string_columns_are_stored_as_utf8_bytes(tmp_path, cache_dir):
+    """Một ô rất dài không làm phình cả cột (không dùng unicode độ dài cố định)"""
+    path = tmp_path / "long.tsv"
+    long_description = "Mô tả công việc " * 500
+    rows = ["header", "title\tdescription", f"Dev 0\t{long_description.strip()}"]
+    rows += [f"Dev {i}\tngắn" for i in range(1, 200)]
+    path.write_text("\n".join(rows), encoding="utf-8")
+
+    first = fetch_google_sheet(str(path), cache_dir=cache_dir)
+    second = fetch_google_sheet(str(path), cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(first, second)
+
+    entry = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+    column_file = os.path.join(entry, "part-00000", "1.npy")
+    assert os.path.getsize(column_file) < len(long_description.encode("utf-8")) + 199 * len("ngắn".encode("utf-8")) + 1024
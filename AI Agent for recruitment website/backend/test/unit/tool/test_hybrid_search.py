@@ -0,0 +1,81 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+from tool.hybrid_search import HybridJobIndex, fold_diacritics, tokenize
+
+VOCAB = ["python", "java", "unity", "game", "data", "ai"]
+
+
+def _fold_synonyms(text):
+    """"trí tuệ nhân tạo" được map sang "ai" để kiểm tra recall ngữ nghĩa"""
+    return fold_diacritics(text).replace("tri tue nhan tao", "ai")
+
+
+@pytest.fixture
+def embedding(fake_embedding):
+    return fake_embedding(VOCAB, bias=0.01, preprocess=_fold_synonyms)
+
+
+JOBS = [
+    {"job_key": "j1", "title": "Lập trình viên Python", "skills": ["Python", "Django"], "location": "Hà Nội"},
+    {"job_key": "j2", "title": "Java Developer", "skills": ["Java", "Spring"], "location": "Hồ Chí Minh"},
+    {"job_key": "j3", "title": "Unity Game Developer", "skills": ["Unity", "C#"], "location": "Đà Nẵng"},
+    {"job_key": "j4", "title": "AI Engineer", "skills": ["Python", "PyTorch"], "location": "Hà Nội"},
+]
+
+
+@pytest.fixture
+def index(embedding):
+    index = HybridJobIndex(embedding=embedding, candidates=10)
+    index.add(JOBS)
+    return index
+
+
+def test_tokenize_folds_diacritics():
+    """Bỏ dấu (kể cả đ) và thêm bigram âm tiết"""
+    assert tokenize("Đà Nẵng, C# và Node.js") == ["da", "nang", "c#", "va", "node.js", "da_nang", "nang_c#", "c#_va", "va_node.js"]
+
+
+def test_search_matches_without_diacritics(index):
+    """Query không dấu vẫn khớp job có dấu"""
+    results = index.search("lap trinh python ha noi", top_k=2)
+    assert results[0]["job_key"] == "j1"
+    assert results[0]["bm25_rank"] == 1
+
+
+def test_vector_branch_adds_semantic_recall(index):
+    """Không có từ khóa chung nhưng vẫn tìm được nhờ embedding"""
+    results = index.search("trí tuệ nhân tạo", top_k=1)
+    assert results[0]["job_key"] == "j4"
+    assert results[0]["bm25_rank"] is None and results[0]["vector_rank"] == 1
+
+
+def test_incremental_add_delete_and_persist(index, embedding, tmp_path):
+    """Cập nhật job trùng key, xóa job, lưu rồi load lại cho kết quả như cũ"""
+    index.add([{"job_key": "j2", "title": "Senior Java Developer", "skills": ["Java"], "location": "Hà Nội"}])
+    assert index.delete(["j3"]) == 1
+    assert len(index) == 3
+    assert "j3" not in [r["job_key"] for r in index.search("unity game", top_k=5)]
+    assert index.bm25.deleted_ratio == 0  # tỉ lệ xóa vượt ngưỡng nên đã compact
+
+    index.save(str(tmp_path / "index"))
+    loaded = HybridJobIndex.load(str(tmp_path / "index"), embedding=embedding, candidates=10)
+
+    assert len(loaded) == 3
+    assert loaded.search("java ha noi", top_k=1)[0]["title"] == "Senior Java Developer"
+    assert loaded.search("java", top_k=3) == index.search("java", top_k=3)
+    assert loaded.search("python", top_k=2, location="ha noi")[0]["job_key"] in {"j1", "j4"}
+
+
+def test_location_filter_matches_folded_locations(index):
+    """Lọc địa điểm không dấu / chuỗi con; job đã xóa hoặc ở nơi khác bị loại"""
+    assert {r["job_key"] for r in index.search("python", top_k=5, location="Ha Noi")} == {"j1", "j4"}
+
+    index.delete(["j4"])
+    assert [r["job_key"] for r in index.search("python", top_k=5, location="noi")] == ["j1"]
+    assert index.search("python", top_k=5, location="Hải Phòng") == []
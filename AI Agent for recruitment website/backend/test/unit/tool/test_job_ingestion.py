@@ -0,0 +1,120 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+from tool.job_ingestion import JobIngestionPipeline, normalize_job
+
+
+class FakeCollection:
+    """Collection giả: lưu document theo job_key, đếm số lần bulk_write"""
+
+    def __init__(self):
+        self.docs = {}
+        self.bulk_calls = []
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def find(self, query, projection=None):
+        keys = query["job_key"]["$in"]
+        return [{"job_key": k, "content_hash": self.docs[k].get("content_hash")} for k in keys if k in self.docs]
+
+    def bulk_write(self, operations, ordered=True):
+        self.bulk_calls.append(len(operations))
+        upserted = modified = 0
+        for op in operations:
+            key = op._filter["job_key"]
+            if key in self.docs:
+                modified += 1
+            else:
+                upserted += 1
+            doc = self.docs.setdefault(key, {})
+            doc.update(op._doc["$set"])
+            for name in op._doc.get("$unset", {}):
+                doc.pop(name, None)
+        return SimpleNamespace(upserted_count=upserted, modified_count=modified)
+
+
+def _write_tsv(path, rows):
+    header = "Vị trí\tCông ty\tĐịa điểm\tKỹ năng\tMô tả"
+    path.write_text("\n".join([header] + ["\t".join(row) for row in rows]), encoding="utf-8")
+
+
+def test_normalize_job_maps_aliases():
+    """Cột tiếng Việt được map sang field chuẩn, skills tách thành list"""
+    job = normalize_job({"Vị trí": "  Python  Dev ", "Địa điểm": "HCM", "Kỹ năng": "Python, SQL; python", "Ghi chú": "x"})
+    assert job == {"title": "Python Dev", "location": "Hồ Chí Minh", "skills": ["Python", "SQL"], "extra": {"ghi chú": "x"}}
+    assert normalize_job({"Công ty": "FPT"}) is None
+
+
+def test_reingest_only_touches_changed_rows(tmp_path, fake_embedding):
+    """Ingest lại chỉ ghi posting mới hoặc đã thay đổi"""
+    source = tmp_path / "jobs.tsv"
+    rows = [[f"Dev {i}", "FPT", "Hà Nội", "Python", f"JD {i}"] for i in range(5)]
+    _write_tsv(source, rows)
+
+    collection, embedding = FakeCollection(), fake_embedding(bias=1.0)
+    pipeline = JobIngestionPipeline(collection=collection, embed=True, embedding=embedding, write_batch_size=2)
+    first = pipeline.run(str(source), chunksize=3)
+    assert first["upserted"] == 5
+    assert collection.bulk_calls == [2, 1, 2]
+
+    rows[1][4] = "JD mới"
+    rows.append(["Tester", "VNG", "Đà Nẵng", "Selenium", "JD test"])
+    _write_tsv(source, rows)
+    second = pipeline.run(str(source), chunksize=3)
+
+    assert second["unchanged"] == 4
+    assert second["modified"] == 1 and second["upserted"] == 1
+    assert embedding.batches[-2:] == [1, 1]
+    assert all(doc["embedding"] == [1.0] for doc in collection.docs.values())
+
+
+class FlakyAnalysisPipeline(JobIngestionPipeline):
+    """Phân tích JD giả: lỗi (không có analysis) với JD chứa chữ 'lỗi'"""
+
+    def _analyze_jobs(self, jobs):
+        for job in jobs:
+            if "lỗi" not in job.get("description", ""):
+                job["analysis"] = "- Python"
+
+
+def test_changed_posting_drops_stale_derived_fields(tmp_path):
+    """Posting đổi nội dung không giữ analysis/field nguồn của bản cũ; enrich lỗi thì lần sau thử lại"""
+    source = tmp_path / "jobs.tsv"
+    _write_tsv(source, [["Dev", "FPT", "Hà Nội", "Python", "JD"]])
+    collection = FakeCollection()
+    pipeline = FlakyAnalysisPipeline(collection=collection, analyze=True)
+    pipeline.run(str(source))
+    doc = next(iter(collection.docs.values()))
+    assert doc["analysis"] == "- Python" and doc["skills"] == ["Python"]
+
+    _write_tsv(source, [["Dev", "FPT", "Hà Nội", "", "JD lỗi"]])
+    pipeline.run(str(source))
+    assert "analysis" not in doc and "skills" not in doc
+    assert "content_hash" not in doc
+
+    # Không có content_hash: posting được phân tích lại ở lần ingest sau
+    assert pipeline.run(str(source))["unchanged"] == 0
+
+
+def test_ingestion_updates_saved_hybrid_index(tmp_path, fake_embedding):
+    """Posting mới/đổi được thêm vào hybrid index và index được lưu lại cho process khác load"""
+    from tool.hybrid_search import HybridJobIndex
+
+    source = tmp_path / "jobs.tsv"
+    _write_tsv(source, [["Dev", "FPT", "Hà Nội", "Python", "JD"], ["Tester", "VNG", "Đà Nẵng", "Selenium", "JD test"]])
+    index_path = str(tmp_path / "hybrid_index")
+    embedding = fake_embedding(bias=1.0)
+    index = HybridJobIndex(embedding=embedding)
+    pipeline = JobIngestionPipeline(
+        collection=FakeCollection(), embed=True, embedding=embedding, index=index, index_path=index_path
+    )
+    pipeline.run(str(source))
+
+    assert len(index) == 2
+    assert index.disk_mtime == HybridJobIndex.stored_mtime(index_path)
+    assert len(HybridJobIndex.load(index_path, embedding=embedding)) == 2
@@ -0,0 +1,82 @@
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+from tool.job_matching import JobMatcher, VectorIndex, parse_min_years, top_k_indices
+
+# Bag-of-words trên VOCAB để kiểm tra thứ hạng
+VOCAB = ["python", "java", "react", "unity", "sql", "ai/ml", "game development"]
+
+
+@pytest.fixture
+def matcher(fake_embedding):
+    matcher = JobMatcher(embedding=fake_embedding(VOCAB), experience_tolerance=1.0)
+    matcher.index_jobs([
+        {"job_key": "j1", "title": "Python Developer", "skills": ["Python", "SQL"], "location": "Hà Nội", "experience": "1-2 năm"},
+        {"job_key": "j2", "title": "Senior Python Engineer", "skills": ["Python"], "location": "HN", "experience": "5 năm"},
+        {"job_key": "j3", "title": "Python Dev", "skills": ["Python"], "location": "Hồ Chí Minh", "experience": "1 năm"},
+        {"job_key": "j4", "title": "Unity Developer", "skills": ["Unity"], "location": "Hà Nội"},
+        {"job_key": "j5", "title": "Java Developer", "skills": ["Java"], "location": "Hà Nội", "experience": "Internship"},
+    ])
+    return matcher
+
+
+def test_top_k_indices_sorted_descending():
+    scores = np.array([[0.1, 0.9, 0.3, 0.7], [0.5, 0.2, 0.8, 0.1]])
+    assert top_k_indices(scores, 2).tolist() == [[1, 3], [2, 0]]
+    assert top_k_indices(scores[0], 10).tolist() == [1, 3, 2, 0]
+
+
+@pytest.mark.parametrize("text, expected", [("1-2 năm", 1.0), ("trên 3 năm", 3.0), ("Internship", 0.0), (2, 2.0)])
+def test_parse_min_years(text, expected):
+    assert parse_min_years(text) == expected
+
+
+def test_suggest_jobs_applies_location_and_experience_masks(matcher):
+    """Job khác thành phố hoặc yêu cầu quá nhiều năm kinh nghiệm bị loại"""
+    cv = {"skills": ["Python", "SQL"], "experience_years": 2, "location": "ha noi"}
+    results = matcher.suggest_jobs(cv, top_k=3)
+
+    assert [job["id"] for job in results][:1] == ["j1"]
+    assert "j2" not in [job["id"] for job in results]  # yêu cầu 5 năm
+    assert "j3" not in [job["id"] for job in results]  # Hồ Chí Minh
+    assert results[0]["score"] >= results[-1]["score"]
+
+
+def test_suggest_candidates_reverse_direction(matcher):
+    matcher.index_candidates([
+        {"id": "c1", "skills": ["Python"], "experience_years": 0, "location": "Hà Nội"},
+        {"id": "c2", "skills": ["Python", "SQL"], "experience_years": 3, "location": "Hà Nội"},
+        {"id": "c3", "skills": ["Unity"], "experience_years": 4, "location": "Hà Nội"},
+    ])
+    job = {"title": "Python Developer", "skills": ["Python", "SQL"], "location": "Hà Nội", "experience": "2 năm"}
+
+    results = matcher.suggest_candidates(job, top_k=2)
+    assert [cv["id"] for cv in results] == ["c2", "c3"]
+
+
+def test_search_100k_jobs_is_fast():
+    """Một CV so với 100k job (matmul + argpartition) trong vài chục ms"""
+    rng = np.random.default_rng(0)
+    index = VectorIndex()
+    index.build(
+        ids=[str(i) for i in range(100_000)], items=[{}] * 100_000,
+        vectors=rng.standard_normal((100_000, 256), dtype=np.float32),
+        locations=["Hà Nội", "Hồ Chí Minh"] * 50_000, years=np.zeros(100_000)
+    )
+    query = rng.standard_normal(256, dtype=np.float32)
+    mask = index.location_mask(["Hà Nội"])
+    index.search(query, 10, mask)
+
+    start = time.perf_counter()
+    indices, scores = index.search(query, 10, mask)
+    elapsed = time.perf_counter() - start
+
+    assert len(indices) == 10 and np.all(np.diff(scores) <= 0)
+    assert elapsed < 0.5
@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+
+from loguru import logger
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+from log_config import LogFilter
+
+
+def _capture(log_filter):
+    messages = []
+    handler_id = logger.add(lambda message: messages.append(message.record["message"]), level=0, filter=log_filter)
+    return messages, handler_id
+
+
+def test_module_levels_match_longest_prefix():
+    log_filter = LogFilter({"": "INFO", "tool": "WARNING", "tool.model_manager": "DEBUG"})
+
+    assert log_filter.min_level("tool.model_manager") == logger.level("DEBUG").no
+    assert log_filter.min_level("tool.model_manager_extra") == logger.level("WARNING").no
+    assert log_filter.min_level("tool.session_store.store") == logger.level("WARNING").no
+    assert log_filter.min_level("MCP.server") == logger.level("INFO").no
+
+
+def test_debug_is_sampled_unless_overridden():
+    messages, handler_id = _capture(LogFilter({"": "DEBUG"}, debug_sample_rate=0.0))
+    try:
+        logger.debug("sampled out")
+        logger.bind(sample=1.0).debug("always kept")
+        logger.info("info is never sampled")
+    finally:
+        logger.remove(handler_id)
+
+    assert messages == ["always kept", "info is never sampled"]
+
+
+def test_throttle_per_call_site():
+    log_filter = LogFilter({"": "DEBUG"})
+    messages, handler_id = _capture(log_filter)
+    try:
+        for attempt in range(5):
+            logger.bind(throttle=60).warning("Keep-alive failed ({})", attempt)
+        logger.bind(throttle=60, throttle_key="other").warning("Other warning")
+    finally:
+        logger.remove(handler_id)
+
+    assert messages == ["Keep-alive failed (0)", "Other warning"]
+    assert log_filter.suppressed == 4
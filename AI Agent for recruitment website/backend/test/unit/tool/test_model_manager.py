@@ -0,0 +1,74 @@
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+from tool.model_manager import ModelManager
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setenv("OLLAMA_MODEL", "qwen3:1.7b")
+    manager = ModelManager()
+    monkeypatch.setattr(manager.settings, "LLM_TASK_MODELS", {"classify": "qwen3:0.6b", "extract": "", "answer": ""})
+    monkeypatch.setattr(manager.settings, "LLM_TASK_FALLBACKS", {"classify": ["extract", "answer"]})
+    return manager
+
+
+def test_task_resolves_to_its_tier(manager):
+    """Task dùng model tier đã cấu hình khi model có trên Ollama"""
+    with patch.object(ModelManager, "_get_available_models", return_value={"qwen3:0.6b", "qwen3:1.7b"}):
+        assert manager.resolve_task_model("classify") == "qwen3:0.6b"
+
+
+def test_task_falls_back_when_tier_unavailable(manager):
+    """Model tier không có thì đi theo fallback chain tới model mặc định"""
+    with patch.object(ModelManager, "_get_available_models", return_value={"qwen3:1.7b"}):
+        assert manager.resolve_task_model("classify") == "qwen3:1.7b"
+
+
+def test_empty_tier_uses_default_model(manager):
+    """Tier rỗng dùng OLLAMA_MODEL"""
+    with patch.object(ModelManager, "_get_available_models", return_value=None):
+        assert manager.resolve_task_model("answer") == "qwen3:1.7b"
+
+
+def test_task_client_is_cached_before_resolving(manager):
+    """Lần gọi sau của cùng task lấy client đã cache, không gọi lại /api/tags"""
+    manager.clear_cache()
+    llms_module = MagicMock()
+    with patch.object(ModelManager, "_get_available_models", return_value={"qwen3:0.6b"}) as available, \
+            patch.dict(sys.modules, {"llms.ollama_llms": llms_module}):
+        first = manager.get_llm_model(task="classify")
+        second = manager.get_llm_model(task="classify")
+
+    assert first is second
+    assert available.call_count == 1
+    assert llms_module.OllamaLLMs.call_count == 1
+    manager.clear_cache()
+
+
+def test_hybrid_index_reloads_when_saved_by_another_process(manager, monkeypatch, tmp_path):
+    from tool.hybrid_search import HybridJobIndex
+
+    index_path = str(tmp_path / "hybrid_index")
+    monkeypatch.setattr(manager.settings, "HYBRID_INDEX_PATH", index_path)
+    monkeypatch.setattr(manager, "get_embedding_model", lambda: None)
+    manager.models_cache.pop("hybrid_index", None)
+
+    index = manager.get_hybrid_index()
+    assert len(index) == 0 and manager.get_hybrid_index() is index
+
+    # Process khác (job ingestion) lưu index mới
+    saved = HybridJobIndex()
+    saved.add([{"job_key": "j1", "title": "Python Developer", "embedding": [1.0, 0.0]}])
+    saved.save(index_path)
+
+    reloaded = manager.get_hybrid_index()
+    assert reloaded is not index and len(reloaded) == 1
+    assert manager.get_hybrid_index() is reloaded
+    manager.models_cache.pop("hybrid_index", None)
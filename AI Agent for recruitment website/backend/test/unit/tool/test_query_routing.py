@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+from tool.model_manager import model_manager
+from tool.query_routing import route_query
+
+
+class FakeRouter:
+    def embed(self, query):
+        return np.array([[0.6, 0.8]], dtype=np.float32)
+
+    def guide(self, query, query_embedding=None):
+        return 0.91, "chitchat"
+
+
+def test_route_query_returns_json_serializable_embedding():
+    with patch.object(model_manager, "get_semantic_router", return_value=FakeRouter()):
+        result = route_query("Xin chào")
+
+    assert result["route"] == "chitchat"
+    assert np.allclose(np.asarray(result["embedding"], dtype=np.float32), [[0.6, 0.8]])
+
+
+def test_route_query_without_embedding_on_error():
+    with patch.object(model_manager, "get_semantic_router", side_effect=RuntimeError("model not loaded")):
+        assert route_query("Xin chào") == {"route": "unknown", "embedding": None}
@@ -0,0 +1,56 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+from tool.semantic_cache import SemanticCache
+
+
+@pytest.fixture
+def cache():
+    return SemanticCache(name="chitchat", threshold=0.9, ttl=60, max_size=2)
+
+
+def test_lookup_hit_for_similar_embedding(cache):
+    """Embedding gần giống phải trả về câu trả lời đã cache"""
+    cache.add([1.0, 0.0, 0.0], "Xin chào", "Chào bạn!")
+
+    assert cache.lookup([0.99, 0.05, 0.0]) == "Chào bạn!"
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_lookup_miss_below_threshold(cache):
+    """Embedding khác xa không được trả về câu trả lời cũ"""
+    cache.add([1.0, 0.0, 0.0], "Xin chào", "Chào bạn!")
+
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+    stats = cache.get_stats()
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.0
+
+
+def test_expired_entry_is_not_returned(cache):
+    """Entry quá TTL bị loại bỏ khi lookup"""
+    cache.add([1.0, 0.0, 0.0], "Xin chào", "Chào bạn!")
+    cache._entries[0].created_at = time.time() - 120
+
+    assert cache.lookup([1.0, 0.0, 0.0]) is None
+    assert cache.get_stats()["expirations"] == 1
+    assert len(cache) == 0
+
+
+def test_size_bound_evicts_least_recently_used(cache):
+    """Khi đầy, entry ít được dùng gần đây nhất bị xóa"""
+    cache.add([1.0, 0.0, 0.0], "Xin chào", "Chào bạn!")
+    cache.add([0.0, 1.0, 0.0], "Thời tiết?", "Trời đẹp.")
+    cache.lookup([1.0, 0.0, 0.0])  # Dùng lại entry đầu tiên
+    cache.add([0.0, 0.0, 1.0], "Bạn tên gì?", "Mình là trợ lý.")
+
+    assert len(cache) == 2
+    assert cache.lookup([1.0, 0.0, 0.0]) == "Chào bạn!"
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+    assert cache.get_stats()["evictions"] == 1
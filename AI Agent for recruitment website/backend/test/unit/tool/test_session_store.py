@@ -0,0 +1,185 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+from app.chatbot.base import BaseChatbot
+from tool.session_store import (
+    FileSessionStore,
+    SQLiteSessionStore,
+    WriteBehindSessionStore,
+    decode_state,
+    encode_state,
+)
+
+
+class EchoChatbot(BaseChatbot):
+    def classify_intent(self, message: str) -> str:
+        return "chitchat"
+
+    def chat(self, message: str, include_history: bool = True) -> str:
+        self.add_user_message(message)
+        self.add_assistant_message(message)
+        return message
+
+
+@pytest.fixture(params=["sqlite", "file"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        store = SQLiteSessionStore(str(tmp_path / "sessions.db"), ttl=3600)
+    else:
+        store = FileSessionStore(str(tmp_path / "sessions"), ttl=3600)
+    yield store
+    store.close()
+
+
+def test_chatbot_state_round_trip():
+    """to_state/apply_state giữ nguyên history, slot state và context"""
+    bot = EchoChatbot(model_name="qwen3")
+    bot.add_system_message("Bạn là trợ lý tuyển dụng")
+    bot.chat("Tìm việc Python ở Hà Nội")
+    bot.conversation_state = "waiting_for_salary"
+    bot.recruitment_context = {"location": "Hà Nội", "skills": ["python"]}
+    bot.last_intent = "recruitment"
+    bot.state_revision = 3
+    bot.used_tokens = 450
+
+    state = bot.to_state()
+    assert state["history"][0] == ["system", "Bạn là trợ lý tuyển dụng"]
+
+    restored = EchoChatbot()
+    assert restored.apply_state(decode_state(encode_state(state, compress_min_bytes=16)))
+    assert restored.get_history() == bot.get_history()
+    assert restored.conversation_state == "waiting_for_salary"
+    assert restored.recruitment_context == bot.recruitment_context
+    assert restored.last_intent == "recruitment"
+    assert restored.state_revision == 3
+    assert restored.used_tokens == 450
+
+    assert not EchoChatbot().apply_state({**state, "v": -1})
+
+
+def test_backend_save_load_and_revision(backend):
+    """load-on-miss trả về state đã lưu; newer_than chỉ trả về khi store có revision mới hơn"""
+    assert backend.load("missing") is None
+
+    backend.save("s1", {"v": 1, "rev": 2, "history": [["user", "xin chào"]]})
+    assert backend.load("s1")["history"] == [["user", "xin chào"]]
+    assert backend.load("s1", newer_than=2) is None
+    assert backend.load("s1", newer_than=1)["rev"] == 2
+
+    backend.delete("s1")
+    assert backend.load("s1") is None
+
+
+def test_backend_ignores_expired_sessions(backend):
+    backend.ttl = -1
+    backend.save("s1", {"v": 1, "rev": 1})
+    assert backend.load("s1") is None
+
+
+def test_write_behind_batches_writes(tmp_path):
+    """save() không ghi ngay; flush() gom các lần save (bản cuối của mỗi session) thành một batch"""
+    backend = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    store = WriteBehindSessionStore(backend, interval=60, max_batch=100)
+
+    for rev in range(1, 4):
+        store.save("s1", {"v": 1, "rev": rev})
+    store.save("s2", {"v": 1, "rev": 1})
+
+    # Chưa flush: process hiện tại vẫn thấy bản mới nhất, backend thì chưa có gì
+    assert store.load("s1")["rev"] == 3
+    assert backend.load("s1") is None
+
+    store.flush()
+    assert backend.load("s1")["rev"] == 3
+    assert backend.load("s2")["rev"] == 1
+    stats = store.get_stats()
+    assert stats["saves"] == 4
+    assert stats["writes"] == 2
+    assert stats["batches"] == 1
+    assert stats["pending"] == 0
+
+    store.close()
+
+
+def test_write_behind_keeps_pending_on_backend_error(tmp_path):
+    class FailingStore(FileSessionStore):
+        fail = True
+
+        def save_many(self, items):
+            if self.fail:
+                raise OSError("disk full")
+            super().save_many(items)
+
+    backend = FailingStore(str(tmp_path / "sessions"))
+    store = WriteBehindSessionStore(backend, interval=60)
+    store.save("s1", {"v": 1, "rev": 1})
+    store.flush()
+    assert store.get_stats()["errors"] == 1
+    assert store.get_stats()["pending"] == 1
+
+    backend.fail = False
+    store.flush()
+    assert backend.load("s1")["rev"] == 1
+    store.close()
+
+
+def _open_twin_stores(kind, tmp_path, merge=None):
+    """Hai store trên cùng file/thư mục, như hai worker gunicorn"""
+    if kind == "sqlite":
+        return [SQLiteSessionStore(str(tmp_path / "sessions.db"), merge=merge) for _ in range(2)]
+    return [FileSessionStore(str(tmp_path / "sessions"), merge=merge) for _ in range(2)]
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "file"])
+def test_older_revision_does_not_overwrite(kind, tmp_path):
+    worker_a, worker_b = _open_twin_stores(kind, tmp_path)
+
+    assert worker_a.save_many([("s1", {"v": 1, "rev": 2, "history": [["user", "a"]]})]) == []
+    assert worker_b.save_many([("s1", {"v": 1, "rev": 1, "history": [["user", "b"]]})]) == ["s1"]
+    assert worker_b.save_many([("s1", {"v": 1, "rev": 2, "history": [["user", "b"]]})]) == ["s1"]
+    assert worker_b.load("s1")["history"] == [["user", "a"]]
+
+    for store in (worker_a, worker_b):
+        store.close()
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "file"])
+def test_concurrent_turns_of_same_session_are_merged(kind, tmp_path):
+    """Hai worker cùng trả lời một lượt từ revision 1: lượt ghi sau được merge, không mất lượt nào"""
+    worker_a, worker_b = _open_twin_stores(kind, tmp_path, merge=BaseChatbot.merge_states)
+    base = EchoChatbot()
+    base.add_system_message("Bạn là trợ lý tuyển dụng")
+    base.state_revision = 1
+    base.used_tokens = 100
+    worker_a.save("s1", base.to_state())
+
+    bots = []
+    for message, tokens in (("Tìm việc Python", 50), ("Lương bao nhiêu?", 70)):
+        bot = EchoChatbot()
+        bot.apply_state(worker_a.load("s1"))
+        bot.chat(message)
+        bot.used_tokens += tokens
+        bot.state_revision += 1
+        bots.append(bot)
+
+    assert worker_a.save_many([("s1", bots[0].to_state())]) == []
+    assert worker_b.save_many([("s1", bots[1].to_state())]) == []
+
+    restored = EchoChatbot()
+    restored.apply_state(worker_a.load("s1"))
+    assert restored.state_revision == 3
+    assert [m["content"] for m in restored.get_history()] == [
+        "Bạn là trợ lý tuyển dụng", "Tìm việc Python", "Tìm việc Python", "Lương bao nhiêu?", "Lương bao nhiêu?"
+    ]
+    # Token của cả hai lượt đều được tính vào budget của session
+    assert restored.used_tokens == 100 + 50 + 70
+    # Worker A thấy được bản đã merge ở lần revalidate tiếp theo
+    assert worker_a.load("s1", newer_than=bots[0].state_revision)["rev"] == 3
+
+    for store in (worker_a, worker_b):
+        store.close()
@@ -0,0 +1,123 @@
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+from tool.single_flight import SingleFlight, llm_call_key
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    group = SingleFlight("llm")
+    executions = []
+    release = threading.Event()
+
+    def generate():
+        executions.append(1)
+        release.wait(5)
+        return {"message": {"content": "Xin chào!"}}
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(group.do, "same-key", generate) for _ in range(4)]
+        while group.get_stats()["calls"] < 4:
+            time.sleep(0.01)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(executions) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert all(result is results[0][0] for result, _ in results)
+    stats = group.get_stats()
+    assert (stats["executed"], stats["coalesced"], stats["in_flight"]) == (1, 3, 0)
+
+    # Call xong thì không còn được gộp (không phải cache)
+    group.do("same-key", generate)
+    assert len(executions) == 2
+
+
+def test_error_is_shared_and_not_cached():
+    group = SingleFlight("llm")
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise TimeoutError("ollama timeout")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(group.do, "key", failing)
+        started.wait(5)
+        follower = executor.submit(group.do, "key", failing)
+        while group.get_stats()["calls"] < 2:
+            time.sleep(0.01)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(TimeoutError):
+                future.result()
+
+    assert group.get_stats()["errors"] == 1
+    assert group.do("key", lambda: "ok") == ("ok", False)
+
+
+def test_async_calls_are_coalesced():
+    group = SingleFlight("llm")
+    executions = []
+
+    async def generate():
+        executions.append(1)
+        await asyncio.sleep(0.05)
+        return "Xin chào!"
+
+    async def main():
+        return await asyncio.gather(*(group.ado("key", generate) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert len(executions) == 1
+    assert [result for result, _ in results] == ["Xin chào!"] * 3
+
+
+def test_llm_call_key_only_for_deterministic_requests():
+    payload = {
+        "model": "qwen3:0.6b",
+        "messages": [{"role": "user", "content": "Tôi muốn  tìm việc Python "}],
+        "stream": False,
+        "options": {"temperature": 0, "num_predict": 16},
+    }
+    same_after_normalization = {**payload, "messages": [{"role": "user", "content": "Tôi muốn tìm việc Python"}]}
+
+    assert llm_call_key("/api/chat", payload) == llm_call_key("/api/chat", same_after_normalization)
+    assert llm_call_key("/api/chat", payload) != llm_call_key("/api/generate", payload)
+    assert llm_call_key("/api/chat", {**payload, "options": {"temperature": 0, "num_predict": 32}}) != \
+        llm_call_key("/api/chat", payload)
+    assert llm_call_key("/api/chat", {**payload, "options": {"temperature": 0.7}}) is None
+    assert llm_call_key("/api/chat", {**payload, "options": {"temperature": 0.7, "seed": 42}}) is not None
+    assert llm_call_key("/api/chat", {**payload, "stream": True}) is None
+
+
+def test_cancelled_async_follower_does_not_affect_others():
+    group = SingleFlight("llm")
+
+    async def generate():
+        await asyncio.sleep(0.05)
+        return "Xin chào!"
+
+    async def main():
+        leader = asyncio.ensure_future(group.ado("key", generate))
+        await asyncio.sleep(0)
+        cancelled = asyncio.ensure_future(group.ado("key", generate))
+        follower = asyncio.ensure_future(group.ado("key", generate))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        results = await asyncio.gather(leader, follower)
+        assert cancelled.cancelled()
+        return results
+
+    assert asyncio.run(main()) == [("Xin chào!", False), ("Xin chào!", True)]
+    assert group.get_stats()["errors"] == 0
@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+from tool.semantic_router import SlotClassifier
+from tool.question_enhancer import QuestionEnhancer
+
+
+# Embedding giả: mỗi slot là một trục, dựa trên từ khóa trong câu
+AXES = {"triệu": 2, "usd": 2, "python": 1, "kỹ năng": 1, "quận": 0, "marketing": 3}
+
+
+@pytest.fixture
+def classifier(fake_embedding):
+    samples = {
+        "location": ["Quận 1", "Quận 3"],
+        "skills": ["Python", "Kỹ năng Python"],
+        "salary": ["15 triệu", "1000 USD"],
+        "position": ["Nhân viên marketing", "Marketing"]
+    }
+    return SlotClassifier(embedding=fake_embedding(AXES, bias=0.01), enhancer=QuestionEnhancer(), threshold=0.8, samples=samples)
+
+
+def test_keyword_match_returns_full_confidence(classifier):
+    """Keyword tables của QuestionEnhancer được dùng trước"""
+    assert classifier.classify("Mình muốn làm ở Hà Nội") == ("location", 1.0)
+
+
+def test_keywords_match_on_word_boundaries(classifier):
+    """'hp' (Hải Phòng) không được khớp bên trong từ khác"""
+    assert "location" not in classifier._match_keywords("php")
+
+
+def test_expected_slot_breaks_keyword_ties(classifier):
+    """Nhiều slot cùng khớp thì ưu tiên slot bot đang hỏi"""
+    slot, confidence = classifier.classify("remote lương 20 triệu", expected_slot="salary")
+    assert slot == "salary"
+    assert confidence == 1.0
+
+
+def test_embedding_similarity_above_threshold(classifier):
+    """Không có keyword thì dùng embedding similarity"""
+    slot, confidence = classifier.classify("Python")
+    assert slot == "skills"
+    assert confidence >= 0.8
+
+
+def test_low_confidence_returns_none(classifier):
+    """Dưới threshold trả về None để caller fallback sang LLM"""
+    slot, confidence = classifier.classify("hmm")
+    assert slot is None
+    assert confidence < 0.8
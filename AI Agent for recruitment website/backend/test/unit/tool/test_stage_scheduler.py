@@ -0,0 +1,59 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+from tool.stage_scheduler import StageScheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = StageScheduler(max_workers=4)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_independent_stages_run_concurrently(scheduler):
+    """Hai stage độc lập phải chạy chồng lên nhau"""
+    barrier = threading.Barrier(2, timeout=2)
+
+    def stage(value):
+        barrier.wait()  # Chỉ qua được nếu cả hai stage chạy cùng lúc
+        return value
+
+    with scheduler.run_pass() as stages:
+        stages.submit("route", stage, "chitchat")
+        stages.submit("keywords", stage, {"location": False})
+
+        assert stages.result("route") == "chitchat"
+        assert stages.result("keywords") == {"location": False}
+        assert set(stages.timings) == {"route", "keywords"}
+
+
+def test_unused_speculative_stage_is_cancelled():
+    """Stage speculative chưa chạy sẽ bị hủy khi đóng pass"""
+    scheduler = StageScheduler(max_workers=1)
+    release = threading.Event()
+    executed = []
+
+    with scheduler.run_pass() as stages:
+        stages.submit("route", release.wait, 2)
+        stages.submit("features", executed.append, "features", speculative=True)
+    release.set()
+    scheduler.shutdown(wait=True)
+
+    assert executed == []
+    assert scheduler.stats["cancelled_before_start"] == 1
+
+
+def test_consumed_speculative_stage_is_kept(scheduler):
+    """Stage speculative đã được dùng thì không bị hủy"""
+    with scheduler.run_pass() as stages:
+        stages.submit("features", lambda: {"title": "Python Developer"}, speculative=True)
+        assert stages.result("features") == {"title": "Python Developer"}
+
+    assert scheduler.stats == {"cancelled_before_start": 0, "discarded_running": 0}
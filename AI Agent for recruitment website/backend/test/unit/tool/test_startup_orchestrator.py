@@ -0,0 +1,101 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+import tool.startup_orchestrator as startup
+from setting import Settings
+from tool.startup_orchestrator import DONE, FAILED, StartupOrchestrator, register_default_tasks
+
+
+def test_independent_tasks_run_in_parallel():
+    """Các task độc lập chạy cùng lúc, task có depends_on chờ dependency xong"""
+    barrier = threading.Barrier(2, timeout=2)
+    order = []
+
+    orchestrator = StartupOrchestrator(retry_interval=0)
+    orchestrator.register("embedding_model", lambda: (barrier.wait(), order.append("embedding_model")))
+    orchestrator.register("ollama_warmup", lambda: barrier.wait())
+    orchestrator.register("route_index", lambda: order.append("route_index"), depends_on=["embedding_model"])
+
+    assert not orchestrator.is_ready()
+    assert orchestrator.start().wait(timeout=5)
+    assert order == ["embedding_model", "route_index"]
+
+    status = orchestrator.get_status()
+    assert status["ready"]
+    assert all(task["status"] == DONE and task["duration"] is not None for task in status["tasks"].values())
+
+
+def test_not_ready_until_critical_tasks_finish():
+    """Task không critical bị lỗi không chặn ready; task critical chưa xong thì chưa ready"""
+    release = threading.Event()
+
+    def mongo():
+        raise ConnectionError("no route to host")
+
+    orchestrator = StartupOrchestrator(retry_interval=0)
+    orchestrator.register("embedding_model", lambda: release.wait(5))
+    orchestrator.register("mongo", mongo, critical=False)
+    orchestrator.start()
+
+    assert not orchestrator.wait(timeout=0.1)
+    assert not orchestrator.get_status()["ready"]
+
+    release.set()
+    assert orchestrator.wait(timeout=5)
+    assert orchestrator.tasks["mongo"].status == FAILED
+    assert "no route to host" in orchestrator.tasks["mongo"].error
+
+
+def test_failed_critical_task_is_retried():
+    attempts = []
+
+    def ollama_warmup():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise RuntimeError("Ollama is starting")
+
+    orchestrator = StartupOrchestrator(retry_interval=0.01)
+    orchestrator.register("ollama_warmup", ollama_warmup)
+    orchestrator.register("route_index", lambda: None, depends_on=["ollama_warmup"])
+
+    assert orchestrator.start().wait(timeout=5)
+    assert orchestrator.tasks["ollama_warmup"].attempts == 3
+    assert orchestrator.tasks["route_index"].status == DONE
+
+
+def test_remote_tools_gate_readiness_on_mcp_pool(monkeypatch):
+    """Có MCP_SERVER_URL: không load model embedding trong process, ready khi kết nối được tool server"""
+    monkeypatch.setenv("MCP_SERVER_URL", "http://mcp-server:8000/mcp")
+    import llms.mcp_client
+    from tool.model_manager import model_manager
+
+    connects = []
+
+    class FakePool:
+        def list_tools(self):
+            connects.append(time.monotonic())
+            if len(connects) < 2:
+                raise ConnectionError("tool server is starting")
+            return ["route_query", "classify_slot"]
+
+    def loaded_in_process():
+        raise AssertionError("embedding model loaded although tools are remote")
+
+    monkeypatch.setattr(llms.mcp_client, "get_mcp_client_pool", lambda url: FakePool())
+    monkeypatch.setattr(model_manager, "get_embedding_model", loaded_in_process)
+    monkeypatch.setattr(startup, "warm_ollama_models", lambda settings: None)
+    monkeypatch.setattr(startup, "check_mongo", lambda settings: None)
+
+    settings = Settings(ENABLE_MODEL_PRELOAD=True)
+    orchestrator = StartupOrchestrator(retry_interval=0.01)
+    register_default_tasks(orchestrator, settings)
+
+    assert set(orchestrator.tasks) == {"mcp_pool", "ollama_warmup", "mongo"}
+    assert orchestrator.tasks["mcp_pool"].critical
+    assert orchestrator.start().wait(timeout=5)
+    assert orchestrator.tasks["mcp_pool"].attempts == 2
@@ -0,0 +1,141 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).parents[3]))
+
+from tool.stage_scheduler import StageScheduler
+from tool.tracing import (
+    InMemorySpanExporter,
+    JsonlSpanExporter,
+    OTLPHttpSpanExporter,
+    SPAN_KIND_SERVER,
+    Tracer,
+    current_trace_id,
+    set_tracer,
+    traced,
+)
+
+
+@pytest.fixture
+def exporter():
+    exporter = InMemorySpanExporter()
+    previous = set_tracer(Tracer(exporter, sample_rate=1.0, interval=60))
+    yield exporter
+    set_tracer(previous)
+
+
+def _by_name(spans):
+    return {span.name: span for span in spans}
+
+
+def test_nested_spans_share_trace_across_stage_threads(exporter):
+    """Span con (kể cả stage chạy trên thread khác) thuộc cùng trace, trỏ về span cha"""
+    from tool.tracing import get_tracer
+
+    @traced("tool.intent_classification")
+    def classify(message):
+        return "chitchat"
+
+    tracer = get_tracer()
+    scheduler = StageScheduler(max_workers=2)
+    with tracer.span("POST /api/chat", kind=SPAN_KIND_SERVER) as root:
+        trace_id = current_trace_id()
+        with scheduler.run_pass() as stages:
+            stages.submit("route", classify, "xin chào")
+            assert stages.result("route") == "chitchat"
+    scheduler.shutdown(wait=True)
+    assert current_trace_id() is None
+
+    tracer.flush()
+    spans = _by_name(exporter.spans)
+    assert set(spans) == {"POST /api/chat", "stage.route", "tool.intent_classification"}
+    assert {span.trace_id for span in spans.values()} == {trace_id}
+    assert spans["stage.route"].parent_id == root.span_id
+    assert spans["tool.intent_classification"].parent_id == spans["stage.route"].span_id
+    assert spans["POST /api/chat"].duration >= spans["stage.route"].duration
+
+
+def test_unsampled_trace_is_not_exported_but_has_trace_id():
+    exporter = InMemorySpanExporter()
+    tracer = Tracer(exporter, sample_rate=0.0, interval=60)
+
+    with tracer.span("POST /api/chat") as root:
+        with tracer.span("ollama /api/chat", model="qwen3") as child:
+            pass
+    tracer.flush()
+
+    assert root.trace_id and child.trace_id == root.trace_id
+    assert not child.attributes
+    assert exporter.spans == []
+    assert tracer.get_stats()["traces"] == 1
+
+
+def test_traceparent_from_upstream_is_continued():
+    exporter = InMemorySpanExporter()
+    tracer = Tracer(exporter, sample_rate=0.0, interval=60)
+    upstream = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+    span = tracer.start_span("GET /ready", traceparent=upstream)
+    tracer.end_span(span)
+    tracer.flush()
+
+    assert span.trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert span.parent_id == "00f067aa0ba902b7"
+    assert exporter.spans == [span]  # Upstream đã sample thì luôn ghi lại
+
+
+def test_error_is_recorded_on_span(exporter):
+    from tool.tracing import get_tracer
+
+    @traced("mongo.find")
+    def find():
+        raise TimeoutError("server selection timeout")
+
+    with pytest.raises(TimeoutError):
+        find()
+    get_tracer().flush()
+
+    span = exporter.spans[0]
+    assert span.status == "error"
+    assert "server selection timeout" in span.error
+
+
+def test_jsonl_and_otlp_exporters(tmp_path):
+    tracer = Tracer(InMemorySpanExporter(), interval=60)
+    with tracer.span("POST /api/chat", kind=SPAN_KIND_SERVER, **{"session.id": "s1"}):
+        with tracer.span("ollama /api/chat", **{"llm.completion_tokens": 42}):
+            pass
+    tracer.flush()
+    spans = tracer.exporter.spans
+
+    path = tmp_path / "traces" / "spans.jsonl"
+    JsonlSpanExporter(str(path)).export(spans)
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [line["name"] for line in lines] == ["ollama /api/chat", "POST /api/chat"]
+    assert lines[0]["attributes"]["llm.completion_tokens"] == 42
+
+    payload = OTLPHttpSpanExporter("http://collector:4318").to_payload(spans)
+    otlp_spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert otlp_spans[0]["parentSpanId"] == otlp_spans[1]["spanId"]
+    assert otlp_spans[1]["kind"] == 2
+    assert otlp_spans[0]["attributes"] == [{"key": "llm.completion_tokens", "value": {"intValue": "42"}}]
+
+
+def test_jsonl_exporter_rotates_by_size(tmp_path):
+    tracer = Tracer(InMemorySpanExporter(), interval=60)
+    with tracer.span("POST /api/chat", kind=SPAN_KIND_SERVER):
+        pass
+    tracer.flush()
+
+    path = tmp_path / "spans.jsonl"
+    exporter = JsonlSpanExporter(str(path), max_bytes=1)
+    for _ in range(3):
+        exporter.export(tracer.exporter.spans)
+
+    # Mỗi batch vượt max_bytes: file hiện tại và bản .1 đều chỉ có một span
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 1
+    assert len((tmp_path / "spans.jsonl.1").read_text(encoding="utf-8").splitlines()) == 1
@@ -0,0 +1,3 @@
+from .pipeline import CVExtractionPipeline, CVRecord, BatchStats, iter_cv_records, load_checkpoint
+
+__all__ = ["CVExtractionPipeline", "CVRecord", "BatchStats", "iter_cv_records", "load_checkpoint"]
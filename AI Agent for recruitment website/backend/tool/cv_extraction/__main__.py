@@ -0,0 +1,49 @@
+"""
+CLI trích xuất đặc trưng CV hàng loạt
+
+Ví dụ:
+    python -m tool.cv_extraction data/cvs/ -o output/cv_features.jsonl --workers 8
+    python -m tool.cv_extraction cvs.jsonl -o output/cv_features.jsonl --no-resume
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add backend to path
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from log_config import setup_logging
+from tool.cv_extraction.pipeline import CVExtractionPipeline, iter_cv_records
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk CV feature extraction")
+    parser.add_argument("source", help="Thư mục chứa CV (.txt/.md) hoặc file JSONL")
+    parser.add_argument("-o", "--output", required=True, help="File JSONL kết quả (đồng thời là checkpoint)")
+    parser.add_argument("--workers", type=int, default=None, help="Số CV xử lý song song")
+    parser.add_argument("--model", default=None, help="Model Ollama (mặc định: model tier của task extract)")
+    parser.add_argument("--max-retries", type=int, default=None, help="Số lần retry cho mỗi CV")
+    parser.add_argument("--limit", type=int, default=None, help="Chỉ xử lý tối đa N CV mới")
+    parser.add_argument("--no-resume", action="store_true", help="Ghi đè output thay vì tiếp tục từ checkpoint")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    pipeline = CVExtractionPipeline(
+        model_name=args.model,
+        max_workers=args.workers,
+        max_retries=args.max_retries
+    )
+    summary = pipeline.run(
+        iter_cv_records(args.source),
+        output_path=args.output,
+        resume=not args.no_resume,
+        limit=args.limit
+    )
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
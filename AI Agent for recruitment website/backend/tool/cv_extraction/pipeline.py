@@ -0,0 +1,286 @@
+"""
+Pipeline trích xuất đặc trưng CV hàng loạt:
+- đọc CV từ thư mục (.txt/.md) hoặc file JSONL
+- gọi LLM song song có giới hạn (priority BATCH để không chặn request của user)
+- ghi kết quả JSONL ngay khi có, file output cũng là checkpoint để resume
+"""
+import json
+import os
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from loguru import logger
+
+from llms.admission import AdmissionRejected, Priority, request_priority
+from prompt.promt_config import PromptConfig
+from setting import Settings
+from tool.extract_feature_question_about_jd import repair_json
+
+CV_FILE_EXTENSIONS = (".txt", ".md")
+CV_TEXT_KEYS = ("text", "cv_text", "content", "cv")
+CV_ID_KEYS = ("id", "cv_id", "_id")
+
+# JSON schema theo prompt "extract_features_cv", dùng cho structured output của Ollama
+CV_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "skills": {"type": "array", "items": {"type": "string"}},
+        "experience_years": {"type": "integer"},
+        "experience_detail": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"domain": {"type": "string"}, "years": {"type": "integer"}},
+                "required": ["domain", "years"]
+            }
+        },
+        "education_level": {"type": "string", "enum": ["Bachelor", "Master", "PhD", "College", "Other"]},
+        "location": {"type": "string"},
+        "ielts": {"type": ["number", "null"]},
+        "certs": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["skills", "experience_years", "experience_detail", "education_level", "location", "ielts", "certs"]
+}
+
+
+@dataclass
+class CVRecord:
+    """Một CV cần trích xuất"""
+    id: str
+    text: str
+
+
+@dataclass
+class BatchStats:
+    """Thống kê throughput và lỗi của một lần chạy"""
+    total: int = 0
+    skipped: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    retries: int = 0
+    started_at: float = field(default_factory=time.time)
+    latencies: List[float] = field(default_factory=list)
+    errors: Counter = field(default_factory=Counter)
+
+    @property
+    def processed(self) -> int:
+        return self.succeeded + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self.started_at
+
+    def as_dict(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        elapsed = self.elapsed
+        return {
+            "total": self.total,
+            "skipped": self.skipped,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retries": self.retries,
+            "elapsed_seconds": round(elapsed, 2),
+            "throughput_per_minute": round(self.processed / elapsed * 60, 2) if elapsed > 0 else 0.0,
+            "latency_p50": round(statistics.median(latencies), 3) if latencies else 0.0,
+            "latency_p95": round(latencies[int(0.95 * (len(latencies) - 1))], 3) if latencies else 0.0,
+            "errors": dict(self.errors),
+        }
+
+
+def iter_cv_records(source: str) -> Iterator[CVRecord]:
+    """
+    Đọc CV từ thư mục (mỗi file .txt/.md là một CV, id = đường dẫn tương đối)
+    hoặc file JSONL (mỗi dòng có text/cv_text/content và id/cv_id nếu có)
+    """
+    path = Path(source)
+    if path.is_dir():
+        for file_path in sorted(path.rglob("*")):
+            if file_path.is_file() and file_path.suffix.lower() in CV_FILE_EXTENSIONS:
+                text = file_path.read_text(encoding="utf-8", errors="ignore")
+                yield CVRecord(id=file_path.relative_to(path).as_posix(), text=text)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"⚠️ Skip invalid JSON at line {line_number}")
+                continue
+            text = next((item[key] for key in CV_TEXT_KEYS if item.get(key)), None)
+            if not text:
+                logger.warning(f"⚠️ Skip line {line_number}: no CV text")
+                continue
+            cv_id = next((str(item[key]) for key in CV_ID_KEYS if item.get(key) is not None), str(line_number))
+            yield CVRecord(id=cv_id, text=text)
+
+
+def load_checkpoint(output_path: str) -> Set[str]:
+    """
+    Id các CV đã trích xuất thành công trong output trước đó.
+    Dòng cuối bị ghi dở (crash giữa chừng) sẽ được bỏ qua.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if item.get("status") == "ok":
+                done.add(item["id"])
+    return done
+
+
+class CVExtractionPipeline:
+    """Trích xuất đặc trưng cho hàng nghìn CV với số worker giới hạn"""
+
+    def __init__(
+        self,
+        llm=None,
+        model_name: str = None,
+        max_workers: int = None,
+        max_retries: int = None,
+        progress_every: int = 50
+    ):
+        self.settings = Settings.load_settings()
+        if llm is None:
+            from tool.model_manager import model_manager
+            llm = model_manager.get_llm_model(model_name=model_name, task="extract")
+        self.llm = llm
+        self.max_workers = max_workers or self.settings.CV_EXTRACTION_WORKERS
+        self.max_retries = self.settings.CV_EXTRACTION_MAX_RETRIES if max_retries is None else max_retries
+        self.progress_every = progress_every
+        self.prompt_config = PromptConfig()
+        self.stats = BatchStats()
+        self._stats_lock = threading.Lock()
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        """Trích xuất đặc trưng của một CV (structured output + repair parser dự phòng)"""
+        prompt = self.prompt_config.get_prompt("extract_features_cv", user_input=text)
+        response = self.llm.chat(
+            [{"role": "user", "content": prompt}],
+            think=False,
+            format=CV_SCHEMA,
+            options={"temperature": 0, "num_predict": self.settings.CV_EXTRACTION_NUM_PREDICT}
+        )
+        features = json.loads(repair_json(response))
+        if not features:
+            raise ValueError("empty extraction result")
+        return {key: value for key, value in features.items() if key in CV_SCHEMA["properties"]}
+
+    def _process(self, record: CVRecord) -> Dict[str, Any]:
+        """Chạy trong worker thread: retry lỗi tạm thời, trả về một dòng output"""
+        start_time = time.time()
+        attempt = 0
+        with request_priority(Priority.BATCH):
+            while True:
+                try:
+                    features = self.extract(record.text)
+                    return {"id": record.id, "status": "ok", "features": features,
+                            "latency": round(time.time() - start_time, 3)}
+                except AdmissionRejected as e:
+                    # Hàng đợi đầy vì traffic của user: chờ theo retry_after rồi thử lại
+                    error = e
+                    delay = e.retry_after or 1.0
+                except Exception as e:
+                    error = e
+                    delay = min(2 ** attempt, 30)
+
+                attempt += 1
+                if attempt > self.max_retries:
+                    return {"id": record.id, "status": "error", "error_type": type(error).__name__,
+                            "error": str(error), "latency": round(time.time() - start_time, 3)}
+                with self._stats_lock:
+                    self.stats.retries += 1
+                time.sleep(delay)
+
+    def run(
+        self,
+        records: Iterator[CVRecord],
+        output_path: str,
+        resume: bool = True,
+        limit: Optional[int] = None,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Trích xuất tất cả CV, ghi mỗi kết quả thành một dòng JSONL ngay khi xong.
+        Số CV đang xử lý tối đa là 2 * max_workers để bộ nhớ không tăng theo số CV.
+        """
+        self.stats = BatchStats()
+        done = load_checkpoint(output_path) if resume else set()
+        if done:
+            logger.info(f"♻️ Resuming: {len(done)} CVs already extracted")
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        mode = "a" if resume else "w"
+        # Dòng cuối có thể bị ghi dở khi crash: xuống dòng trước khi ghi tiếp
+        if resume and os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            with open(output_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b"\n"
+        else:
+            needs_newline = False
+
+        max_in_flight = self.max_workers * 2
+        submitted = 0
+        with open(output_path, mode, encoding="utf-8") as output, \
+                ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="cv-extract") as executor:
+            if needs_newline:
+                output.write("\n")
+
+            in_flight = set()
+            for record in records:
+                if record.id in done:
+                    self.stats.total += 1
+                    self.stats.skipped += 1
+                    continue
+                if limit is not None and submitted >= limit:
+                    break
+                self.stats.total += 1
+
+                in_flight.add(executor.submit(self._process, record))
+                submitted += 1
+                if len(in_flight) >= max_in_flight:
+                    completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    self._write_results(completed, output, on_result)
+
+            while in_flight:
+                completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                self._write_results(completed, output, on_result)
+
+        summary = self.stats.as_dict()
+        logger.info(f"✅ CV extraction finished: {json.dumps(summary, ensure_ascii=False)}")
+        return summary
+
+    def _write_results(self, futures, output, on_result):
+        for future in futures:
+            result = future.result()
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+
+            if result["status"] == "ok":
+                self.stats.succeeded += 1
+            else:
+                self.stats.failed += 1
+                self.stats.errors[result["error_type"]] += 1
+            self.stats.latencies.append(result["latency"])
+
+            if on_result:
+                on_result(result)
+            if self.stats.processed % self.progress_every == 0:
+                summary = self.stats.as_dict()
+                logger.info(f"📊 {self.stats.processed} CVs processed "
+                            f"({summary['throughput_per_minute']}/min, {self.stats.failed} failed)")
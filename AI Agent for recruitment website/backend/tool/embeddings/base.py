@@ -20,6 +20,10 @@ class BaseEmbedding():
     def encode(self, text: str):
         raise NotImplementedError("The encode method must be implemented by subclasses")
 
+    def encode_batch(self, texts: list, batch_size: int = 32):
+        """Encode nhiều text một lần (mặc định encode lần lượt từng text)"""
+        return [self.encode(text) for text in texts]
+
 
 class APIBaseEmbedding(BaseEmbedding):
     baseUrl: str
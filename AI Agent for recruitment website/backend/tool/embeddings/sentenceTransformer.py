@@ -1,12 +1,25 @@
 from pydantic.v1 import BaseModel, Field, validator
 from .base import BaseEmbedding, EmbeddingConfig
 from sentence_transformers import SentenceTransformer
+from tool.single_flight import get_single_flight
 
 class SentenceTransformerEmbedding(BaseEmbedding):
     def __init__(self, config: EmbeddingConfig):
         super().__init__(config.name)
         self.config = config
         self.embedding_model = SentenceTransformer(self.config.name, trust_remote_code=True)
+        self.single_flight = get_single_flight("embedding")
 
     def encode(self, text: str):
-        return self.embedding_model.encode(text)
+        # Cùng một query đang được encode (nhiều session gửi cùng câu) thì chờ kết quả chung
+        if isinstance(text, str):
+            key = (self.name, "text", text)
+        elif isinstance(text, (list, tuple)) and len(text) == 1 and isinstance(text[0], str):
+            key = (self.name, "list", text[0])
+        else:
+            key = None
+        embedding, _ = self.single_flight.do(key, lambda: self.embedding_model.encode(text))
+        return embedding
+
+    def encode_batch(self, texts: list, batch_size: int = 32):
+        return self.embedding_model.encode(texts, batch_size=batch_size)
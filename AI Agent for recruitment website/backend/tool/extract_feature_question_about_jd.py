@@ -3,69 +3,141 @@ import os
 import json
 import re
 
+from loguru import logger
 
-from llms.ollama_llms import OllamaLLMs
 from prompt.promt_config import PromptConfig
+from tool.model_manager import model_manager
+from setting import Settings
+
+
+THINK_PATTERN = re.compile(r'<think>.*?</think>', re.DOTALL)
+CODE_FENCE_PATTERN = re.compile(r'```(?:json)?')
+TRAILING_COMMA_PATTERN = re.compile(r',\s*([}\]])')
+
+
+def repair_json(response: str) -> str:
+    """
+    Repair parser cho JSON do LLM sinh ra (dùng chung cho các pipeline trích xuất):
+    bỏ <think>, code fence, lấy object đầu tiên theo cặp ngoặc cân bằng,
+    đóng các ngoặc/chuỗi bị cắt bởi num_predict và bỏ dấu phẩy thừa.
+    """
+    cleaned = THINK_PATTERN.sub('', response)
+    if '</think>' in cleaned:
+        cleaned = cleaned.split('</think>')[-1]
+    cleaned = CODE_FENCE_PATTERN.sub('', cleaned).strip()
+
+    start = cleaned.find('{')
+    if start == -1:
+        return '{}'
+
+    # Quét tới khi các ngoặc cân bằng, bỏ qua ký tự nằm trong chuỗi
+    stack = []
+    in_string = False
+    escaped = False
+    end = len(cleaned)
+    for i in range(start, len(cleaned)):
+        char = cleaned[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]':
+            if stack:
+                stack.pop()
+            if not stack:
+                end = i + 1
+                break
+
+    candidate = cleaned[start:end]
+    # Output bị cắt giữa chừng: đóng chuỗi và các ngoặc còn mở
+    if stack:
+        if in_string:
+            candidate += '"'
+        candidate = re.sub(r'(,\s*|(?<=\{)\s*)"[^"]*"\s*:?\s*$', '', candidate)
+        candidate += ''.join(reversed(stack))
+
+    return TRAILING_COMMA_PATTERN.sub(r'\1', candidate)
 
 
 class ExtractFeatureQuestion:
-    def __init__(self, model_name: str, validate_response: list = ["title", "skills", "company", "location", "experience", "description"]):
+    def __init__(self, model_name: str = None, validate_response: list = ["title", "skills", "company", "location", "experience", "description"]):
         self.valid_fields = validate_response
-        default_url = "http://host.docker.internal:11434" if os.getenv("DOCKER_ENV") == "true" else "http://localhost:11434"
-        ollama_url = os.getenv("OLLAMA_URL", default_url)
-        model_name = os.getenv("OLLAMA_MODEL", "hf.co/Cactus-Compute/Qwen3-1.7B-Instruct-GGUF:Q4_K_M")
-        self.llm = OllamaLLMs(base_url=ollama_url, model_name=model_name)
+        # model_name = None thì dùng model tier của task "extract" (model nhỏ, temperature 0)
+        self.llm = model_manager.get_llm_model(model_name=model_name, task="extract")
+        self.settings = Settings.load_settings()
+        self.schema = self._build_schema()
 
 
     def extract(self, query: str, prompt_type: str) -> str:
         try:
             response = self._call_llm(query, prompt_type)
-            cleaned_response = self._clear_llm_response(response)
-            response_dict = json.loads(cleaned_response)
-            validated_dict = self._validate_query_fields(response_dict)
-            print(f"📝 User input: {query}")
-            print(f"🔍 Extracted query: {validated_dict}")
-            return validated_dict
+            return self._parse_response(query, response)
         except Exception as e:
-            print(f"Error extracting features: {e}")
+            logger.warning(f"Error extracting features: {e}")
             return {}
 
-    def _call_llm(self, query: str, prompt_type: str) -> str:
+    async def aextract(self, query: str, prompt_type: str) -> dict:
+        """extract() bản async (LLM call qua ollama.AsyncClient)"""
+        try:
+            response = await self.llm.achat(**self._llm_request(query, prompt_type))
+            return self._parse_response(query, response)
+        except Exception as e:
+            logger.warning(f"Error extracting features: {e}")
+            return {}
+
+    def _parse_response(self, query: str, response: str) -> dict:
+        cleaned_response = self._clear_llm_response(response)
+        response_dict = json.loads(cleaned_response)
+        validated_dict = self._validate_query_fields(response_dict)
+        logger.debug("📝 User input: {} | 🔍 Extracted query: {}", query, validated_dict)
+        return validated_dict
+
+    def _build_schema(self) -> dict:
+        """
+        JSON schema từ các field hợp lệ, truyền vào tham số `format` của Ollama
+        để model chỉ sinh ra JSON đúng cấu trúc (không prose, không <think>)
+        """
+        return {
+            "type": "object",
+            "properties": {field: {"type": "string"} for field in self.valid_fields},
+            "additionalProperties": False
+        }
+
+    def _llm_request(self, query: str, prompt_type: str) -> dict:
+        """Tham số của LLM call (dùng chung cho bản sync và async)"""
         promptConfig = PromptConfig()
         prompt = promptConfig.get_prompt(prompt_name=prompt_type, user_input=query)
         messages = [
             {"role": "user", "content": prompt}
         ]
-        response = self.llm.chat(messages)
+        return {
+            "messages": messages,
+            "format": self.schema,
+            "options": {
+                "temperature": 0,
+                "num_predict": self.settings.EXTRACT_NUM_PREDICT,
+                "stop": self.settings.EXTRACT_STOP
+            }
+        }
+
+    def _call_llm(self, query: str, prompt_type: str) -> str:
+        response = self.llm.chat(**self._llm_request(query, prompt_type))
         return response
     
     def _clear_llm_response(self, response: str) -> str:
         """
         Clear the LLM response to be a valid JSON object.
+        Dự phòng khi structured output không được hỗ trợ (xem repair_json).
         """
-        # Tìm JSON trong response
-        json_pattern = r'\{[^{}]*\}'
-        matches = re.findall(json_pattern, response)
-        
-        if matches:
-            return matches[0]
-        
-        # Nếu không tìm thấy JSON pattern, thử clean up
-        cleaned = response.strip()
-        if cleaned.startswith('```json'):
-            cleaned = cleaned[7:]
-        if cleaned.endswith('```'):
-            cleaned = cleaned[:-3]
-        if cleaned.startswith('```'):
-            cleaned = cleaned[3:]
-            
-        cleaned = cleaned.strip()
-        
-        # Nếu vẫn không có dấu ngoặc, trả về empty dict
-        if not cleaned.startswith('{'):
-            return '{}'
-            
-        return cleaned
+        return repair_json(response)
     
     def _validate_query_fields(self, query_dict: dict) -> dict:
         """
@@ -0,0 +1,4 @@
+from .bm25 import BM25Index, fold_diacritics, tokenize
+from .index import HybridJobIndex, reciprocal_rank_fusion
+
+__all__ = ["BM25Index", "HybridJobIndex", "fold_diacritics", "tokenize", "reciprocal_rank_fusion"]
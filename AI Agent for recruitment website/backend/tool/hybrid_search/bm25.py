@@ -0,0 +1,153 @@
+"""
+BM25 inverted index trong process cho tiếng Việt:
+- token được bỏ dấu (đ -> d) nên "Hà Nội", "ha noi", "HÀ NỘI" là một
+- thêm bigram âm tiết ("ha_noi") vì từ tiếng Việt thường gồm nhiều âm tiết
+- postings lưu bằng array.array (doc id int32 + tf uint16) thay vì list/dict Python
+"""
+import re
+import unicodedata
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*")
+
+
+def fold_diacritics(text: str) -> str:
+    """Chữ thường, bỏ dấu tiếng Việt (đ -> d)"""
+    text = text.lower().replace("đ", "d")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+
+
+def tokenize(text: str, bigrams: bool = True) -> List[str]:
+    """Tách token đã bỏ dấu, kèm bigram của các token liền nhau"""
+    if not text:
+        return []
+    tokens = TOKEN_PATTERN.findall(fold_diacritics(text))
+    if bigrams and len(tokens) > 1:
+        tokens = tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+    return tokens
+
+
+class BM25Index:
+    """
+    Inverted index BM25 hỗ trợ thêm/xóa tăng dần.
+    Doc id nội bộ là số nguyên tăng dần; xóa chỉ đánh dấu (tombstone) và
+    compact() dựng lại postings khi số doc đã xóa đủ lớn.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_ids: Dict[str, int] = {}
+        self.postings_docs: List[array] = []  # term id -> array('i') doc ids
+        self.postings_tfs: List[array] = []  # term id -> array('H') term frequency
+        self.doc_lengths = array("I")
+        self.deleted = bytearray()
+        self.live_docs = 0
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, text: str) -> int:
+        """Thêm một document, trả về doc id nội bộ"""
+        doc_id = len(self.doc_lengths)
+        tokens = tokenize(text)
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+
+        for token, tf in counts.items():
+            term_id = self.term_ids.get(token)
+            if term_id is None:
+                term_id = len(self.postings_docs)
+                self.term_ids[token] = term_id
+                self.postings_docs.append(array("i"))
+                self.postings_tfs.append(array("H"))
+            self.postings_docs[term_id].append(doc_id)
+            self.postings_tfs[term_id].append(min(tf, 65535))
+
+        self.doc_lengths.append(len(tokens))
+        self.deleted.append(0)
+        self.live_docs += 1
+        self.total_length += len(tokens)
+        return doc_id
+
+    def delete(self, doc_id: int):
+        if self.deleted[doc_id]:
+            return
+        self.deleted[doc_id] = 1
+        self.live_docs -= 1
+        self.total_length -= self.doc_lengths[doc_id]
+
+    @property
+    def deleted_ratio(self) -> float:
+        return 1 - self.live_docs / len(self.doc_lengths) if len(self.doc_lengths) else 0.0
+
+    def scores(self, query: str) -> np.ndarray:
+        """Điểm BM25 của query cho mọi doc (doc đã xóa = 0), tính vector hóa theo từng term"""
+        n_docs = len(self.doc_lengths)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        if not n_docs or not self.live_docs:
+            return scores
+
+        doc_lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32).astype(np.float32)
+        deleted = np.frombuffer(bytes(self.deleted), dtype=np.uint8).astype(bool)
+        avgdl = self.total_length / self.live_docs if self.total_length else 1.0
+        length_norm = self.k1 * (1 - self.b + self.b * doc_lengths / avgdl)
+
+        for token in set(tokenize(query)):
+            term_id = self.term_ids.get(token)
+            if term_id is None:
+                continue
+            docs = np.frombuffer(self.postings_docs[term_id], dtype=np.int32)
+            tfs = np.frombuffer(self.postings_tfs[term_id], dtype=np.uint16).astype(np.float32)
+            live = ~deleted[docs]
+            docs, tfs = docs[live], tfs[live]
+            df = len(docs)
+            if not df:
+                continue
+            idf = np.log(1 + (self.live_docs - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + length_norm[docs])
+
+        return scores
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Postings dạng CSR (offsets + docs + tfs) để lưu bằng np.savez"""
+        lengths = np.array([len(p) for p in self.postings_docs], dtype=np.int64)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return {
+            "bm25_offsets": offsets,
+            "bm25_docs": np.concatenate([np.frombuffer(p, dtype=np.int32) for p in self.postings_docs])
+            if self.postings_docs else np.zeros(0, dtype=np.int32),
+            "bm25_tfs": np.concatenate([np.frombuffer(p, dtype=np.uint16) for p in self.postings_tfs])
+            if self.postings_tfs else np.zeros(0, dtype=np.uint16),
+            "bm25_doc_lengths": np.frombuffer(self.doc_lengths, dtype=np.uint32).copy(),
+            "bm25_deleted": np.frombuffer(bytes(self.deleted), dtype=np.uint8).copy(),
+        }
+
+    @classmethod
+    def from_arrays(cls, terms: Iterable[str], arrays: Dict[str, np.ndarray], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        index = cls(k1=k1, b=b)
+        offsets, docs, tfs = arrays["bm25_offsets"], arrays["bm25_docs"], arrays["bm25_tfs"]
+        for term_id, term in enumerate(terms):
+            index.term_ids[term] = term_id
+            start, end = offsets[term_id], offsets[term_id + 1]
+            index.postings_docs.append(array("i", docs[start:end].astype(np.int32).tobytes()))
+            index.postings_tfs.append(array("H", tfs[start:end].astype(np.uint16).tobytes()))
+        index.doc_lengths = array("I", arrays["bm25_doc_lengths"].astype(np.uint32).tobytes())
+        index.deleted = bytearray(arrays["bm25_deleted"].astype(np.uint8).tobytes())
+        live = ~arrays["bm25_deleted"].astype(bool)
+        index.live_docs = int(live.sum())
+        index.total_length = int(arrays["bm25_doc_lengths"][live].sum())
+        return index
+
+    def terms(self) -> List[str]:
+        terms: List[Optional[str]] = [None] * len(self.term_ids)
+        for term, term_id in self.term_ids.items():
+            terms[term_id] = term
+        return terms
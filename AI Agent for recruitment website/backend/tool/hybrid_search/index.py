@@ -0,0 +1,276 @@
+"""
+Hybrid retrieval cho job catalog: BM25 (từ khóa, bỏ dấu) + embedding (ngữ nghĩa),
+gộp bằng reciprocal rank fusion. Chạy trong process, thêm/xóa tăng dần và lưu xuống disk.
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from tool.hybrid_search.bm25 import BM25Index, fold_diacritics
+from tool.job_matching.matcher import item_vectors, job_text, top_k_indices
+
+
+# Field không lưu trong index (vector đã nằm trong ma trận, còn lại không cần cho kết quả tìm kiếm)
+EXCLUDED_FIELDS = ("embedding", "_id", "content_hash", "created_at", "updated_at")
+
+
+def job_document_text(job: Dict[str, Any]) -> str:
+    """Text được index BM25 (title lặp lại để tăng trọng số)"""
+    skills = job.get("skills") or []
+    if isinstance(skills, str):
+        skills = [skills]
+    parts = [job.get("title", ""), job.get("title", ""), ", ".join(skills),
+             job.get("company", ""), job.get("location", ""), job.get("description", "")]
+    return " ".join(str(p) for p in parts if p)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[np.ndarray], n_docs: int, k: int = 60) -> np.ndarray:
+    """RRF: score(d) = sum 1 / (k + rank(d)) trên các danh sách xếp hạng (rank bắt đầu từ 1)"""
+    fused = np.zeros(n_docs, dtype=np.float32)
+    for ranking in rankings:
+        if len(ranking):
+            fused[ranking] += 1.0 / (k + np.arange(1, len(ranking) + 1, dtype=np.float32))
+    return fused
+
+
+class HybridJobIndex:
+    """
+    Index job hỗ trợ add/delete tăng dần:
+    - BM25Index cho từ khóa
+    - ma trận embedding float32 đã chuẩn hóa (tăng capacity gấp đôi khi đầy)
+    - mảng live và code địa điểm (đã bỏ dấu) để lọc bằng mask NumPy
+    - doc bị xóa chỉ đánh dấu, compact() khi tỉ lệ xóa vượt ngưỡng
+    """
+
+    def __init__(self, embedding=None, rrf_k: int = 60, candidates: int = 100,
+                 compact_ratio: float = 0.3, batch_size: int = 32):
+        self._embedding = embedding
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        self.compact_ratio = compact_ratio
+        self.batch_size = batch_size
+
+        self._lock = threading.RLock()
+        self.bm25 = BM25Index()
+        self.vectors: Optional[np.ndarray] = None  # (capacity, dim)
+        self.live: Optional[np.ndarray] = None  # (capacity,) False = đã xóa hoặc chưa dùng
+        self.location_codes: Optional[np.ndarray] = None  # (capacity,) code địa điểm, -1 = không có
+        self.location_vocab: Dict[str, int] = {}  # địa điểm đã bỏ dấu -> code
+        self.keys: List[Optional[str]] = []  # doc id nội bộ -> job key (None = đã xóa)
+        self.docs: List[Optional[Dict[str, Any]]] = []
+        self.key_to_doc: Dict[str, int] = {}
+        self.disk_mtime: Optional[float] = None  # mtime của docs.json ở lần save/load gần nhất
+
+    @property
+    def embedding(self):
+        if self._embedding is None:
+            from tool.model_manager import model_manager
+            self._embedding = model_manager.get_embedding_model()
+        return self._embedding
+
+    def __len__(self) -> int:
+        return len(self.key_to_doc)
+
+    @staticmethod
+    def _job_key(job: Dict[str, Any], position: int) -> str:
+        return str(job.get("job_key") or job.get("_id") or job.get("url") or f"{job.get('title')}|{job.get('company')}|{position}")
+
+    def _encode(self, jobs: Sequence[Dict[str, Any]]) -> np.ndarray:
+        vectors = item_vectors(jobs, job_text, lambda texts: np.asarray(
+            self.embedding.encode_batch(texts, batch_size=self.batch_size), dtype=np.float32
+        ))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _ensure_capacity(self, size: int, dim: int):
+        if self.vectors is None:
+            capacity = max(size, 64)
+            self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+            self.live = np.zeros(capacity, dtype=bool)
+            self.location_codes = np.full(capacity, -1, dtype=np.int32)
+        elif size > self.vectors.shape[0]:
+            old, capacity = self.vectors.shape[0], max(size, self.vectors.shape[0] * 2)
+            grown = np.zeros((capacity, dim), dtype=np.float32)
+            grown[:old] = self.vectors
+            self.vectors = grown
+            self.live = np.concatenate([self.live, np.zeros(capacity - old, dtype=bool)])
+            self.location_codes = np.concatenate([self.location_codes, np.full(capacity - old, -1, dtype=np.int32)])
+
+    def _set_doc(self, doc_id: int, job: Dict[str, Any]):
+        """Đánh dấu doc còn sống và gán code địa điểm (địa điểm mới được thêm vào vocab)"""
+        location = job.get("location")
+        self.live[doc_id] = True
+        self.location_codes[doc_id] = (
+            self.location_vocab.setdefault(fold_diacritics(str(location)), len(self.location_vocab))
+            if location else -1
+        )
+
+    def add(self, jobs: Sequence[Dict[str, Any]]):
+        """Thêm (hoặc cập nhật nếu trùng key) các job"""
+        if not jobs:
+            return
+        vectors = self._encode(jobs)
+        with self._lock:
+            self._ensure_capacity(len(self.keys) + len(jobs), vectors.shape[1])
+            for job, vector in zip(jobs, vectors):
+                key = self._job_key(job, len(self.keys))
+                if key in self.key_to_doc:
+                    self._delete_doc(self.key_to_doc[key])
+                doc_id = self.bm25.add(job_document_text(job))
+                self.vectors[doc_id] = vector
+                self._set_doc(doc_id, job)
+                self.keys.append(key)
+                self.docs.append({k: v for k, v in job.items() if k not in EXCLUDED_FIELDS})
+                self.key_to_doc[key] = doc_id
+
+    def _delete_doc(self, doc_id: int):
+        key = self.keys[doc_id]
+        self.bm25.delete(doc_id)
+        self.vectors[doc_id] = 0.0
+        self.live[doc_id] = False
+        self.keys[doc_id] = None
+        self.docs[doc_id] = None
+        self.key_to_doc.pop(key, None)
+
+    def delete(self, keys: Sequence[str]) -> int:
+        """Xóa các job theo key, trả về số job đã xóa"""
+        removed = 0
+        with self._lock:
+            for key in keys:
+                doc_id = self.key_to_doc.get(str(key))
+                if doc_id is not None:
+                    self._delete_doc(doc_id)
+                    removed += 1
+            if self.bm25.deleted_ratio > self.compact_ratio:
+                self.compact()
+        return removed
+
+    def compact(self):
+        """Dựng lại index chỉ với các doc còn sống (doc id được đánh lại)"""
+        with self._lock:
+            live = [doc_id for doc_id, key in enumerate(self.keys) if key is not None]
+            jobs = [dict(self.docs[doc_id], embedding=self.vectors[doc_id]) for doc_id in live]
+            keys = [self.keys[doc_id] for doc_id in live]
+            self.bm25 = BM25Index(k1=self.bm25.k1, b=self.bm25.b)
+            dim = self.vectors.shape[1] if self.vectors is not None else 0
+            self.vectors = self.live = self.location_codes = None
+            self.location_vocab = {}
+            self.keys, self.docs, self.key_to_doc = [], [], {}
+            if jobs:
+                self._ensure_capacity(len(jobs), dim)
+                for job, key in zip(jobs, keys):
+                    doc_id = self.bm25.add(job_document_text(job))
+                    self.vectors[doc_id] = job.pop("embedding")
+                    self._set_doc(doc_id, job)
+                    self.keys.append(key)
+                    self.docs.append(job)
+                    self.key_to_doc[key] = doc_id
+
+    def search(self, query: str, top_k: int = 5, location: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Tìm job theo query: lấy top `candidates` của BM25 và của vector, gộp bằng RRF
+        Args:
+            location: chỉ lấy job ở địa điểm này (so sánh sau khi bỏ dấu)
+        """
+        if not self.key_to_doc:
+            return []
+        # Embed query ngoài lock để không chặn add/delete
+        query_vector = self._encode([{"title": query}])[0]
+
+        with self._lock:
+            n_docs = len(self.keys)
+
+            live = self.live[:n_docs].copy()
+            if location:
+                # So khớp chuỗi con trên vocab địa điểm (nhỏ), rồi lọc doc bằng mask
+                folded = fold_diacritics(location)
+                codes = [code for name, code in self.location_vocab.items() if folded in name]
+                live &= np.isin(self.location_codes[:n_docs], codes)
+
+            bm25_scores = self.bm25.scores(query)
+            bm25_scores[~live] = 0.0
+            bm25_ranking = top_k_indices(bm25_scores, self.candidates)
+            bm25_ranking = bm25_ranking[bm25_scores[bm25_ranking] > 0]
+
+            if self.vectors is not None:
+                vector_scores = self.vectors[:n_docs] @ query_vector
+                vector_scores[~live] = -np.inf
+                vector_ranking = top_k_indices(vector_scores, self.candidates)
+                vector_ranking = vector_ranking[np.isfinite(vector_scores[vector_ranking])]
+            else:
+                vector_scores, vector_ranking = None, np.zeros(0, dtype=np.int64)
+
+            fused = reciprocal_rank_fusion([bm25_ranking, vector_ranking], n_docs, k=self.rrf_k)
+            bm25_rank = {int(doc_id): rank for rank, doc_id in enumerate(bm25_ranking, start=1)}
+            vector_rank = {int(doc_id): rank for rank, doc_id in enumerate(vector_ranking, start=1)}
+
+            results = []
+            for doc_id in top_k_indices(fused, top_k):
+                doc_id = int(doc_id)
+                if fused[doc_id] <= 0:
+                    break
+                results.append({
+                    **self.docs[doc_id],
+                    "job_key": self.keys[doc_id],
+                    "score": round(float(fused[doc_id]), 6),
+                    "bm25_rank": bm25_rank.get(doc_id),
+                    "vector_rank": vector_rank.get(doc_id),
+                })
+            return results
+
+    def save(self, path: str):
+        """Lưu index vào thư mục path (arrays.npz + docs.json), ghi tạm rồi rename"""
+        with self._lock:
+            os.makedirs(path, exist_ok=True)
+            arrays = self.bm25.to_arrays()
+            n_docs = len(self.keys)
+            arrays["vectors"] = self.vectors[:n_docs] if self.vectors is not None else np.zeros((0, 0), dtype=np.float32)
+            meta = {
+                "terms": self.bm25.terms(),
+                "keys": self.keys,
+                "docs": self.docs,
+                "k1": self.bm25.k1,
+                "b": self.bm25.b,
+            }
+            tmp_arrays = os.path.join(path, "arrays.tmp.npz")
+            tmp_meta = os.path.join(path, "docs.json.tmp")
+            np.savez(tmp_arrays, **arrays)
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False, default=str)
+            os.replace(tmp_arrays, os.path.join(path, "arrays.npz"))
+            os.replace(tmp_meta, os.path.join(path, "docs.json"))
+            self.disk_mtime = self.stored_mtime(path)
+
+    @staticmethod
+    def stored_mtime(path: str) -> Optional[float]:
+        """mtime của index đã lưu ở path (process khác vừa save thì lớn hơn disk_mtime), None nếu chưa có"""
+        try:
+            return os.path.getmtime(os.path.join(path, "docs.json"))
+        except OSError:
+            return None
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "HybridJobIndex":
+        index = cls(**kwargs)
+        index.disk_mtime = cls.stored_mtime(path)
+        with open(os.path.join(path, "docs.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with np.load(os.path.join(path, "arrays.npz")) as data:
+            arrays = {name: data[name] for name in data.files}
+
+        index.bm25 = BM25Index.from_arrays(meta["terms"], arrays, k1=meta["k1"], b=meta["b"])
+        index.keys = meta["keys"]
+        index.docs = meta["docs"]
+        index.key_to_doc = {key: doc_id for doc_id, key in enumerate(index.keys) if key is not None}
+        vectors = arrays["vectors"]
+        if vectors.size:
+            index._ensure_capacity(len(index.keys), vectors.shape[1])
+            index.vectors[:len(vectors)] = vectors
+            for doc_id, doc in enumerate(index.docs):
+                if doc is not None:
+                    index._set_doc(doc_id, doc)
+        return index
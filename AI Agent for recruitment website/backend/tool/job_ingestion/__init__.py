@@ -0,0 +1,3 @@
+from .pipeline import JobIngestionPipeline, IngestStats, iter_job_chunks, normalize_job, job_key, content_hash
+
+__all__ = ["JobIngestionPipeline", "IngestStats", "iter_job_chunks", "normalize_job", "job_key", "content_hash"]
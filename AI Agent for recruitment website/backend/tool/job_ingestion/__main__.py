@@ -0,0 +1,66 @@
+"""
+CLI nạp job posting vào MongoDB
+
+Ví dụ:
+    python -m tool.job_ingestion data/jobs.tsv
+    python -m tool.job_ingestion "https://docs.google.com/spreadsheets/d/.../export?format=tsv" --skiprows 1 --embed
+    python -m tool.job_ingestion jobs.jsonl --analyze --force
+    python -m tool.job_ingestion data/jobs.tsv --embed --update-index
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add backend to path
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from loguru import logger
+
+from log_config import setup_logging
+from setting import Settings
+from tool.job_ingestion.pipeline import JobIngestionPipeline
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Batched job ingestion into MongoDB")
+    parser.add_argument("source", help="File/URL TSV, CSV hoặc JSONL")
+    parser.add_argument("--format", choices=["tsv", "csv", "jsonl"], default=None, help="Mặc định đoán theo đuôi file")
+    parser.add_argument("--chunksize", type=int, default=None, help="Số dòng mỗi chunk")
+    parser.add_argument("--skiprows", type=int, default=0, help="Bỏ qua N dòng đầu (TSV/CSV)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Số upsert mỗi lần bulk_write")
+    parser.add_argument("--analyze", action="store_true", help="Chạy prompt job_description_analysis cho posting mới/đổi")
+    parser.add_argument("--embed", action="store_true", help="Tính embedding cho posting mới/đổi")
+    parser.add_argument("--force", action="store_true", help="Ghi lại cả posting không thay đổi")
+    parser.add_argument("--update-index", action="store_true",
+                        help="Cập nhật hybrid index đã lưu (HYBRID_INDEX_PATH) với posting mới/đổi")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    index = index_path = None
+    if args.update_index:
+        from tool.hybrid_search import HybridJobIndex
+        from tool.model_manager import model_manager
+        index_path = Settings.load_settings().HYBRID_INDEX_PATH
+        if HybridJobIndex.stored_mtime(index_path) is None:
+            # Chưa có index: lần search đầu tiên sẽ index toàn bộ catalog
+            logger.warning(f"⚠️ No hybrid index at {index_path}, skipping index update")
+        else:
+            index = model_manager.get_hybrid_index()
+
+    pipeline = JobIngestionPipeline(
+        analyze=args.analyze,
+        embed=args.embed,
+        write_batch_size=args.batch_size,
+        force=args.force,
+        index=index,
+        index_path=index_path
+    )
+    summary = pipeline.run(args.source, fmt=args.format, chunksize=args.chunksize, skiprows=args.skiprows)
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
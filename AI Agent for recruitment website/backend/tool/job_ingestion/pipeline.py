@@ -0,0 +1,339 @@
+"""
+Pipeline nạp job posting vào MongoDB:
+- đọc TSV/CSV/JSONL theo từng chunk (không load cả file vào RAM)
+- chuẩn hóa field, tính content hash để bỏ qua posting không thay đổi
+- (tuỳ chọn) phân tích JD bằng LLM và tính embedding theo batch, chỉ cho posting mới/đổi
+- upsert bằng bulk_write theo từng batch
+- (tuỳ chọn) cập nhật hybrid index đã lưu trên disk, process phục vụ search tự load lại
+"""
+import hashlib
+import json
+import math
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+import pandas as pd
+from loguru import logger
+from pymongo import UpdateOne
+
+from setting import Settings
+
+# Tên cột trong sheet/file -> field chuẩn trong collection jobs
+FIELD_ALIASES = {
+    "title": ["title", "job_title", "position", "job", "vị trí", "chức danh", "tên công việc"],
+    "company": ["company", "company_name", "công ty", "tên công ty"],
+    "location": ["location", "city", "address", "địa điểm", "nơi làm việc", "khu vực"],
+    "skills": ["skills", "skill", "kỹ năng", "công nghệ"],
+    "experience": ["experience", "kinh nghiệm", "yêu cầu kinh nghiệm"],
+    "salary": ["salary", "lương", "mức lương", "thu nhập"],
+    "description": ["description", "job_description", "jd", "mô tả", "mô tả công việc"],
+    "url": ["url", "link", "job_url"],
+    "source_id": ["id", "job_id", "source_id"],
+}
+COLUMN_TO_FIELD = {alias: name for name, aliases in FIELD_ALIASES.items() for alias in aliases}
+
+LOCATION_ALIASES = {
+    "hn": "Hà Nội", "ha noi": "Hà Nội", "hà nội": "Hà Nội", "hanoi": "Hà Nội",
+    "hcm": "Hồ Chí Minh", "tp.hcm": "Hồ Chí Minh", "tp hcm": "Hồ Chí Minh", "tphcm": "Hồ Chí Minh",
+    "ho chi minh": "Hồ Chí Minh", "hồ chí minh": "Hồ Chí Minh", "sài gòn": "Hồ Chí Minh", "saigon": "Hồ Chí Minh",
+    "đà nẵng": "Đà Nẵng", "da nang": "Đà Nẵng",
+}
+
+# Các field tham gia content hash (thay đổi field khác không làm re-ingest)
+HASH_FIELDS = ("title", "company", "location", "skills", "experience", "salary", "description", "url")
+
+# Field có thể vắng trong bản mới của posting: bị $unset để không giữ giá trị cũ
+# (field nguồn đã bị xóa, analysis/embedding của nội dung cũ, content_hash khi enrich lỗi)
+OPTIONAL_FIELDS = tuple(name for name in FIELD_ALIASES if name != "title") + (
+    "extra", "analysis", "embedding", "content_hash"
+)
+
+SKILL_SEPARATORS = re.compile(r"[,;|/\n]+")
+WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class IngestStats:
+    """Thống kê một lần ingest"""
+    rows_read: int = 0
+    invalid: int = 0
+    duplicates: int = 0
+    unchanged: int = 0
+    upserted: int = 0
+    modified: int = 0
+    analyzed: int = 0
+    embedded: int = 0
+    write_batches: int = 0
+    started_at: float = field(default_factory=time.time)
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.time() - self.started_at
+        return {
+            "rows_read": self.rows_read,
+            "invalid": self.invalid,
+            "duplicates": self.duplicates,
+            "unchanged": self.unchanged,
+            "upserted": self.upserted,
+            "modified": self.modified,
+            "analyzed": self.analyzed,
+            "embedded": self.embedded,
+            "write_batches": self.write_batches,
+            "elapsed_seconds": round(elapsed, 2),
+            "rows_per_second": round(self.rows_read / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+def _detect_format(source: str) -> str:
+    lowered = source.lower().split("?")[0]
+    if lowered.endswith(".jsonl") or lowered.endswith(".json"):
+        return "jsonl"
+    if lowered.endswith(".csv"):
+        return "csv"
+    # Google Sheet export (output=tsv) và .tsv
+    return "tsv"
+
+
+def iter_job_chunks(source: str, fmt: str = None, chunksize: int = 2000, skiprows: int = 0) -> Iterator[pd.DataFrame]:
+    """
+    Đọc posting theo từng chunk DataFrame (mọi cột là string)
+    Args:
+        source: đường dẫn file hoặc URL (Google Sheet export TSV/CSV)
+        fmt: "tsv", "csv" hoặc "jsonl" (mặc định đoán theo đuôi file)
+    """
+    fmt = fmt or _detect_format(source)
+    if fmt == "jsonl":
+        return pd.read_json(source, lines=True, chunksize=chunksize, dtype=False)
+    sep = "\t" if fmt == "tsv" else ","
+    return pd.read_csv(source, sep=sep, encoding="utf-8", chunksize=chunksize, skiprows=skiprows, dtype=str)
+
+
+def _clean_text(value: Any) -> Optional[str]:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    text = WHITESPACE.sub(" ", str(value)).strip()
+    return text or None
+
+
+def normalize_job(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Chuẩn hóa một dòng thành document của collection jobs.
+    Trả về None nếu thiếu title (không dùng được cho tìm kiếm).
+    """
+    job: Dict[str, Any] = {}
+    extra: Dict[str, Any] = {}
+    for column, value in row.items():
+        key = WHITESPACE.sub(" ", str(column)).strip().lower()
+        name = COLUMN_TO_FIELD.get(key)
+        if name == "skills" and isinstance(value, list):
+            value = ", ".join(str(v) for v in value)
+        value = _clean_text(value)
+        if value is None:
+            continue
+        if name is None:
+            extra[key] = value
+        elif name not in job:
+            job[name] = value
+
+    if not job.get("title"):
+        return None
+
+    if "location" in job:
+        job["location"] = LOCATION_ALIASES.get(job["location"].lower(), job["location"])
+
+    if "skills" in job:
+        skills = []
+        for skill in SKILL_SEPARATORS.split(job["skills"]):
+            skill = skill.strip()
+            if skill and skill.lower() not in {s.lower() for s in skills}:
+                skills.append(skill)
+        job["skills"] = skills
+
+    if extra:
+        job["extra"] = extra
+    return job
+
+
+def job_key(job: Dict[str, Any]) -> str:
+    """Khóa định danh posting: id nguồn nếu có, nếu không thì hash của title/company/location/url"""
+    if job.get("source_id"):
+        return f"id:{job['source_id']}"
+    identity = "|".join(str(job.get(name, "")).lower() for name in ("title", "company", "location", "url"))
+    return "h:" + hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+
+def content_hash(job: Dict[str, Any]) -> str:
+    """Hash nội dung posting (JSON có thứ tự key cố định) để phát hiện thay đổi"""
+    payload = {name: job.get(name) for name in HASH_FIELDS}
+    return hashlib.sha1(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class JobIngestionPipeline:
+    """Ingest job posting vào MongoDB, chỉ ghi những posting mới hoặc đã thay đổi"""
+
+    def __init__(
+        self,
+        collection=None,
+        analyze: bool = False,
+        embed: bool = False,
+        llm=None,
+        embedding=None,
+        write_batch_size: int = None,
+        max_workers: int = None,
+        force: bool = False,
+        index=None,
+        index_path: str = None
+    ):
+        """
+        index: HybridJobIndex được cập nhật (add) cùng với mỗi batch ghi vào MongoDB,
+        lưu vào index_path khi run() xong
+        """
+        self.settings = Settings.load_settings()
+        if collection is None:
+            from pymongo import MongoClient
+            client = MongoClient(self.settings.DATABASE_HOST)
+            collection = client[self.settings.DATABASE_NAME][self.settings.COLLECTION_JOB or "jobs"]
+        self.collection = collection
+        self.analyze = analyze
+        self.embed = embed
+        self.llm = llm
+        self.embedding = embedding
+        self.write_batch_size = write_batch_size or self.settings.JOB_INGEST_WRITE_BATCH
+        self.max_workers = max_workers or self.settings.MAX_WORKERS
+        self.force = force  # Ghi lại cả posting không đổi (vd: khi bật analyze/embed lần đầu)
+        self.index = index
+        self.index_path = index_path
+        self.stats = IngestStats()
+
+    def _get_llm(self):
+        if self.llm is None:
+            from tool.model_manager import model_manager
+            self.llm = model_manager.get_llm_model(task="extract")
+        return self.llm
+
+    def _get_embedding(self):
+        if self.embedding is None:
+            from tool.model_manager import model_manager
+            self.embedding = model_manager.get_embedding_model()
+        return self.embedding
+
+    def ensure_indexes(self):
+        self.collection.create_index("job_key", unique=True)
+
+    def _filter_changed(self, jobs: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Bỏ các posting có content hash trùng với bản đã lưu (một query $in cho cả batch)"""
+        existing = {
+            doc["job_key"]: doc.get("content_hash")
+            for doc in self.collection.find(
+                {"job_key": {"$in": list(jobs.keys())}},
+                {"job_key": 1, "content_hash": 1, "_id": 0}
+            )
+        }
+        changed = {key: job for key, job in jobs.items() if existing.get(key) != job["content_hash"]}
+        self.stats.unchanged += len(jobs) - len(changed)
+        return changed
+
+    def _analyze_jobs(self, jobs: List[Dict[str, Any]]):
+        """Chạy prompt job_description_analysis song song (priority BATCH)"""
+        from llms.admission import Priority, request_priority
+        from prompt.promt_config import PromptConfig
+
+        prompt_config = PromptConfig()
+        llm = self._get_llm()
+
+        def analyze(job):
+            text = job.get("description") or job["title"]
+            prompt = prompt_config.get_prompt("job_description_analysis", job_description=text)
+            with request_priority(Priority.BATCH):
+                try:
+                    return llm.chat([{"role": "user", "content": prompt}], think=False)
+                except Exception as e:
+                    logger.warning(f"⚠️ JD analysis failed for {job['job_key']}: {e}")
+                    return None
+
+        targets = [job for job in jobs if "analysis" not in job]
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="jd-analysis") as executor:
+            for job, analysis in zip(targets, executor.map(analyze, targets)):
+                if analysis:
+                    job["analysis"] = analysis
+                    self.stats.analyzed += 1
+
+    def _embed_jobs(self, jobs: List[Dict[str, Any]]):
+        """Tính embedding theo batch cho title + skills + description"""
+        from tool.job_matching.matcher import job_text
+
+        texts = [job_text(job) for job in jobs]
+        vectors = self._get_embedding().encode_batch(texts, batch_size=self.settings.BATCH_SIZE)
+        for job, vector in zip(jobs, vectors):
+            job["embedding"] = [float(x) for x in vector]
+        self.stats.embedded += len(jobs)
+
+    def _write(self, jobs: List[Dict[str, Any]]):
+        now = datetime.now(timezone.utc)
+        for start in range(0, len(jobs), self.write_batch_size):
+            batch = jobs[start:start + self.write_batch_size]
+            operations = []
+            for job in batch:
+                update = {"$set": {**job, "updated_at": now}, "$setOnInsert": {"created_at": now}}
+                stale = {name: "" for name in OPTIONAL_FIELDS if name not in job}
+                if stale:
+                    update["$unset"] = stale
+                operations.append(UpdateOne({"job_key": job["job_key"]}, update, upsert=True))
+            result = self.collection.bulk_write(operations, ordered=False)
+            self.stats.upserted += result.upserted_count
+            self.stats.modified += result.modified_count
+            self.stats.write_batches += 1
+            if self.index is not None:
+                # Cùng job_key: index thay bản cũ bằng bản mới
+                self.index.add(batch)
+
+    def ingest_chunk(self, chunk: pd.DataFrame):
+        """Chuẩn hóa, lọc posting không đổi, enrich rồi ghi một chunk"""
+        jobs: Dict[str, Dict[str, Any]] = {}
+        for row in chunk.to_dict(orient="records"):
+            self.stats.rows_read += 1
+            job = normalize_job(row)
+            if job is None:
+                self.stats.invalid += 1
+                continue
+            job["job_key"] = job_key(job)
+            job["content_hash"] = content_hash(job)
+            if job["job_key"] in jobs:
+                self.stats.duplicates += 1
+            jobs[job["job_key"]] = job
+
+        if not jobs:
+            return
+        changed = list(jobs.values()) if self.force else list(self._filter_changed(jobs).values())
+        if not changed:
+            return
+        if self.analyze:
+            self._analyze_jobs(changed)
+        if self.embed:
+            self._embed_jobs(changed)
+        for job in changed:
+            # Enrich lỗi: không lưu content_hash để lần ingest sau thử lại posting này
+            if (self.analyze and "analysis" not in job) or (self.embed and "embedding" not in job):
+                job.pop("content_hash", None)
+        self._write(changed)
+
+    def run(self, source: str, fmt: str = None, chunksize: int = None, skiprows: int = 0) -> Dict[str, Any]:
+        self.stats = IngestStats()
+        self.ensure_indexes()
+        chunksize = chunksize or self.settings.JOB_INGEST_CHUNK_SIZE
+
+        for chunk in iter_job_chunks(source, fmt=fmt, chunksize=chunksize, skiprows=skiprows):
+            self.ingest_chunk(chunk)
+            summary = self.stats.as_dict()
+            logger.info(f"📊 {summary['rows_read']} rows read, {summary['unchanged']} unchanged, "
+                        f"{summary['upserted']} inserted, {summary['modified']} updated")
+
+        if self.index is not None and self.index_path:
+            self.index.save(self.index_path)
+
+        summary = self.stats.as_dict()
+        logger.info(f"✅ Job ingestion finished: {json.dumps(summary, ensure_ascii=False)}")
+        return summary
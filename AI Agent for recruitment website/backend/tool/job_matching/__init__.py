@@ -0,0 +1,3 @@
+from .matcher import JobMatcher, VectorIndex, top_k_indices, parse_min_years
+
+__all__ = ["JobMatcher", "VectorIndex", "top_k_indices", "parse_min_years"]
@@ -0,0 +1,275 @@
+"""
+Matching CV <-> job bằng embedding:
+- vector job/CV lưu trong một ma trận float32 liên tục, đã chuẩn hóa (cosine = dot product)
+- chấm điểm một CV với mọi job bằng một phép matmul + argpartition lấy top-k
+- lọc cứng (địa điểm, kinh nghiệm) bằng mask vector hóa
+"""
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from loguru import logger
+
+from tool.job_ingestion.pipeline import LOCATION_ALIASES
+
+YEARS_PATTERN = re.compile(r"(\d+(?:[.,]\d+)?)")
+NO_EXPERIENCE_KEYWORDS = ("intern", "thực tập", "fresher", "không yêu cầu", "chưa có kinh nghiệm", "mới ra trường")
+
+
+def normalize_location(location: Optional[str]) -> Optional[str]:
+    if not location:
+        return None
+    location = " ".join(str(location).split())
+    return LOCATION_ALIASES.get(location.lower(), location)
+
+
+def parse_min_years(experience: Any) -> float:
+    """
+    Số năm kinh nghiệm tối thiểu từ text ("1-2 năm" -> 1, "trên 3 năm" -> 3, "Internship" -> 0).
+    NaN nếu không xác định (không bị loại bởi filter kinh nghiệm).
+    """
+    if experience is None:
+        return np.nan
+    if isinstance(experience, (int, float)):
+        return float(experience)
+    text = str(experience).lower()
+    numbers = YEARS_PATTERN.findall(text)
+    if numbers:
+        return float(numbers[0].replace(",", "."))
+    if any(keyword in text for keyword in NO_EXPERIENCE_KEYWORDS):
+        return 0.0
+    return np.nan
+
+
+def job_text(job: Dict[str, Any]) -> str:
+    """Text đại diện cho job để embed (dùng chung cho job ingestion, hybrid search và matching)"""
+    skills = job.get("skills") or []
+    if isinstance(skills, str):
+        skills = [skills]
+    return " | ".join(filter(None, [job.get("title", ""), ", ".join(skills), job.get("description", "")]))
+
+
+def cv_text(cv: Dict[str, Any]) -> str:
+    """Text đại diện cho CV (theo output của prompt extract_features_cv)"""
+    skills = cv.get("skills") or []
+    if isinstance(skills, str):
+        skills = [skills]
+    domains = [d.get("domain", "") for d in cv.get("experience_detail") or [] if isinstance(d, dict)]
+    return " | ".join(filter(None, [", ".join(skills), ", ".join(domains), cv.get("education_level", "")]))
+
+
+def item_vectors(items: Sequence[Dict[str, Any]], to_text: Callable[[Dict[str, Any]], str],
+                 encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+    """Vector của các item: dùng field "embedding" có sẵn (vd: từ job ingestion), chỉ embed những item còn thiếu"""
+    missing = [i for i, item in enumerate(items) if item.get("embedding") is None]
+    encoded = encode([to_text(items[i]) for i in missing]) if missing else None
+    dim = encoded.shape[1] if encoded is not None else len(items[0]["embedding"])
+    vectors = np.empty((len(items), dim), dtype=np.float32)
+    for row, i in enumerate(missing):
+        vectors[i] = encoded[row]
+    for i, item in enumerate(items):
+        if item.get("embedding") is not None:
+            vectors[i] = item["embedding"]
+    return vectors
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Index của k điểm cao nhất (giảm dần) trên trục cuối bằng argpartition: O(n) thay vì sort O(n log n).
+    Hỗ trợ scores 1D (một query) hoặc 2D (nhiều query).
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape[:-1] + (n,))
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+class VectorIndex:
+    """Ma trận vector đã chuẩn hóa + metadata dạng mảng (location code, số năm kinh nghiệm)"""
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.items: List[Dict[str, Any]] = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.location_codes = np.zeros(0, dtype=np.int32)
+        self.years = np.zeros(0, dtype=np.float32)
+        self.location_vocab: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def build(self, ids: Sequence[str], items: Sequence[Dict[str, Any]], vectors: np.ndarray,
+              locations: Sequence[Optional[str]], years: Sequence[float]):
+        matrix = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+
+        self.location_vocab = {}
+        codes = np.empty(len(locations), dtype=np.int32)
+        for i, location in enumerate(locations):
+            location = normalize_location(location)
+            codes[i] = -1 if location is None else self.location_vocab.setdefault(location.lower(), len(self.location_vocab))
+
+        self.ids = list(ids)
+        self.items = list(items)
+        self.matrix = matrix
+        self.location_codes = codes
+        self.years = np.asarray(years, dtype=np.float32)
+
+    def location_mask(self, locations: Optional[Sequence[str]], allow_unknown: bool = True) -> Optional[np.ndarray]:
+        """Mask các phần tử thuộc một trong các địa điểm (None = không lọc)"""
+        if not locations:
+            return None
+        codes = [self.location_vocab.get(normalize_location(l).lower(), -2) for l in locations if normalize_location(l)]
+        if not codes:
+            return None
+        mask = np.isin(self.location_codes, codes)
+        if allow_unknown:
+            mask |= self.location_codes == -1
+        return mask
+
+    def search(self, queries: np.ndarray, top_k: int, mask: Optional[np.ndarray] = None):
+        """
+        Điểm cosine của (các) query với toàn bộ index bằng một phép matmul.
+        Trả về (indices, scores) đã sắp xếp giảm dần, bỏ các phần tử bị mask.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        single = queries.ndim == 1
+        queries = np.atleast_2d(queries)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        scores = queries @ self.matrix.T
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+
+        indices = top_k_indices(scores, top_k)
+        top_scores = np.take_along_axis(scores, indices, axis=-1)
+        results = []
+        for row_indices, row_scores in zip(indices, top_scores):
+            keep = np.isfinite(row_scores)
+            results.append((row_indices[keep], row_scores[keep]))
+        return results[0] if single else results
+
+
+class JobMatcher:
+    """Gợi ý job cho CV và ứng viên cho job"""
+
+    def __init__(self, embedding=None, experience_tolerance: float = 1.0, batch_size: int = 32):
+        """
+        embedding: model có encode_batch (mặc định embedding model của ModelManager)
+        experience_tolerance: cho phép job yêu cầu nhiều hơn số năm của CV tối đa chừng này năm
+        """
+        self._embedding = embedding
+        self.experience_tolerance = experience_tolerance
+        self.batch_size = batch_size
+        self.jobs = VectorIndex()
+        self.candidates = VectorIndex()
+
+    @property
+    def embedding(self):
+        if self._embedding is None:
+            from tool.model_manager import model_manager
+            self._embedding = model_manager.get_embedding_model()
+        return self._embedding
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.asarray(self.embedding.encode_batch(texts, batch_size=self.batch_size), dtype=np.float32)
+
+    def _vectors(self, items: Sequence[Dict[str, Any]], to_text) -> np.ndarray:
+        return item_vectors(items, to_text, self._encode)
+
+    def index_jobs(self, jobs: Sequence[Dict[str, Any]]):
+        """Xây index job (document theo schema của collection jobs)"""
+        if not jobs:
+            self.jobs = VectorIndex()
+            return
+        self.jobs.build(
+            ids=[str(job.get("job_key") or job.get("_id") or i) for i, job in enumerate(jobs)],
+            items=[{k: v for k, v in job.items() if k != "embedding"} for job in jobs],
+            vectors=self._vectors(jobs, job_text),
+            locations=[job.get("location") for job in jobs],
+            years=[parse_min_years(job.get("experience")) for job in jobs]
+        )
+        logger.info(f"✅ Job matcher indexed {len(self.jobs)} jobs")
+
+    def index_candidates(self, cvs: Sequence[Dict[str, Any]]):
+        """Xây index ứng viên (features theo prompt extract_features_cv, kèm "id")"""
+        if not cvs:
+            self.candidates = VectorIndex()
+            return
+        self.candidates.build(
+            ids=[str(cv.get("id", i)) for i, cv in enumerate(cvs)],
+            items=[{k: v for k, v in cv.items() if k != "embedding"} for cv in cvs],
+            vectors=self._vectors(cvs, cv_text),
+            locations=[cv.get("location") for cv in cvs],
+            years=[parse_min_years(cv.get("experience_years")) for cv in cvs]
+        )
+
+    def _results(self, index: VectorIndex, hits) -> List[Dict[str, Any]]:
+        indices, scores = hits
+        return [
+            {"id": index.ids[i], "score": round(float(score), 4), **index.items[i]}
+            for i, score in zip(indices, scores)
+        ]
+
+    def suggest_jobs(
+        self,
+        cv: Dict[str, Any],
+        top_k: int = 10,
+        locations: Optional[Sequence[str]] = None,
+        filter_location: bool = True,
+        filter_experience: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k job phù hợp với một CV
+        Args:
+            cv: features của CV (skills, experience_years, location, ...)
+            locations: địa điểm mong muốn (mặc định là location của CV)
+        """
+        if not len(self.jobs):
+            return []
+        query = self._vectors([cv], cv_text)[0]
+
+        mask = None
+        if filter_location:
+            mask = self.jobs.location_mask(locations or [cv.get("location")])
+        if filter_experience:
+            cv_years = parse_min_years(cv.get("experience_years"))
+            if not np.isnan(cv_years):
+                # Job không rõ yêu cầu (NaN) vẫn được giữ lại vì so sánh với NaN luôn False
+                experience_mask = ~(self.jobs.years > cv_years + self.experience_tolerance)
+                mask = experience_mask if mask is None else mask & experience_mask
+
+        return self._results(self.jobs, self.jobs.search(query, top_k, mask))
+
+    def suggest_candidates(
+        self,
+        job: Dict[str, Any],
+        top_k: int = 10,
+        filter_location: bool = True,
+        filter_experience: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Top-k ứng viên phù hợp với một job (chiều ngược lại của suggest_jobs)"""
+        if not len(self.candidates):
+            return []
+        query = self._vectors([job], job_text)[0]
+
+        mask = None
+        if filter_location:
+            mask = self.candidates.location_mask([job.get("location")])
+        if filter_experience:
+            required_years = parse_min_years(job.get("experience"))
+            if not np.isnan(required_years):
+                experience_mask = ~(self.candidates.years + self.experience_tolerance < required_years)
+                mask = experience_mask if mask is None else mask & experience_mask
+
+        return self._results(self.candidates, self.candidates.search(query, top_k, mask))
@@ -3,12 +3,20 @@ Model Manager để cache và quản lý các models tránh load lại nhiều l
 """
 import os
 import threading
-from typing import Dict, Any, Optional
-from tool.embeddings import SentenceTransformerEmbedding, EmbeddingConfig
-from tool.semantic_router import SemanticRouter, Route
+import time
+from typing import TYPE_CHECKING, Dict, Any, Optional
+from tool.semantic_router import SemanticRouter, Route, SlotClassifier
 from tool.semantic_router.sample import Sample
+from tool.semantic_cache import SemanticCache
+from loguru import logger
 from setting import Settings
 
+if TYPE_CHECKING:
+    from tool.embeddings import SentenceTransformerEmbedding
+
+# Thời gian giữ danh sách model trên Ollama và model đã chọn cho từng task (giây)
+AVAILABLE_MODELS_TTL = 60
+
 class ModelManager:
     """Singleton class để quản lý và cache các models"""
     
@@ -29,11 +37,13 @@ class ModelManager:
             
         self.settings = Settings.load_settings()
         self.models_cache: Dict[str, Any] = {}
+        self._available_models = None  # (timestamp, set tên model trên Ollama)
+        self._task_llms: Dict[str, tuple] = {}  # task -> (timestamp, LLM client đã resolve)
         self._initialized = True
         
-        print("🔧 ModelManager initialized")
+        logger.debug("🔧 ModelManager initialized")
     
-    def get_embedding_model(self, model_name: str = None) -> SentenceTransformerEmbedding:
+    def get_embedding_model(self, model_name: str = None) -> "SentenceTransformerEmbedding":
         """
         Lấy embedding model từ cache hoặc load mới nếu chưa có
         """
@@ -43,13 +53,15 @@ class ModelManager:
         cache_key = f"embedding_{model_name}"
         
         if cache_key not in self.models_cache:
-            print(f"🚀 Loading embedding model: {model_name}")
+            logger.info(f"🚀 Loading embedding model: {model_name}")
+            # Import khi cần: web worker gọi routing qua MCP tool server không import sentence_transformers/torch
+            from tool.embeddings import SentenceTransformerEmbedding, EmbeddingConfig
             config = EmbeddingConfig(name=model_name)
             embedding_model = SentenceTransformerEmbedding(config)
             self.models_cache[cache_key] = embedding_model
-            print(f"✅ Embedding model cached: {model_name}")
+            logger.info(f"✅ Embedding model cached: {model_name}")
         else:
-            print(f"📦 Using cached embedding model: {model_name}")
+            logger.debug(f"📦 Using cached embedding model: {model_name}")
             
         return self.models_cache[cache_key]
     
@@ -60,7 +72,7 @@ class ModelManager:
         cache_key = "semantic_router"
         
         if cache_key not in self.models_cache:
-            print("🚀 Creating semantic router...")
+            logger.info("🚀 Creating semantic router...")
             
             # Lấy embedding model
             embedding_tool = self.get_embedding_model()
@@ -75,57 +87,259 @@ class ModelManager:
             # Tạo semantic router
             semantic_router = SemanticRouter(embedding=embedding_tool, routes=routes)
             self.models_cache[cache_key] = semantic_router
-            print("✅ Semantic router cached")
+            logger.info("✅ Semantic router cached")
         else:
-            print("📦 Using cached semantic router")
+            logger.debug("📦 Using cached semantic router")
             
         return self.models_cache[cache_key]
     
-    def get_llm_model(self, model_name: str = None):
+    def get_slot_classifier(self) -> SlotClassifier:
+        """
+        Lấy slot classifier (location/skills/salary/position) từ cache hoặc tạo mới
+        """
+        cache_key = "slot_classifier"
+
+        if cache_key not in self.models_cache:
+            logger.info("🚀 Creating slot classifier...")
+            from tool.question_enhancer import QuestionEnhancer
+
+            slot_classifier = SlotClassifier(
+                embedding=self.get_embedding_model(),
+                enhancer=QuestionEnhancer(),
+                threshold=self.settings.SLOT_CLASSIFIER_THRESHOLD
+            )
+            self.models_cache[cache_key] = slot_classifier
+            logger.info("✅ Slot classifier cached")
+
+        return self.models_cache[cache_key]
+
+    def get_job_matcher(self):
+        """
+        Lấy job matcher (index vector của job) từ cache hoặc tạo mới (chưa có job nào)
+        """
+        cache_key = "job_matcher"
+
+        if cache_key not in self.models_cache:
+            with self._lock:
+                if cache_key not in self.models_cache:
+                    from tool.job_matching import JobMatcher
+                    self.models_cache[cache_key] = JobMatcher(
+                        embedding=self.get_embedding_model(),
+                        experience_tolerance=self.settings.MATCH_EXPERIENCE_TOLERANCE,
+                        batch_size=self.settings.BATCH_SIZE
+                    )
+
+        return self.models_cache[cache_key]
+
+    def get_hybrid_index(self):
+        """
+        Lấy hybrid index (BM25 + vector) của job catalog: load từ disk nếu đã lưu, ngược lại tạo rỗng.
+        Index trên disk được process khác lưu lại (job ingestion, worker khác bootstrap) thì load lại.
+        """
+        from tool.hybrid_search import HybridJobIndex
+
+        cache_key = "hybrid_index"
+        path = self.settings.HYBRID_INDEX_PATH
+
+        index = self.models_cache.get(cache_key)
+        if index is not None:
+            stored_mtime = HybridJobIndex.stored_mtime(path)
+            if stored_mtime is not None and (index.disk_mtime is None or stored_mtime > index.disk_mtime):
+                with self._lock:
+                    if self.models_cache.get(cache_key) is index:
+                        logger.info(f"🔄 Hybrid index changed on disk, reloading from {path}")
+                        del self.models_cache[cache_key]
+
+        if cache_key not in self.models_cache:
+            with self._lock:
+                if cache_key not in self.models_cache:
+                    options = dict(
+                        embedding=self.get_embedding_model(),
+                        rrf_k=self.settings.HYBRID_RRF_K,
+                        candidates=self.settings.HYBRID_CANDIDATES,
+                        batch_size=self.settings.BATCH_SIZE
+                    )
+                    if os.path.exists(os.path.join(path, "docs.json")):
+                        logger.info(f"🚀 Loading hybrid index from {path}")
+                        index = HybridJobIndex.load(path, **options)
+                    else:
+                        index = HybridJobIndex(**options)
+                    self.models_cache[cache_key] = index
+                    logger.info(f"✅ Hybrid index cached ({len(index)} jobs)")
+
+        return self.models_cache[cache_key]
+
+    def _default_ollama_url(self) -> str:
+        default_url = "http://host.docker.internal:11434" if os.getenv("DOCKER_ENV") == "true" else self.settings.OLLAMA_BASE_URL
+        return os.getenv("OLLAMA_URL", default_url)
+
+    def _default_llm_model(self) -> str:
+        return os.getenv("OLLAMA_MODEL", self.settings.RAG_MODEL_ID)
+
+    def _get_available_models(self) -> Optional[set]:
+        """
+        Danh sách model có trên Ollama (/api/tags), cache AVAILABLE_MODELS_TTL giây.
+        Trả về None nếu không kiểm tra được (khi đó không fallback).
+        """
+        now = time.time()
+        if self._available_models is not None and now - self._available_models[0] < AVAILABLE_MODELS_TTL:
+            return self._available_models[1]
+
+        try:
+            from llms.backend_pool import get_backend_pool
+            response = get_backend_pool(self._default_ollama_url()).get("/api/tags", timeout=5)
+            if response.status_code != 200:
+                return None
+            names = set()
+            for model in response.json().get("models", []):
+                name = model.get("name", "")
+                names.add(name)
+                if name.endswith(":latest"):
+                    names.add(name[:-len(":latest")])
+            self._available_models = (now, names)
+            return names
+        except Exception as e:
+            logger.bind(throttle=60).warning(f"⚠️ Cannot list Ollama models: {e}")
+            return None
+
+    def resolve_task_model(self, task: str) -> str:
+        """
+        Chọn model cho một task theo Settings.LLM_TASK_MODELS, đi theo
+        LLM_TASK_FALLBACKS nếu model của tier đó không có trên Ollama
+        """
+        task_models = self.settings.LLM_TASK_MODELS
+        chain = [task] + self.settings.LLM_TASK_FALLBACKS.get(task, [])
+
+        candidates = []
+        for chain_task in chain:
+            model_name = task_models.get(chain_task) or self._default_llm_model()
+            if model_name not in candidates:
+                candidates.append(model_name)
+        if self._default_llm_model() not in candidates:
+            candidates.append(self._default_llm_model())
+
+        available_models = self._get_available_models()
+        if available_models is None:
+            return candidates[0]
+
+        for model_name in candidates:
+            if model_name in available_models:
+                if model_name != candidates[0]:
+                    logger.warning(f"⚠️ Model {candidates[0]} for task '{task}' unavailable, falling back to {model_name}")
+                return model_name
+        return candidates[-1]
+
+    def get_llm_model(self, model_name: str = None, task: str = None):
         """
         Lấy LLM model từ cache (có thể extend cho Ollama, etc.)
+        Args:
+            model_name: tên model cụ thể (ưu tiên hơn task)
+            task: loại task ("classify", "extract", "reflect", "chitchat", "answer")
+                  để chọn model tier và generation defaults
         """
+        by_task = model_name is None and task is not None
+        if by_task:
+            # Client đã resolve cho task: không gọi lại /api/tags (blocking) mỗi lần
+            resolved = self._task_llms.get(task)
+            if resolved is not None and time.time() - resolved[0] < AVAILABLE_MODELS_TTL:
+                return resolved[1]
         if model_name is None:
-            model_name = self.settings.RAG_MODEL_ID
-            
-        cache_key = f"llm_{model_name}"
+            model_name = self.resolve_task_model(task) if task else self._default_llm_model()
+
+        cache_key = f"llm_{task}_{model_name}" if task else f"llm_{model_name}"
         
         if cache_key not in self.models_cache:
-            print(f"🚀 Loading LLM model: {model_name}")
-            # TODO: Implement LLM loading logic
-            # Ví dụ cho Ollama client
+            logger.info(f"🚀 Loading LLM model: {model_name}")
             from llms.ollama_llms import OllamaLLMs
-            llm_model = OllamaLLMs(model_name=model_name)
+            llm_model = OllamaLLMs(
+                base_url=self._default_ollama_url(),
+                model_name=model_name,
+                default_options=self.settings.LLM_TASK_OPTIONS.get(task, {}),
+                think=self.settings.LLM_TASK_THINK.get(task),
+                think_mode=self.settings.LLM_THINK_MODE
+            )
+            llm_model.task = task
             self.models_cache[cache_key] = llm_model
-            print(f"✅ LLM model cached: {model_name}")
+            logger.info(f"✅ LLM model cached: {model_name}")
         else:
-            print(f"📦 Using cached LLM model: {model_name}")
-            
+            logger.debug(f"📦 Using cached LLM model: {model_name}")
+
+        if by_task:
+            self._task_llms[task] = (time.time(), self.models_cache[cache_key])
         return self.models_cache[cache_key]
     
+    def get_semantic_cache(self, route_name: str) -> Optional[SemanticCache]:
+        """
+        Lấy semantic cache của một route, trả về None nếu route không bật cache
+        """
+        enabled_routes = [
+            route.strip() for route in self.settings.SEMANTIC_CACHE_ROUTES.split(",") if route.strip()
+        ]
+        if route_name not in enabled_routes:
+            return None
+
+        cache_key = f"semantic_cache_{route_name}"
+
+        if cache_key not in self.models_cache:
+            with self._lock:
+                if cache_key not in self.models_cache:
+                    self.models_cache[cache_key] = SemanticCache(
+                        name=route_name,
+                        threshold=self.settings.SEMANTIC_CACHE_THRESHOLD,
+                        ttl=self.settings.SEMANTIC_CACHE_TTL,
+                        max_size=self.settings.SEMANTIC_CACHE_MAX_SIZE
+                    )
+
+        return self.models_cache[cache_key]
+
+    def get_semantic_cache_stats(self) -> Dict[str, Any]:
+        """
+        Lấy hit-rate metrics của tất cả semantic cache đang hoạt động
+        """
+        return {
+            cache.name: cache.get_stats()
+            for key, cache in list(self.models_cache.items())
+            if key.startswith("semantic_cache_")
+        }
+
     def preload_models(self):
         """
         Preload tất cả models khi khởi động ứng dụng
         """
-        print("🚀 Preloading all models...")
+        logger.info("🚀 Preloading all models...")
         
         # Preload embedding model
         self.get_embedding_model()
         
         # Preload semantic router
         self.get_semantic_router()
+
+        # Preload slot classifier
+        self.get_slot_classifier()
         
         # Preload LLM model (optional)
         # self.get_llm_model()
         
-        print("✅ All models preloaded successfully!")
+        logger.info("✅ All models preloaded successfully!")
     
+    def reset_after_fork(self):
+        """
+        Giữ các model đã load (dùng chung copy-on-write với master),
+        chỉ tạo lại kết nối HTTP của các LLM client đã cache
+        """
+        self._available_models = None
+        self._task_llms.clear()
+        for model in list(self.models_cache.values()):
+            if hasattr(model, "reset_connections"):
+                model.reset_connections()
+
     def clear_cache(self):
         """
         Xóa cache models (để free memory nếu cần)
         """
         self.models_cache.clear()
-        print("🗑️ Model cache cleared")
+        self._task_llms.clear()
+        logger.info("🗑️ Model cache cleared")
     
     def get_cache_info(self) -> Dict[str, Any]:
         """
@@ -0,0 +1,70 @@
+"""
+Routing câu hỏi (semantic router, slot classifier) và prompt, tách khỏi MCP.server để web worker
+import được mà không kéo theo MongoClient / tool server. Model embedding chỉ
+được load khi routing chạy trong process (không có Settings.MCP_SERVER_URL).
+"""
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from tool.tracing import current_span, traced
+
+
+@traced("router.classify_query")
+def classify_query(query: str):
+    """
+    Phân loại intent và trả về kèm embedding của câu hỏi để tái sử dụng (vd: semantic cache)
+    Args:
+        query: câu hỏi của user
+    Returns:
+        tuple: (route_name, query_embedding), embedding là None nếu có lỗi
+    """
+    from tool.model_manager import model_manager
+
+    try:
+        # Lấy semantic router từ cache
+        semantic_router = model_manager.get_semantic_router()
+
+        # Phân loại intent
+        query_embedding = semantic_router.embed(query)
+        score, route_name = semantic_router.guide(query, query_embedding=query_embedding)
+        logger.debug("🔍 Classified query {!r} as {} (score: {:.4f})", query, route_name, score)
+        current_span().set_attributes({"route": route_name, "score": float(score)})
+
+        return route_name, query_embedding
+
+    except Exception as e:
+        logger.exception("❌ Error in intent classification: {}", e)
+        return "unknown", None
+
+
+def route_query(query: str) -> Dict[str, Any]:
+    """
+    Phân loại intent của câu hỏi, trả về cả embedding (để client tra semantic cache
+    mà không cần load model embedding)
+    Args:
+        query: câu hỏi của user
+    Returns:
+        dict: {"route": intent, "embedding": list[float] hoặc None}
+    """
+    route_name, query_embedding = classify_query(query)
+    return {
+        "route": route_name,
+        "embedding": query_embedding.tolist() if query_embedding is not None else None,
+    }
+
+
+@traced("router.classify_slot")
+def classify_slot(message: str, expected_slot: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Phân loại câu trả lời của user vào slot tuyển dụng (location/skills/salary/position)
+    Args:
+        message: câu trả lời của user
+        expected_slot: slot mà bot đang hỏi (phá thế hòa khi nhiều keyword khớp)
+    Returns:
+        dict: {"slot": slot hoặc None nếu không đủ tin cậy, "confidence": float}
+    """
+    from tool.model_manager import model_manager
+
+    slot, confidence = model_manager.get_slot_classifier().classify(message, expected_slot=expected_slot)
+    return {"slot": slot, "confidence": float(confidence)}
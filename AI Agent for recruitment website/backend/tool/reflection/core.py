@@ -1,3 +1,6 @@
+from loguru import logger
+
+
 class Reflection():
     def __init__(self, llm):
         self.llm = llm
@@ -15,7 +18,18 @@ class Reflection():
     
     
     def __call__(self, chatHistory, lastItemsConsidereds=100):
-        
+        higherLevelSummariesPrompt = self._build_prompt(chatHistory, lastItemsConsidereds)
+
+        completion = self.llm.generate_content([higherLevelSummariesPrompt])
+    
+        return completion
+
+    async def acall(self, chatHistory, lastItemsConsidereds=100):
+        """__call__ bản async (llm cần có agenerate_content)"""
+        higherLevelSummariesPrompt = self._build_prompt(chatHistory, lastItemsConsidereds)
+        return await self.llm.agenerate_content([higherLevelSummariesPrompt])
+
+    def _build_prompt(self, chatHistory, lastItemsConsidereds=100):
         if len(chatHistory) >= lastItemsConsidereds:
             chatHistory = chatHistory[len(chatHistory) - lastItemsConsidereds:]
 
@@ -27,9 +41,7 @@ class Reflection():
         """.format(historyString=historyString)
         }
 
-        print(higherLevelSummariesPrompt)
+        logger.debug("Reflection prompt: {}", higherLevelSummariesPrompt["content"])
 
-        completion = self.llm.generate_content([higherLevelSummariesPrompt])
-    
-        return completion
+        return higherLevelSummariesPrompt
 
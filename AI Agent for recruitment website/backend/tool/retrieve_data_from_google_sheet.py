@@ -1,10 +1,258 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
 import pandas as pd
+import requests
+from loguru import logger
+
+from setting import Settings
+
+CACHE_FORMAT_VERSION = 2
+
+
+def _is_url(source: str) -> bool:
+    return source.startswith("http://") or source.startswith("https://")
+
+
+def _source_validator(source: str) -> Optional[str]:
+    """
+    Giá trị dùng để kiểm tra cache còn hợp lệ:
+    - file local: mtime + size
+    - URL: ETag hoặc Last-Modified (HEAD request), None nếu server không trả về
+    """
+    if not _is_url(source):
+        stat = os.stat(source)
+        return f"mtime:{stat.st_mtime_ns}:{stat.st_size}"
+
+    try:
+        response = requests.head(source, allow_redirects=True, timeout=5)
+        if response.status_code < 400:
+            if response.headers.get("ETag"):
+                return f"etag:{response.headers['ETag']}"
+            if response.headers.get("Last-Modified"):
+                return f"last-modified:{response.headers['Last-Modified']}"
+    except requests.RequestException as e:
+        logger.warning(f"⚠️ Cannot validate sheet cache for {source}: {e}")
+    return None
+
+
+class SheetCache:
+    """
+    Cache dạng cột trên disk: mỗi chunk là một thư mục part-xxxxx chứa file .npy
+    cho mỗi cột nên có thể đọc lại bằng np.load(mmap_mode="r") mà không cần tải và
+    parse lại sheet. Cột string lưu dạng bytes UTF-8 nối liền + offsets + mask null
+    (không phải unicode độ dài cố định: một ô dài không làm phình cả cột).
+    """
+
+    def __init__(self, cache_dir: str = None, ttl: int = None):
+        settings = Settings.load_settings()
+        self.cache_dir = cache_dir or settings.SHEET_CACHE_DIR
+        self.ttl = settings.SHEET_CACHE_TTL if ttl is None else ttl
+
+    def entry_path(self, source: str, read_options: Dict[str, Any]) -> str:
+        key = json.dumps({"source": source, **read_options}, sort_keys=True, default=str)
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+    def lookup(self, entry: str, validator: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Trả về metadata nếu cache hợp lệ (cùng validator, hoặc chưa quá TTL khi không có validator)"""
+        meta_path = os.path.join(entry, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+        if meta.get("version") != CACHE_FORMAT_VERSION:
+            return None
+        if validator is not None:
+            return meta if meta.get("validator") == validator else None
+        return meta if time.time() - meta.get("created_at", 0) < self.ttl else None
+
+    @staticmethod
+    def _write_part(part_dir: str, df: pd.DataFrame) -> List[str]:
+        os.makedirs(part_dir)
+        kinds = []
+        for i, column in enumerate(df.columns):
+            values = df[column]
+            if values.dtype.kind in "biuf":
+                np.save(os.path.join(part_dir, f"{i}.npy"), values.to_numpy())
+                kinds.append(values.dtype.kind)
+            else:
+                mask = values.isna().to_numpy()
+                encoded = [value.encode("utf-8") for value in values.fillna("").astype(str)]
+                offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+                offsets[1:] = np.cumsum([len(value) for value in encoded])
+                np.save(os.path.join(part_dir, f"{i}.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+                np.save(os.path.join(part_dir, f"{i}.offsets.npy"), offsets)
+                np.save(os.path.join(part_dir, f"{i}.mask.npy"), mask)
+                kinds.append("utf8")
+        return kinds
+
+    @staticmethod
+    def _read_strings(part_dir: str, i: int) -> np.ndarray:
+        """Cột string của một part -> mảng object (None ở ô null)"""
+        data = np.load(os.path.join(part_dir, f"{i}.npy"), mmap_mode="r").tobytes()
+        offsets = np.load(os.path.join(part_dir, f"{i}.offsets.npy")).tolist()
+        mask = np.load(os.path.join(part_dir, f"{i}.mask.npy"))
+        values = np.empty(len(mask), dtype=object)
+        values[:] = [data[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+        values[mask] = None
+        return values
+
+    def write(self, entry: str, validator: Optional[str], chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """
+        Ghi từng chunk vào cache trong khi trả chunk cho caller.
+        Cache chỉ được publish (rename) khi đọc hết nguồn, nên dừng giữa chừng không để lại cache hỏng.
+        """
+        tmp_entry = f"{entry}.tmp-{uuid.uuid4().hex}"
+        os.makedirs(tmp_entry)
+        columns, kinds, rows, parts = None, [], 0, 0
+        completed = False
+        try:
+            for chunk in chunks:
+                # dtype có thể khác nhau giữa các chunk (vd: cột toàn null) nên lưu kind theo từng part
+                kinds.append(self._write_part(os.path.join(tmp_entry, f"part-{parts:05d}"), chunk))
+                if columns is None:
+                    columns = [str(c) for c in chunk.columns]
+                rows += len(chunk)
+                parts += 1
+                yield chunk
+            completed = True
+        finally:
+            if completed:
+                with open(os.path.join(tmp_entry, "meta.json"), "w", encoding="utf-8") as f:
+                    json.dump({
+                        "version": CACHE_FORMAT_VERSION,
+                        "validator": validator,
+                        "created_at": time.time(),
+                        "columns": columns or [],
+                        "kinds": kinds,
+                        "rows": rows,
+                        "parts": parts,
+                    }, f, ensure_ascii=False)
+                shutil.rmtree(entry, ignore_errors=True)
+                os.replace(tmp_entry, entry)
+            else:
+                shutil.rmtree(tmp_entry, ignore_errors=True)
+
+    @staticmethod
+    def read(entry: str, meta: Dict[str, Any]) -> Iterator[pd.DataFrame]:
+        """Đọc lại từng part bằng memory-map (cột string chỉ decode cho part đang đọc)"""
+        for part in range(meta["parts"]):
+            part_dir = os.path.join(entry, f"part-{part:05d}")
+            data = {}
+            for i, (column, kind) in enumerate(zip(meta["columns"], meta["kinds"][part])):
+                if kind == "utf8":
+                    data[column] = SheetCache._read_strings(part_dir, i)
+                else:
+                    data[column] = np.load(os.path.join(part_dir, f"{i}.npy"), mmap_mode="r")
+            yield pd.DataFrame(data, columns=meta["columns"])
+
+
+def _rechunk(chunks: Iterator[pd.DataFrame], chunksize: int) -> Iterator[pd.DataFrame]:
+    """Gom/tách các chunk đọc từ cache theo chunksize caller yêu cầu"""
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        while len(chunk):
+            take = chunk.iloc[:chunksize - buffered]
+            chunk = chunk.iloc[len(take):]
+            buffer.append(take)
+            buffered += len(take)
+            if buffered == chunksize:
+                yield pd.concat(buffer, ignore_index=True)
+                buffer, buffered = [], 0
+    if buffered:
+        yield pd.concat(buffer, ignore_index=True)
+
+
+def iter_google_sheet(
+    url: str,
+    chunksize: int = 10000,
+    usecols: Optional[Sequence[Union[int, str]]] = None,
+    dtype: Optional[Dict[Union[int, str], Any]] = None,
+    skiprows: int = 1,
+    sep: str = "\t",
+    use_cache: bool = True,
+    cache_dir: str = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Đọc sheet (URL export TSV/CSV hoặc file local) theo từng chunk DataFrame
+    Args:
+        url: URL Google Sheet export hoặc đường dẫn file local
+        chunksize: số dòng mỗi chunk
+        usecols: chỉ đọc các cột này (index hoặc tên)
+        dtype: dtype cho từng cột (tránh pandas đoán kiểu trên từng chunk)
+        use_cache: dùng cache cột trên disk (bỏ qua tải + parse khi sheet không đổi)
+        cache_dir: thư mục cache (mặc định Settings.SHEET_CACHE_DIR)
+    """
+    read_options = {
+        "usecols": list(usecols) if usecols is not None else None,
+        "dtype": {str(k): str(v) for k, v in (dtype or {}).items()},
+        "skiprows": skiprows,
+        "sep": sep,
+    }
+    cache = SheetCache(cache_dir=cache_dir)
+    entry = cache.entry_path(url, read_options)
+    validator = _source_validator(url) if use_cache else None
+
+    if use_cache:
+        meta = cache.lookup(entry, validator)
+        if meta is not None:
+            yield from _rechunk(cache.read(entry, meta), chunksize)
+            return
+
+    chunks = pd.read_csv(
+        url, sep=sep, encoding="utf-8", skiprows=skiprows,
+        usecols=usecols, dtype=dtype, chunksize=chunksize
+    )
+    if use_cache:
+        os.makedirs(cache.cache_dir, exist_ok=True)
+        chunks = cache.write(entry, validator, chunks)
+    yield from chunks
+
 
-def fetch_google_sheet(url: str, column: int) -> pd.DataFrame:
+def fetch_google_sheet(
+    url: str,
+    column: Optional[int] = None,
+    chunksize: Optional[int] = None,
+    usecols: Optional[Sequence[Union[int, str]]] = None,
+    dtype: Optional[Dict[Union[int, str], Any]] = None,
+    use_cache: bool = True,
+    cache_dir: str = None
+) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
     """
     Đọc dữ liệu TSV từ Google Sheet về dạng pandas DataFrame
+    Args:
+        url: URL Google Sheet export TSV hoặc đường dẫn file local
+        column: index của một cột (tương thích cách gọi cũ fetch_google_sheet(url, column))
+        chunksize: nếu có thì trả về iterator các DataFrame thay vì cả sheet
+        usecols, dtype: cột cần đọc và dtype tương ứng
+        use_cache, cache_dir: dùng cache cột trên disk (mặc định Settings.SHEET_CACHE_DIR)
     """
+    if column is not None:
+        usecols = [column]
 
+    chunks = iter_google_sheet(
+        url,
+        chunksize=chunksize or 10000,
+        usecols=usecols,
+        dtype=dtype,
+        use_cache=use_cache,
+        cache_dir=cache_dir
+    )
+    if chunksize:
+        return chunks
 
-    df = pd.read_csv(url, sep="\t", encoding="utf-8", skiprows=1, usecols=[column])  
-    return df
+    frames = list(chunks)
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
@@ -0,0 +1,3 @@
+from .cache import SemanticCache, CacheEntry
+
+__all__ = ["SemanticCache", "CacheEntry"]
@@ -0,0 +1,159 @@
+"""
+Semantic cache cho các câu trả lời LLM theo route (vd: chitchat).
+Tra cứu bằng embedding của câu hỏi (đã tính sẵn khi routing) trên một
+ma trận embedding đã chuẩn hóa, trả về câu trả lời cũ nếu đủ giống.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+
+@dataclass
+class CacheEntry:
+    """Một câu hỏi đã trả lời được lưu trong cache"""
+    query: str
+    answer: str
+    created_at: float
+    last_access: float
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache nhỏ với TTL và giới hạn kích thước.
+
+    Embedding được lưu trong một ma trận liên tục (max_size x dim) đã chuẩn hóa,
+    nên mỗi lần lookup chỉ là một phép nhân ma trận-vector.
+    """
+
+    def __init__(self, name: str, threshold: float = 0.92, ttl: int = 3600, max_size: int = 512):
+        self.name = name
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None  # Khởi tạo khi biết số chiều
+        self._entries: list = [None] * max_size
+        self._free_slots = list(range(max_size - 1, -1, -1))
+
+        # Metrics
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return vector
+        return vector / norm
+
+    def _is_expired(self, entry: CacheEntry, now: float) -> bool:
+        return self.ttl > 0 and now - entry.created_at > self.ttl
+
+    def _remove_slot(self, slot: int):
+        self._entries[slot] = None
+        self._matrix[slot] = 0.0
+        self._free_slots.append(slot)
+
+    def lookup(self, embedding) -> Optional[str]:
+        """
+        Tìm câu trả lời đã cache cho embedding gần nhất.
+        Returns:
+            str: câu trả lời nếu similarity >= threshold, ngược lại None
+        """
+        query_vector = self._normalize(embedding)
+        now = time.time()
+
+        with self._lock:
+            if self._matrix is None or len(self._free_slots) == self.max_size:
+                self._misses += 1
+                return None
+
+            # Slot trống có vector 0 nên similarity = 0, không ảnh hưởng argmax
+            scores = self._matrix @ query_vector
+            while True:
+                slot = int(np.argmax(scores))
+                entry = self._entries[slot]
+                if entry is None or scores[slot] < self.threshold:
+                    self._misses += 1
+                    return None
+                if self._is_expired(entry, now):
+                    self._remove_slot(slot)
+                    self._expirations += 1
+                    scores[slot] = -np.inf
+                    continue
+                entry.last_access = now
+                self._hits += 1
+                return entry.answer
+
+    def add(self, embedding, query: str, answer: str):
+        """
+        Thêm một cặp câu hỏi/câu trả lời vào cache (LRU eviction khi đầy)
+        """
+        if not answer:
+            return
+        vector = self._normalize(embedding)
+        now = time.time()
+
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+
+            if not self._free_slots:
+                self._evict(now)
+
+            slot = self._free_slots.pop()
+            self._matrix[slot] = vector
+            self._entries[slot] = CacheEntry(query=query, answer=answer, created_at=now, last_access=now)
+
+    def _evict(self, now: float):
+        """Xóa các entry hết hạn, nếu không có thì xóa entry ít dùng gần đây nhất"""
+        expired = [
+            slot for slot, entry in enumerate(self._entries)
+            if entry is not None and self._is_expired(entry, now)
+        ]
+        for slot in expired:
+            self._remove_slot(slot)
+        self._expirations += len(expired)
+
+        if not self._free_slots:
+            lru_slot = min(
+                (slot for slot, entry in enumerate(self._entries) if entry is not None),
+                key=lambda slot: self._entries[slot].last_access
+            )
+            self._remove_slot(lru_slot)
+            self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._matrix = None
+            self._entries = [None] * self.max_size
+            self._free_slots = list(range(self.max_size - 1, -1, -1))
+
+    def __len__(self) -> int:
+        return self.max_size - len(self._free_slots)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Lấy metrics của cache (hit rate, kích thước, ...)
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "name": self.name,
+                "size": len(self),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "threshold": self.threshold,
+                "ttl": self.ttl
+            }
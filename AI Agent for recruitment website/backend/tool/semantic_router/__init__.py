@@ -1,5 +1,6 @@
 from .router import SemanticRouter
 from .route import Route
-from .sample import Sample
+from .sample import Sample, SlotSample
+from .slot_classifier import SlotClassifier
 
-__all__ = ["SemanticRouter", "Route", "Sample"]
\ No newline at end of file
+__all__ = ["SemanticRouter", "Route", "Sample", "SlotSample", "SlotClassifier"]
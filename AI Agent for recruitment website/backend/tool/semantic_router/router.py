@@ -14,9 +14,17 @@ class SemanticRouter():
     def get_routes(self):
         return self.routes
 
-    def guide(self, query):
-        queryEmbedding = self.embedding.encode([query]) 
-        queryEmbedding = queryEmbedding / np.linalg.norm(queryEmbedding)
+    def embed(self, query):
+        """
+        Tính embedding (đã chuẩn hóa) của query, có thể tái sử dụng cho guide() và semantic cache
+        """
+        queryEmbedding = self.embedding.encode([query])
+        return queryEmbedding / np.linalg.norm(queryEmbedding)
+
+    def guide(self, query, query_embedding=None):
+        if query_embedding is None:
+            query_embedding = self.embed(query)
+        queryEmbedding = query_embedding
         scores = []
 
         # Calculate the cosine similarity of the query embedding with the sample embeddings of the router.
@@ -27,4 +35,4 @@ class SemanticRouter():
             scores.append((score, route.name))
 
         scores.sort(reverse=True)
-        return scores[0]
\ No newline at end of file
+        return scores[0]
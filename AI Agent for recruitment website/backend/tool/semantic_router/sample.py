@@ -155,3 +155,81 @@ class Sample():
     
     
 
+
+
+class SlotSample():
+    """Câu trả lời mẫu khi bot đang hỏi thêm thông tin (slot filling)"""
+
+    location = [
+    "Hà Nội",
+    "Mình ở TP.HCM",
+    "Đà Nẵng nhé",
+    "Sài Gòn",
+    "Mình muốn làm ở Hải Phòng",
+    "Khu vực Cầu Giấy",
+    "Quận 1",
+    "Gần Thủ Đức thì tốt",
+    "Bình Dương",
+    "Làm remote được không?",
+    "Làm từ xa",
+    "Ở Cần Thơ",
+    "Chỗ nào gần trung tâm Hà Nội",
+    "Mình ở Huế",
+]
+
+    skills = [
+    "Mình biết Python và SQL",
+    "Có 2 năm kinh nghiệm ReactJS",
+    "Java, Spring Boot",
+    "Mình là fresher",
+    "Thành thạo Excel và Word",
+    "Biết tiếng Anh giao tiếp",
+    "Photoshop, Illustrator, Figma",
+    "Kỹ năng giao tiếp tốt",
+    "Mình có 3 năm kinh nghiệm bán hàng",
+    "NodeJS và Docker",
+    "Machine learning, TensorFlow",
+    "Chưa có kinh nghiệm",
+    "Mình mới ra trường",
+    "Biết lái xe và có bằng B2",
+]
+
+    salary = [
+    "Khoảng 15 triệu",
+    "Trên 20 triệu",
+    "1000 USD",
+    "Lương thỏa thuận",
+    "Từ 10 đến 12 triệu",
+    "Mức lương 25tr",
+    "Tầm 8 triệu một tháng",
+    "Lương không quan trọng lắm",
+    "Gross 30 triệu",
+    "Net 2000$",
+    "Ít nhất 7 triệu",
+    "Càng cao càng tốt",
+]
+
+    position = [
+    "Lập trình viên backend",
+    "Nhân viên marketing",
+    "Kế toán",
+    "Data Analyst",
+    "Mình muốn làm tester",
+    "Vị trí Product Manager",
+    "Thực tập sinh AI",
+    "Nhân viên bán hàng",
+    "Giáo viên tiếng Anh",
+    "Designer UI/UX",
+    "Frontend developer",
+    "Nhân viên chăm sóc khách hàng",
+    "Phục vụ nhà hàng",
+]
+
+    @classmethod
+    def as_dict(cls):
+        return {
+            "location": cls.location,
+            "skills": cls.skills,
+            "salary": cls.salary,
+            "position": cls.position
+        }
@@ -0,0 +1,93 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .route import Route
+from .router import SemanticRouter
+from .sample import SlotSample
+
+
+class SlotClassifier():
+    """
+    Phân loại câu trả lời của user khi bot đang hỏi thêm thông tin
+    (location, skills, salary, position) mà không cần gọi LLM.
+
+    Thứ tự: keyword tables của QuestionEnhancer -> embedding similarity với SlotSample.
+    Trả về slot None nếu độ tin cậy thấp hơn threshold để caller fallback sang LLM.
+    """
+
+    SLOTS = ["location", "skills", "salary", "position"]
+
+    def __init__(self, embedding, enhancer=None, threshold: float = 0.6, top_k: int = 3, samples: Dict[str, List[str]] = None):
+        if enhancer is None:
+            from tool.question_enhancer import QuestionEnhancer
+            enhancer = QuestionEnhancer()
+
+        self.threshold = threshold
+        self.top_k = top_k
+        samples = samples or SlotSample.as_dict()
+
+        routes = [Route(name=slot, samples=samples[slot]) for slot in self.SLOTS]
+        self.router = SemanticRouter(embedding=embedding, routes=routes)
+
+        # Chuẩn hóa từng sample để tính cosine similarity thật sự
+        self.samplesEmbedding = {}
+        for slot, sampleEmbedding in self.router.routesEmbedding.items():
+            sampleEmbedding = np.asarray(sampleEmbedding, dtype=np.float32)
+            norms = np.linalg.norm(sampleEmbedding, axis=1, keepdims=True)
+            self.samplesEmbedding[slot] = sampleEmbedding / np.maximum(norms, 1e-12)
+
+        self.keyword_patterns = self._build_keyword_patterns(enhancer)
+
+    @staticmethod
+    def _compile(keywords: List[str]):
+        keywords = sorted(set(keywords), key=len, reverse=True)
+        return re.compile(r"(?<!\w)(" + "|".join(re.escape(keyword) for keyword in keywords) + r")(?!\w)")
+
+    def _build_keyword_patterns(self, enhancer) -> Dict[str, "re.Pattern"]:
+        """Ghép keyword tables của QuestionEnhancer vào từng slot (match theo ranh giới từ)"""
+        location_keywords = [keyword for keywords in enhancer.location_keywords.values() for keyword in keywords]
+        position_keywords = [keyword for keywords in enhancer.job_keywords.values() for keyword in keywords]
+        return {
+            "location": self._compile(location_keywords),
+            "skills": self._compile(enhancer.experience_keywords),
+            "salary": self._compile(enhancer.salary_keywords),
+            "position": self._compile(position_keywords)
+        }
+
+    def _match_keywords(self, message: str) -> List[str]:
+        message_lower = message.lower()
+        return [slot for slot, pattern in self.keyword_patterns.items() if pattern.search(message_lower)]
+
+    def _score_embedding(self, message: str) -> Tuple[str, float]:
+        queryEmbedding = np.asarray(self.router.embed(message), dtype=np.float32).reshape(-1)
+        best_slot, best_score = None, -1.0
+
+        for slot, samplesEmbedding in self.samplesEmbedding.items():
+            similarities = samplesEmbedding @ queryEmbedding
+            top_k = min(self.top_k, similarities.shape[0])
+            score = float(np.mean(np.partition(similarities, -top_k)[-top_k:]))
+            if score > best_score:
+                best_slot, best_score = slot, score
+
+        return best_slot, best_score
+
+    def classify(self, message: str, expected_slot: Optional[str] = None) -> Tuple[Optional[str], float]:
+        """
+        Args:
+            message: câu trả lời của user
+            expected_slot: slot mà bot đang hỏi (dùng để phá thế hòa khi nhiều keyword khớp)
+        Returns:
+            tuple: (slot hoặc None nếu không đủ tin cậy, confidence)
+        """
+        matched_slots = self._match_keywords(message)
+        if len(matched_slots) == 1:
+            return matched_slots[0], 1.0
+        if expected_slot in matched_slots:
+            return expected_slot, 1.0
+
+        slot, score = self._score_embedding(message)
+        if score >= self.threshold:
+            return slot, score
+        return None, score
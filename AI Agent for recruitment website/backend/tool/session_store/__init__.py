@@ -0,0 +1,23 @@
+from .store import (
+    SessionStore,
+    MemorySessionStore,
+    SQLiteSessionStore,
+    FileSessionStore,
+    RedisSessionStore,
+    WriteBehindSessionStore,
+    create_session_store,
+    encode_state,
+    decode_state,
+)
+
+__all__ = [
+    "SessionStore",
+    "MemorySessionStore",
+    "SQLiteSessionStore",
+    "FileSessionStore",
+    "RedisSessionStore",
+    "WriteBehindSessionStore",
+    "create_session_store",
+    "encode_state",
+    "decode_state",
+]
@@ -0,0 +1,493 @@
+"""
+Session store: lưu state của chatbot (BaseChatbot.to_state()) ra ngoài process
+để nhiều worker (gunicorn) dùng chung một hội thoại.
+
+- SQLiteSessionStore: một file SQLite (WAL) dùng chung cho các worker trên cùng máy
+- FileSessionStore: mỗi session một file, ghi tạm rồi rename
+- RedisSessionStore: cho nhiều máy (cần package redis)
+- WriteBehindSessionStore: bọc một store, gom các lần save và ghi theo batch ở thread nền
+  để request không phải chờ ghi đồng bộ mỗi lượt chat
+
+Ghi có điều kiện theo revision ("rev" trong state): chỉ ghi khi rev lớn hơn bản trong store.
+Hai worker cùng ghi một revision (request song song của cùng session) thì bản ghi sau bị
+từ chối, được merge với bản trong store (merge=...) rồi ghi lại với revision mới.
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: FileSessionStore không khóa file khi so revision
+    fcntl = None
+
+from setting import Settings
+
+_RAW_PREFIX = b"j"
+_ZLIB_PREFIX = b"z"
+
+
+def encode_state(state: Dict[str, Any], compress_min_bytes: int = 1024) -> bytes:
+    """JSON gọn (không khoảng trắng, giữ unicode), nén zlib khi đủ lớn"""
+    raw = json.dumps(state, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    if compress_min_bytes is not None and len(raw) >= compress_min_bytes:
+        return _ZLIB_PREFIX + zlib.compress(raw, 6)
+    return _RAW_PREFIX + raw
+
+
+def decode_state(data: bytes) -> Optional[Dict[str, Any]]:
+    if not data:
+        return None
+    prefix, body = data[:1], data[1:]
+    try:
+        if prefix == _ZLIB_PREFIX:
+            body = zlib.decompress(body)
+        elif prefix != _RAW_PREFIX:
+            return None
+        return json.loads(body.decode("utf-8"))
+    except (zlib.error, ValueError) as e:
+        logger.warning(f"⚠️ Cannot decode session state: {e}")
+        return None
+
+
+class SessionStore:
+    """Interface chung của các backend"""
+
+    # Số lần merge + ghi lại khi revision bị worker khác ghi trước
+    max_merge_attempts = 3
+
+    def __init__(
+        self,
+        ttl: Optional[int] = None,
+        compress_min_bytes: int = 1024,
+        merge: Optional[Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]] = None
+    ):
+        """
+        merge(stored, local): gộp state bị từ chối (local) với bản trong store,
+        trả về state có rev lớn hơn bản trong store (vd: BaseChatbot.merge_states)
+        """
+        self.ttl = ttl
+        self.compress_min_bytes = compress_min_bytes
+        self.merge = merge
+
+    def load(self, session_id: str, newer_than: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        State của session, None nếu không có/hết hạn.
+        newer_than: chỉ trả về nếu revision trong store lớn hơn (dùng để kiểm tra bản local còn mới không)
+        """
+        raise NotImplementedError
+
+    def save(self, session_id: str, state: Dict[str, Any]):
+        self.save_many([(session_id, state)])
+
+    def save_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        """
+        Ghi các state có rev lớn hơn bản trong store; state bị từ chối được merge với bản
+        trong store rồi ghi lại. Trả về các session vẫn không ghi được (conflict).
+        """
+        states = dict(items)
+        conflicts = self._write_many(states.items())
+        for _ in range(self.max_merge_attempts):
+            if not conflicts or self.merge is None:
+                break
+            merged = {}
+            for sid in conflicts:
+                stored = self.load(sid)
+                merged[sid] = self.merge(stored, states[sid]) if stored else states[sid]
+            states = merged
+            conflicts = self._write_many(states.items())
+        if conflicts:
+            logger.bind(throttle=10).warning(f"⚠️ Session revision conflict, state not saved: {conflicts}")
+        return conflicts
+
+    def _write_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        """Ghi có điều kiện (rev mới hơn bản trong store hoặc bản trong store đã hết hạn), trả về session bị từ chối"""
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def _expired(self, updated_at: float) -> bool:
+        return bool(self.ttl) and time.time() - updated_at > self.ttl
+
+
+class MemorySessionStore(SessionStore):
+    """Store trong process (mặc định khi tắt persistence, và cho test)"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._data: Dict[str, Tuple[int, float, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, session_id, newer_than=None):
+        with self._lock:
+            entry = self._data.get(session_id)
+        if entry is None or self._expired(entry[1]):
+            return None
+        if newer_than is not None and entry[0] <= newer_than:
+            return None
+        return decode_state(entry[2])
+
+    def _write_many(self, items):
+        now = time.time()
+        encoded = [(sid, state.get("rev", 0), encode_state(state, self.compress_min_bytes)) for sid, state in items]
+        conflicts = []
+        with self._lock:
+            for sid, rev, data in encoded:
+                entry = self._data.get(sid)
+                if entry is not None and entry[0] >= rev and not self._expired(entry[1]):
+                    conflicts.append(sid)
+                    continue
+                self._data[sid] = (rev, now, data)
+        return conflicts
+
+    def delete(self, session_id):
+        with self._lock:
+            self._data.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Bảng sessions(session_id, rev, updated_at, state BLOB) trong một file SQLite ở chế độ WAL:
+    nhiều process đọc song song, ghi batch trong một transaction.
+    Mỗi thread dùng connection riêng.
+    """
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, rev INTEGER NOT NULL, "
+            "updated_at REAL NOT NULL, state BLOB NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # Sau fork, connection của process cha không dùng lại được
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def load(self, session_id, newer_than=None):
+        query = "SELECT updated_at, state FROM sessions WHERE session_id = ?"
+        params: Tuple = (session_id,)
+        if newer_than is not None:
+            query += " AND rev > ?"
+            params += (newer_than,)
+        row = self._conn().execute(query, params).fetchone()
+        if row is None or self._expired(row[0]):
+            return None
+        return decode_state(row[1])
+
+    def _write_many(self, items):
+        now = time.time()
+        # Bản trong store cũ hơn mốc này đã hết hạn: ghi đè bất kể revision
+        expired_before = now - self.ttl if self.ttl else float("-inf")
+        rows = [
+            (sid, state.get("rev", 0), now, encode_state(state, self.compress_min_bytes))
+            for sid, state in items
+        ]
+        conflicts = []
+        if not rows:
+            return conflicts
+        conn = self._conn()
+        with conn:
+            for row in rows:
+                cursor = conn.execute(
+                    "INSERT INTO sessions (session_id, rev, updated_at, state) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET rev = excluded.rev, "
+                    "updated_at = excluded.updated_at, state = excluded.state "
+                    "WHERE excluded.rev > sessions.rev OR sessions.updated_at < ?",
+                    row + (expired_before,)
+                )
+                if cursor.rowcount == 0:
+                    conflicts.append(row[0])
+        return conflicts
+
+    def delete(self, session_id):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def purge_expired(self) -> int:
+        if not self.ttl:
+            return 0
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl,))
+        return cursor.rowcount
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class FileSessionStore(SessionStore):
+    """Mỗi session một file <dir>/<session_id>.state (revision nằm trong state)"""
+
+    def __init__(self, directory: str, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        safe_id = "".join(ch for ch in session_id if ch.isalnum() or ch in "-_")
+        return os.path.join(self.directory, f"{safe_id}.state")
+
+    def load(self, session_id, newer_than=None):
+        path = self._path(session_id)
+        try:
+            if self._expired(os.path.getmtime(path)):
+                return None
+            with open(path, "rb") as f:
+                state = decode_state(f.read())
+        except OSError:
+            return None
+        if state is None or (newer_than is not None and state.get("rev", 0) <= newer_than):
+            return None
+        return state
+
+    def _stored_rev(self, path: str) -> Optional[int]:
+        """Revision của file state hiện có, None nếu không có hoặc đã hết hạn"""
+        try:
+            if self._expired(os.path.getmtime(path)):
+                return None
+            with open(path, "rb") as f:
+                state = decode_state(f.read())
+        except OSError:
+            return None
+        return state.get("rev", 0) if state is not None else None
+
+    def _write_many(self, items):
+        conflicts = []
+        for sid, state in items:
+            path = self._path(sid)
+            rev = state.get("rev", 0)
+            # Khóa theo session (file .lock) để so revision và rename là một bước với các process khác
+            with open(f"{path}.lock", "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                stored_rev = self._stored_rev(path)
+                if stored_rev is not None and stored_rev >= rev:
+                    conflicts.append(sid)
+                    continue
+                tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+                with open(tmp_path, "wb") as f:
+                    f.write(encode_state(state, self.compress_min_bytes))
+                os.replace(tmp_path, path)
+        return conflicts
+
+    def delete(self, session_id):
+        path = self._path(session_id)
+        for file_path in (path, f"{path}.lock"):
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+
+
+class RedisSessionStore(SessionStore):
+    """Mỗi session là một hash {rev, state} với TTL, ghi batch bằng pipeline"""
+
+    # Ghi khi rev mới hơn (so sánh và ghi trong một lệnh, atomic trên Redis)
+    _SAVE_IF_NEWER = """
+local current = redis.call('HGET', KEYS[1], 'rev')
+if current and tonumber(current) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'rev', ARGV[1], 'state', ARGV[2])
+if tonumber(ARGV[3]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return 1
+"""
+
+    def __init__(self, url: str, prefix: str = "session:", **kwargs):
+        super().__init__(**kwargs)
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("RedisSessionStore cần package redis (pip install redis)") from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._save_if_newer = self.client.register_script(self._SAVE_IF_NEWER)
+
+    def load(self, session_id, newer_than=None):
+        key = self.prefix + session_id
+        if newer_than is not None:
+            rev = self.client.hget(key, "rev")
+            if rev is None or int(rev) <= newer_than:
+                return None
+        data = self.client.hget(key, "state")
+        return decode_state(data) if data else None
+
+    def _write_many(self, items):
+        pipe = self.client.pipeline(transaction=False)
+        session_ids = []
+        for sid, state in items:
+            session_ids.append(sid)
+            self._save_if_newer(
+                keys=[self.prefix + sid],
+                args=[state.get("rev", 0), encode_state(state, self.compress_min_bytes), self.ttl or 0],
+                client=pipe
+            )
+        results = pipe.execute() if session_ids else []
+        return [sid for sid, written in zip(session_ids, results) if not written]
+
+    def delete(self, session_id):
+        self.client.delete(self.prefix + session_id)
+
+    def close(self):
+        self.client.close()
+
+
+class WriteBehindSessionStore(SessionStore):
+    """
+    Write-behind: save() chỉ ghi vào bảng pending (lần save sau đè lần trước của cùng session),
+    thread nền flush theo chu kỳ `interval` hoặc khi pending đạt `max_batch`.
+    load() đọc pending trước để process luôn thấy bản mới nhất của chính nó.
+    """
+
+    def __init__(self, backend: SessionStore, interval: float = 0.05, max_batch: int = 256):
+        super().__init__(ttl=backend.ttl, compress_min_bytes=backend.compress_min_bytes, merge=backend.merge)
+        self.backend = backend
+        self.interval = interval
+        self.max_batch = max_batch
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._closed = False
+        self.stats = {"saves": 0, "writes": 0, "batches": 0, "errors": 0, "conflicts": 0}
+        atexit.register(self.close)
+
+    def _ensure_thread(self):
+        # Thread không sống qua fork: tạo lại khi pid đổi
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="session-write-behind", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def load(self, session_id, newer_than=None):
+        with self._lock:
+            state = self._pending.get(session_id)
+        if state is not None:
+            if newer_than is not None and state.get("rev", 0) <= newer_than:
+                return None
+            return state
+        return self.backend.load(session_id, newer_than=newer_than)
+
+    def save_many(self, items):
+        with self._lock:
+            for sid, state in items:
+                self._pending[sid] = state
+                self.stats["saves"] += 1
+            pending = len(self._pending)
+        if self._closed:
+            self.flush()
+            return []
+        self._ensure_thread()
+        if pending >= self.max_batch:
+            self._wakeup.set()
+        # Conflict (nếu có) được backend merge khi flush
+        return []
+
+    def delete(self, session_id):
+        with self._lock:
+            self._pending.pop(session_id, None)
+        self.backend.delete(session_id)
+
+    def flush(self):
+        """Ghi toàn bộ pending xuống backend (gọi đồng bộ được, vd: trước khi tắt worker)"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, {}
+            try:
+                conflicts = self.backend.save_many(batch.items()) or []
+                self.stats["writes"] += len(batch) - len(conflicts)
+                self.stats["conflicts"] += len(conflicts)
+                self.stats["batches"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.bind(throttle=10).warning(f"⚠️ Session write-behind failed ({len(batch)} sessions): {e}")
+                # Trả lại pending (không đè bản mới hơn đã được save trong lúc ghi)
+                with self._lock:
+                    for sid, state in batch.items():
+                        self._pending.setdefault(sid, state)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {**self.stats, "pending": pending, "backend": type(self.backend).__name__}
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+        self.backend.close()
+
+
+def create_session_store(settings: Settings = None, merge: Optional[Callable] = None) -> SessionStore:
+    """
+    Tạo store theo Settings.SESSION_STORE_BACKEND (kèm write-behind nếu interval > 0).
+    merge: hàm gộp state khi conflict revision (xem SessionStore)
+    """
+    settings = settings or Settings.load_settings()
+    backend_name = (settings.SESSION_STORE_BACKEND or "memory").lower()
+    options = {"ttl": settings.SESSION_TTL, "compress_min_bytes": settings.SESSION_COMPRESS_MIN_BYTES, "merge": merge}
+
+    if backend_name == "sqlite":
+        backend = SQLiteSessionStore(settings.SESSION_STORE_PATH, **options)
+    elif backend_name == "file":
+        backend = FileSessionStore(settings.SESSION_STORE_PATH, **options)
+    elif backend_name == "redis":
+        backend = RedisSessionStore(settings.SESSION_REDIS_URL, **options)
+    elif backend_name == "memory":
+        return MemorySessionStore(**options)
+    else:
+        raise ValueError(f"Unknown SESSION_STORE_BACKEND: {settings.SESSION_STORE_BACKEND}")
+
+    if settings.SESSION_WRITE_BEHIND_INTERVAL > 0:
+        return WriteBehindSessionStore(
+            backend,
+            interval=settings.SESSION_WRITE_BEHIND_INTERVAL,
+            max_batch=settings.SESSION_WRITE_BEHIND_MAX_BATCH
+        )
+    return backend
@@ -0,0 +1,139 @@
+"""
+Single-flight: các call giống hệt nhau đang chạy đồng thời chỉ thực hiện một lần,
+các call đến sau chờ và nhận chung kết quả (hoặc exception) của call đầu tiên.
+
+Dùng cho LLM call deterministic (temperature 0 / có seed, khóa theo model + message
+đã chuẩn hóa + options) và embedding của query (khóa theo text). Chỉ gộp call đang
+chạy, không cache kết quả sau khi call xong.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from setting import Settings
+
+
+def _normalize_text(text: Any) -> Any:
+    return " ".join(text.split()) if isinstance(text, str) else text
+
+
+def llm_call_key(path: str, payload: Dict[str, Any]) -> Optional[str]:
+    """
+    Khóa single-flight của một request Ollama, None nếu kết quả không deterministic
+    (temperature khác 0 và không có seed) hoặc là request stream
+    """
+    options = payload.get("options") or {}
+    if payload.get("stream") or (options.get("temperature") != 0 and "seed" not in options):
+        return None
+    normalized = dict(payload)
+    if "messages" in normalized:
+        normalized["messages"] = [
+            {**message, "content": _normalize_text(message.get("content"))} for message in normalized["messages"]
+        ]
+    if "prompt" in normalized:
+        normalized["prompt"] = _normalize_text(normalized["prompt"])
+    raw = json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+    return f"{path}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+
+class SingleFlight:
+    """Gộp các call cùng khóa đang chạy (dùng được cả từ thread lẫn event loop)"""
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._stats = {"calls": 0, "executed": 0, "coalesced": 0, "errors": 0}
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """Trả về (future của call đang chạy, True nếu call này là leader)"""
+        with self._lock:
+            self._stats["calls"] += 1
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                return future, False
+            future = self._calls[key] = Future()
+            # RUNNING: future dùng chung không thể bị cancel bởi một follower
+            future.set_running_or_notify_cancel()
+            self._stats["executed"] += 1
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future, result: Any = None, error: Optional[BaseException] = None):
+        with self._lock:
+            self._calls.pop(key, None)
+            if error is not None:
+                self._stats["errors"] += 1
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    def do(self, key: Optional[Hashable], fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Chạy fn() hoặc chờ call cùng khóa đang chạy.
+        Returns: (kết quả, True nếu kết quả được chia sẻ từ call khác)
+        """
+        if key is None or not self.enabled:
+            return fn(), False
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result, False
+
+    async def ado(self, key: Optional[Hashable], fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """do() bản async: call đến sau await future của leader, không chặn event loop"""
+        if key is None or not self.enabled:
+            return await fn(), False
+        future, leader = self._join(key)
+        if not leader:
+            # shield: follower bị cancel (client ngắt kết nối) không ảnh hưởng leader và các follower khác
+            return await asyncio.shield(asyncio.wrap_future(future)), True
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result, False
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        stats["coalesced_ratio"] = round(stats["coalesced"] / stats["calls"], 4) if stats["calls"] else 0.0
+        return stats
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """SingleFlight dùng chung trong process theo tên ("llm", "embedding", ...)"""
+    group = _groups.get(name)
+    if group is None:
+        with _groups_lock:
+            group = _groups.get(name)
+            if group is None:
+                group = _groups[name] = SingleFlight(name, enabled=Settings.load_settings().SINGLE_FLIGHT_ENABLED)
+    return group
+
+
+def get_single_flight_stats() -> Dict[str, Any]:
+    with _groups_lock:
+        groups = dict(_groups)
+    return {name: group.get_stats() for name, group in groups.items()}
@@ -0,0 +1,129 @@
+"""
+Stage scheduler để chạy song song các bước độc lập trong một lượt chat
+(routing, phân tích keyword, trích xuất đặc trưng, ...) và hủy các bước
+speculative khi kết quả không còn cần thiết.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from setting import Settings
+from tool.tracing import trace_span
+
+
+class StagePass:
+    """Các stage của một lượt xử lý (một request)"""
+
+    def __init__(self, scheduler: "StageScheduler"):
+        self.scheduler = scheduler
+        self.futures: Dict[str, Future] = {}
+        self.speculative: Dict[str, bool] = {}
+        self.consumed = set()
+        self.timings: Dict[str, float] = {}
+
+    def submit(self, name: str, fn: Callable, *args, speculative: bool = False, **kwargs) -> Future:
+        """
+        Chạy một stage trên thread pool
+        Args:
+            name: tên stage (duy nhất trong một pass)
+            fn: hàm cần chạy
+            speculative: True nếu kết quả có thể không được dùng (sẽ bị hủy khi đóng pass)
+        """
+        # Copy context để contextvars (session, priority, ...) đi theo sang thread khác
+        context = contextvars.copy_context()
+
+        def traced_stage():
+            with trace_span(f"stage.{name}", speculative=speculative):
+                return fn(*args, **kwargs)
+
+        def run_stage():
+            start_time = time.perf_counter()
+            try:
+                return context.run(traced_stage)
+            finally:
+                self.timings[name] = time.perf_counter() - start_time
+
+        future = self.scheduler.executor.submit(run_stage)
+        self.futures[name] = future
+        self.speculative[name] = speculative
+        return future
+
+    def result(self, name: str, timeout: Optional[float] = None) -> Any:
+        """Chờ và lấy kết quả của một stage"""
+        self.consumed.add(name)
+        return self.futures[name].result(timeout=timeout)
+
+    def has(self, name: str) -> bool:
+        return name in self.futures
+
+    def cancel(self, name: str) -> bool:
+        """
+        Hủy một stage. Stage chưa chạy sẽ không bao giờ chạy;
+        stage đang chạy thì kết quả bị bỏ qua.
+        """
+        future = self.futures.get(name)
+        if future is None or name in self.consumed:
+            return False
+        self.consumed.add(name)
+        cancelled = future.cancel()
+        self.scheduler._record_cancel(cancelled)
+        return True
+
+    def close(self):
+        """Hủy tất cả stage speculative chưa được dùng"""
+        for name, speculative in self.speculative.items():
+            if speculative and name not in self.consumed:
+                self.cancel(name)
+
+    def __enter__(self) -> "StagePass":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class StageScheduler:
+    """Thread pool dùng chung cho các stage của mọi request"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.stats = {"cancelled_before_start": 0, "discarded_running": 0}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    max_workers = self.max_workers or Settings.load_settings().STAGE_SCHEDULER_WORKERS
+                    self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage")
+        return self._executor
+
+    def run_pass(self) -> StagePass:
+        """Tạo một pass mới cho một lượt xử lý"""
+        return StagePass(self)
+
+    def _record_cancel(self, cancelled: bool):
+        with self._lock:
+            if cancelled:
+                self.stats["cancelled_before_start"] += 1
+            else:
+                self.stats["discarded_running"] += 1
+
+    def reset_after_fork(self):
+        """Thread của executor không tồn tại trong process con: bỏ executor cũ, tạo lại khi cần"""
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def shutdown(self, wait: bool = False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+# Global instance
+stage_scheduler = StageScheduler()
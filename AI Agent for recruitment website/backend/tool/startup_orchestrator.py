@@ -0,0 +1,258 @@
+"""
+Startup orchestrator: chạy song song các bước warm-up độc lập khi khởi động
+(load embedding model, dựng route index hoặc kết nối MCP tool server, warm-up Ollama, ping MongoDB, ...),
+ghi lại thời gian từng bước và cho biết khi nào node sẵn sàng nhận traffic (/ready).
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from loguru import logger
+
+from setting import Settings
+
+PENDING = "pending"
+RUNNING = "running"
+RETRYING = "retrying"
+DONE = "done"
+FAILED = "failed"
+
+
+class WarmupTask:
+    """Một bước warm-up"""
+
+    def __init__(self, name: str, fn: Callable[[], Any], critical: bool = True, depends_on: Iterable[str] = ()):
+        self.name = name
+        self.fn = fn
+        self.critical = critical  # Node chỉ ready khi mọi task critical đã xong
+        self.depends_on = tuple(depends_on)
+        self.status = PENDING
+        self.attempts = 0
+        self.duration: Optional[float] = None  # Thời gian của lần chạy gần nhất (giây)
+        self.error: Optional[str] = None
+        self.finished = threading.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "critical": self.critical,
+            "attempts": self.attempts,
+            "duration": round(self.duration, 3) if self.duration is not None else None,
+            "error": self.error,
+        }
+
+
+class StartupOrchestrator:
+    """
+    Chạy các WarmupTask trên thread riêng (task có depends_on chờ task kia xong).
+    Task critical bị lỗi được thử lại sau retry_interval giây (vd: Ollama khởi động chậm hơn app).
+    """
+
+    def __init__(self, retry_interval: float = 10.0):
+        self.retry_interval = retry_interval
+        self.tasks: Dict[str, WarmupTask] = {}
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+
+    def register(self, name: str, fn: Callable[[], Any], critical: bool = True, depends_on: Iterable[str] = ()):
+        """Thêm một task (trước khi start)"""
+        unknown = [dep for dep in depends_on if dep not in self.tasks]
+        if unknown:
+            raise ValueError(f"Warm-up task {name} depends on unknown tasks: {unknown}")
+        with self._lock:
+            self.tasks[name] = WarmupTask(name, fn, critical=critical, depends_on=depends_on)
+
+    def _run(self, task: WarmupTask):
+        for dep_name in task.depends_on:
+            dependency = self.tasks[dep_name]
+            dependency.finished.wait()
+            if dependency.status != DONE:
+                task.status = FAILED
+                task.error = f"dependency {dep_name} failed"
+                task.finished.set()
+                return
+
+        while True:
+            task.status = RUNNING
+            task.attempts += 1
+            start_time = time.perf_counter()
+            try:
+                task.fn()
+                task.status = DONE
+                task.error = None
+                logger.info(f"✅ Warm-up {task.name} done in {time.perf_counter() - start_time:.2f}s")
+                break
+            except Exception as e:
+                task.error = f"{type(e).__name__}: {e}"
+                if not task.critical or self.retry_interval <= 0:
+                    task.status = FAILED
+                    logger.warning(f"⚠️ Warm-up {task.name} failed: {task.error}")
+                    break
+                task.status = RETRYING
+                logger.warning(f"⚠️ Warm-up {task.name} failed ({task.error}), retrying in {self.retry_interval:.0f}s")
+            finally:
+                task.duration = time.perf_counter() - start_time
+            time.sleep(self.retry_interval)
+
+        task.finished.set()
+        if self.ready_at is None and self.is_ready():
+            self.ready_at = time.time()
+            logger.info(f"🎯 Critical warm-up finished in {self.ready_at - self.started_at:.2f}s, node is ready")
+
+    def start(self) -> "StartupOrchestrator":
+        """Chạy các task chưa xong (gọi nhiều lần chỉ chạy một lần mỗi process)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return self
+            self._pid = os.getpid()
+            if self.started_at is None:
+                self.started_at = time.time()
+            pending = [task for task in self.tasks.values() if task.status not in (DONE, FAILED)]
+            for task in pending:
+                task.status = PENDING
+                task.finished = threading.Event()
+
+        for task in pending:
+            threading.Thread(target=self._run, args=(task,), name=f"warmup-{task.name}", daemon=True).start()
+        if not pending and self.ready_at is None and self.is_ready():
+            self.ready_at = time.time()
+        return self
+
+    def is_ready(self) -> bool:
+        """True khi mọi task critical đã chạy xong thành công"""
+        return self._pid is not None and all(
+            task.status == DONE for task in self.tasks.values() if task.critical
+        )
+
+    def wait(self, timeout: Optional[float] = None, critical_only: bool = True) -> bool:
+        """Chờ các task (mặc định chỉ task critical) xong, trả về is_ready()"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for task in list(self.tasks.values()):
+            if critical_only and not task.critical:
+                continue
+            remaining = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+            if not task.finished.wait(remaining):
+                break
+        return self.is_ready()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.is_ready(),
+            "startup_seconds": round(self.ready_at - self.started_at, 3) if self.ready_at and self.started_at else None,
+            "tasks": {name: task.to_dict() for name, task in self.tasks.items()},
+        }
+
+    def reset_after_fork(self):
+        """Thread warm-up không tồn tại trong process con: chạy lại các task chưa xong"""
+        self._lock = threading.Lock()
+        if self._pid is not None:
+            self.start()
+
+
+def warm_ollama_models(settings: Settings):
+    """
+    Load các model tier (theo tên đầy đủ, vd: hf.co/...:Q4_K_M) vào Ollama,
+    đặt keep-alive và giao cho residency manager gia hạn định kỳ
+    """
+    from llms.residency import get_residency_manager
+    from tool.model_manager import model_manager
+
+    models = {}
+    for task in ["answer", *settings.LLM_TASK_MODELS]:
+        llm = model_manager.get_llm_model(task=task)
+        models.setdefault(llm.model_name, llm)
+
+    residency = get_residency_manager(model_manager._default_ollama_url())
+    residency.track(models)
+    residency.start()
+
+    failed = [name for name, llm in models.items() if not llm.keep_alive(settings.MODEL_KEEP_ALIVE)]
+    if failed:
+        raise RuntimeError(f"Ollama warm-up failed for {failed}")
+    logger.info(f"✅ Ollama models warmed up: {list(models)}")
+
+
+def check_mongo(settings: Settings):
+    """Ping MongoDB và kiểm tra index job_key của collection job"""
+    from pymongo import MongoClient
+
+    client = MongoClient(settings.DATABASE_HOST, serverSelectionTimeoutMS=int(settings.STARTUP_MONGO_TIMEOUT * 1000))
+    try:
+        client.admin.command("ping")
+        collection = client[settings.DATABASE_NAME][settings.COLLECTION_JOB or "jobs"]
+        indexed = any(
+            info["key"][0][0] == "job_key" for info in collection.index_information().values()
+        )
+        if not indexed:
+            logger.warning(f"⚠️ Collection {collection.name} has no job_key index (run job ingestion to create it)")
+    finally:
+        client.close()
+
+
+def connect_mcp_pool(settings: Settings):
+    """Kết nối pool MCP tới tool server (Settings.MCP_SERVER_URL) và lấy danh sách tool"""
+    from llms.mcp_client import get_mcp_client_pool
+
+    tools = get_mcp_client_pool(settings.MCP_SERVER_URL).list_tools()
+    logger.info(f"✅ MCP tool server {settings.MCP_SERVER_URL} connected ({len(tools)} tools)")
+
+
+def register_default_tasks(orchestrator: StartupOrchestrator, settings: Settings):
+    """
+    Các bước warm-up của app; task nằm trong STARTUP_CRITICAL_TASKS là critical.
+    Có Settings.MCP_SERVER_URL thì model embedding / route index nằm ở tool server:
+    process này không load chúng mà chờ kết nối được tool server (task mcp_pool)
+    """
+    from tool.model_manager import model_manager
+
+    critical = set(settings.STARTUP_CRITICAL_TASKS)
+
+    if settings.MCP_SERVER_URL:
+        orchestrator.register(
+            "mcp_pool", lambda: connect_mcp_pool(settings),
+            critical="mcp_pool" in critical
+        )
+    elif settings.ENABLE_MODEL_PRELOAD:
+        orchestrator.register(
+            "embedding_model", model_manager.get_embedding_model,
+            critical="embedding_model" in critical
+        )
+
+        def build_route_index():
+            model_manager.get_semantic_router()
+            model_manager.get_slot_classifier()
+
+        orchestrator.register(
+            "route_index", build_route_index,
+            critical="route_index" in critical, depends_on=["embedding_model"]
+        )
+
+    if settings.ENABLE_MODEL_PRELOAD:
+        # LLM vẫn được gọi trực tiếp từ process này (kể cả khi tool ở tool server)
+        orchestrator.register(
+            "ollama_warmup", lambda: warm_ollama_models(settings),
+            critical="ollama_warmup" in critical
+        )
+
+    orchestrator.register("mongo", lambda: check_mongo(settings), critical="mongo" in critical)
+
+
+# Global instance
+startup_orchestrator = StartupOrchestrator()
+_defaults_registered = False
+
+
+def start_warmup(settings: Optional[Settings] = None) -> StartupOrchestrator:
+    """Đăng ký các task mặc định (một lần) và chạy warm-up nền cho process hiện tại"""
+    global _defaults_registered
+    settings = settings or Settings.load_settings()
+    with startup_orchestrator._lock:
+        register = not _defaults_registered
+        _defaults_registered = True
+    if register:
+        startup_orchestrator.retry_interval = settings.STARTUP_RETRY_INTERVAL
+        register_default_tasks(startup_orchestrator, settings)
+    return startup_orchestrator.start()
@@ -0,0 +1,45 @@
+from .tracer import (
+    NOOP_SPAN,
+    SPAN_KIND_CLIENT,
+    SPAN_KIND_INTERNAL,
+    SPAN_KIND_SERVER,
+    Span,
+    Tracer,
+    create_tracer,
+    current_span,
+    current_trace_id,
+    get_tracer,
+    parse_traceparent,
+    reset_tracer_after_fork,
+    set_tracer,
+    trace_span,
+    traced,
+)
+from .exporters import (
+    SpanExporter,
+    InMemorySpanExporter,
+    JsonlSpanExporter,
+    OTLPHttpSpanExporter,
+)
+
+__all__ = [
+    "NOOP_SPAN",
+    "SPAN_KIND_CLIENT",
+    "SPAN_KIND_INTERNAL",
+    "SPAN_KIND_SERVER",
+    "Span",
+    "Tracer",
+    "create_tracer",
+    "current_span",
+    "current_trace_id",
+    "get_tracer",
+    "parse_traceparent",
+    "reset_tracer_after_fork",
+    "set_tracer",
+    "trace_span",
+    "traced",
+    "SpanExporter",
+    "InMemorySpanExporter",
+    "JsonlSpanExporter",
+    "OTLPHttpSpanExporter",
+]
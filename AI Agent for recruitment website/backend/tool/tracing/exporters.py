@@ -0,0 +1,137 @@
+"""
+Exporter cho span đã kết thúc:
+- JsonlSpanExporter: ghi mỗi span một dòng JSON (xem offline, không cần collector)
+- OTLPHttpSpanExporter: gửi OTLP/HTTP JSON (/v1/traces) tới OpenTelemetry Collector, Jaeger, Tempo, ...
+- InMemorySpanExporter: giữ span trong memory (test, debug)
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import requests
+
+# Mã SpanKind / StatusCode của OTLP
+_OTLP_KIND = {"internal": 1, "server": 2, "client": 3}
+_OTLP_STATUS = {"ok": 1, "error": 2}
+
+
+class SpanExporter:
+    """Interface: export() được gọi từ thread nền của Tracer với một batch span"""
+
+    def export(self, spans: List[Any]):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    def __init__(self):
+        self.spans: List[Any] = []
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        with self._lock:
+            self.spans.extend(spans)
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+
+class JsonlSpanExporter(SpanExporter):
+    """
+    Append span vào file JSONL (một lần write cho cả batch, an toàn khi nhiều worker cùng ghi).
+    File vượt max_bytes thì đổi tên thành <path>.1 (giữ một bản cũ) và ghi sang file mới.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _rotate(self):
+        try:
+            if os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+        except FileNotFoundError:
+            # Worker khác vừa rotate
+            pass
+
+    def export(self, spans):
+        lines = "".join(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n" for span in spans)
+        if self.max_bytes:
+            self._rotate()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+class OTLPHttpSpanExporter(SpanExporter):
+    """Gửi span theo OTLP/HTTP JSON encoding (không cần opentelemetry-sdk)"""
+
+    def __init__(self, endpoint: str, service_name: str = "ai-recruitment-agent",
+                 headers: Optional[Dict[str, str]] = None, timeout: float = 5.0):
+        endpoint = endpoint.rstrip("/")
+        self.url = endpoint if endpoint.endswith("/v1/traces") else f"{endpoint}/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json", **(headers or {})})
+
+    def _span_to_otlp(self, span) -> Dict[str, Any]:
+        data = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": _OTLP_KIND.get(span.kind, 1),
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": _otlp_attributes(span.attributes),
+            "status": {"code": _OTLP_STATUS.get(span.status, 0)},
+        }
+        if span.parent_id:
+            data["parentSpanId"] = span.parent_id
+        if span.error:
+            data["status"]["message"] = span.error
+        return data
+
+    def to_payload(self, spans) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({
+                    "service.name": self.service_name,
+                    "process.pid": os.getpid(),
+                })},
+                "scopeSpans": [{
+                    "scope": {"name": "tool.tracing"},
+                    "spans": [self._span_to_otlp(span) for span in spans],
+                }],
+            }]
+        }
+
+    def export(self, spans):
+        response = self.session.post(self.url, data=json.dumps(self.to_payload(spans), default=str), timeout=self.timeout)
+        if response.status_code >= 300:
+            raise RuntimeError(f"OTLP collector returned {response.status_code}: {response.text[:200]}")
+
+    def shutdown(self):
+        self.session.close()
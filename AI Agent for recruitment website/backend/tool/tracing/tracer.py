@@ -0,0 +1,365 @@
+"""
+Tracing nhẹ cho một lượt chat (Flask -> chatbot -> MCP tool -> Ollama/Mongo):
+- span lồng nhau theo contextvars (đi theo sang thread của stage scheduler)
+- trace id trả về trong header của response, nhận traceparent (W3C) từ upstream
+- sampling theo tỉ lệ ở root span; span không được sample không ghi attribute, không export
+- export theo batch trên thread nền (exporter không chặn request)
+"""
+import asyncio
+import atexit
+import functools
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from loguru import logger
+
+from setting import Settings
+
+SPAN_KIND_INTERNAL = "internal"
+SPAN_KIND_SERVER = "server"
+SPAN_KIND_CLIENT = "client"
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def parse_traceparent(header: Optional[str]):
+    """traceparent W3C -> (trace_id, parent span id, sampled) hoặc None"""
+    match = _TRACEPARENT_RE.match((header or "").strip().lower())
+    if match is None or match.group(1) == "0" * 32:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+class Span:
+    """Một đoạn công việc có thời gian bắt đầu/kết thúc, thuộc một trace"""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "sampled",
+                 "start_ns", "end_ns", "attributes", "status", "error", "_token")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool,
+                 kind: str = SPAN_KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = dict(attributes) if sampled and attributes else {}
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        if self.sampled and value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        if self.sampled:
+            self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def record_exception(self, error: BaseException):
+        self.status = "error"
+        if self.sampled:
+            self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Thời gian chạy (giây), None nếu chưa kết thúc"""
+        return (self.end_ns - self.start_ns) / 1e9 if self.end_ns is not None else None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration * 1000, 3) if self.end_ns is not None else None,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Span khi tracing tắt: mọi thao tác đều bỏ qua"""
+
+    name = kind = trace_id = span_id = parent_id = error = None
+    sampled = False
+    status = "ok"
+    duration = None
+    attributes: Dict[str, Any] = {}
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+    def record_exception(self, error):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Tạo span và đẩy span đã kết thúc (được sample) vào hàng đợi;
+    thread nền gom batch gửi cho exporter mỗi `interval` giây hoặc khi đủ `batch_size` span.
+    """
+
+    def __init__(self, exporter=None, sample_rate: float = 1.0, enabled: bool = True,
+                 max_queue: int = 2048, batch_size: int = 256, interval: float = 2.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.enabled = enabled and exporter is not None
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: deque = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._closed = False
+        self.stats = {"traces": 0, "sampled_traces": 0, "spans": 0, "exported": 0, "dropped": 0, "export_errors": 0}
+        atexit.register(self.shutdown)
+
+    def _should_sample(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def start_span(self, name: str, kind: str = SPAN_KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None,
+                   traceparent: Optional[str] = None):
+        """
+        Bắt đầu span con của span hiện tại (hoặc root span, tiếp tục trace của traceparent nếu có)
+        và đặt nó làm span hiện tại. Phải gọi end_span() trong cùng context.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = _current_span.get()
+        if parent is not None:
+            span = Span(name, parent.trace_id, parent.span_id, parent.sampled, kind, attributes)
+        else:
+            upstream = parse_traceparent(traceparent)
+            if upstream is not None:
+                trace_id, parent_id, sampled = upstream
+            else:
+                trace_id, parent_id, sampled = _new_id(128), None, self._should_sample()
+            span = Span(name, trace_id, parent_id, sampled, kind, attributes)
+            self.stats["traces"] += 1
+            if sampled:
+                self.stats["sampled_traces"] += 1
+        span._token = _current_span.set(span)
+        return span
+
+    def end_span(self, span, error: Optional[BaseException] = None):
+        """Kết thúc span, trả span cha về làm span hiện tại"""
+        if span is NOOP_SPAN:
+            return
+        if error is not None:
+            span.record_exception(error)
+        span.end_ns = time.time_ns()
+        if span._token is not None:
+            try:
+                _current_span.reset(span._token)
+            except ValueError:  # end_span ở context khác (vd: teardown của Flask)
+                _current_span.set(None)
+            span._token = None
+        if span.sampled:
+            self._enqueue(span)
+
+    @contextmanager
+    def span(self, name: str, kind: str = SPAN_KIND_INTERNAL, **attributes) -> Iterator[Span]:
+        """with tracer.span("ollama /api/chat", kind=SPAN_KIND_CLIENT, model=...) as span: ..."""
+        span = self.start_span(name, kind, attributes)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, e)
+            raise
+        else:
+            self.end_span(span)
+
+    def _enqueue(self, span: Span):
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.stats["dropped"] += 1
+                return
+            self._queue.append(span)
+            self.stats["spans"] += 1
+            queued = len(self._queue)
+        self._ensure_thread()
+        if queued >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_thread(self):
+        # Thread không sống qua fork: tạo lại khi pid đổi
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Gửi toàn bộ span đang chờ cho exporter"""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._queue:
+                        return
+                    batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                try:
+                    self.exporter.export(batch)
+                    self.stats["exported"] += len(batch)
+                except Exception as e:
+                    # Tracing là best-effort: bỏ batch lỗi, không retry
+                    self.stats["export_errors"] += 1
+                    self.stats["dropped"] += len(batch)
+                    logger.bind(throttle=60).warning(f"⚠️ Trace export failed ({len(batch)} spans): {e}")
+                    return
+
+    def reset_after_fork(self):
+        """Bỏ các span của master (đã/ sẽ được master export), tạo lại lock"""
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._queue = deque()
+        self._thread = None
+
+    def shutdown(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self.enabled:
+            self.flush()
+            self.exporter.shutdown()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = len(self._queue)
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "queued": queued,
+            "exporter": type(self.exporter).__name__ if self.exporter is not None else None,
+        }
+
+
+def create_tracer(settings: Settings = None) -> Tracer:
+    """Tạo tracer theo Settings.TRACING_* (exporter "jsonl", "otlp" hoặc "none")"""
+    from tool.tracing.exporters import JsonlSpanExporter, OTLPHttpSpanExporter
+
+    settings = settings or Settings.load_settings()
+    exporter_name = (settings.TRACING_EXPORTER or "none").lower()
+    if not settings.TRACING_ENABLED or exporter_name == "none":
+        exporter = None
+    elif exporter_name == "jsonl":
+        exporter = JsonlSpanExporter(settings.TRACING_JSONL_PATH, max_bytes=settings.TRACING_JSONL_MAX_BYTES)
+    elif exporter_name == "otlp":
+        exporter = OTLPHttpSpanExporter(settings.TRACING_OTLP_ENDPOINT, service_name=settings.TRACING_SERVICE_NAME)
+    else:
+        raise ValueError(f"Unknown TRACING_EXPORTER: {settings.TRACING_EXPORTER}")
+
+    return Tracer(
+        exporter,
+        sample_rate=settings.TRACING_SAMPLE_RATE,
+        enabled=settings.TRACING_ENABLED,
+        max_queue=settings.TRACING_MAX_QUEUE,
+        interval=settings.TRACING_EXPORT_INTERVAL
+    )
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Tracer dùng chung trong process"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = create_tracer()
+    return _tracer
+
+
+def set_tracer(tracer: Tracer) -> Tracer:
+    """Thay tracer dùng chung (vd: trong test), trả về tracer cũ"""
+    global _tracer
+    previous, _tracer = _tracer, tracer
+    return previous
+
+
+def reset_tracer_after_fork():
+    if _tracer is not None:
+        _tracer.reset_after_fork()
+
+
+def current_span():
+    """Span hiện tại (NOOP_SPAN nếu không có)"""
+    return _current_span.get() or NOOP_SPAN
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+def trace_span(name: str, kind: str = SPAN_KIND_INTERNAL, **attributes):
+    """Context manager tạo span con bằng tracer dùng chung"""
+    return get_tracer().span(name, kind, **attributes)
+
+
+def traced(name: Optional[str] = None, kind: str = SPAN_KIND_INTERNAL, **attributes) -> Callable:
+    """Decorator bọc hàm (sync hoặc async) trong một span"""
+
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or fn.__qualname__
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with get_tracer().span(span_name, kind, **attributes):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with get_tracer().span(span_name, kind, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+